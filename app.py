@@ -1,84 +1,842 @@
 """
 HappyGrow - 儿童绘画评分系统主应用
 """
-from flask import Flask, request, jsonify, render_template
+from flask import Flask, Response, request, jsonify, render_template, send_file, stream_with_context, url_for
 import os
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from contextlib import contextmanager
+import re
+import hmac
+import time
+import click
+import numpy as np
+from PIL import Image
 from happygrow.services.image_service import ImageService
-from happygrow.core.scoring_engine import ScoringEngine
-from happygrow.core.feedback_generator import FeedbackGenerator
-from happygrow.config.config import SERVER_CONFIG, BASE_DIR
+from happygrow.services.result_store import ResultStore
+from happygrow.services.duplicate_index import DuplicateIndex
+from happygrow.services.micro_batcher import MicroBatcher
+from happygrow.services.request_scheduler import RequestScheduler, SchedulerBusy
+from happygrow.services.image_guard import ImageRejected, MemoryBudget, MemoryBudgetExceeded
+from happygrow.services.shadow_scoring import ShadowScorer, load_candidate
+from happygrow.services.job_broker import create_broker
+from happygrow.services.pixel_cache import PixelCache
+from happygrow.services import rollups
+from happygrow.services.retention import RetentionManager
+from happygrow.core.scoring_engine import ScoringEngine, MultiFrameScoringEngine, DIMENSION_METRICS
+from happygrow.core.analysis_result import AnalysisResult, dumps
+from happygrow.core.deadline import Deadline, ScoringTimeout
+from happygrow.config.config import SERVER_CONFIG, BASE_DIR, STORAGE_CONFIG, \
+    DUPLICATE_CONFIG, THUMBNAIL_CONFIG, SAMPLING_CONFIG, IMAGE_CONFIG, \
+    BATCHING_CONFIG, SCHEDULER_CONFIG, DEADLINE_CONFIG, \
+    IMAGE_GUARD_CONFIG, PIXEL_CACHE_CONFIG, SHADOW_CONFIG, BROKER_CONFIG, ANALYTICS_CONFIG, AGE_GROUPS, \
+    EXPORT_CONFIG, RETENTION_CONFIG
 
 app = Flask(__name__)
 
 # 配置上传文件夹
 UPLOAD_FOLDER = os.path.join(BASE_DIR, 'uploads')
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
+THUMBNAIL_FOLDER = os.path.join(UPLOAD_FOLDER, THUMBNAIL_CONFIG['folder'])
+
+# SHA-256 内容哈希
+HASH_PATTERN = re.compile(r'[0-9a-f]{64}')
+
+# 班级标识（'all' 在统计查询中表示全部班级）
+CLASS_PATTERN = re.compile(r'[A-Za-z0-9_-]{1,64}')
+
+# 评分结果存储
+result_store = ResultStore(STORAGE_CONFIG['database'], ANALYTICS_CONFIG['score_bins'])
+
+# 近似重复索引（进程内，启动时从结果存储加载）
+duplicate_index = DuplicateIndex(
+    DUPLICATE_CONFIG['max_distance'],
+    DUPLICATE_CONFIG['hash_size'],
+    DUPLICATE_CONFIG['min_bits']
+)
+for _image_hash, _phash in result_store.iter_perceptual_hashes():
+    duplicate_index.add(_phash, _image_hash)
+
+# 跨请求微批处理（后台线程在首次提交时启动）
+scoring_batcher = MicroBatcher(
+    ScoringEngine.compute_batch_metrics,
+    BATCHING_CONFIG['max_batch_size'],
+    BATCHING_CONFIG['max_wait_ms'] / 1000
+)
+
+# 按预估成本分通道调度评分请求（每个worker进程独立计数）
+request_scheduler = RequestScheduler(
+    SCHEDULER_CONFIG['lanes'],
+    SCHEDULER_CONFIG['cost_model'],
+    IMAGE_CONFIG['analysis_max_size'],
+    SCHEDULER_CONFIG['queue_timeout'],
+    SCHEDULER_CONFIG['calibration_samples']
+)
+
+# 并发请求的内存预算（每个worker进程独立计数）
+memory_budget = MemoryBudget(
+    IMAGE_GUARD_CONFIG['memory_budget'],
+    IMAGE_GUARD_CONFIG['bytes_per_decoded_pixel'],
+    IMAGE_GUARD_CONFIG['bytes_per_analysis_pixel'],
+    IMAGE_CONFIG['analysis_max_size'],
+    IMAGE_GUARD_CONFIG['draft_max_size']
+)
+
+# 影子评分：对抽样请求在后台用候选引擎重新评分并对比（每个worker进程独立统计）
+shadow_scorer = ShadowScorer(
+    load_candidate(SHADOW_CONFIG['candidate']),
+    SHADOW_CONFIG['sample_rate'],
+    SHADOW_CONFIG['max_pending'],
+    SHADOW_CONFIG['tolerance']
+)
+
+# 评分任务队列（开启时精确评分由评分worker执行）和分析像素的共享暂存目录
+job_broker = create_broker(BROKER_CONFIG) if BROKER_CONFIG['enabled'] else None
+staging_cache = PixelCache(BROKER_CONFIG['staging_dir'], BROKER_CONFIG['staging_max_bytes']) \
+    if BROKER_CONFIG['enabled'] else None
+
+# 上传目录保留策略（后台线程由 gunicorn.conf.py 的 post_worker_init 在worker中启动）
+retention_manager = RetentionManager(
+    UPLOAD_FOLDER,
+    result_store,
+    RETENTION_CONFIG['max_age_days'],
+    RETENTION_CONFIG['max_total_bytes'],
+    RETENTION_CONFIG['keep_per_hash'],
+    RETENTION_CONFIG['interval'],
+    RETENTION_CONFIG['batch_size'],
+    RETENTION_CONFIG['batch_pause'],
+    RETENTION_CONFIG['lock_path'],
+    min_age_seconds=RETENTION_CONFIG['min_age_seconds']
+)
 
 @app.route('/')
 def index():
-    """渲染主页"""
-    return render_template('index.html')
+    """渲染主页（页面据此在上传前缩小过大的图像）"""
+    return render_template(
+        'index.html',
+        analysis_max_size=IMAGE_CONFIG['analysis_max_size'],
+        jpeg_quality=IMAGE_CONFIG['jpeg_quality']
+    )
+
+def _is_reusable(result):
+    """已保存的结果是否可直接复用：全部已注册子指标的算法版本为最新且归档图像仍然存在"""
+    if result is None or not result['image_path']:
+        return False
+    versions = ScoringEngine.metric_versions()
+    if any(result['metric_versions'].get(name) != version for name, version in versions.items()):
+        return False
+    return os.path.exists(os.path.join(BASE_DIR, result['image_path']))
+
+def _find_cached_result(image_hash, phash):
+    """查找已评分的相同图像或近似重复图像"""
+    result = result_store.get_result(image_hash)
+    if _is_reusable(result):
+        duplicate_index.record_lookup(exact=True)
+        return result
+    
+    match = duplicate_index.find(phash)
+    if match is not None:
+        result = result_store.get_result(match[1])
+        if _is_reusable(result):
+            duplicate_index.record_lookup(near=True)
+            return result
+    
+    duplicate_index.record_lookup()
+    return None
+
+def _build_response(scores, details, age_group, image_path, image_hash):
+    """组装分析结果（反馈在序列化完整响应时生成）"""
+    return AnalysisResult(image_hash, image_path, age_group, scores, details, {
+        str(size): url_for('thumbnail', image_hash=image_hash, size=size)
+        for size in THUMBNAIL_CONFIG['sizes']
+    })
+
+def _palette(upload, scoring_engine=None):
+    """
+    完整响应的主色调（不入库；compact 模式或没有解码像素时为None）
+
+    本地评分时与颜色指标共享同一个颜色直方图，复用结果或交给评分worker时由解码的图像计算。
+    """
+    if _compact() or upload.get('image') is None:
+        return None
+    if not isinstance(scoring_engine, ScoringEngine):
+        scoring_engine = ScoringEngine(upload['image'])
+    return scoring_engine.color_palette()
+
+def _compact():
+    """请求（表单或查询参数）指定 format=compact 时只返回数值"""
+    return request.values.get('format') == 'compact'
+
+def _result_response(result):
+    """分析结果的JSON响应"""
+    return Response(result.to_json(_compact()), mimetype='application/json')
+
+def _prepare_upload():
+    """
+    读取并校验上传的图像
+
+    只读取图像头部（不解码像素），解码由 _decode_upload 在调度名额内完成
+
+    Returns:
+        (upload, None) 或 (None, 错误响应)；upload 包含 file、age_group、class_id、mode、dimensions、
+        client_hash、image_hash、header、deadline、partial
+    """
+    # 截止时间从收到请求时开始计算（包括排队时间）
+    deadline = Deadline(DEADLINE_CONFIG['timeout'])
+    
+    # 获取文件和年龄组
+    if 'file' not in request.files:
+        return None, (jsonify({'error': '未找到上传的文件'}), 400)
+    
+    file = request.files['file']
+    age_group = request.form.get('age_group', 'school')
+    mode = request.form.get('mode') or \
+        SAMPLING_CONFIG['age_group_modes'].get(age_group, SAMPLING_CONFIG['default_mode'])
+    if mode not in ('exact', 'fast'):
+        return None, (jsonify({'error': f'不支持的评分模式: {mode}'}), 400)
+    
+    # 只评分部分维度时以逗号分隔，如 dimensions=color_usage；未指定时评分全部维度
+    dimensions = request.form.get('dimensions')
+    if dimensions:
+        try:
+            dimensions = ScoringEngine.select_dimensions([name.strip() for name in dimensions.split(',')])
+        except ValueError as e:
+            return None, (jsonify({'error': str(e)}), 400)
+        if len(dimensions) == len(DIMENSION_METRICS):
+            dimensions = None
+    else:
+        dimensions = None
+    
+    # 所属班级（可选），计入班级统计
+    class_id = request.form.get('class_id') or None
+    if class_id is not None and (not CLASS_PATTERN.fullmatch(class_id) or class_id == 'all'):
+        return None, (jsonify({'error': f'无效的班级标识: {class_id}'}), 400)
+    
+    partial = request.form.get('partial')
+    partial = DEADLINE_CONFIG['partial_results'] if partial is None else partial.lower() in ('1', 'true', 'yes')
+    
+    # 网页端对原始文件计算的哈希（上传的可能是缩小后的图像）
+    client_hash = request.form.get('client_hash', '').lower()
+    if not HASH_PATTERN.fullmatch(client_hash):
+        client_hash = None
+    
+    # 验证图像
+    is_valid, error = ImageService.validate_image(file)
+    if not is_valid:
+        return None, (jsonify({'error': error}), 400)
+    
+    # 计算内容哈希
+    image_hash = ImageService.compute_hash(file)
+    
+    return {
+        'file': file,
+        'age_group': age_group,
+        'class_id': class_id,
+        'mode': mode,
+        'dimensions': dimensions,
+        'client_hash': client_hash,
+        'image_hash': image_hash,
+        'header': ImageService.inspect_header(file),
+        'deadline': deadline,
+        'partial': partial
+    }, None
+
+def _decode_upload(upload):
+    """
+    解码并预处理图像（内存不足时按降级尺寸草稿解码），计算感知哈希
+
+    多帧GIF只解码合成代表帧（和抽样帧）所需的帧，upload['frames'] 为参与评分的 [(帧序号, 图像)]
+    """
+    header = upload['header']
+    if header.format == 'GIF' and header.frames > 1:
+        upload['image'], upload['frames'] = ImageService.preprocess_animation(upload['file'])
+    else:
+        upload['image'] = ImageService.preprocess_image(upload['file'], draft_size=upload.get('draft_size'))
+        upload['frames'] = None
+    upload['phash'] = ImageService.compute_perceptual_hash(upload['image'])
+    upload['deadline'].check()
+
+def _admit(upload):
+    """
+    按图像尺寸在调度通道中等待执行名额，并预留内存预算（不足时可能降级为草稿解码）
+
+    Returns:
+        释放名额和内存预留的函数（可重复调用）
+
+    Raises:
+        SchedulerBusy: 排队超时
+        MemoryBudgetExceeded: 内存预算不足
+    """
+    ticket = None
+    if SCHEDULER_CONFIG['enabled']:
+        ticket = request_scheduler.acquire(*upload['header'].size, timeout=upload['deadline'].remaining())
+    try:
+        reservation, upload['draft_size'] = memory_budget.admit(upload['header'])
+    except MemoryBudgetExceeded:
+        if ticket is not None:
+            ticket.release()
+        raise
+    
+    def release():
+        reservation.release()
+        if ticket is not None:
+            ticket.release()
+    return release
+
+@contextmanager
+def _admitted(upload):
+    """在调度名额和内存预留内执行"""
+    release = _admit(upload)
+    try:
+        yield
+    finally:
+        release()
+
+def _busy_response():
+    """调度通道排队超时或内存预算不足"""
+    response = jsonify({'error': '服务器繁忙，请稍后重试'})
+    response.headers['Retry-After'] = '5'
+    return response, 503
+
+def _timeout_response(error, upload):
+    """评分超时；请求允许时附带已完成维度的部分得分"""
+    body = {'error': '评分超时，请稍后重试或上传较小的图像', 'timeout': True}
+    if upload['partial'] and error.scores:
+        body['partial_scores'] = error.scores
+        body['completed'] = list(error.scores)
+    return jsonify(body), 504
+
+def _cached_analysis(upload):
+    """相同或近似重复的图像直接复用已保存的子指标，返回 (scores, details, response)，没有时返回None"""
+    if not DUPLICATE_CONFIG['enabled'] or _multi_frame(upload):
+        # 多帧平均的结果不入库，已保存的单帧结果也不能代替
+        return None
+    cached = _find_cached_result(upload['image_hash'], upload['phash'])
+    if cached is None:
+        return None
+    _record_alias(upload, cached['image_hash'])
+    scores, details = ScoringEngine.score_from_metrics(cached['metrics'])
+    if upload['dimensions']:
+        scores = {dimension: scores[dimension] for dimension in upload['dimensions']}
+        details = {dimension: details[dimension] for dimension in upload['dimensions']}
+    response = _build_response(scores, details, upload['age_group'], cached['image_path'],
+                               cached['image_hash'])
+    response.duplicate_of = cached['image_hash']
+    response.palette = _palette(upload)
+    return scores, details, response
+
+def _multi_frame(upload):
+    """是否对动图的多个抽样帧评分"""
+    return bool(upload['frames']) and len(upload['frames']) > 1
+
+def _record_alias(upload, image_hash):
+    """
+    客户端哈希与结果的内容哈希不同时记录别名，供上传前查询命中
+
+    客户端哈希对应缩小前的原始文件，服务端无法重新计算，只在收到的图像符合网页端缩小的结果
+    （重新编码的JPEG，最长边不超过评分尺寸）时记录；已有的别名不会被改写。
+    """
+    client_hash = upload['client_hash']
+    if not client_hash or client_hash == image_hash:
+        return
+    header = upload['header']
+    if header.format != 'JPEG' or max(header.size) > IMAGE_CONFIG['analysis_max_size']:
+        return
+    result_store.add_alias(client_hash, image_hash)
+
+def _archive_upload(upload):
+    """保存图像并生成缩略图，返回相对项目根目录的图像路径"""
+    saved_path = ImageService.save_image(upload['image'], upload['file'].filename, UPLOAD_FOLDER)
+    ImageService.generate_thumbnails(upload['image'], upload['image_hash'], THUMBNAIL_FOLDER)
+    image_path = os.path.relpath(saved_path, BASE_DIR)
+    # 记录归档对应的图像哈希，保留策略据此只保留每张图像最新的归档
+    result_store.record_archive(image_path, upload['image_hash'], os.path.getsize(saved_path))
+    return image_path
+
+def _create_engine(upload):
+    """创建评分引擎；启用微批处理时，精确模式的子指标与并发请求合并计算"""
+    deadline = upload['deadline']
+    if _multi_frame(upload):
+        return MultiFrameScoringEngine([image for _, image in upload['frames']], deadline=deadline)
+    if BATCHING_CONFIG['enabled'] and upload['mode'] == 'exact' and not upload['dimensions']:
+        try:
+            precomputed = scoring_batcher.submit(upload['image']).result(timeout=deadline.remaining())
+        except FutureTimeoutError:
+            raise ScoringTimeout()
+        return ScoringEngine(upload['image'], precomputed=precomputed, deadline=deadline)
+    return ScoringEngine(upload['image'], mode=upload['mode'], deadline=deadline)
+
+def _finish_analysis(scoring_engine, scores, details, upload, image_path):
+    """保存精确评分结果并组装响应"""
+    response = _build_response(scores, details, upload['age_group'], image_path, upload['image_hash'])
+    response.palette = _palette(upload, scoring_engine)
+    
+    if scoring_engine.metric_intervals:
+        response.score_errors = {
+            dimension: details[dimension].get('score_error', 0.0) for dimension in scores
+        }
+    if upload['draft_size']:
+        response.downgraded = True
+    sampled_frames = _multi_frame(upload)
+    if sampled_frames:
+        response.frames = [
+            {'index': index, 'scores': frame_scores}
+            for (index, _), frame_scores in zip(upload['frames'], scoring_engine.frame_scores())
+        ]
+    if scoring_engine.metric_intervals or upload['draft_size'] or sampled_frames or upload['dimensions']:
+        # 抽样近似、降级解码或多帧平均的结果不写入存储，避免被当作精确结果复用
+        # （重新评分只能由存档的代表帧重新计算）；只评分部分维度时缺少其他维度的子指标
+        return response
+    
+    # 保存评分结果和原始子指标（包括第三方子指标）
+    versions = ScoringEngine.metric_versions()
+    metrics = {
+        name: value
+        for dimension in details.values()
+        for name, value in dimension.items()
+        if name in versions
+    }
+    result_store.save_result(
+        upload['image_hash'],
+        scores,
+        metrics,
+        versions,
+        image_path=image_path,
+        age_group=upload['age_group'],
+        config_version=ScoringEngine.config_version(),
+        phash=upload['phash'],
+        class_id=upload['class_id']
+    )
+    duplicate_index.add(upload['phash'], upload['image_hash'])
+    _record_alias(upload, upload['image_hash'])
+    return response
 
 @app.route('/analyze', methods=['POST'])
 def analyze_drawing():
     """分析上传的绘画"""
     try:
-        # 获取文件和年龄组
-        if 'file' not in request.files:
-            return jsonify({'error': '未找到上传的文件'}), 400
-        
-        file = request.files['file']
-        age_group = request.form.get('age_group', 'school')
-        
-        # 验证图像
-        is_valid, error = ImageService.validate_image(file)
-        if not is_valid:
-            return jsonify({'error': error}), 400
-        
-        # 预处理图像
-        image = ImageService.preprocess_image(file)
-        
-        # 保存图像
-        saved_path = ImageService.save_image(image, file.filename, UPLOAD_FOLDER)
-        
-        # 评分分析
-        scoring_engine = ScoringEngine(image)
+        upload, error_response = _prepare_upload()
+        if error_response is not None:
+            return error_response
         
-        # 分析各个维度
-        color_score, color_details = scoring_engine.analyze_color_usage()
-        composition_score, composition_details = scoring_engine.analyze_composition()
-        creativity_score, creativity_details = scoring_engine.analyze_creativity()
+        with _admitted(upload):
+            _decode_upload(upload)
+            cached = _cached_analysis(upload)
+            if cached is not None:
+                return _result_response(cached[2])
+            
+            image_path = _archive_upload(upload)
+            if _use_broker(upload):
+                _submit_remote(upload, image_path)
+            else:
+                # 评分分析
+                scoring_engine = _create_engine(upload)
+                start = time.perf_counter()
+                scores, details = scoring_engine.analyze(upload['dimensions'])
+                _shadow_score(upload, scoring_engine, scores, details, time.perf_counter() - start)
+                
+                return _result_response(_finish_analysis(scoring_engine, scores, details, upload, image_path))
         
-        # 整合评分
-        scores = {
-            'color_usage': color_score,
-            'composition': composition_score,
-            'creativity': creativity_score
-        }
-        
-        details = {
-            'color_usage': color_details,
-            'composition': composition_details,
-            'creativity': creativity_details
-        }
-        
-        # 生成反馈
-        feedback_generator = FeedbackGenerator(age_group, scores, details)
-        feedback = feedback_generator.generate_feedback()
-        suggestions = feedback_generator.get_improvement_suggestions()
-        
-        return jsonify({
-            'scores': scores,
-            'feedback': feedback,
-            'suggestions': suggestions,
-            'image_path': os.path.relpath(saved_path, BASE_DIR)
-        })
+        # 评分在评分worker上执行：等待结果时已释放调度名额和内存预留，不限制本进程同时等待的请求数
+        return _result_response(_await_remote(upload, image_path))
         
+    except (SchedulerBusy, MemoryBudgetExceeded):
+        return _busy_response()
+    except ImageRejected as e:
+        # 动图解码帧数超过上限等
+        return jsonify({'error': str(e)}), 400
+    except ScoringTimeout as e:
+        return _timeout_response(e, upload)
     except Exception as e:
         app.logger.error(f"Error processing image: {str(e)}")
         return jsonify({'error': '处理图像时发生错误'}), 500
 
+def _use_broker(upload):
+    """是否交给评分worker：只处理全部维度、精确计算的单帧图像（其余情况的结果不入库，仍在本地计算）"""
+    return job_broker is not None and upload['mode'] == 'exact' and not upload['dimensions'] and \
+        not upload['draft_size'] and not _multi_frame(upload)
+
+def _submit_remote(upload, image_path):
+    """
+    暂存分析像素并提交评分任务（在调度名额和内存预留内执行），之后不再需要解码的图像
+
+    同一图像的任务未完成时不重复提交，等待同一结果。
+    """
+    image_hash = upload['image_hash']
+    staging_cache.put(image_hash, np.asarray(upload['image']))
+    job_broker.enqueue(image_hash, {
+        'image_hash': image_hash,
+        'image_path': image_path,
+        'age_group': upload['age_group'],
+        'class_id': upload['class_id'],
+        'phash': upload['phash']
+    })
+    upload['palette'] = _palette(upload)
+    upload['image'] = upload['frames'] = None
+
+def _await_remote(upload, image_path):
+    """等待评分worker的结果（worker负责写入结果存储），组装响应"""
+    image_hash = upload['image_hash']
+    result = job_broker.wait_result(image_hash, upload['deadline'].remaining(), BROKER_CONFIG['poll_interval'])
+    if result is None:
+        raise ScoringTimeout()
+    if 'error' in result:
+        raise RuntimeError(result['error'])
+    scores, details = ScoringEngine.score_from_metrics(result['metrics'])
+    duplicate_index.add(upload['phash'], image_hash)
+    _record_alias(upload, image_hash)
+    response = _build_response(scores, details, upload['age_group'], image_path, image_hash)
+    response.palette = upload.get('palette')
+    return response
+
+def _shadow_score(upload, scoring_engine, scores, details, seconds):
+    """抽样提交影子评分（只比较单帧、全部维度、精确计算的结果），不等待结果"""
+    if not SHADOW_CONFIG['enabled'] or not isinstance(scoring_engine, ScoringEngine):
+        return
+    if upload['dimensions'] or upload['mode'] != 'exact' or scoring_engine.precomputed:
+        return
+    shadow_scorer.maybe_submit(upload['image'], scores, details, seconds)
+
+def _sse(event, data):
+    """格式化一条 Server-Sent Events 消息"""
+    return f"event: {event}\ndata: {dumps(data).decode('utf-8')}\n\n"
+
+def _dimension_event(dimension, score, details):
+    """单个维度的评分事件"""
+    return _sse('dimension', {
+        'dimension': dimension,
+        'score': float(score),
+        'details': {name: float(value) for name, value in details.items()}
+    })
+
+@app.route('/analyze/stream', methods=['POST'])
+def analyze_drawing_stream():
+    """
+    渐进式分析上传的绘画（Server-Sent Events）
+
+    每完成一个维度发送一条 dimension 事件（颜色、构图、创造力依次发送；
+    快速模式回退为精确计算时会再次发送各维度，以最后一条为准），
+    最后发送 feedback 事件，内容与 /analyze 的响应相同；出错时发送 error 事件，
+    超过截止时间时发送 timeout 事件（此前已完成维度的得分已经发送）。
+    请求参数错误仍以普通 JSON 返回 400。
+    """
+    try:
+        upload, error_response = _prepare_upload()
+        if error_response is not None:
+            return error_response
+        # 名额和内存预留在事件流生成完毕（或客户端断开、响应关闭）时释放
+        release = _admit(upload)
+        try:
+            _decode_upload(upload)
+            cached = _cached_analysis(upload)
+        except Exception:
+            release()
+            raise
+    except (SchedulerBusy, MemoryBudgetExceeded):
+        return _busy_response()
+    except ImageRejected as e:
+        # 动图解码帧数超过上限等
+        return jsonify({'error': str(e)}), 400
+    except ScoringTimeout as e:
+        return _timeout_response(e, upload)
+    except Exception as e:
+        app.logger.error(f"Error processing image: {str(e)}")
+        return jsonify({'error': '处理图像时发生错误'}), 500
+    
+    def generate():
+        scores = {}
+        details = {}
+        try:
+            if cached is not None:
+                scores, details, response = cached
+                for dimension, score in scores.items():
+                    yield _dimension_event(dimension, score, details[dimension])
+                yield _sse('feedback', response.to_dict(_compact()))
+                return
+            
+            image_path = _archive_upload(upload)
+            scoring_engine = _create_engine(upload)
+            for dimension, score, dimension_details in scoring_engine.iter_analyze(upload['dimensions']):
+                scores[dimension], details[dimension] = score, dimension_details
+                yield _dimension_event(dimension, score, dimension_details)
+            
+            result = _finish_analysis(scoring_engine, scores, details, upload, image_path)
+            yield _sse('feedback', result.to_dict(_compact()))
+        except ScoringTimeout:
+            # 已完成维度的得分已经以 dimension 事件发送
+            yield _sse('timeout', {'error': '评分超时，请稍后重试或上传较小的图像', 'completed': list(scores)})
+        except Exception as e:
+            app.logger.error(f"Error processing image: {str(e)}")
+            yield _sse('error', {'error': '处理图像时发生错误'})
+        finally:
+            release()
+    
+    response = Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        # 禁止反向代理缓冲，使每个事件立即到达客户端
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+    response.call_on_close(release)
+    return response
+
+@app.route('/results/<content_hash>')
+def lookup_result(content_hash):
+    """
+    上传前按原始文件的SHA-256查询已有评分结果，命中时返回与 /analyze 相同的内容，
+    未命中返回404（客户端随后正常上传）
+    """
+    if not HASH_PATTERN.fullmatch(content_hash):
+        return jsonify({'error': '无效的图像哈希'}), 400
+    
+    result = result_store.find_result(content_hash)
+    if not _is_reusable(result):
+        return jsonify({'error': '未找到评分结果'}), 404
+    
+    duplicate_index.record_lookup(exact=True)
+    scores, details = ScoringEngine.score_from_metrics(result['metrics'])
+    response = _build_response(scores, details, request.args.get('age_group', 'school'),
+                               result['image_path'], result['image_hash'])
+    response.duplicate_of = result['image_hash']
+    return _result_response(response)
+
+def _class_key(class_id):
+    """统计查询的班级参数：'all' 为全部班级"""
+    if class_id == 'all':
+        return rollups.ALL
+    return class_id if CLASS_PATTERN.fullmatch(class_id) else None
+
+def _age_group_key(age_group):
+    """统计查询的年龄组参数：未指定或 'all' 为全部年龄组"""
+    if not age_group or age_group == 'all':
+        return rollups.ALL
+    return age_group if age_group in AGE_GROUPS else None
+
+def _rollup_key(key):
+    return 'all' if key == rollups.ALL else key
+
+@app.route('/classes/<class_id>/summary')
+def class_summary(class_id):
+    """
+    班级（'all' 为全部班级）各年龄组及全部年龄组的评分统计：
+    各维度和总体得分的数量、均值、标准差和得分分布，由预聚合统计读取
+    """
+    class_key = _class_key(class_id)
+    if class_key is None:
+        return jsonify({'error': f'无效的班级标识: {class_id}'}), 400
+    
+    data = result_store.rollup(class_key, list(AGE_GROUPS) + [rollups.ALL], 'all', ['all'])
+    return jsonify({
+        'class_id': class_id,
+        'age_groups': {
+            _rollup_key(age_group): buckets['all']
+            for age_group, buckets in data.items()
+        }
+    })
+
+@app.route('/classes/<class_id>/trend')
+def class_trend(class_id):
+    """
+    班级最近若干天或周（?period=day|week&count=12&age_group=）的评分统计，
+    每个时间桶一项，没有结果的时间桶 dimensions 为空
+    """
+    class_key = _class_key(class_id)
+    if class_key is None:
+        return jsonify({'error': f'无效的班级标识: {class_id}'}), 400
+    age_group = request.args.get('age_group')
+    age_key = _age_group_key(age_group)
+    if age_key is None:
+        return jsonify({'error': f'未知的年龄组: {age_group}'}), 400
+    period = request.args.get('period', 'week')
+    if period not in ('day', 'week'):
+        return jsonify({'error': f'不支持的统计周期: {period}'}), 400
+    count = request.args.get('count', ANALYTICS_CONFIG['default_trend_buckets'], type=int)
+    count = max(1, min(count, ANALYTICS_CONFIG['max_trend_buckets']))
+    
+    buckets = rollups.recent_buckets(period, count)
+    data = result_store.rollup(class_key, [age_key], period, buckets).get(age_key, {})
+    return jsonify({
+        'class_id': class_id,
+        'age_group': _rollup_key(age_key),
+        'period': period,
+        'buckets': [{'bucket': bucket, 'dimensions': data.get(bucket, {})} for bucket in buckets]
+    })
+
+def _is_admin():
+    """请求是否带有管理令牌（Authorization: Bearer <EXPORT_CONFIG['admin_token']>）"""
+    token = EXPORT_CONFIG['admin_token']
+    header = request.headers.get('Authorization', '')
+    return bool(token) and header.startswith('Bearer ') and hmac.compare_digest(header[7:], token)
+
+@app.route('/admin/export')
+def admin_export():
+    """
+    逐块下载评分结果（?cursor=0&limit=5000&format=csv|parquet），格式与 flask export-results 的分块文件相同；
+    响应头 X-Export-Cursor 为下一块的游标，没有更多结果时返回204
+    """
+    from happygrow.services.result_export import export_chunk
+    if not _is_admin():
+        return jsonify({'error': '需要管理令牌'}), 403
+    
+    cursor = request.args.get('cursor', 0, type=int)
+    limit = request.args.get('limit', EXPORT_CONFIG['chunk_rows'], type=int)
+    limit = max(1, min(limit, EXPORT_CONFIG['chunk_rows']))
+    fmt = request.args.get('format', EXPORT_CONFIG['format'])
+    try:
+        body, next_cursor, rows = export_chunk(result_store, cursor, limit, fmt)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    headers = {'X-Export-Cursor': str(next_cursor), 'X-Export-Rows': str(rows), 'Cache-Control': 'no-store'}
+    if body is None:
+        return Response(status=204, headers=headers)
+    
+    name = f"results-{cursor + 1:012d}-{next_cursor:012d}.{'parquet' if fmt == 'parquet' else 'csv.gz'}"
+    headers['Content-Disposition'] = f'attachment; filename="{name}"'
+    mimetype = 'application/vnd.apache.parquet' if fmt == 'parquet' else 'application/gzip'
+    return Response(body, mimetype=mimetype, headers=headers)
+
+@app.route('/thumbnails/<image_hash>')
+def thumbnail(image_hash):
+    """
+    返回缩略图：size 参数为客户端需要的最长边像素，返回不小于该尺寸的最小缩略图；
+    客户端 Accept 头支持时优先返回 WebP
+    """
+    if not HASH_PATTERN.fullmatch(image_hash):
+        return jsonify({'error': '无效的图像哈希'}), 400
+    
+    sizes = sorted(THUMBNAIL_CONFIG['sizes'])
+    requested = request.args.get('size', sizes[0], type=int)
+    size = next((s for s in sizes if s >= requested), sizes[-1])
+    formats = ImageService.thumbnail_formats()
+    fmt = 'webp' if 'webp' in formats and 'image/webp' in request.headers.get('Accept', '') else 'jpeg'
+    
+    path = ImageService.thumbnail_path(THUMBNAIL_FOLDER, image_hash, size, fmt)
+    if not os.path.exists(path):
+        # 缩略图功能上线前归档的图像按需补生成
+        result = result_store.get_result(image_hash)
+        if result is None or not result['image_path'] or \
+           not os.path.exists(os.path.join(BASE_DIR, result['image_path'])):
+            return jsonify({'error': '未找到图像'}), 404
+        with Image.open(os.path.join(BASE_DIR, result['image_path'])) as image:
+            ImageService.generate_thumbnails(image.convert('RGB'), image_hash, THUMBNAIL_FOLDER)
+    
+    response = send_file(
+        path,
+        mimetype=f'image/{fmt}',
+        etag=f'{image_hash}-{size}-{fmt}',
+        max_age=THUMBNAIL_CONFIG['max_age']
+    )
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    response.vary.add('Accept')
+    return response
+
+@app.route('/stats/duplicates')
+def duplicate_stats():
+    """当前进程的重复上传统计"""
+    return jsonify(duplicate_index.report())
+
+@app.route('/stats/batching')
+def batching_stats():
+    """当前进程的微批处理统计"""
+    return jsonify(scoring_batcher.report())
+
+@app.route('/stats/scheduler')
+def scheduler_stats():
+    """当前进程各调度通道的预估与实际耗时，以及据此拟合的成本模型"""
+    return jsonify(request_scheduler.report())
+
+@app.route('/stats/shadow')
+def shadow_stats():
+    """当前进程影子评分的子指标、得分差异和耗时比汇总"""
+    return jsonify(shadow_scorer.report())
+
+@app.route('/stats/memory')
+def memory_stats():
+    """当前进程的内存预算使用情况"""
+    return jsonify(memory_budget.report())
+
+@app.route('/stats/broker')
+def broker_stats():
+    """评分任务队列的任务数和在线评分worker"""
+    if job_broker is None:
+        return jsonify({'enabled': False})
+    return jsonify(dict(job_broker.report(), enabled=True))
+
+@app.route('/stats/retention')
+def retention_stats():
+    """上传目录保留策略的清理次数和按原因回收的文件数、字节数"""
+    return jsonify(dict(retention_manager.report(), enabled=RETENTION_CONFIG['enabled']))
+
+@app.cli.command('scoring-worker')
+@click.option('--jobs', type=int, default=None, help='执行指定数量的任务后退出')
+def scoring_worker_command(jobs):
+    """从评分任务队列领取并执行评分任务（可在多台主机上各启动若干个）"""
+    from happygrow.services.scoring_worker import ScoringWorker
+    broker = job_broker or create_broker(BROKER_CONFIG)
+    staging = staging_cache or PixelCache(BROKER_CONFIG['staging_dir'], BROKER_CONFIG['staging_max_bytes'])
+    worker = ScoringWorker(broker, result_store, staging=staging,
+                           heartbeat_interval=BROKER_CONFIG['heartbeat_interval'])
+    click.echo(f"评分worker {worker.worker_id} 已启动（{BROKER_CONFIG['backend']}）")
+    try:
+        worker.run(max_jobs=jobs)
+    except KeyboardInterrupt:
+        pass
+    click.echo(f"已完成 {worker.stats['processed']} 个任务，失败 {worker.stats['failed']} 次")
+
+@app.cli.command('rebuild-rollups')
+def rebuild_rollups_command():
+    """由全部评分结果重建班级/年龄组聚合统计（回填历史结果或修改得分分布区间后执行）"""
+    count = result_store.rebuild_rollups()
+    click.echo(f"已由 {count} 条评分结果重建聚合统计")
+
+@app.cli.command('export-results')
+@click.option('--format', 'fmt', type=click.Choice(['csv', 'parquet']), default=None, help='导出格式')
+@click.option('--output', type=click.Path(file_okay=False), default=None, help='导出目录')
+@click.option('--chunk-rows', type=int, default=None, help='每个文件的结果数')
+@click.option('--max-chunks', type=int, default=None, help='最多写入的文件数（分多次导出）')
+@click.option('--restart', is_flag=True, help='忽略已有进度从头导出')
+def export_results_command(fmt, output, chunk_rows, max_chunks, restart):
+    """把评分结果分块导出为gzip压缩的CSV或Parquet文件，再次执行时从上次的游标继续（只导出新增和覆盖写入的结果）"""
+    from happygrow.services.result_export import ResultExporter
+    try:
+        exporter = ResultExporter(result_store, output or EXPORT_CONFIG['directory'],
+                                  fmt or EXPORT_CONFIG['format'], chunk_rows or EXPORT_CONFIG['chunk_rows'])
+        stats = exporter.export(restart=restart, max_chunks=max_chunks)
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    click.echo(f"导出 {stats['rows']} 条结果到 {len(stats['files'])} 个文件，游标 {stats['cursor']}"
+               f"{'（已导出全部结果）' if stats['done'] else ''}")
+
+@app.cli.command('retention')
+@click.option('--dry-run', is_flag=True, help='只统计会删除的文件')
+def retention_command(dry_run):
+    """按 RETENTION_CONFIG 的策略清理一次上传目录"""
+    result = retention_manager.sweep(dry_run=dry_run)
+    if result is None:
+        raise click.ClickException("其他进程正在清理上传目录")
+    click.echo(f"扫描 {result['scanned']} 个文件（{result['total_bytes']} 字节），"
+               f"{'将' if dry_run else '已'}回收后剩余 {result['remaining_bytes']} 字节")
+    for reason, item in result['reclaimed'].items():
+        click.echo(f"  {reason}: {item['files']} 个文件，{item['bytes']} 字节")
+
+@app.cli.command('rescore')
+def rescore_command():
+    """增量重评分归档图像（只重新计算算法版本变化的指标）"""
+    from happygrow.services.rescore_service import RescoreService
+    pixel_cache = None
+    if PIXEL_CACHE_CONFIG['enabled']:
+        pixel_cache = PixelCache(PIXEL_CACHE_CONFIG['directory'], PIXEL_CACHE_CONFIG['max_bytes'])
+    stats = RescoreService(result_store, pixel_cache=pixel_cache).rescore_all()
+    click.echo(f"重评分 {stats['rescored']} 条结果，其中仅重新加权 {stats['reweighted_only']} 条，失败 {stats['failed']} 条")
+    for metric, count in sorted(stats['recomputed'].items()):
+        click.echo(f"  重新计算 {metric}: {count}")
+    if pixel_cache is not None:
+        cache_stats = pixel_cache.report()
+        click.echo(f"像素缓存命中 {cache_stats['hits']} 次，未命中 {cache_stats['misses']} 次，淘汰 {cache_stats['evicted']} 个文件")
+
 if __name__ == '__main__':
+    if RETENTION_CONFIG['enabled']:
+        retention_manager.start()
     app.run(
         host=SERVER_CONFIG['host'],
         port=SERVER_CONFIG['port'],
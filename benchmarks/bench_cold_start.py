@@ -0,0 +1,84 @@
+"""
+冷启动基准：在全新的Python进程中分别测量
+1. 导入应用的耗时
+2. （可选）预加载依赖的耗时
+3. 首个 /analyze 请求的延迟
+4. 第二个请求的延迟（作为稳态参考）
+
+子进程使用临时结果存储并关闭重复图像复用，两个请求上传不同的图像，都完整评分，
+不读写 data/happygrow.db。
+
+用法:
+    python benchmarks/bench_cold_start.py [--runs 5]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 在子进程中执行，保证每次测量都是冷启动
+_CHILD_SCRIPT = r'''
+import io, json, os, sys, tempfile, time
+# 配置模块只有常量，在计时前修改：临时结果存储，关闭重复图像复用
+from happygrow.config.config import STORAGE_CONFIG, DUPLICATE_CONFIG
+storage_dir = tempfile.TemporaryDirectory()
+STORAGE_CONFIG['database'] = os.path.join(storage_dir.name, 'bench.db')
+DUPLICATE_CONFIG['enabled'] = False
+
+t0 = time.perf_counter()
+from app import app
+t_import = time.perf_counter() - t0
+
+t_preload = 0.0
+if sys.argv[1] == 'preload':
+    from happygrow.core.warmup import preload_dependencies
+    t_preload = preload_dependencies()
+
+from happygrow.core.warmup import create_warmup_image
+
+def request_once(client, size):
+    buf = io.BytesIO()
+    create_warmup_image(size).save(buf, 'PNG')
+    buf.seek(0)
+    start = time.perf_counter()
+    response = client.post('/analyze', data={'file': (buf, 'bench.png'), 'age_group': 'school'},
+                           content_type='multipart/form-data')
+    assert response.status_code == 200, response.data
+    return time.perf_counter() - start, response.get_json()['image_path']
+
+app.config['TESTING'] = True
+with app.test_client() as client:
+    t_first, path_first = request_once(client, 400)
+    t_second, path_second = request_once(client, 401)
+
+for path in (path_first, path_second):
+    os.remove(os.path.join(app.root_path, path))
+storage_dir.cleanup()
+
+print(json.dumps({'import': t_import, 'preload': t_preload, 'first': t_first, 'second': t_second}))
+'''
+
+def run_once(mode):
+    """在新进程中执行一次测量"""
+    output = subprocess.check_output(
+        [sys.executable, '-c', _CHILD_SCRIPT, mode], cwd=ROOT_DIR, text=True
+    )
+    return json.loads(output.strip().splitlines()[-1])
+
+def main():
+    parser = argparse.ArgumentParser(description='HappyGrow 冷启动基准')
+    parser.add_argument('--runs', type=int, default=5, help='每种模式的重复次数')
+    args = parser.parse_args()
+    
+    print(f"{'模式':<10}{'导入(ms)':>12}{'预加载(ms)':>12}{'首请求(ms)':>12}{'次请求(ms)':>12}")
+    for mode in ('lazy', 'preload'):
+        samples = [run_once(mode) for _ in range(args.runs)]
+        row = {key: statistics.median(s[key] for s in samples) * 1000 for key in samples[0]}
+        print(f"{mode:<10}{row['import']:>12.1f}{row['preload']:>12.1f}{row['first']:>12.1f}{row['second']:>12.1f}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,43 @@
+"""
+差分测试与基准：在生成的和真实的儿童画上比较评分引擎与参考实现，输出各子指标的最大偏差和加速比
+
+用法:
+    python benchmarks/bench_differential.py [--mode exact] [--images 24] [--seed 20241202] [--size 128]
+                                            [--corpus uploads] [--min-speedup 1] [--json]
+有子指标超出容差，或总加速比低于 --min-speedup 时退出码为1。
+"""
+import argparse
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from happygrow.config.config import DIFFERENTIAL_CONFIG
+from happygrow.core.differential import generate_corpus, load_corpus, run_differential
+from happygrow.core.warmup import preload_dependencies
+
+def main():
+    parser = argparse.ArgumentParser(description='HappyGrow 评分差分测试')
+    parser.add_argument('--mode', choices=['exact', 'fast'], default='exact', help='候选引擎的评分模式')
+    parser.add_argument('--images', type=int, default=DIFFERENTIAL_CONFIG['generated_images'], help='随机生成的用例数')
+    parser.add_argument('--seed', type=int, default=DIFFERENTIAL_CONFIG['seed'], help='生成用例的随机种子')
+    parser.add_argument('--size', type=int, default=DIFFERENTIAL_CONFIG['max_size'], help='用例最长边像素')
+    parser.add_argument('--corpus', action='append', help='真实图像目录（可重复），默认取配置')
+    parser.add_argument('--min-speedup', type=float, default=1.0, help='评分引擎相对参考实现的最低总加速比')
+    parser.add_argument('--json', action='store_true', help='输出JSON报告')
+    args = parser.parse_args()
+
+    preload_dependencies()
+    corpus = generate_corpus(args.images, args.seed, args.size)
+    for directory in args.corpus or DIFFERENTIAL_CONFIG['corpus_dirs']:
+        corpus.extend(load_corpus(directory, args.size))
+    report = run_differential(corpus, mode=args.mode)
+    print(json.dumps(report.to_dict(), ensure_ascii=False, indent=2) if args.json else report.format())
+    fast_enough = report.speedup is not None and report.speedup >= args.min_speedup
+    if not fast_enough:
+        print(f"总加速比 {report.speedup or 0:.1f}x 低于 {args.min_speedup:g}x", file=sys.stderr)
+    sys.exit(0 if report.passed and fast_enough else 1)
+
+if __name__ == '__main__':
+    main()
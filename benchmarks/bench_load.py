@@ -0,0 +1,485 @@
+"""
+负载测试：在本机启动 HappyGrow（gunicorn，指定worker/线程数），按目标请求速率或并发数
+回放不同尺寸和格式的上传，测量吞吐量、延迟分位数、错误率和服务端内存（RSS）随时间的变化，
+输出该worker配置的容量报告
+
+用法:
+    python benchmarks/bench_load.py [--workers 4] [--threads 2]
+                                    [--rates 2,4,8 | --concurrency 1,4,8] [--duration 30]
+                                    [--mix png:800:3,jpeg:1600:4,jpeg:3000:1,gif:400:1]
+                                    [--slo-p95-ms 2000] [--max-error-rate 0.01] [--json report.json]
+    python benchmarks/bench_load.py --url http://host:5001 --server-pid <master_pid> ...   # 压测已运行的服务
+
+--rates 为开环模式：按固定间隔（--poisson 时为泊松到达）发送，延迟从计划发送时间算起，
+服务变慢时不会因客户端等待而少发请求；--concurrency 为闭环模式：N个客户端各自收到响应后立即发下一个。
+每个阶段依次运行，容量为延迟 p95 和错误率都满足目标的阶段中的最高吞吐量。
+本地启动的服务使用临时结果数据库（HAPPYGROW_DATABASE），结果、别名和班级统计不写入 data/happygrow.db，
+结束后连同数据库一起删除；默认也删除本次测试归档的上传图像和缩略图（--keep-uploads 保留）。
+"""
+import argparse
+import glob
+import io
+import json
+import os
+import random
+import signal
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+from PIL import Image, ImageDraw
+from happygrow.config.config import AGE_GROUPS, IMAGE_CONFIG, SERVER_CONFIG, THUMBNAIL_CONFIG
+
+def parse_mix(spec):
+    """解析 '格式:最长边:权重' 列表，如 'png:800:3,jpeg:1600:4'"""
+    mix = []
+    for item in spec.split(','):
+        fmt, size, weight = item.split(':')
+        fmt = fmt.lower()
+        if fmt not in ('png', 'jpeg', 'gif'):
+            raise argparse.ArgumentTypeError(f"不支持的格式: {fmt}")
+        mix.append((fmt, int(size), float(weight)))
+    return mix
+
+def make_drawing(rng, size):
+    """随机的画：白底上若干彩色线条和色块，宽高比随机（最短边不小于200，满足上传的最小尺寸）"""
+    ratio = rng.choice((0.75, 1.0, 4 / 3))
+    width, height = (size, max(200, int(size * ratio))) if ratio <= 1 else (max(200, int(size / ratio)), size)
+    image = Image.new('RGB', (width, height), 'white')
+    draw = ImageDraw.Draw(image)
+    for _ in range(rng.randint(6, 30)):
+        color = tuple(rng.randrange(256) for _ in range(3))
+        x0, x1 = sorted((rng.randrange(width), rng.randrange(width)))
+        y0, y1 = sorted((rng.randrange(height), rng.randrange(height)))
+        if rng.random() < 0.6:
+            draw.line((x0, y0, x1, y1), fill=color, width=rng.randint(2, max(3, size // 80)))
+        else:
+            draw.ellipse((x0, y0, x1, y1), fill=color)
+    return image
+
+def encode(image, fmt, rng):
+    """编码为上传文件内容；GIF为几帧逐步添加笔画的动图"""
+    buffer = io.BytesIO()
+    if fmt == 'gif':
+        frames = [image.copy()]
+        for _ in range(3):
+            frame = frames[-1].copy()
+            w, h = frame.size
+            x, y = rng.randrange(w), rng.randrange(h)
+            ImageDraw.Draw(frame).line((x, y, rng.randrange(w), rng.randrange(h)), fill=(0, 0, 0), width=4)
+            frames.append(frame)
+        frames = [frame.convert('P', palette=Image.ADAPTIVE) for frame in frames]
+        frames[0].save(buffer, 'GIF', save_all=True, append_images=frames[1:], duration=200, loop=0)
+    elif fmt == 'jpeg':
+        image.save(buffer, 'JPEG', quality=90)
+    else:
+        image.save(buffer, 'PNG')
+    return buffer.getvalue()
+
+def build_payloads(mix, unique, seed):
+    """
+    按混合比例预先生成上传内容（测试期间客户端不占用CPU编码图像）
+
+    每种格式和尺寸生成 unique 张不同的画；循环使用后会命中服务端的重复图像缓存，
+    报告中单独统计重复命中数，需要纯计算负载时增大 --unique。
+    """
+    rng = random.Random(seed)
+    payloads = []
+    for fmt, size, weight in mix:
+        variants = [encode(make_drawing(rng, size), fmt, rng) for _ in range(unique)]
+        payloads.append({'kind': f"{fmt}:{size}", 'format': fmt, 'weight': weight,
+                         'variants': variants, 'next': 0})
+    return payloads
+
+def multipart(fields, filename, data, content_type):
+    boundary = uuid.uuid4().hex
+    lines = []
+    for name, value in fields.items():
+        lines.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode())
+    lines.append(f'--{boundary}\r\nContent-Disposition: form-data; name="file"; filename="{filename}"\r\n'
+                 f'Content-Type: {content_type}\r\n\r\n'.encode())
+    lines.append(data)
+    lines.append(f'\r\n--{boundary}--\r\n'.encode())
+    return b''.join(lines), f'multipart/form-data; boundary={boundary}'
+
+class LoadClient:
+    def __init__(self, url, payloads, seed, timeout):
+        """
+        发送上传请求并记录结果
+
+        Args:
+            url: 服务地址
+            payloads: build_payloads 的结果
+            seed: 选择负载的随机种子
+            timeout: 单个请求的超时（秒）
+        """
+        self.url = url.rstrip('/')
+        self.payloads = payloads
+        self.timeout = timeout
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.records = []
+        self.archived = []  # (image_path, image_hash)，供结束后清理
+
+    def _choose(self):
+        with self._lock:
+            payload = self._random.choices(self.payloads, weights=[p['weight'] for p in self.payloads])[0]
+            data = payload['variants'][payload['next'] % len(payload['variants'])]
+            payload['next'] += 1
+            age_group = self._random.choice(list(AGE_GROUPS))
+        return payload, data, age_group
+
+    def send(self, stage, scheduled=None):
+        """
+        发送一个请求；scheduled 为开环模式的计划发送时间，延迟从该时间算起（包括客户端排队）
+        """
+        payload, data, age_group = self._choose()
+        body, content_type = multipart({'age_group': age_group}, f"load.{payload['format']}", data,
+                                       f"image/{payload['format']}")
+        request = urllib.request.Request(f"{self.url}/analyze", data=body, method='POST',
+                                         headers={'Content-Type': content_type})
+        start = time.perf_counter()
+        status, result = None, None
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                status = response.status
+                result = json.loads(response.read())
+        except urllib.error.HTTPError as e:
+            status = e.code
+            e.read()
+        except (urllib.error.URLError, OSError):
+            status = 'connection_error'
+        end = time.perf_counter()
+        record = {
+            'stage': stage,
+            'kind': payload['kind'],
+            'status': status,
+            'latency': end - (scheduled if scheduled is not None else start),
+            'service_time': end - start,
+            'end': end,
+            'duplicate': bool(result and result.get('duplicate_of'))
+        }
+        with self._lock:
+            self.records.append(record)
+            if result and not record['duplicate'] and result.get('image_path'):
+                self.archived.append((result['image_path'], result.get('image_hash')))
+        return record
+
+def run_open_loop(client, stage, rate, duration, poisson, max_inflight, rng):
+    """开环：按速率发送，未完成请求数达到 max_inflight 时记为客户端饱和（跳过该次发送）"""
+    skipped = 0
+    inflight = threading.BoundedSemaphore(max_inflight)
+    with ThreadPoolExecutor(max_workers=max_inflight) as executor:
+        start = time.perf_counter()
+        scheduled = start
+        while scheduled < start + duration:
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            if inflight.acquire(blocking=False):
+                future = executor.submit(client.send, stage, scheduled)
+                future.add_done_callback(lambda _: inflight.release())
+            else:
+                skipped += 1
+            scheduled += rng.expovariate(rate) if poisson else 1 / rate
+    return skipped
+
+def run_closed_loop(client, stage, concurrency, duration):
+    """闭环：concurrency 个客户端各自收到响应后立即发送下一个"""
+    deadline = time.perf_counter() + duration
+
+    def loop():
+        while time.perf_counter() < deadline:
+            client.send(stage)
+
+    threads = [threading.Thread(target=loop, daemon=True) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return 0
+
+def process_tree(pid):
+    """pid 及其所有子孙进程（读取 /proc，仅Linux）"""
+    children = {}
+    for stat_path in glob.glob('/proc/[0-9]*/stat'):
+        try:
+            with open(stat_path) as f:
+                fields = f.read().rsplit(')', 1)[1].split()
+        except OSError:
+            continue
+        children.setdefault(int(fields[1]), []).append(int(stat_path.split('/')[2]))
+    tree, stack = [], [pid]
+    while stack:
+        current = stack.pop()
+        tree.append(current)
+        stack.extend(children.get(current, []))
+    return tree
+
+def rss_bytes(pid):
+    try:
+        with open(f'/proc/{pid}/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return 0
+
+class RssSampler(threading.Thread):
+    def __init__(self, pid, interval):
+        """后台按间隔采样服务进程树的RSS：[(时间, 总RSS, 各进程RSS)]"""
+        super().__init__(daemon=True)
+        self.pid = pid
+        self.interval = interval
+        self.samples = []
+        self.stage = None
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.is_set():
+            per_process = {pid: rss_bytes(pid) for pid in process_tree(self.pid)}
+            self.samples.append((time.perf_counter(), self.stage, sum(per_process.values()), per_process))
+            self._stop_event.wait(self.interval)
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+def percentile(values, q):
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(q / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+def _latency_summary(records):
+    latencies = [r['latency'] * 1000 for r in records if r['status'] == 200]
+    return {
+        'count': len(records),
+        'p50_ms': percentile(latencies, 50),
+        'p90_ms': percentile(latencies, 90),
+        'p95_ms': percentile(latencies, 95),
+        'p99_ms': percentile(latencies, 99),
+        'max_ms': max(latencies) if latencies else None,
+        'mean_ms': statistics.fmean(latencies) if latencies else None
+    }
+
+def summarize_stage(name, target, records, duration, skipped, rss_samples, master_pid):
+    """单个阶段的吞吐量、延迟分位数、错误率、重复命中和RSS"""
+    statuses = {}
+    for record in records:
+        statuses[str(record['status'])] = statuses.get(str(record['status']), 0) + 1
+    ok = statuses.get('200', 0)
+    errors = len(records) - ok
+    worker_peaks = {}
+    for _, _, _, per_process in rss_samples:
+        for pid, rss in per_process.items():
+            if pid != master_pid:
+                worker_peaks[pid] = max(worker_peaks.get(pid, 0), rss)
+    by_kind = {}
+    for record in records:
+        by_kind.setdefault(record['kind'], []).append(record)
+    return {
+        'stage': name,
+        'target': target,
+        'requests': len(records),
+        'throughput_rps': ok / duration,
+        'error_rate': errors / len(records) if records else 0.0,
+        'statuses': statuses,
+        'client_skipped': skipped,
+        'duplicates': sum(1 for r in records if r['duplicate']),
+        'latency': _latency_summary(records),
+        'latency_by_kind': {kind: _latency_summary(items) for kind, items in sorted(by_kind.items())},
+        'rss': {
+            'peak_total_mb': max((s[2] for s in rss_samples), default=0) / 2 ** 20,
+            'end_total_mb': rss_samples[-1][2] / 2 ** 20 if rss_samples else 0,
+            'peak_worker_mb': max(worker_peaks.values(), default=0) / 2 ** 20,
+            'processes': len(rss_samples[-1][3]) if rss_samples else 0
+        }
+    }
+
+def capacity(stages, slo_p95_ms, max_error_rate):
+    """满足延迟和错误率目标的阶段中的最高吞吐量"""
+    passing = [stage for stage in stages
+               if stage['latency']['p95_ms'] is not None and stage['latency']['p95_ms'] <= slo_p95_ms
+               and stage['error_rate'] <= max_error_rate]
+    best = max(passing, key=lambda stage: stage['throughput_rps'], default=None)
+    return {
+        'slo_p95_ms': slo_p95_ms,
+        'max_error_rate': max_error_rate,
+        'sustainable_rps': best['throughput_rps'] if best else 0.0,
+        'stage': best['stage'] if best else None
+    }
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+def start_server(workers, threads, port, preload_dependencies, database):
+    """以gunicorn启动服务（使用仓库的 gunicorn.conf.py，只覆盖监听地址和结果数据库），等待就绪"""
+    env = dict(os.environ, HAPPYGROW_WORKERS=str(workers), HAPPYGROW_THREADS=str(threads),
+               HAPPYGROW_PRELOAD_DEPENDENCIES='1' if preload_dependencies else '0',
+               HAPPYGROW_DATABASE=str(database))
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', '-b', f'127.0.0.1:{port}', 'wsgi:app'],
+        cwd=ROOT_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    url = f'http://127.0.0.1:{port}'
+    deadline = time.time() + 120
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"服务启动失败，退出码 {process.returncode}")
+        try:
+            with urllib.request.urlopen(f'{url}/stats/memory', timeout=1):
+                return process, url
+        except (urllib.error.URLError, OSError):
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError("等待服务就绪超时")
+
+def stop_server(process):
+    process.send_signal(signal.SIGTERM)
+    try:
+        process.wait(timeout=60)
+    except subprocess.TimeoutExpired:
+        process.kill()
+
+def cleanup(archived):
+    """删除本次测试归档的上传图像和缩略图"""
+    thumbnail_dir = os.path.join(ROOT_DIR, IMAGE_CONFIG['upload_folder'], THUMBNAIL_CONFIG['folder'])
+    removed = 0
+    for image_path, image_hash in set(archived):
+        paths = [os.path.join(ROOT_DIR, image_path)]
+        if image_hash:
+            paths.extend(glob.glob(os.path.join(thumbnail_dir, image_hash[:2], f"{image_hash}_*")))
+        for path in paths:
+            try:
+                os.remove(path)
+                removed += 1
+            except FileNotFoundError:
+                pass
+    return removed
+
+def format_report(report):
+    lines = [f"服务: {report['server']['url']}  workers={report['server']['workers']} "
+             f"threads={report['server']['threads']}  负载: {report['mix']}"]
+    lines.append(f"{'阶段':<16}{'请求':>7}{'吞吐(rps)':>11}{'错误率':>8}{'p50':>9}{'p95':>9}{'p99':>9}"
+                 f"{'重复':>6}{'RSS峰值(MB)':>13}{'单worker(MB)':>14}")
+    for stage in report['stages']:
+        latency = stage['latency']
+        ms = lambda value: f"{value:>9.0f}" if value is not None else f"{'-':>9}"
+        lines.append(f"{stage['stage']:<16}{stage['requests']:>7}{stage['throughput_rps']:>11.2f}"
+                     f"{stage['error_rate']:>8.1%}{ms(latency['p50_ms'])}{ms(latency['p95_ms'])}{ms(latency['p99_ms'])}"
+                     f"{stage['duplicates']:>6}{stage['rss']['peak_total_mb']:>13.0f}{stage['rss']['peak_worker_mb']:>14.0f}")
+    result = report['capacity']
+    lines.append(f"容量（p95 <= {result['slo_p95_ms']:.0f}ms，错误率 <= {result['max_error_rate']:.1%}）: "
+                 f"{result['sustainable_rps']:.2f} rps" + (f"（{result['stage']}）" if result['stage'] else "（无满足目标的阶段）"))
+    return '\n'.join(lines)
+
+def main():
+    parser = argparse.ArgumentParser(description='HappyGrow 负载测试与容量报告')
+    parser.add_argument('--url', help='压测已运行的服务（不启动本地服务）')
+    parser.add_argument('--server-pid', type=int, help='--url 模式下用于采样RSS的服务master进程号')
+    parser.add_argument('--workers', type=int, default=SERVER_CONFIG['production']['workers'], help='gunicorn worker数')
+    parser.add_argument('--threads', type=int, default=SERVER_CONFIG['production']['threads'], help='每个worker的线程数')
+    parser.add_argument('--lazy-dependencies', action='store_true', help='worker首次请求时再导入SciPy等依赖')
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument('--rates', default='2,4,8', help='开环模式各阶段的目标请求速率（请求/秒，逗号分隔）')
+    group.add_argument('--concurrency', help='闭环模式各阶段的并发客户端数（逗号分隔）')
+    parser.add_argument('--poisson', action='store_true', help='开环模式按泊松过程到达')
+    parser.add_argument('--duration', type=float, default=30, help='每个阶段的时长（秒）')
+    parser.add_argument('--warmup', type=float, default=5, help='开始测量前以最低负载预热的时长（秒）')
+    parser.add_argument('--mix', type=parse_mix, default=parse_mix('png:800:3,jpeg:1600:4,jpeg:3000:1,gif:400:1'),
+                        help="负载组成 '格式:最长边:权重,...'")
+    parser.add_argument('--unique', type=int, default=32, help='每种负载预先生成的不同图像数')
+    parser.add_argument('--max-inflight', type=int, default=256, help='开环模式未完成请求数上限')
+    parser.add_argument('--timeout', type=float, default=120, help='单个请求超时（秒）')
+    parser.add_argument('--slo-p95-ms', type=float, default=2000, help='容量计算的延迟 p95 目标')
+    parser.add_argument('--max-error-rate', type=float, default=0.01, help='容量计算允许的错误率')
+    parser.add_argument('--rss-interval', type=float, default=0.5, help='RSS采样间隔（秒）')
+    parser.add_argument('--seed', type=int, default=20241202, help='随机种子')
+    parser.add_argument('--keep-uploads', action='store_true', help='保留测试期间归档的上传图像')
+    parser.add_argument('--json', help='同时把完整报告（包括RSS时间序列）写入该文件')
+    args = parser.parse_args()
+
+    closed_loop = args.concurrency is not None
+    targets = [float(value) for value in (args.concurrency or args.rates).split(',')]
+    print("生成负载图像...", file=sys.stderr)
+    payloads = build_payloads(args.mix, args.unique, args.seed)
+
+    process = None
+    storage_dir = None
+    if args.url:
+        url, master_pid = args.url, args.server_pid
+    else:
+        storage_dir = tempfile.TemporaryDirectory(prefix='happygrow-load-')
+        process, url = start_server(args.workers, args.threads, free_port(), not args.lazy_dependencies,
+                                    os.path.join(storage_dir.name, 'happygrow.db'))
+        master_pid = process.pid
+    client = LoadClient(url, payloads, args.seed, args.timeout)
+    sampler = RssSampler(master_pid, args.rss_interval) if master_pid else None
+    rng = random.Random(args.seed)
+    stages = []
+    try:
+        if sampler:
+            sampler.start()
+        if args.warmup > 0:
+            print("预热...", file=sys.stderr)
+            if closed_loop:
+                run_closed_loop(client, 'warmup', 1, args.warmup)
+            else:
+                run_open_loop(client, 'warmup', min(targets), args.warmup, False, args.max_inflight, rng)
+        for target in targets:
+            name = f"c={target:g}" if closed_loop else f"{target:g} rps"
+            print(f"阶段 {name}...", file=sys.stderr)
+            if sampler:
+                sampler.stage = name
+            start = time.perf_counter()
+            if closed_loop:
+                skipped = run_closed_loop(client, name, int(target), args.duration)
+            else:
+                skipped = run_open_loop(client, name, target, args.duration, args.poisson, args.max_inflight, rng)
+            elapsed = time.perf_counter() - start
+            records = [r for r in client.records if r['stage'] == name]
+            samples = [s for s in sampler.samples if s[1] == name] if sampler else []
+            stages.append(summarize_stage(name, target, records, elapsed, skipped, samples, master_pid))
+    finally:
+        if sampler:
+            sampler.stop()
+        if process:
+            stop_server(process)
+        if storage_dir:
+            storage_dir.cleanup()
+        removed = 0 if args.keep_uploads or args.url else cleanup(client.archived)
+
+    report = {
+        'server': {'url': url, 'workers': None if args.url else args.workers,
+                   'threads': None if args.url else args.threads},
+        'mix': ','.join(f"{fmt}:{size}:{weight:g}" for fmt, size, weight in args.mix),
+        'mode': 'closed' if closed_loop else ('poisson' if args.poisson else 'open'),
+        'stages': stages,
+        'capacity': capacity(stages, args.slo_p95_ms, args.max_error_rate),
+        'removed_files': removed
+    }
+    print(format_report(report))
+    if args.json:
+        report['rss_timeline'] = [{'t': t - sampler.samples[0][0], 'stage': stage, 'total_mb': total / 2 ** 20}
+                                  for t, stage, total, _ in sampler.samples] if sampler else []
+        with open(args.json, 'w') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,48 @@
+"""
+微批处理基准：比较逐张计算与按批计算一组小图像的全部子指标的耗时
+
+用法:
+    python benchmarks/bench_micro_batch.py [--images 32] [--size 256] [--batch 16] [--runs 5]
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from happygrow.core.scoring_engine import ScoringEngine
+from happygrow.core.warmup import create_warmup_image, preload_dependencies
+
+def time_per_image(images):
+    start = time.perf_counter()
+    for image in images:
+        ScoringEngine(image).compute_metrics()
+    return time.perf_counter() - start
+
+def time_batched(images, batch_size):
+    start = time.perf_counter()
+    for offset in range(0, len(images), batch_size):
+        ScoringEngine.compute_batch_metrics(images[offset:offset + batch_size])
+    return time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser(description='HappyGrow 微批处理基准')
+    parser.add_argument('--images', type=int, default=32, help='图像数量')
+    parser.add_argument('--size', type=int, default=256, help='图像边长')
+    parser.add_argument('--batch', type=int, default=16, help='批大小')
+    parser.add_argument('--runs', type=int, default=5, help='重复次数')
+    args = parser.parse_args()
+    
+    preload_dependencies()
+    images = [create_warmup_image(args.size) for _ in range(args.images)]
+    time_batched(images[:2], 2)  # 预热
+    
+    single = statistics.median(time_per_image(images) for _ in range(args.runs))
+    batched = statistics.median(time_batched(images, args.batch) for _ in range(args.runs))
+    print(f"逐张: {single / args.images * 1000:.2f} ms/张")
+    print(f"批量(批大小 {args.batch}): {batched / args.images * 1000:.2f} ms/张，加速 {single / batched:.2f}x")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,47 @@
+"""
+HappyGrow 生产环境 gunicorn 配置
+
+启动:   gunicorn -c gunicorn.conf.py wsgi:app
+重载:   kill -HUP <master_pid>     # 平滑重启全部worker（配置变更）
+升级:   kill -USR2 <master_pid>    # 启动加载新代码的master，确认就绪后向旧master发送 TERM
+"""
+import gc
+import os
+from happygrow.config.config import SERVER_CONFIG
+
+_production = SERVER_CONFIG['production']
+
+bind = f"{SERVER_CONFIG['host']}:{SERVER_CONFIG['port']}"
+workers = int(os.environ.get('HAPPYGROW_WORKERS', _production['workers']))
+threads = int(os.environ.get('HAPPYGROW_THREADS', _production['threads']))
+worker_class = 'gthread' if threads > 1 else 'sync'
+timeout = _production['timeout']
+graceful_timeout = _production['graceful_timeout']
+max_requests = _production['max_requests']
+max_requests_jitter = _production['max_requests_jitter']
+
+# 在master中预加载应用（以及NumPy/SciPy），fork后worker以写时复制方式共享内存
+preload_app = _production['preload']
+_preload_dependencies = os.environ.get(
+    'HAPPYGROW_PRELOAD_DEPENDENCIES', str(_production['preload_dependencies'])
+).lower() in ('1', 'true', 'yes')
+
+def when_ready(server):
+    """master就绪（应用已预加载）后、fork worker之前导入依赖并预热评分路径"""
+    if preload_app and _preload_dependencies:
+        from happygrow.core.warmup import preload_dependencies as preload
+        server.log.info("依赖预加载完成，耗时 %.2fs", preload())
+    if preload_app and _preload_dependencies and _production['warmup']:
+        from happygrow.core.warmup import warmup_scoring_path
+        elapsed = warmup_scoring_path()
+        server.log.info("评分路径预热完成，耗时 %.2fs", elapsed)
+    if preload_app:
+        # 冻结预加载阶段创建的对象，避免worker中的GC触碰这些页面破坏写时复制共享
+        gc.freeze()
+
+def post_worker_init(worker):
+    """worker初始化后启动上传目录清理线程（master中的线程不会随fork进入worker，各worker通过锁文件互斥）"""
+    from happygrow.config.config import RETENTION_CONFIG
+    if RETENTION_CONFIG['enabled']:
+        from app import retention_manager
+        retention_manager.start()
@@ -1,6 +1,7 @@
 """
 配置文件，包含评分标准和系统设置
 """
+import os
 from pathlib import Path
 
 # 项目根目录
@@ -10,7 +11,19 @@ BASE_DIR = Path(__file__).parent.parent.parent
 SERVER_CONFIG = {
     'host': '0.0.0.0',
     'port': 5001,
-    'debug': True
+    'debug': True,
+    # 生产环境（gunicorn）配置，见 gunicorn.conf.py
+    'production': {
+        'workers': 4,
+        'threads': 2,
+        'preload': True,             # fork前预加载应用
+        'preload_dependencies': True,  # fork前导入SciPy等按需加载的依赖；False时由worker在首次请求时导入
+        'warmup': True,              # fork前用合成图像预热评分路径
+        'timeout': 60,
+        'graceful_timeout': 30,
+        'max_requests': 1000,        # worker处理一定请求数后平滑回收
+        'max_requests_jitter': 100
+    }
 }
 
 # 图像处理配置
@@ -20,11 +33,48 @@ IMAGE_CONFIG = {
     'min_height': 200,
     'max_width': 4096,
     'max_height': 4096,
+    'analysis_max_size': 2048,  # 评分使用的最长边像素，网页端上传前按此尺寸缩小
     'max_file_size': 10 * 1024 * 1024,  # 10MB
     'jpeg_quality': 85,
     'upload_folder': 'uploads'
 }
 
+# 解码前的图像防护配置
+IMAGE_GUARD_CONFIG = {
+    'max_pixels': 4096 * 4096,                 # 单帧像素上限（由文件头判断，解码前拒绝）
+    'max_frames': 500,                         # 动图帧数上限
+    'max_total_pixels': 512 * 1024 * 1024,     # 动图所有帧像素之和上限
+    'max_metadata_chunk': 1024 * 1024,         # PNG 文本/ICC 等辅助块的大小上限
+    'memory_budget': 1024 * 1024 * 1024,       # 每个worker进程并发请求的预估内存之和上限
+    'bytes_per_decoded_pixel': 4,              # 解码原图每像素内存（Pillow RGB按4字节存储）
+    'bytes_per_analysis_pixel': 60,            # 评分每像素峰值内存（灰度、边缘、局部方差等float64平面）
+    'draft_max_size': 1024                     # 内存不足时JPEG草稿解码并以该尺寸评分
+}
+
+# 动图（GIF）配置
+ANIMATION_CONFIG = {
+    'strategy': 'representative',    # 'representative' 只评分代表帧（最后一帧）；'sample' 评分均匀抽取的若干帧并取子指标均值
+    'sample_frames': 4,              # 'sample' 策略抽取的帧数（包含代表帧）
+    'max_decoded_frames': 32         # 每个请求最多解码的帧数（合成代表帧或抽样帧所需的帧都计入）
+}
+
+# 缩略图配置
+THUMBNAIL_CONFIG = {
+    'sizes': (256, 1024),            # 缩略图最长边（像素）
+    'formats': ('webp', 'jpeg'),     # 生成的格式，按客户端 Accept 头协商
+    'quality': 80,
+    'folder': 'thumbnails',          # 位于上传目录下
+    'max_age': 365 * 24 * 3600       # 缩略图按内容哈希命名，可长期缓存
+}
+
+# 近似重复检测配置
+DUPLICATE_CONFIG = {
+    'enabled': True,
+    'hash_size': 8,       # dHash边长（哈希位数 = hash_size^2）
+    'max_distance': 6,    # 判定为近似重复的最大汉明距离
+    'min_bits': 8         # 哈希中1和0至少各有的位数，过滤接近空白的画面
+}
+
 # 年龄组配置
 AGE_GROUPS = {
     'toddler': {'min': 2, 'max': 4},
@@ -48,6 +98,8 @@ SCORING_CRITERIA = {
     'color_usage': {
         'unique_colors': {
             'weight': 0.4,
+            'bits': 5,              # 统计时每通道保留的位数，合并肉眼难以区分的相近颜色
+            'min_fraction': 0.005,  # 像素占比低于该值的颜色视为压缩噪声，不计入
             'thresholds': {
                 5: 60,   # 5种颜色以下得60分
                 10: 75,  # 5-10种颜色得75分
@@ -58,7 +110,11 @@ SCORING_CRITERIA = {
         'color_harmony': {
             'weight': 0.3,
             'complementary_bonus': 10,
-            'analogous_bonus': 8
+            'analogous_bonus': 8,
+            'analogous_range': 30,        # 色相扇区宽度（度），相邻的主要扇区视为类似色
+            'analogous_min_share': 0.05,  # 扇区占有彩色像素的最小比例
+            'min_saturation_bin': 1,      # 低于该饱和度分档的像素视为无彩色
+            'min_value_bin': 1            # 低于该明度分档的像素视为无彩色
         },
         'color_coverage': {
             'weight': 0.3,
@@ -86,6 +142,180 @@ SCORING_CRITERIA = {
     }
 }
 
+# 评分指标算法版本（算法改动时递增对应版本号，重评分时只重新计算版本变化的指标）
+# 评分分辨率改为 analysis_max_size 后，与像素尺度相关的指标（颜色数、边缘和笔触）递增一次
+METRIC_VERSIONS = {
+    'unique_colors': 3,
+    'harmony_score': 2,
+    'coverage_score': 1,
+    'thirds_score': 1,
+    'balance_score': 1,
+    'focal_score': 2,
+    'shape_variety': 2,
+    'stroke_expression': 2,
+    'space_usage': 1
+}
+
+# 主色调提取配置（完整响应的 palette 字段，不入库）
+COLOR_PALETTE_CONFIG = {
+    'bits': 5,              # 提取前将颜色降到每通道5位，限制参与切分的颜色数
+    'palette_size': 8,      # 最多提取的主色调数量
+    'refine_iterations': 4  # 中位切分后k-means细化的固定轮数
+}
+
+# 色相查找表配置（构建一次，各worker进程以只读内存映射共享）
+HUE_LUT_CONFIG = {
+    'bits': 6,              # 查找表下标的每通道位数
+    'saturation_bins': 4,
+    'value_bins': 4,
+    'directory': BASE_DIR / 'data'
+}
+
+# 抽样快速评分配置
+SAMPLING_CONFIG = {
+    'default_mode': 'exact',     # 'exact' 精确计算；'fast' 在抽样像素上估计像素统计类指标
+    'age_group_modes': {},       # 按年龄组指定默认模式，如 {'toddler': 'fast'}
+    'pixel_samples': 16384,      # 分层抽样的像素数
+    'line_samples': 128,         # 估计空间分布时抽样的行数/列数
+    'seed': 20241202,            # 固定随机种子，同一图像的抽样结果可复现
+    'confidence_z': 2.576        # 置信区间的z值（99%）
+}
+
+# 差分测试配置（评分引擎与参考实现逐子指标比较的容差）
+DIFFERENTIAL_CONFIG = {
+    'tolerances': {
+        # 精确模式应与参考实现一致，只允许浮点运算顺序带来的误差
+        'exact': {
+            'unique_colors': 0,
+            'harmony_score': 1e-9,
+            'coverage_score': 1e-9,
+            'thirds_score': 1e-9,
+            'balance_score': 1e-9,
+            'focal_score': 1e-9,
+            'shape_variety': 1e-9,
+            'stroke_expression': 1e-9,
+            'space_usage': 1e-9
+        },
+        # 快速模式的像素统计类指标为抽样估计
+        'fast': {
+            'unique_colors': 4,
+            'harmony_score': 0.2,
+            'coverage_score': 0.05,
+            'thirds_score': 1e-9,
+            'balance_score': 1e-9,
+            'focal_score': 1e-9,
+            'shape_variety': 1e-9,
+            'stroke_expression': 1e-9,
+            'space_usage': 0.02
+        }
+    },
+    'default_tolerance': 1e-9,   # 未列出的子指标
+    'generated_images': 24,      # 随机生成的用例数
+    'seed': 20241202,
+    'max_size': 128,             # 用例最长边像素（参考实现逐像素计算，尺寸过大时很慢）
+    'corpus_dirs': ['uploads']   # 真实图像目录
+}
+
+# 跨请求微批处理配置（同一进程内并发的精确评分请求合并计算）
+BATCHING_CONFIG = {
+    'enabled': False,
+    'max_batch_size': 16,        # 每批最多合并的请求数
+    'max_wait_ms': 5             # 收到第一个请求后最多等待的毫秒数
+}
+
+# 请求调度配置：按图像头部尺寸预估耗时，分入各自限制并发数的通道（每个worker进程独立计数）
+SCHEDULER_CONFIG = {
+    'enabled': True,
+    # 预估耗时（秒）= base + decode_megapixels * 原图百万像素 + analysis_megapixels * 评分百万像素
+    # 可根据 /stats/scheduler 返回的 calibrated_cost_model 校准
+    'cost_model': {
+        'base': 0.01,
+        'decode_megapixels': 0.02,
+        'analysis_megapixels': 0.2
+    },
+    # 按 max_cost 升序匹配，最后一个通道接收其余请求
+    'lanes': [
+        {'name': 'small', 'max_cost': 0.25, 'concurrency': 2},
+        {'name': 'large', 'max_cost': None, 'concurrency': 1}
+    ],
+    'queue_timeout': 30,           # 排队超时秒数，超时返回503
+    'calibration_samples': 500     # 保留用于校准的最近样本数
+}
+
+# 评分截止时间配置
+DEADLINE_CONFIG = {
+    'timeout': 30,                 # 每个请求的评分截止秒数（含排队），应小于代理和gunicorn的超时
+    'partial_results': False,      # 超时时是否默认返回已完成维度的部分得分（可由请求参数 partial 覆盖）
+    'tile_rows': 256,              # 大图按行分条滤波，每条之间检查截止时间
+    'tile_min_pixels': 1024 * 1024 # 像素数达到该值时分条
+}
+
+# 影子评分配置：抽样的 /analyze 请求在后台线程中再用候选引擎计算一次并对比（每个worker进程独立统计）
+SHADOW_CONFIG = {
+    'enabled': False,
+    'candidate': 'happygrow.core.scoring_engine:ScoringEngine',  # 候选引擎 'module:attribute'，以图像为参数构造
+    'sample_rate': 0.05,         # 进入影子评分的请求比例
+    'max_pending': 2,            # 排队和执行中的影子评分上限，超过时丢弃
+    'tolerance': 1e-6            # 子指标或得分差异超过该值记为不一致
+}
+
+# 结果存储配置
+STORAGE_CONFIG = {
+    'database': os.environ.get('HAPPYGROW_DATABASE', BASE_DIR / 'data' / 'happygrow.db')  # 可由环境变量指定其他数据库文件
+}
+
+# 归档重评分的解码像素缓存
+PIXEL_CACHE_CONFIG = {
+    'enabled': False,                                  # 开启后重评分时以内存映射读取缓存的像素，不再解码JPEG
+    'directory': BASE_DIR / 'data' / 'pixel_cache',
+    'max_bytes': 2 * 1024 * 1024 * 1024                # 缓存文件总大小上限，超过时按最近使用时间淘汰
+}
+
+# 评分任务队列：开启后 /analyze 的精确评分交给评分worker（flask scoring-worker，可部署在多台主机）执行
+BROKER_CONFIG = {
+    'enabled': False,
+    'backend': 'sqlite',                               # 'sqlite' 或 'redis'
+    'sqlite_path': BASE_DIR / 'data' / 'jobs.db',      # 跨主机时需放在共享存储上
+    'redis_url': 'redis://localhost:6379/0',
+    'prefix': 'happygrow',                             # Redis键前缀
+    'staging_dir': BASE_DIR / 'data' / 'staging',      # 网页端写入分析像素的共享目录（PixelCache格式）
+    'staging_max_bytes': 1024 * 1024 * 1024,
+    'lease_seconds': 60,         # 任务租约，worker超过该时长未确认或续租时重新投递
+    'max_attempts': 3,           # 最多投递次数，之后请求返回错误
+    'heartbeat_interval': 5,     # worker心跳（及续租）间隔
+    'heartbeat_timeout': 30,     # 超过该时长没有心跳的worker视为下线
+    'result_ttl': 3600,          # 任务结果保留秒数
+    'poll_interval': 0.05        # 网页端等待结果的轮询间隔
+}
+
+# 班级/年龄组聚合统计（结果写入时增量更新，flask rebuild-rollups 回填）
+ANALYTICS_CONFIG = {
+    'score_bins': 10,            # 得分分布的区间数（[0, 1] 等分），修改后需重建聚合
+    'default_trend_buckets': 12, # 趋势查询默认返回的时间桶数
+    'max_trend_buckets': 90      # 趋势查询最多返回的时间桶数
+}
+
+# 上传目录保留策略（后台低优先级清理，flask retention 手动执行）
+RETENTION_CONFIG = {
+    'enabled': False,
+    'max_age_days': None,        # 归档保留天数，None为不限
+    'max_total_bytes': None,     # 归档和缩略图总大小上限，超过时从最旧的归档开始删除，None为不限
+    'keep_per_hash': 1,          # 同一图像哈希保留的归档数（结果指向的那份总是保留），None为不限
+    'interval': 3600,            # 后台清理间隔（秒）
+    'batch_size': 200,           # 每批扫描或删除的文件数
+    'batch_pause': 0.05,         # 批次之间暂停的秒数
+    'lock_path': BASE_DIR / 'data' / 'retention.lock',  # 多个worker进程之间互斥
+    'min_age_seconds': 600       # 最近写入的归档不清理（评分完成前结果还未指向新归档）
+}
+
+# 评分结果导出（flask export-results、/admin/export）
+EXPORT_CONFIG = {
+    'directory': BASE_DIR / 'data' / 'exports',
+    'format': 'csv',             # 'csv'（gzip压缩）或 'parquet'（需要 pyarrow）
+    'chunk_rows': 5000,          # 每个文件（或每次下载）的结果数
+    'admin_token': os.environ.get('HAPPYGROW_ADMIN_TOKEN')  # 管理接口的Bearer令牌，未设置时接口关闭
+}
+
 # 反馈模板
 FEEDBACK_TEMPLATES = {
     'color_usage': {
@@ -0,0 +1,116 @@
+"""
+分析结果的响应结构和序列化
+
+/analyze、/analyze/stream 和 /results/<hash> 都由 AnalysisResult 生成响应：完整模式与原有响应相同
+（得分、反馈、建议、归档路径和缩略图，有解码像素时附带主色调 palette），compact 模式只返回数值
+（各维度得分、总体得分和子指标），不生成反馈文本，供机器客户端使用。
+
+评分引擎的得分和子指标可能是 NumPy 标量（np.float64、np.int64 等），dumps 直接序列化这些类型：
+默认使用标准库 json 并在 default 中转换；orjson 是可选依赖（不在 requirements.txt 中），
+另行安装后自动改用 orjson（原生支持 NumPy，编码更快）。
+"""
+import json
+from typing import Dict, Optional
+import numpy as np
+from .feedback_generator import FeedbackGenerator
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+def _default(obj):
+    """标准库 json 和 orjson 都不直接支持的类型"""
+    if isinstance(obj, AnalysisResult):
+        return obj.to_dict()
+    if isinstance(obj, np.generic):
+        return obj.item()
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    raise TypeError(f"无法序列化的类型: {type(obj).__name__}")
+
+def dumps(obj) -> bytes:
+    """序列化为UTF-8编码的JSON（NumPy标量和数组按对应的Python数值/列表输出）"""
+    if orjson is not None:
+        return orjson.dumps(obj, default=_default, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS)
+    return json.dumps(obj, default=_default, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+def _numbers(values: Dict) -> Dict[str, float]:
+    return {name: float(value) for name, value in values.items()}
+
+class AnalysisResult:
+    __slots__ = ('image_hash', 'image_path', 'age_group', 'scores', 'details', 'thumbnails',
+                 'duplicate_of', 'score_errors', 'downgraded', 'frames', 'palette')
+
+    def __init__(self, image_hash: str, image_path: Optional[str], age_group: str, scores: Dict,
+                 details: Dict[str, Dict], thumbnails: Optional[Dict[str, str]] = None):
+        """
+        初始化分析结果
+
+        Args:
+            image_hash: 图像内容哈希
+            image_path: 归档图像路径
+            age_group: 年龄组（生成反馈用）
+            scores: 各维度得分
+            details: 各维度的子指标
+            thumbnails: {尺寸: 缩略图URL}
+        """
+        self.image_hash = image_hash
+        self.image_path = image_path
+        self.age_group = age_group
+        self.scores = _numbers(scores)
+        self.details = details
+        self.thumbnails = thumbnails or {}
+        self.duplicate_of = None   # 复用的已有结果的图像哈希
+        self.score_errors = None   # 抽样近似时各维度得分的误差上限
+        self.downgraded = False    # 降级为草稿解码
+        self.frames = None         # 多帧抽样时各帧得分 [{index, scores}]
+        self.palette = None        # 主色调 [{color, coverage}]（只在完整模式返回，不入库）
+
+    @property
+    def overall(self) -> Optional[float]:
+        """总体得分（各维度平均，与反馈中的总体评价一致）"""
+        return sum(self.scores.values()) / len(self.scores) if self.scores else None
+
+    def _optional(self, body: Dict) -> Dict:
+        if self.score_errors is not None:
+            body['score_errors'] = _numbers(self.score_errors)
+        if self.downgraded:
+            body['downgraded'] = True
+        if self.frames is not None:
+            body['frames'] = [{'index': int(frame['index']), 'scores': _numbers(frame['scores'])}
+                              for frame in self.frames]
+        if self.duplicate_of is not None:
+            body['duplicate_of'] = self.duplicate_of
+        return body
+
+    def to_dict(self, compact: bool = False) -> Dict:
+        """
+        转换为响应内容
+
+        Args:
+            compact: 只返回数值（image_hash、scores、overall、details），不生成反馈文本
+        """
+        if compact:
+            return self._optional({
+                'image_hash': self.image_hash,
+                'scores': self.scores,
+                'overall': self.overall,
+                'details': {dimension: _numbers(values) for dimension, values in self.details.items()}
+            })
+        feedback_generator = FeedbackGenerator(self.age_group, self.scores, self.details)
+        body = {
+            'scores': self.scores,
+            'feedback': feedback_generator.generate_feedback(),
+            'suggestions': feedback_generator.get_improvement_suggestions(),
+            'image_path': self.image_path,
+            'image_hash': self.image_hash,
+            'thumbnails': self.thumbnails
+        }
+        if self.palette is not None:
+            body['palette'] = [{'color': entry['color'], 'coverage': float(entry['coverage'])}
+                               for entry in self.palette]
+        return self._optional(body)
+
+    def to_json(self, compact: bool = False) -> bytes:
+        return dumps(self.to_dict(compact))
@@ -0,0 +1,186 @@
+"""
+可在批维度上向量化的像素统计子指标
+
+所有函数都作用于数组的最后几个维度：单张图像传入 (H, W, 3) / (H, W)，
+同尺寸的一批图像传入 (N, H, W, 3) / (N, H, W)，返回标量数组或 (N,) 数组。
+ScoringEngine 的单图计算也调用这些函数，保证单张计算与批量计算的结果一致。
+"""
+from typing import Callable, Dict
+import numpy as np
+from .sampling import luminance
+from ..config.config import SCORING_CRITERIA
+
+# 可批量计算的子指标
+VECTORIZED_METRICS = (
+    'coverage_score', 'thirds_score', 'balance_score', 'focal_score',
+    'shape_variety', 'stroke_expression', 'space_usage'
+)
+
+def _load_ndimage():
+    from .scoring_engine import load_ndimage
+    return load_ndimage()
+
+def _spatial_size(array: np.ndarray, size: int) -> tuple:
+    """只在最后两个维度上滤波的窗口尺寸（批维度取1，不跨图像）"""
+    return (1,) * (array.ndim - 2) + (size, size)
+
+def gray(rgb: np.ndarray) -> np.ndarray:
+    """三通道均值灰度"""
+    return np.mean(rgb, axis=-1)
+
+def sobel_edges(gray_image: np.ndarray) -> np.ndarray:
+    """
+    沿宽度方向的Sobel边缘（与 ndimage.sobel(gray) 对单张图像的结果相同：
+    先沿宽度求导，再只沿高度平滑，不在批维度上平滑）
+    """
+    ndimage = _load_ndimage()
+    edges = ndimage.correlate1d(gray_image, [-1, 0, 1], axis=-1)
+    return ndimage.correlate1d(edges, [1, 2, 1], axis=-2)
+
+def content_counts(rgb: np.ndarray) -> np.ndarray:
+    """每个像素非纯白（不等于255）的通道数，三分法和平衡性指标共享"""
+    return np.sum(rgb != 255, axis=-1, dtype=np.uint8)
+
+def _density(counts: np.ndarray) -> np.ndarray:
+    """区域内非纯白通道数的均值"""
+    return np.mean(counts, axis=(-2, -1))
+
+def coverage(rgb: np.ndarray) -> np.ndarray:
+    """颜色覆盖率得分（非空白像素比例 / 最小覆盖率，上限为1）"""
+    non_white = np.mean(luminance(rgb) < 250, axis=(-2, -1))
+    min_coverage = SCORING_CRITERIA['color_usage']['color_coverage']['min_coverage']
+    return np.minimum(1.0, non_white / min_coverage)
+
+def rule_of_thirds(counts: np.ndarray) -> np.ndarray:
+    """三分法构图：四个交叉点周围区域的内容密度（counts 为 content_counts 的结果）"""
+    height, width = counts.shape[-2:]
+    h_thirds = height // 3
+    w_thirds = width // 3
+    densities = [
+        _density(counts[..., (i-1)*h_thirds:(i+1)*h_thirds, (j-1)*w_thirds:(j+1)*w_thirds])
+        for i in [1, 2]
+        for j in [1, 2]
+    ]
+    return np.mean(densities, axis=0) / 255
+
+def balance(counts: np.ndarray) -> np.ndarray:
+    """画面平衡性：四个象限内容密度的离散程度（counts 为 content_counts 的结果）"""
+    height, width = counts.shape[-2:]
+    h_mid = height // 2
+    w_mid = width // 2
+    densities = np.stack([
+        _density(counts[..., :h_mid, :w_mid]),    # 左上
+        _density(counts[..., :h_mid, w_mid:]),    # 右上
+        _density(counts[..., h_mid:, :w_mid]),    # 左下
+        _density(counts[..., h_mid:, w_mid:])     # 右下
+    ])
+    with np.errstate(invalid='ignore', divide='ignore'):
+        result = 1 - np.std(densities, axis=0) / np.mean(densities, axis=0)
+    # 纯白画面各象限密度均为0，视为完全平衡
+    return np.where(np.isnan(result), 1.0, np.clip(result, 0, 1))
+
+def focal_kernel_size(edges: np.ndarray) -> int:
+    """焦点检测的均值滤波窗口边长"""
+    height, width = edges.shape[-2:]
+    return min(width, height) // 5
+
+def focal_map(edges: np.ndarray, kernel_size: int) -> np.ndarray:
+    """局部边缘密度"""
+    return _load_ndimage().uniform_filter(np.abs(edges), _spatial_size(edges, kernel_size))
+
+def focal_score(density: np.ndarray) -> np.ndarray:
+    """由局部边缘密度的最大值计算焦点得分"""
+    threshold = SCORING_CRITERIA['composition']['focal_point']['detection_threshold']
+    return np.minimum(1.0, np.max(density, axis=(-2, -1)) / (255 * threshold))
+
+def focal_point(edges: np.ndarray) -> np.ndarray:
+    """焦点区域：局部边缘密度的最大值"""
+    return focal_score(focal_map(edges, focal_kernel_size(edges)))
+
+def shape_variety(edges: np.ndarray) -> np.ndarray:
+    """形状多样性：强边缘像素比例"""
+    shape_complexity = np.mean(edges > 50, axis=(-2, -1))
+    return np.minimum(1.0, shape_complexity * 5)
+
+def local_std(gray_image: np.ndarray) -> np.ndarray:
+    """
+    5x5邻域标准差
+
+    由两次均值滤波得到 sqrt(E[x^2] - E[x]^2)，
+    与逐窗口调用 np.std 的结果相差在浮点舍入误差内，但快两个数量级。
+    """
+    ndimage = _load_ndimage()
+    size = _spatial_size(gray_image, 5)
+    mean = ndimage.uniform_filter(gray_image, size)
+    mean_of_squares = ndimage.uniform_filter(gray_image * gray_image, size)
+    variance = mean_of_squares - mean * mean
+    # 灰度为1/3的整数倍，非零的窗口方差不小于约4e-3；更小的值只可能是平坦区域的舍入误差，
+    # 直接开方会把它放大到1e-5量级
+    variance[variance < 1e-6] = 0
+    return np.sqrt(variance)
+
+def stroke_score(std_map: np.ndarray) -> np.ndarray:
+    """由局部标准差计算笔触表现力得分"""
+    stroke_variety = np.mean(std_map, axis=(-2, -1)) / 128
+    return np.minimum(1.0, stroke_variety * 2)
+
+def stroke_expression(gray_image: np.ndarray) -> np.ndarray:
+    """笔触表现力：5x5邻域标准差的均值"""
+    return stroke_score(local_std(gray_image))
+
+def space_usage(gray_image: np.ndarray) -> np.ndarray:
+    """空间利用：内容在水平和垂直方向分布的均匀性"""
+    content_mask = gray_image < 250
+    x_distribution = np.mean(content_mask, axis=-2)
+    y_distribution = np.mean(content_mask, axis=-1)
+    usage = (np.std(x_distribution, axis=-1) + np.std(y_distribution, axis=-1)) / 2
+    return np.minimum(1.0, 1 - usage)
+
+def apply_in_strips(function: Callable[[np.ndarray], np.ndarray], array: np.ndarray, halo: int,
+                    strip_rows: int, check: Callable[[], None] = None) -> np.ndarray:
+    """
+    按行分条执行局部滤波，每条之前调用检查点（用于在大图上及时响应截止时间）
+
+    每条上下各多取 halo 行邻域，滤波后裁掉，只要滤波在高度方向的半径不超过 halo，
+    结果与整幅图像一次滤波相同（均值滤波的累加起点不同，可能相差浮点舍入误差）。
+
+    Args:
+        function: 输出与输入形状相同的局部滤波函数
+        array: (..., H, W) 数组
+        halo: 邻域行数
+        strip_rows: 每条的行数
+        check: 检查点，可抛出异常中止
+    """
+    height = array.shape[-2]
+    parts = []
+    for start in range(0, height, strip_rows):
+        if check is not None:
+            check()
+        stop = min(height, start + strip_rows)
+        low = max(0, start - halo)
+        high = min(height, stop + halo)
+        parts.append(function(array[..., low:high, :])[..., start - low:stop - low, :])
+    return np.concatenate(parts, axis=-2)
+
+def compute_batch(rgb: np.ndarray) -> Dict[str, np.ndarray]:
+    """
+    一次计算一批同尺寸图像的全部可向量化子指标（内容计数、灰度和边缘只计算一次）
+
+    Args:
+        rgb: (N, H, W, 3) uint8
+
+    Returns:
+        子指标名称到 (N,) 数组的映射
+    """
+    counts = content_counts(rgb)
+    gray_images = gray(rgb)
+    edges = sobel_edges(gray_images)
+    return {
+        'coverage_score': coverage(rgb),
+        'thirds_score': rule_of_thirds(counts),
+        'balance_score': balance(counts),
+        'focal_score': focal_point(edges),
+        'shape_variety': shape_variety(edges),
+        'stroke_expression': stroke_expression(gray_images),
+        'space_usage': space_usage(gray_images)
+    }
@@ -0,0 +1,168 @@
+"""
+颜色直方图：将RGB打包为整数键一次遍历完成统计，
+供独特颜色计数、主色调提取和颜色和谐度分析共享
+"""
+from typing import List, Tuple
+import numpy as np
+
+# 键空间不超过该位数时使用 bincount 稠密统计，否则排序去重（内存与像素数成正比）
+_DENSE_MAX_KEY_BITS = 18
+
+def pack_rgb(pixels: np.ndarray, bits: int) -> np.ndarray:
+    """将 (N, 3) 的通道值（每通道 bits 位）打包为整数键"""
+    pixels = pixels.astype(np.uint32)
+    return (pixels[:, 0] << (2 * bits)) | (pixels[:, 1] << bits) | pixels[:, 2]
+
+def unpack_rgb(keys: np.ndarray, bits: int) -> np.ndarray:
+    """将整数键还原为 (N, 3) 的通道值"""
+    mask = (1 << bits) - 1
+    return np.stack([(keys >> (2 * bits)) & mask, (keys >> bits) & mask, keys & mask], axis=1)
+
+class ColorHistogram:
+    def __init__(self, keys: np.ndarray, counts: np.ndarray, bits: int):
+        """
+        稀疏颜色直方图（只保存出现过的颜色）
+
+        Args:
+            keys: 升序排列的颜色键
+            counts: 每个颜色键的像素数
+            bits: 每通道位数（8为全精度）
+        """
+        self.keys = keys
+        self.counts = counts
+        self.bits = bits
+        self.total = int(counts.sum())
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    @classmethod
+    def from_rgb(cls, rgb: np.ndarray, bits: int = 8) -> 'ColorHistogram':
+        """
+        由 (H, W, 3) uint8 图像构建直方图
+
+        Args:
+            rgb: RGB像素数组
+            bits: 每通道保留的高位数，降低位数可合并相近颜色
+        """
+        pixels = np.asarray(rgb, dtype=np.uint8).reshape(-1, 3)
+        if bits < 8:
+            pixels = pixels >> (8 - bits)
+        keys = pack_rgb(pixels, bits)
+        if 3 * bits <= _DENSE_MAX_KEY_BITS:
+            dense = np.bincount(keys, minlength=1 << (3 * bits))
+            present = np.flatnonzero(dense)
+            return cls(present.astype(np.uint32), dense[present], bits)
+        unique_keys, counts = np.unique(keys, return_counts=True)
+        return cls(unique_keys, counts, bits)
+
+    def reduce(self, bits: int) -> 'ColorHistogram':
+        """降低每通道位数，合并落入同一区间的颜色"""
+        if bits >= self.bits:
+            return self
+        channels = unpack_rgb(self.keys, self.bits) >> (self.bits - bits)
+        keys = pack_rgb(channels, bits)
+        dense = np.bincount(keys, weights=self.counts, minlength=1 << (3 * bits))
+        present = np.flatnonzero(dense)
+        return ColorHistogram(present.astype(np.uint32), dense[present].astype(np.int64), bits)
+
+    def rgb_colors(self) -> np.ndarray:
+        """每个颜色键对应的8位RGB颜色（降位直方图取区间中心）"""
+        channels = unpack_rgb(self.keys, self.bits)
+        shift = 8 - self.bits
+        if shift == 0:
+            return channels.astype(np.int64)
+        return ((channels << shift) + (1 << (shift - 1))).astype(np.int64)
+
+    def unique_count(self, min_fraction: float = 0.0) -> int:
+        """统计像素占比不低于 min_fraction 的颜色数量（过滤压缩噪声产生的零散颜色）"""
+        min_count = max(1, int(np.ceil(min_fraction * self.total)))
+        return int(np.count_nonzero(self.counts >= min_count))
+
+    def palette(self, n_colors: int, refine_iterations: int = 4) -> List[Tuple[Tuple[int, int, int], float]]:
+        """
+        提取主色调：中位切分得到初始颜色，再做固定轮数的加权k-means细化
+        （修正中位切分把一个密集色块切成两半的情况），耗时只与直方图中的颜色数有关
+
+        Returns:
+            按覆盖率降序排列的 [((r, g, b), coverage), ...]
+        """
+        initial = self.median_cut(n_colors)
+        if len(initial) < 2 or refine_iterations <= 0:
+            return initial
+        colors = self.rgb_colors().astype(np.float64)
+        centers = np.array([color for color, _ in initial], dtype=np.float64)
+        for _ in range(refine_iterations):
+            distances = ((colors[:, None, :] - centers[None, :, :]) ** 2).sum(axis=2)
+            labels = np.argmin(distances, axis=1)
+            weights = np.bincount(labels, weights=self.counts, minlength=len(centers))
+            for channel in range(3):
+                sums = np.bincount(labels, weights=self.counts * colors[:, channel], minlength=len(centers))
+                nonempty = weights > 0
+                centers[nonempty, channel] = sums[nonempty] / weights[nonempty]
+        distances = ((colors[:, None, :] - centers[None, :, :]) ** 2).sum(axis=2)
+        labels = np.argmin(distances, axis=1)
+        weights = np.bincount(labels, weights=self.counts, minlength=len(centers))
+        palette = [
+            (tuple(int(round(c)) for c in center), float(weight / self.total))
+            for center, weight in zip(centers, weights)
+            if weight > 0
+        ]
+        return sorted(palette, key=lambda entry: entry[1], reverse=True)
+
+    def median_cut(self, n_colors: int) -> List[Tuple[Tuple[int, int, int], float]]:
+        """
+        中位切分法提取主色调
+
+        每次选取加权方差最大的颜色盒，沿方差最大的通道在使两侧方差之和最小的位置一分为二
+        （方差切分比严格取中位数更不容易把一个密集色块切成两半），
+        最多切分 n_colors-1 次，耗时只与直方图中的颜色数有关。
+
+        Returns:
+            按覆盖率降序排列的 [((r, g, b), coverage), ...]
+        """
+        if not len(self):
+            return []
+        colors = self.rgb_colors().astype(np.float64)
+        counts = self.counts.astype(np.float64)
+
+        def channel_sse(box):
+            weights = counts[box]
+            mean = weights @ colors[box] / weights.sum()
+            return weights @ (colors[box] - mean) ** 2
+
+        boxes = [np.arange(len(self))]
+        sse = [channel_sse(boxes[0])]
+        while len(boxes) < n_colors:
+            index = int(np.argmax([box_sse.sum() for box_sse in sse]))
+            if sse[index].sum() <= 0:
+                break
+            box = boxes.pop(index)
+            channel = int(np.argmax(sse.pop(index)))
+            ordered = box[np.argsort(colors[box, channel], kind='stable')]
+            values = colors[ordered, channel]
+            weights = counts[ordered]
+            # 前缀和计算每个切分位置两侧的平方误差和
+            w = np.cumsum(weights)
+            wv = np.cumsum(weights * values)
+            wv2 = np.cumsum(weights * values ** 2)
+            left = wv2[:-1] - wv[:-1] ** 2 / w[:-1]
+            right = (wv2[-1] - wv2[:-1]) - (wv[-1] - wv[:-1]) ** 2 / (w[-1] - w[:-1])
+            # 只在取值发生变化的位置切分
+            valid = values[1:] > values[:-1]
+            if not valid.any():
+                # 方差仅来自浮点误差，该颜色盒不可再分
+                boxes.append(box)
+                sse.append(np.zeros(3))
+                continue
+            split = int(np.argmin(np.where(valid, left + right, np.inf)))
+            for part in (ordered[:split + 1], ordered[split + 1:]):
+                boxes.append(part)
+                sse.append(channel_sse(part))
+
+        palette = []
+        for box in boxes:
+            weights = self.counts[box]
+            mean = np.average(colors[box], axis=0, weights=weights)
+            palette.append((tuple(int(round(c)) for c in mean), float(weights.sum() / self.total)))
+        return sorted(palette, key=lambda entry: entry[1], reverse=True)
@@ -0,0 +1,46 @@
+"""
+评分截止时间
+"""
+import time
+from typing import Dict, Optional
+
+class ScoringTimeout(Exception):
+    def __init__(self, message: str = "评分超时"):
+        """
+        评分超过截止时间
+
+        scores / details 为已完成维度的部分结果（由 ScoringEngine.analyze 填充）
+        """
+        super().__init__(message)
+        self.scores: Dict[str, float] = {}
+        self.details: Dict[str, Dict] = {}
+
+class Deadline:
+    def __init__(self, timeout: Optional[float]):
+        """
+        截止时间
+
+        Args:
+            timeout: 从现在起允许的秒数，None 表示不限时
+        """
+        self.expires_at = None if timeout is None else time.monotonic() + timeout
+
+    def remaining(self) -> Optional[float]:
+        """剩余秒数（不小于0），不限时返回None"""
+        if self.expires_at is None:
+            return None
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def expired(self) -> bool:
+        """是否已超时"""
+        return self.expires_at is not None and time.monotonic() >= self.expires_at
+
+    def check(self):
+        """
+        检查点：已超时时抛出 ScoringTimeout
+
+        Raises:
+            ScoringTimeout
+        """
+        if self.expired():
+            raise ScoringTimeout()
@@ -0,0 +1,231 @@
+"""
+差分测试：在生成的和真实的儿童画上，比较评分引擎（候选实现）与按定义实现的参考子指标，
+按子指标的容差检查偏差，并汇总耗时加速比
+
+用于验证对 ScoringEngine 子指标的向量化或近似改写没有改变结果。
+"""
+import random
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+import numpy as np
+from PIL import Image, ImageDraw
+from .reference_metrics import REFERENCE_METRICS
+from .scoring_engine import ScoringEngine
+from ..config.config import DIFFERENTIAL_CONFIG
+
+IMAGE_EXTENSIONS = {'.png', '.jpg', '.jpeg', '.gif'}
+
+def _random_color(rng: random.Random) -> Tuple[int, int, int]:
+    return tuple(rng.randrange(256) for _ in range(3))
+
+def generate_drawing(rng: random.Random, max_size: int) -> Image.Image:
+    """
+    随机生成一张画：白底上随机尺寸、笔画数、线宽和颜色的线条、矩形、椭圆，部分叠加噪点
+
+    Args:
+        rng: 随机数生成器（决定生成结果）
+        max_size: 最长边像素
+    """
+    width = rng.randint(16, max_size)
+    height = rng.randint(16, max_size)
+    image = Image.new('RGB', (width, height), 'white')
+    draw = ImageDraw.Draw(image)
+    palette = [_random_color(rng) for _ in range(rng.randint(1, 8))]
+    for _ in range(rng.randint(0, 24)):
+        x0, x1 = rng.randrange(width), rng.randrange(width)
+        y0, y1 = rng.randrange(height), rng.randrange(height)
+        box = (min(x0, x1), min(y0, y1), max(x0, x1), max(y0, y1))
+        color = rng.choice(palette)
+        kind = rng.random()
+        if kind < 0.5:
+            draw.line((x0, y0, x1, y1), fill=color, width=rng.randint(1, 8))
+        elif kind < 0.75:
+            draw.rectangle(box, fill=color if rng.random() < 0.5 else None, outline=color)
+        else:
+            draw.ellipse(box, fill=color if rng.random() < 0.5 else None, outline=color)
+    if rng.random() < 0.3:
+        # 纸张纹理或扫描噪点
+        pixels = np.array(image).astype(np.int16)
+        noise = np.random.default_rng(rng.randrange(2 ** 32)).integers(-12, 13, pixels.shape)
+        image = Image.fromarray(np.clip(pixels + noise, 0, 255).astype(np.uint8))
+    return image
+
+def edge_cases() -> List[Tuple[str, Image.Image]]:
+    """边界情况：空白、纯色、单像素线条、随机噪声、极端宽高比"""
+    cases = [
+        ('blank', Image.new('RGB', (64, 48), 'white')),
+        ('solid-black', Image.new('RGB', (40, 40), 'black')),
+        ('solid-red', Image.new('RGB', (50, 30), (255, 0, 0))),
+        ('noise', Image.fromarray(np.random.default_rng(0).integers(0, 256, (60, 80, 3), dtype=np.uint8))),
+        ('wide', Image.new('RGB', (160, 16), 'white')),
+        ('tall', Image.new('RGB', (16, 160), 'white'))
+    ]
+    line = Image.new('RGB', (64, 64), 'white')
+    ImageDraw.Draw(line).line((0, 32, 63, 32), fill='black', width=1)
+    cases.append(('hairline', line))
+    complementary = Image.new('RGB', (64, 64), (255, 0, 0))
+    ImageDraw.Draw(complementary).rectangle((32, 0, 63, 63), fill=(0, 255, 255))
+    cases.append(('complementary', complementary))
+    ImageDraw.Draw(cases[4][1]).line((0, 8, 159, 8), fill=(0, 0, 255), width=3)
+    ImageDraw.Draw(cases[5][1]).line((8, 0, 8, 159), fill=(0, 128, 0), width=3)
+    return cases
+
+def generate_corpus(count: int, seed: int, max_size: int) -> List[Tuple[str, Image.Image]]:
+    """边界情况加上 count 张随机生成的画，名称中带种子和序号，便于复现失败的用例"""
+    corpus = edge_cases()
+    for index in range(count):
+        rng = random.Random(f"{seed}-{index}")
+        corpus.append((f"generated-{seed}-{index}", generate_drawing(rng, max_size)))
+    return corpus
+
+def load_corpus(directory, max_size: int) -> List[Tuple[str, Image.Image]]:
+    """读取目录下的真实图像（如 uploads/），缩小到最长边不超过 max_size；无法解码的文件跳过"""
+    corpus = []
+    directory = Path(directory)
+    if not directory.is_dir():
+        return corpus
+    for path in sorted(directory.iterdir()):
+        if path.suffix.lower() not in IMAGE_EXTENSIONS:
+            continue
+        try:
+            with Image.open(path) as image:
+                image.draft('RGB', (max_size, max_size))
+                image = image.convert('RGB')
+        except OSError:
+            continue
+        image.thumbnail((max_size, max_size))
+        corpus.append((path.name, image))
+    return corpus
+
+class MetricComparison:
+    def __init__(self, name: str, tolerance: float):
+        """
+        单个子指标在整个语料上的比较结果
+
+        Args:
+            name: 子指标名称
+            tolerance: 允许的最大绝对偏差
+        """
+        self.name = name
+        self.tolerance = tolerance
+        self.max_deviation = 0.0
+        self.worst_case = None
+        self.failures: List[Tuple[str, float, float]] = []  # (用例, 参考值, 候选值)
+        self.reference_seconds = 0.0
+        self.candidate_seconds = 0.0
+
+    def add(self, case: str, reference: float, candidate: float, reference_seconds: float, candidate_seconds: float):
+        deviation = abs(float(candidate) - float(reference))
+        if deviation > self.max_deviation or self.worst_case is None:
+            self.max_deviation = deviation
+            self.worst_case = case
+        if deviation > self.tolerance:
+            self.failures.append((case, float(reference), float(candidate)))
+        self.reference_seconds += reference_seconds
+        self.candidate_seconds += candidate_seconds
+
+    @property
+    def speedup(self) -> Optional[float]:
+        return self.reference_seconds / self.candidate_seconds if self.candidate_seconds > 0 else None
+
+    def to_dict(self) -> Dict:
+        return {
+            'tolerance': self.tolerance,
+            'max_deviation': self.max_deviation,
+            'worst_case': self.worst_case,
+            'failures': [{'case': case, 'reference': reference, 'candidate': candidate}
+                         for case, reference, candidate in self.failures],
+            'reference_seconds': self.reference_seconds,
+            'candidate_seconds': self.candidate_seconds,
+            'speedup': self.speedup
+        }
+
+class DifferentialReport:
+    def __init__(self, mode: str, metrics: Dict[str, MetricComparison], cases: int,
+                 reference_seconds: float, candidate_seconds: float):
+        """
+        差分测试报告
+
+        Args:
+            mode: 候选引擎的评分模式
+            metrics: 各子指标的比较结果
+            cases: 用例数
+            reference_seconds: 参考实现计算全部子指标的总耗时
+            candidate_seconds: 候选引擎一次计算全部子指标的总耗时（共享特征平面）
+        """
+        self.mode = mode
+        self.metrics = metrics
+        self.cases = cases
+        self.reference_seconds = reference_seconds
+        self.candidate_seconds = candidate_seconds
+
+    @property
+    def passed(self) -> bool:
+        return not any(comparison.failures for comparison in self.metrics.values())
+
+    @property
+    def speedup(self) -> Optional[float]:
+        return self.reference_seconds / self.candidate_seconds if self.candidate_seconds > 0 else None
+
+    def failures(self) -> Dict[str, List[Tuple[str, float, float]]]:
+        """超出容差的子指标及其用例"""
+        return {name: comparison.failures for name, comparison in self.metrics.items() if comparison.failures}
+
+    def to_dict(self) -> Dict:
+        return {
+            'mode': self.mode,
+            'cases': self.cases,
+            'passed': self.passed,
+            'speedup': self.speedup,
+            'reference_seconds': self.reference_seconds,
+            'candidate_seconds': self.candidate_seconds,
+            'metrics': {name: comparison.to_dict() for name, comparison in self.metrics.items()}
+        }
+
+    def format(self) -> str:
+        """文本表格：每个子指标的最大偏差、容差、失败用例数和加速比"""
+        lines = [f"模式: {self.mode}  用例: {self.cases}  总加速: {self.speedup or 0:.1f}x  "
+                 f"{'通过' if self.passed else '失败'}",
+                 f"{'子指标':<20}{'最大偏差':>12}{'容差':>10}{'失败':>6}{'加速':>9}  最大偏差用例"]
+        for name, comparison in self.metrics.items():
+            lines.append(f"{name:<20}{comparison.max_deviation:>12.3g}{comparison.tolerance:>10.3g}"
+                         f"{len(comparison.failures):>6}{comparison.speedup or 0:>8.1f}x  {comparison.worst_case if comparison.max_deviation else '-'}")
+        return '\n'.join(lines)
+
+def run_differential(corpus: List[Tuple[str, Image.Image]], mode: str = 'exact',
+                     candidate: Callable = None, tolerances: Dict[str, float] = None,
+                     names: List[str] = None) -> DifferentialReport:
+    """
+    在语料上比较候选引擎与参考实现
+
+    每个子指标分别用新的候选引擎计算并计时（包括其所需特征平面的计算），与参考实现的耗时对比；
+    另外计时候选引擎一次计算全部子指标（特征平面共享）得到总加速比。
+
+    Args:
+        corpus: (名称, 图像) 列表
+        mode: 候选引擎的评分模式
+        candidate: 以 (图像, mode) 构造候选引擎的函数，默认为 ScoringEngine
+        tolerances: 各子指标的容差，默认取 DIFFERENTIAL_CONFIG 中该模式的容差
+        names: 比较的子指标，默认为所有有参考实现的子指标
+    """
+    candidate = candidate or (lambda image, mode: ScoringEngine(image, mode=mode))
+    tolerances = tolerances or DIFFERENTIAL_CONFIG['tolerances'][mode]
+    names = names or list(REFERENCE_METRICS)
+    metrics = {name: MetricComparison(name, tolerances.get(name, DIFFERENTIAL_CONFIG['default_tolerance']))
+               for name in names}
+    reference_total = candidate_total = 0.0
+    for case, image in corpus:
+        for name in names:
+            start = time.perf_counter()
+            reference = REFERENCE_METRICS[name](image)
+            reference_seconds = time.perf_counter() - start
+            start = time.perf_counter()
+            value = candidate(image, mode).compute_metrics([name])[name]
+            candidate_seconds = time.perf_counter() - start
+            metrics[name].add(case, reference, value, reference_seconds, candidate_seconds)
+            reference_total += reference_seconds
+        start = time.perf_counter()
+        candidate(image, mode).compute_metrics(names)
+        candidate_total += time.perf_counter() - start
+    return DifferentialReport(mode, metrics, len(corpus), reference_total, candidate_total)
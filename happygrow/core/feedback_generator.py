@@ -1,10 +1,24 @@
 """
 反馈生成器，根据评分结果生成个性化的反馈建议
 """
-from typing import Dict, List
+from typing import Dict, List, Tuple
 from ..config.config import FEEDBACK_TEMPLATES, AGE_GROUPS
 
 class FeedbackGenerator:
+    # 得分分档阈值（不低于阈值即进入对应档位）
+    SCORE_LEVELS = ((0.85, 'excellent'), (0.7, 'good'), (0.5, 'fair'))
+    # 维度得分低于该值时给出改进建议
+    SUGGESTION_THRESHOLD = 0.7
+    # 生成改进建议时各子指标的阈值（低于阈值时给出对应建议）
+    DETAIL_THRESHOLDS = {
+        'unique_colors': 10,
+        'harmony_score': 0.6,
+        'balance_score': 0.6,
+        'focal_score': 0.6,
+        'shape_variety': 0.6,
+        'space_usage': 0.6
+    }
+
     def __init__(self, age_group: str, scores: Dict[str, float], details: Dict[str, Dict]):
         """
         初始化反馈生成器
@@ -32,40 +46,32 @@ class FeedbackGenerator:
         """生成总体评价"""
         avg_score = sum(self.scores.values()) / len(self.scores)
         
-        if avg_score >= 0.85:
+        level = self._score_level(avg_score)
+        if level == 'excellent':
             return "你的画作非常出色！展现了丰富的想象力和良好的艺术感觉。"
-        elif avg_score >= 0.7:
+        elif level == 'good':
             return "这是一幅很棒的作品！可以看出你在创作时投入了很多心思。"
-        elif avg_score >= 0.5:
+        elif level == 'fair':
             return "你的画作很有特色，继续坚持创作，相信会做得更好！"
         else:
             return "每一次创作都是一次成长，保持热爱艺术的心，继续加油！"
 
+    @classmethod
+    def _score_level(cls, score: float) -> str:
+        """得分所在档位"""
+        for threshold, level in cls.SCORE_LEVELS:
+            if score >= threshold:
+                return level
+        return 'needs_improvement'
+
     def _generate_specific_feedback(self) -> str:
         """生成具体维度的反馈"""
         feedback_parts = []
         
-        # 颜色运用反馈
-        color_score = self.scores.get('color_usage', 0)
-        if color_score >= 0.85:
-            feedback_parts.append(self.templates['color_usage']['excellent'])
-        elif color_score >= 0.7:
-            feedback_parts.append(self.templates['color_usage']['good'])
-        elif color_score >= 0.5:
-            feedback_parts.append(self.templates['color_usage']['fair'])
-        else:
-            feedback_parts.append(self.templates['color_usage']['needs_improvement'])
-        
-        # 构图反馈
-        composition_score = self.scores.get('composition', 0)
-        if composition_score >= 0.85:
-            feedback_parts.append(self.templates['composition']['excellent'])
-        elif composition_score >= 0.7:
-            feedback_parts.append(self.templates['composition']['good'])
-        elif composition_score >= 0.5:
-            feedback_parts.append(self.templates['composition']['fair'])
-        else:
-            feedback_parts.append(self.templates['composition']['needs_improvement'])
+        # 颜色运用和构图反馈（只对已评分的维度生成）
+        for dimension in ('color_usage', 'composition'):
+            if dimension in self.scores:
+                feedback_parts.append(self.templates[dimension][self._score_level(self.scores[dimension])])
         
         return " ".join(feedback_parts)
 
@@ -80,23 +86,57 @@ class FeedbackGenerator:
         """生成改进建议"""
         suggestions = []
         
+        thresholds = self.DETAIL_THRESHOLDS
+        
         # 根据各维度得分生成具体建议
-        if self.scores.get('color_usage', 0) < 0.7:
-            if self.details['color_usage']['unique_colors'] < 10:
+        if 'color_usage' in self.scores and self.scores['color_usage'] < self.SUGGESTION_THRESHOLD:
+            if self.details['color_usage']['unique_colors'] < thresholds['unique_colors']:
                 suggestions.append("尝试使用更多种类的颜色来丰富画面。")
-            if self.details['color_usage']['harmony_score'] < 0.6:
+            if self.details['color_usage']['harmony_score'] < thresholds['harmony_score']:
                 suggestions.append("可以尝试使用互补色来增加画面的视觉效果。")
         
-        if self.scores.get('composition', 0) < 0.7:
-            if self.details['composition']['balance_score'] < 0.6:
+        if 'composition' in self.scores and self.scores['composition'] < self.SUGGESTION_THRESHOLD:
+            if self.details['composition']['balance_score'] < thresholds['balance_score']:
                 suggestions.append("注意画面的平衡性，可以让主要内容更均匀地分布。")
-            if self.details['composition']['focal_score'] < 0.6:
+            if self.details['composition']['focal_score'] < thresholds['focal_score']:
                 suggestions.append("可以让画面的主要内容更加突出。")
         
-        if self.scores.get('creativity', 0) < 0.7:
-            if self.details['creativity']['shape_variety'] < 0.6:
+        if 'creativity' in self.scores and self.scores['creativity'] < self.SUGGESTION_THRESHOLD:
+            if self.details['creativity']['shape_variety'] < thresholds['shape_variety']:
                 suggestions.append("尝试画一些不同形状的内容，让画面更加丰富。")
-            if self.details['creativity']['space_usage'] < 0.6:
+            if self.details['creativity']['space_usage'] < thresholds['space_usage']:
                 suggestions.append("可以多利用画面的空间，不要局限在某一个区域。")
         
         return suggestions
+
+    @classmethod
+    def is_stable(cls, scores: Dict[str, float], score_intervals: Dict[str, Tuple[float, float]],
+                  metric_intervals: Dict[str, Tuple[float, float]]) -> bool:
+        """
+        近似评分的误差范围内反馈是否保持不变
+
+        Args:
+            scores: 各维度得分
+            score_intervals: 近似维度得分的 (下界, 上界)
+            metric_intervals: 近似子指标的 (下界, 上界)
+
+        Returns:
+            任一得分或子指标的区间跨越反馈分档阈值时返回False
+        """
+        crosses = lambda interval, threshold: interval[0] < threshold <= interval[1]
+        score_thresholds = [threshold for threshold, _ in cls.SCORE_LEVELS] + [cls.SUGGESTION_THRESHOLD]
+        
+        intervals = {name: score_intervals.get(name, (score, score)) for name, score in scores.items()}
+        overall = (
+            sum(low for low, _ in intervals.values()) / len(intervals),
+            sum(high for _, high in intervals.values()) / len(intervals)
+        )
+        for interval in list(intervals.values()) + [overall]:
+            if any(crosses(interval, threshold) for threshold in score_thresholds):
+                return False
+        
+        return not any(
+            crosses(interval, cls.DETAIL_THRESHOLDS[name])
+            for name, interval in metric_intervals.items()
+            if name in cls.DETAIL_THRESHOLDS
+        )
@@ -0,0 +1,100 @@
+"""
+RGB到色相/饱和度/明度分档的预计算查找表
+
+查找表以降位深的打包RGB键（与 ColorHistogram 的键一致）为下标，
+每行保存 (色相角度, 饱和度分档, 明度分档)。表只构建一次并保存为 .npy 文件，
+各进程以只读内存映射方式加载，多个worker共享操作系统页缓存中的同一份数据。
+"""
+import os
+import uuid
+import threading
+import numpy as np
+from .color_histogram import unpack_rgb
+
+# 查找表列
+HUE, SATURATION_BIN, VALUE_BIN = 0, 1, 2
+
+_cache = {}
+_lock = threading.Lock()
+
+def rgb_to_hsv_arrays(rgb: np.ndarray):
+    """
+    向量化的RGB到HSV转换，逐元素运算顺序与 colorsys.rgb_to_hsv 一致
+
+    Args:
+        rgb: (N, 3) 的8位RGB颜色
+
+    Returns:
+        (h, s, v)，取值范围均为 [0, 1]
+    """
+    rgb = rgb.astype(np.float64) / 255
+    r, g, b = rgb[:, 0], rgb[:, 1], rgb[:, 2]
+    maxc = rgb.max(axis=1)
+    minc = rgb.min(axis=1)
+    delta = maxc - minc
+    chromatic = delta > 0
+    safe_delta = np.where(chromatic, delta, 1)
+    s = np.where(chromatic, delta / np.where(maxc > 0, maxc, 1), 0.0)
+    rc = (maxc - r) / safe_delta
+    gc = (maxc - g) / safe_delta
+    bc = (maxc - b) / safe_delta
+    h = np.where(r == maxc, bc - gc, np.where(g == maxc, 2.0 + rc - bc, 4.0 + gc - rc))
+    h = np.where(chromatic, (h / 6.0) % 1.0, 0.0)
+    return h, s, maxc
+
+def build_hue_lut(bits: int, saturation_bins: int, value_bins: int) -> np.ndarray:
+    """
+    构建查找表
+
+    Returns:
+        (2^(3*bits), 3) 的 uint16 数组
+    """
+    keys = np.arange(1 << (3 * bits), dtype=np.uint32)
+    channels = unpack_rgb(keys, bits).astype(np.int64)
+    shift = 8 - bits
+    # 降位深时取区间中心的颜色
+    rgb = channels if shift == 0 else (channels << shift) + (1 << (shift - 1))
+    h, s, v = rgb_to_hsv_arrays(rgb)
+    lut = np.empty((len(keys), 3), dtype=np.uint16)
+    lut[:, HUE] = (h * 360).astype(np.int64) % 360
+    lut[:, SATURATION_BIN] = np.minimum((s * saturation_bins).astype(np.int64), saturation_bins - 1)
+    lut[:, VALUE_BIN] = np.minimum((v * value_bins).astype(np.int64), value_bins - 1)
+    return lut
+
+def load_hue_lut(directory, bits: int, saturation_bins: int, value_bins: int) -> np.ndarray:
+    """
+    加载查找表（只读内存映射）；文件不存在或已损坏时先构建并原子写入
+
+    文件名包含构建参数，同一进程内只映射一次。
+    """
+    path = os.path.join(str(directory), f"hue_lut_b{bits}_s{saturation_bins}_v{value_bins}.npy")
+    key = (path, bits, saturation_bins, value_bins)
+    lut = _cache.get(key)
+    if lut is not None:
+        return lut
+    with _lock:
+        if key in _cache:
+            return _cache[key]
+        expected_shape = (1 << (3 * bits), 3)
+        lut = _try_load(path, expected_shape)
+        if lut is None:
+            os.makedirs(str(directory), exist_ok=True)
+            # 先写临时文件再原子替换，多个进程同时构建时互不干扰
+            tmp_path = f"{path}.{uuid.uuid4().hex[:8]}.tmp.npy"
+            np.save(tmp_path, build_hue_lut(bits, saturation_bins, value_bins))
+            os.replace(tmp_path, path)
+            lut = np.load(path, mmap_mode='r')
+        _cache[key] = lut
+        return lut
+
+def _try_load(path: str, expected_shape) -> np.ndarray:
+    """尝试映射已有的查找表文件，文件损坏（形状或类型不符）时返回None"""
+    if not os.path.exists(path):
+        return None
+    try:
+        lut = np.load(path, mmap_mode='r')
+    except (OSError, ValueError):
+        return None
+    if lut.shape != expected_shape or lut.dtype != np.uint16:
+        return None
+    return lut
@@ -0,0 +1,144 @@
+"""
+按定义直接实现的参考子指标：逐像素、逐区域、逐窗口计算，不做任何优化
+
+只用于差分测试（见 differential.py），检查 ScoringEngine 中优化或近似的实现与定义一致。
+每个函数以RGB的PIL图像为参数，返回子指标的原始值。
+"""
+import colorsys
+import math
+from collections import Counter
+from typing import Callable, Dict
+import numpy as np
+from PIL import Image
+from ..config.config import SCORING_CRITERIA, HUE_LUT_CONFIG
+
+def _pixels(image: Image.Image):
+    """逐个像素的 (r, g, b)"""
+    return np.asarray(image.convert('RGB')).reshape(-1, 3).tolist()
+
+def _channel_center(value: int, bits: int) -> int:
+    """降位深后区间中心的8位通道值"""
+    shift = 8 - bits
+    return value if shift == 0 else (value << shift) + (1 << (shift - 1))
+
+def unique_colors(image: Image.Image) -> int:
+    """每通道保留高 bits 位后，像素占比不低于 min_fraction 的颜色数"""
+    criteria = SCORING_CRITERIA['color_usage']['unique_colors']
+    shift = 8 - criteria['bits']
+    pixels = _pixels(image)
+    counts = Counter((r >> shift, g >> shift, b >> shift) for r, g, b in pixels)
+    min_count = max(1, math.ceil(criteria['min_fraction'] * len(pixels)))
+    return sum(1 for count in counts.values() if count >= min_count)
+
+def harmony_score(image: Image.Image) -> float:
+    """互补色和类似色加分（颜色按查找表位深取区间中心后用 colorsys 转换）"""
+    criteria = SCORING_CRITERIA['color_usage']['color_harmony']
+    bits = HUE_LUT_CONFIG['bits']
+    shift = 8 - bits
+    pixels = _pixels(image)
+    total = len(pixels)
+
+    hue_counts = Counter()
+    sector_counts = Counter()
+    for (r, g, b), count in Counter((r >> shift, g >> shift, b >> shift) for r, g, b in pixels).items():
+        h, s, v = colorsys.rgb_to_hsv(*(_channel_center(c, bits) / 255 for c in (r, g, b)))
+        hue = int(h * 360) % 360
+        hue_counts[hue] += count
+        saturation_bin = min(int(s * HUE_LUT_CONFIG['saturation_bins']), HUE_LUT_CONFIG['saturation_bins'] - 1)
+        value_bin = min(int(v * HUE_LUT_CONFIG['value_bins']), HUE_LUT_CONFIG['value_bins'] - 1)
+        if saturation_bin >= criteria['min_saturation_bin'] and value_bin >= criteria['min_value_bin']:
+            sector_counts[hue // criteria['analogous_range']] += count
+
+    harmony = 0
+    for hue in range(360):
+        if hue_counts[hue] > 0 and abs(hue_counts[hue] - hue_counts[(hue + 180) % 360]) < total * 0.1:
+            harmony += criteria['complementary_bonus']
+
+    chromatic_total = sum(sector_counts.values())
+    if chromatic_total > 0:
+        sectors = 360 // criteria['analogous_range']
+        significant = [sector_counts[i] / chromatic_total >= criteria['analogous_min_share'] for i in range(sectors)]
+        for i in range(sectors):
+            if significant[i] and significant[(i + 1) % sectors]:
+                harmony += criteria['analogous_bonus']
+
+    return min(100, harmony) / 100
+
+def coverage_score(image: Image.Image) -> float:
+    """Pillow 灰度低于250的像素比例 / 最小覆盖率"""
+    gray = np.array(image.convert('L'))
+    coverage = np.sum(gray < 250) / gray.size
+    return min(1.0, coverage / SCORING_CRITERIA['color_usage']['color_coverage']['min_coverage'])
+
+def _density(region: np.ndarray) -> float:
+    return np.mean(np.sum(region != 255, axis=2))
+
+def thirds_score(image: Image.Image) -> float:
+    """三分线四个交叉点周围区域的内容密度"""
+    np_image = np.array(image.convert('RGB'))
+    height, width = np_image.shape[:2]
+    h_thirds = height // 3
+    w_thirds = width // 3
+    scores = []
+    for i in [1, 2]:
+        for j in [1, 2]:
+            scores.append(_density(np_image[(i-1)*h_thirds:(i+1)*h_thirds, (j-1)*w_thirds:(j+1)*w_thirds]))
+    return np.mean(scores) / 255
+
+def balance_score(image: Image.Image) -> float:
+    """四个象限内容密度的离散程度（纯白画面为1）"""
+    np_image = np.array(image.convert('RGB'))
+    height, width = np_image.shape[:2]
+    h_mid = height // 2
+    w_mid = width // 2
+    densities = [
+        _density(np_image[:h_mid, :w_mid]),
+        _density(np_image[:h_mid, w_mid:]),
+        _density(np_image[h_mid:, :w_mid]),
+        _density(np_image[h_mid:, w_mid:])
+    ]
+    if np.mean(densities) == 0:
+        return 1.0
+    return max(0, min(1, 1 - np.std(densities) / np.mean(densities)))
+
+def _gray(image: Image.Image) -> np.ndarray:
+    return np.mean(np.array(image.convert('RGB')), axis=2)
+
+def focal_score(image: Image.Image) -> float:
+    """Sobel边缘局部均值的最大值"""
+    from scipy import ndimage
+    edges = ndimage.sobel(_gray(image))
+    kernel_size = min(image.size) // 5
+    focal_map = ndimage.uniform_filter(np.abs(edges), kernel_size)
+    threshold = SCORING_CRITERIA['composition']['focal_point']['detection_threshold']
+    return min(1.0, np.max(focal_map) / (255 * threshold))
+
+def shape_variety(image: Image.Image) -> float:
+    """强边缘像素比例"""
+    from scipy import ndimage
+    edges = ndimage.sobel(_gray(image))
+    return min(1.0, np.sum(edges > 50) / edges.size * 5)
+
+def stroke_expression(image: Image.Image) -> float:
+    """逐窗口计算5x5邻域标准差的均值"""
+    from scipy.ndimage import generic_filter
+    local_std = generic_filter(_gray(image), np.std, size=5)
+    return min(1.0, np.mean(local_std) / 128 * 2)
+
+def space_usage(image: Image.Image) -> float:
+    """内容在水平和垂直方向分布的均匀性"""
+    content_mask = _gray(image) < 250
+    usage = (np.std(np.mean(content_mask, axis=0)) + np.std(np.mean(content_mask, axis=1))) / 2
+    return min(1.0, 1 - usage)
+
+REFERENCE_METRICS: Dict[str, Callable[[Image.Image], float]] = {
+    'unique_colors': unique_colors,
+    'harmony_score': harmony_score,
+    'coverage_score': coverage_score,
+    'thirds_score': thirds_score,
+    'balance_score': balance_score,
+    'focal_score': focal_score,
+    'shape_variety': shape_variety,
+    'stroke_expression': stroke_expression,
+    'space_usage': space_usage
+}
@@ -0,0 +1,133 @@
+"""
+像素统计类指标的抽样估计
+
+在分层抽样（每个网格单元随机取一个像素，随机数种子固定）的像素上估计指标，
+并按正态近似给出置信区间。每个估计函数返回 (估计值, 下界, 上界)。
+"""
+from typing import Tuple
+import numpy as np
+from .color_histogram import ColorHistogram
+from .hue_lut import HUE, SATURATION_BIN, VALUE_BIN
+
+Interval = Tuple[float, float, float]
+
+def stratified_pixel_sample(height: int, width: int, n_samples: int, seed: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    分层抽样像素坐标：将图像划分为约 n_samples 个网格单元，每个单元内随机取一个像素
+
+    Returns:
+        (ys, xs) 坐标数组
+    """
+    rows = max(1, min(height, int(round(np.sqrt(n_samples * height / width)))))
+    cols = max(1, min(width, n_samples // rows))
+    rng = np.random.default_rng(seed)
+    row_index, col_index = np.meshgrid(np.arange(rows), np.arange(cols), indexing='ij')
+    ys = ((row_index + rng.random(row_index.shape)) * height / rows).astype(np.intp)
+    xs = ((col_index + rng.random(col_index.shape)) * width / cols).astype(np.intp)
+    return np.minimum(ys, height - 1).ravel(), np.minimum(xs, width - 1).ravel()
+
+def stratified_line_sample(length: int, n_lines: int, seed: int) -> np.ndarray:
+    """分层抽样行（或列）下标：均分为 n_lines 段，每段随机取一条"""
+    if n_lines >= length:
+        return np.arange(length)
+    rng = np.random.default_rng(seed)
+    starts = np.arange(n_lines) * length / n_lines
+    return np.minimum((starts + rng.random(n_lines) * length / n_lines).astype(np.intp), length - 1)
+
+def proportion_margin(p, n: int, z: float):
+    """比例估计的置信半宽"""
+    return z * np.sqrt(np.asarray(p) * (1 - np.asarray(p)) / n)
+
+def luminance(rgb: np.ndarray) -> np.ndarray:
+    """与 Pillow 的 convert('L') 相同的整数亮度公式"""
+    rgb = rgb.astype(np.uint32)
+    return (rgb[..., 0] * 19595 + rgb[..., 1] * 38470 + rgb[..., 2] * 7471 + 0x8000) >> 16
+
+def estimate_coverage(sample_rgb: np.ndarray, min_coverage: float, z: float) -> Interval:
+    """估计颜色覆盖率得分（非空白像素比例 / 最小覆盖率，上限为1）"""
+    n = len(sample_rgb)
+    p = float(np.mean(luminance(sample_rgb) < 250))
+    margin = float(proportion_margin(p, n, z))
+    score = lambda value: min(1.0, max(0.0, value) / min_coverage)
+    return score(p), score(p - margin), score(p + margin)
+
+def estimate_space_usage(row_gray: np.ndarray, col_gray: np.ndarray, z: float) -> Interval:
+    """
+    估计空间利用得分
+
+    Args:
+        row_gray: 抽样行的灰度 (n_rows, width)，用于估计每列的内容比例
+        col_gray: 抽样列的灰度 (height, n_cols)，用于估计每行的内容比例
+    """
+    x_distribution = np.mean(row_gray < 250, axis=0)
+    y_distribution = np.mean(col_gray < 250, axis=1)
+    # 标准差对分布向量的均方根误差是1-Lipschitz的，以各分量标准误的均方根作为误差
+    x_margin = z * np.sqrt(np.mean(x_distribution * (1 - x_distribution)) / row_gray.shape[0])
+    y_margin = z * np.sqrt(np.mean(y_distribution * (1 - y_distribution)) / col_gray.shape[1])
+    space_usage = (np.std(x_distribution) + np.std(y_distribution)) / 2
+    margin = float(x_margin + y_margin) / 2
+    estimate = min(1.0, 1 - space_usage)
+    return float(estimate), float(min(1.0, 1 - space_usage - margin)), float(min(1.0, 1 - space_usage + margin))
+
+def estimate_unique_colors(histogram: ColorHistogram, min_fraction: float, z: float) -> Interval:
+    """
+    估计占比不低于 min_fraction 的颜色数量
+
+    占比置信区间跨越阈值的颜色计为不确定；样本中未出现的颜色真实占比达到阈值的概率可忽略
+    （约为 (1-min_fraction)^n）。
+    """
+    n = histogram.total
+    shares = histogram.counts / n
+    margin = z * np.sqrt(np.maximum(shares * (1 - shares), min_fraction * (1 - min_fraction)) / n)
+    estimate = int(np.count_nonzero(shares >= min_fraction))
+    low = int(np.count_nonzero(shares - margin >= min_fraction))
+    high = int(np.count_nonzero(shares + margin >= min_fraction))
+    return estimate, low, high
+
+def estimate_harmony(histogram: ColorHistogram, lut: np.ndarray, criteria: dict, z: float) -> Interval:
+    """
+    估计颜色和谐度（与 ScoringEngine._calculate_color_harmony 的规则一致）
+
+    区间考虑每个互补/类似色判断在置信范围内可能的两种结果，
+    以及样本中未出现但可能存在的少量色相。
+    """
+    n = histogram.total
+    entries = np.asarray(lut[histogram.keys])
+    hues = entries[:, HUE]
+    shares = np.bincount(hues, weights=histogram.counts, minlength=360) / n
+    margins = proportion_margin(shares, n, z)
+    complement_shares = np.roll(shares, -180)
+    complement_margins = np.roll(margins, -180)
+
+    observed = shares > 0
+    difference = np.abs(shares - complement_shares)
+    margin = margins + complement_margins
+    balanced = difference < 0.1
+    certainly_balanced = difference + margin < 0.1
+    possibly_balanced = difference - margin < 0.1
+    # 未出现的色相真实占比接近0，若其互补色占比可能低于10%则可能计入
+    possibly_present = ~observed & (complement_shares - complement_margins < 0.1)
+
+    bonus = criteria['complementary_bonus']
+    estimate = np.count_nonzero(observed & balanced) * bonus
+    low = np.count_nonzero(observed & certainly_balanced) * bonus
+    high = (np.count_nonzero(observed & possibly_balanced) + np.count_nonzero(possibly_present)) * bonus
+
+    chromatic = (entries[:, SATURATION_BIN] >= criteria['min_saturation_bin']) & \
+                (entries[:, VALUE_BIN] >= criteria['min_value_bin'])
+    sectors = np.bincount(
+        hues[chromatic] // criteria['analogous_range'],
+        weights=histogram.counts[chromatic],
+        minlength=360 // criteria['analogous_range']
+    )
+    chromatic_total = sectors.sum()
+    if chromatic_total > 0:
+        sector_shares = sectors / chromatic_total
+        sector_margins = proportion_margin(sector_shares, int(chromatic_total), z)
+        threshold = criteria['analogous_min_share']
+        pairs = lambda significant: np.count_nonzero(significant & np.roll(significant, -1))
+        estimate += pairs(sector_shares >= threshold) * criteria['analogous_bonus']
+        low += pairs(sector_shares - sector_margins >= threshold) * criteria['analogous_bonus']
+        high += pairs(sector_shares + sector_margins >= threshold) * criteria['analogous_bonus']
+
+    return min(100, estimate) / 100, min(100, low) / 100, min(100, high) / 100
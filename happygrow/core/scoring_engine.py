@@ -3,143 +3,441 @@
 """
 import numpy as np
 from PIL import Image
-from typing import Dict, Tuple, List
-import colorsys
-from collections import Counter
-from ..config.config import SCORING_CRITERIA, SCORING_WEIGHTS
+from typing import Dict, Iterator, Tuple, List, Union
+import hashlib
+import json
+from .color_histogram import ColorHistogram
+from .hue_lut import load_hue_lut, HUE, SATURATION_BIN, VALUE_BIN
+from . import sampling, batch_metrics
+from .feedback_generator import FeedbackGenerator
+from .deadline import Deadline, ScoringTimeout
+from ..config.config import SCORING_CRITERIA, SCORING_WEIGHTS, COLOR_PALETTE_CONFIG, HUE_LUT_CONFIG, \
+    SAMPLING_CONFIG, DEADLINE_CONFIG, METRIC_VERSIONS
+
+_ndimage = None
+
+def load_ndimage():
+    """
+    按需导入 scipy.ndimage（SciPy导入较慢，只在首次需要时导入一次；
+    生产环境可在fork前通过 warmup.preload_dependencies 提前导入）
+    """
+    global _ndimage
+    if _ndimage is None:
+        from scipy import ndimage
+        _ndimage = ndimage
+    return _ndimage
+
+def load_hue_table() -> np.ndarray:
+    """按 HUE_LUT_CONFIG 加载（必要时构建）共享的色相查找表"""
+    return load_hue_lut(
+        HUE_LUT_CONFIG['directory'],
+        HUE_LUT_CONFIG['bits'],
+        HUE_LUT_CONFIG['saturation_bins'],
+        HUE_LUT_CONFIG['value_bins']
+    )
+
+# 各评分维度包含的原始子指标
+DIMENSION_METRICS = {
+    'color_usage': ('unique_colors', 'harmony_score', 'coverage_score'),
+    'composition': ('thirds_score', 'balance_score', 'focal_score'),
+    'creativity': ('shape_variety', 'stroke_expression', 'space_usage')
+}
+
+# 特征平面及其依赖的平面：各平面在首次需要时计算一次，由子指标共享
+FEATURE_PLANES = {
+    'rgb': (),                     # (H, W, 3) uint8 像素
+    'histogram': ('rgb',),         # 全精度颜色直方图
+    'sample_rgb': ('rgb',),        # 分层抽样的像素
+    'content_counts': ('rgb',),    # 每个像素非纯白的通道数
+    'gray': ('rgb',),              # 三通道均值灰度
+    'edges': ('gray',)             # Sobel边缘
+}
+
+class MetricDefinition:
+    def __init__(self, name: str, dimension: str, compute, planes: Tuple[str, ...] = (),
+                 sampled: str = None, sampled_planes: Tuple[str, ...] = (), version: int = 1):
+        """
+        注册的子指标
+
+        Args:
+            name: 子指标名称
+            dimension: 所属评分维度，子指标出现在该维度的详情中
+            compute: ScoringEngine 的方法名，或以所需特征平面为关键字参数、返回数值的函数
+            planes: 精确计算依赖的特征平面
+            sampled: 快速模式下抽样估计的方法名，方法返回 (估计值, 下界, 上界)
+            sampled_planes: 抽样估计依赖的特征平面
+            version: 算法版本（内置子指标以 METRIC_VERSIONS 为准）
+        """
+        self.name = name
+        self.dimension = dimension
+        self.compute = compute
+        self.planes = tuple(planes)
+        self.sampled = sampled
+        self.sampled_planes = tuple(sampled_planes)
+        self.version = version
 
 class ScoringEngine:
-    def __init__(self, image: Image.Image):
+    # 已注册的子指标（按注册顺序），由 register_metric 填充
+    METRICS: Dict[str, MetricDefinition] = {}
+
+    def __init__(self, image: Union[Image.Image, np.ndarray], mode: str = 'exact',
+                 precomputed: Dict[str, float] = None, deadline: Deadline = None):
         """
         初始化评分引擎
         
         Args:
-            image: PIL Image对象
+            image: PIL Image对象，或 (H, W, 3) uint8 像素数组（如像素缓存的内存映射，直接使用不复制）
+            mode: 'exact' 精确计算；'fast' 像素统计类指标在分层抽样像素上估计，
+                  误差可能改变反馈档位时自动回退为精确计算
+            precomputed: 已计算好的精确子指标（如批量计算的结果），直接使用而不重新计算
+            deadline: 截止时间，在各子指标之间（大图还在分条滤波之间）检查，超时抛出 ScoringTimeout
         """
-        self.image = image
-        self.np_image = np.array(image)
-        self.width, self.height = image.size
-        self.rgb_image = image.convert('RGB')
+        if mode not in ('exact', 'fast'):
+            raise ValueError(f"未知的评分模式: {mode}")
+        if isinstance(image, np.ndarray):
+            self.image = None
+            self.np_image = image
+            self.height, self.width = image.shape[:2]
+            self.rgb_image = None
+            self._rgb = image
+        else:
+            self.image = image
+            self.np_image = np.array(image)
+            self.width, self.height = image.size
+            self.rgb_image = image.convert('RGB')
+            self._rgb = None
+        self.mode = mode
+        self.precomputed = dict(precomputed or {})
+        self.deadline = deadline
+        self._histogram = None
+        self._sample_rgb = None
+        self._content_counts = None
+        self._gray = None
+        self._edges = None
+        # 近似计算的子指标和维度得分的置信区间
+        self.metric_intervals = {}
+        self.score_intervals = {}
 
     def analyze_color_usage(self) -> Tuple[float, Dict]:
         """分析颜色使用情况"""
-        # 获取所有像素的颜色
-        colors = []
-        for x in range(self.width):
-            for y in range(self.height):
-                colors.append(self.rgb_image.getpixel((x, y)))
-        
-        # 计算独特颜色数量
-        unique_colors = len(set(colors))
-        
-        # 计算颜色和谐度
-        harmony_score = self._calculate_color_harmony(colors)
-        
-        # 计算颜色覆盖率
-        coverage_score = self._calculate_color_coverage()
-        
-        # 根据权重计算总分
-        criteria = SCORING_CRITERIA['color_usage']
-        color_score = (
-            self._score_unique_colors(unique_colors) * criteria['unique_colors']['weight'] +
-            harmony_score * criteria['color_harmony']['weight'] +
-            coverage_score * criteria['color_coverage']['weight']
-        )
-        
-        return color_score, {
-            'unique_colors': unique_colors,
-            'harmony_score': harmony_score,
-            'coverage_score': coverage_score
-        }
+        return self._analyze_dimension('color_usage')
 
     def analyze_composition(self) -> Tuple[float, Dict]:
         """分析画面构图"""
-        # 计算三分法得分
-        thirds_score = self._analyze_rule_of_thirds()
-        
-        # 计算平衡性得分
-        balance_score = self._analyze_balance()
-        
-        # 计算焦点得分
-        focal_score = self._analyze_focal_point()
-        
-        # 根据权重计算总分
-        criteria = SCORING_CRITERIA['composition']
-        composition_score = (
-            thirds_score * criteria['rule_of_thirds']['weight'] +
-            balance_score * criteria['balance']['weight'] +
-            focal_score * criteria['focal_point']['weight']
-        )
-        
-        return composition_score, {
-            'thirds_score': thirds_score,
-            'balance_score': balance_score,
-            'focal_score': focal_score
-        }
+        return self._analyze_dimension('composition')
 
     def analyze_creativity(self) -> Tuple[float, Dict]:
         """分析创造力表现"""
-        # 分析形状多样性
-        shape_variety = self._analyze_shape_variety()
-        
-        # 分析笔触表现力
-        stroke_expression = self._analyze_stroke_expression()
-        
-        # 分析空间利用
-        space_usage = self._analyze_space_usage()
-        
-        # 计算总分
-        weights = SCORING_CRITERIA['creativity']
-        creativity_score = (
-            shape_variety * weights['variety'] +
-            stroke_expression * weights['expression'] +
-            space_usage * weights['uniqueness']
+        return self._analyze_dimension('creativity')
+
+    def analyze(self, dimensions=None) -> Tuple[Dict[str, float], Dict[str, Dict]]:
+        """
+        分析指定维度（默认全部维度），只计算这些维度需要的特征平面和子指标
+
+        快速模式下，若任一近似结果的误差范围跨越反馈分档阈值，
+        则对近似指标重新精确计算，保证反馈与精确模式一致。
+
+        Returns:
+            (scores, details)
+
+        Raises:
+            ScoringTimeout: 超过截止时间，异常中带有已完成维度的得分
+        """
+        scores = {}
+        details = {}
+        try:
+            for dimension, score, dimension_details in self.iter_analyze(dimensions):
+                scores[dimension], details[dimension] = score, dimension_details
+        except ScoringTimeout as e:
+            # 附带已完成维度的部分结果
+            e.scores, e.details = scores, details
+            raise
+        return scores, details
+
+    def iter_analyze(self, dimensions=None) -> Iterator[Tuple[str, float, Dict]]:
+        """
+        逐个维度分析，每完成一个维度立即产出 (dimension, score, details)，供渐进式返回结果
+
+        快速模式回退为精确计算时，会再次依次产出各维度的精确结果，以最后一次产出为准。
+
+        Args:
+            dimensions: 要评分的维度，默认全部维度
+        """
+        dimensions = self.select_dimensions(dimensions)
+        scores = {}
+        for dimension in dimensions:
+            scores[dimension], details = self._analyze_dimension(dimension)
+            yield dimension, scores[dimension], details
+        if self.mode == 'fast' and not FeedbackGenerator.is_stable(
+                scores, self.score_intervals, self.metric_intervals):
+            self.mode = 'exact'
+            self.metric_intervals.clear()
+            self.score_intervals.clear()
+            for dimension in dimensions:
+                yield (dimension, *self._analyze_dimension(dimension))
+
+    def _analyze_dimension(self, dimension: str) -> Tuple[float, Dict]:
+        """计算一个维度的子指标和得分；近似指标在详情中附带误差范围"""
+        details = self.compute_metrics(self.metric_names(dimension))
+        score = self.weighted_score(dimension, details)
+        
+        approximated = [name for name in details if name in self.metric_intervals]
+        if approximated:
+            # 各维度得分对子指标单调不减，用子指标区间端点得到得分区间
+            low = self.weighted_score(dimension, {
+                name: self.metric_intervals.get(name, (value, value))[0] for name, value in details.items()
+            })
+            high = self.weighted_score(dimension, {
+                name: self.metric_intervals.get(name, (value, value))[1] for name, value in details.items()
+            })
+            self.score_intervals[dimension] = (low, high)
+            for name in approximated:
+                low_value, high_value = self.metric_intervals[name]
+                details[f'{name}_error'] = max(details[name] - low_value, high_value - details[name])
+            details['score_error'] = max(score - low, high - score)
+        return score, details
+
+    def compute_metrics(self, names=None) -> Dict[str, float]:
+        """
+        计算指定的原始子指标
+
+        Args:
+            names: 子指标名称列表，默认计算全部已注册的子指标
+
+        Returns:
+            子指标名称到原始值的映射
+        """
+        if names is None:
+            names = list(self.METRICS)
+        metrics = {}
+        for name in names:
+            self._check_deadline()
+            definition = self.METRICS[name]
+            if name in self.precomputed:
+                value = self.precomputed[name]
+            elif self.mode == 'fast' and definition.sampled:
+                value, low, high = getattr(self, definition.sampled)()
+                self.metric_intervals[name] = (low, high)
+            elif isinstance(definition.compute, str):
+                value = getattr(self, definition.compute)()
+            else:
+                # 第三方子指标：按声明传入所需的特征平面
+                value = definition.compute(**{plane: self.plane(plane) for plane in definition.planes})
+            metrics[name] = value
+        return metrics
+
+    def plane(self, name: str):
+        """按名称取特征平面（首次访问时计算）"""
+        if name not in FEATURE_PLANES:
+            raise ValueError(f"未知的特征平面: {name}")
+        return getattr(self, name)
+
+    @classmethod
+    def compute_batch_metrics(cls, images: List[Image.Image]) -> List[Dict[str, float]]:
+        """
+        批量计算多张图像的全部原始子指标
+
+        同尺寸的图像堆叠为一个数组，在批维度上一次计算可向量化的子指标；
+        基于颜色直方图的子指标逐张计算。结果与逐张调用 compute_metrics 相同。
+
+        Returns:
+            与 images 顺序对应的子指标字典列表
+        """
+        engines = [cls(image) for image in images]
+        groups = {}
+        for index, engine in enumerate(engines):
+            groups.setdefault(engine.np_image.shape, []).append(index)
+        
+        for indices in groups.values():
+            stacked = np.stack([engines[index].np_image for index in indices])
+            for name, values in batch_metrics.compute_batch(stacked).items():
+                for index, value in zip(indices, values):
+                    engines[index].precomputed[name] = float(value)
+        
+        return [engine.compute_metrics() for engine in engines]
+
+    @classmethod
+    def register_metric(cls, name: str, dimension: str, compute, planes: Tuple[str, ...] = (),
+                        sampled: str = None, sampled_planes: Tuple[str, ...] = (),
+                        version: int = 1) -> MetricDefinition:
+        """
+        注册子指标（内置和第三方子指标都通过此方法接入）
+
+        第三方子指标出现在所属维度的详情中，不参与该维度的加权得分；与内置子指标一起保存到结果存储，
+        已保存的结果缺少该子指标或版本不同时按过期处理（重新计算）。
+
+        Raises:
+            ValueError: 名称已注册，或维度、特征平面未知
+        """
+        if name in cls.METRICS:
+            raise ValueError(f"子指标已注册: {name}")
+        if dimension not in DIMENSION_METRICS:
+            raise ValueError(f"未知的评分维度: {dimension}")
+        unknown = [plane for plane in tuple(planes) + tuple(sampled_planes) if plane not in FEATURE_PLANES]
+        if unknown:
+            raise ValueError(f"未知的特征平面: {', '.join(unknown)}")
+        definition = MetricDefinition(name, dimension, compute, planes, sampled, sampled_planes, version)
+        cls.METRICS[name] = definition
+        return definition
+
+    @classmethod
+    def unregister_metric(cls, name: str):
+        """注销子指标（内置子指标不能注销）"""
+        if any(name in names for names in DIMENSION_METRICS.values()):
+            raise ValueError(f"不能注销内置子指标: {name}")
+        cls.METRICS.pop(name, None)
+
+    @classmethod
+    def metric_versions(cls) -> Dict[str, int]:
+        """全部已注册子指标的算法版本（保存结果和判断结果是否过期时使用）"""
+        return {name: METRIC_VERSIONS.get(name, definition.version) for name, definition in cls.METRICS.items()}
+
+    @classmethod
+    def metric_names(cls, dimension: str) -> List[str]:
+        """一个维度的全部子指标（内置子指标在前）"""
+        return [name for name, definition in cls.METRICS.items() if definition.dimension == dimension]
+
+    @staticmethod
+    def select_dimensions(dimensions=None) -> List[str]:
+        """
+        规范化要评分的维度（按 DIMENSION_METRICS 的顺序），None 表示全部维度
+
+        Raises:
+            ValueError: 维度未知或为空
+        """
+        if dimensions is None:
+            return list(DIMENSION_METRICS)
+        unknown = [dimension for dimension in dimensions if dimension not in DIMENSION_METRICS]
+        if unknown:
+            raise ValueError(f"未知的评分维度: {', '.join(unknown)}")
+        if not dimensions:
+            raise ValueError("至少需要一个评分维度")
+        return [dimension for dimension in DIMENSION_METRICS if dimension in dimensions]
+
+    @classmethod
+    def weighted_score(cls, dimension: str, details: Dict) -> float:
+        """根据原始子指标和当前权重计算维度得分"""
+        if dimension == 'color_usage':
+            criteria = SCORING_CRITERIA['color_usage']
+            return (
+                cls._score_unique_colors(details['unique_colors']) * criteria['unique_colors']['weight'] +
+                details['harmony_score'] * criteria['color_harmony']['weight'] +
+                details['coverage_score'] * criteria['color_coverage']['weight']
+            )
+        if dimension == 'composition':
+            criteria = SCORING_CRITERIA['composition']
+            return (
+                details['thirds_score'] * criteria['rule_of_thirds']['weight'] +
+                details['balance_score'] * criteria['balance']['weight'] +
+                details['focal_score'] * criteria['focal_point']['weight']
+            )
+        if dimension == 'creativity':
+            weights = SCORING_CRITERIA['creativity']
+            return (
+                details['shape_variety'] * weights['variety'] +
+                details['stroke_expression'] * weights['expression'] +
+                details['space_usage'] * weights['uniqueness']
+            )
+        raise ValueError(f"未知的评分维度: {dimension}")
+
+    @classmethod
+    def score_from_metrics(cls, metrics: Dict[str, float]) -> Tuple[Dict[str, float], Dict[str, Dict]]:
+        """
+        由已保存的原始子指标重新推导各维度得分（权重变化时无需重新分析图像）
+
+        详情按注册表组装：已保存的第三方子指标与直接分析时一样出现在所属维度的详情中。
+
+        Returns:
+            (scores, details)
+
+        Raises:
+            KeyError: 缺少内置子指标
+        """
+        scores = {}
+        details = {}
+        for dimension in DIMENSION_METRICS:
+            details[dimension] = {name: metrics[name] for name in cls.metric_names(dimension)
+                                  if name in metrics or name in DIMENSION_METRICS[dimension]}
+            scores[dimension] = cls.weighted_score(dimension, details[dimension])
+        return scores, details
+
+    @staticmethod
+    def config_version() -> str:
+        """当前评分标准的版本标识（评分标准的短哈希）"""
+        payload = json.dumps(SCORING_CRITERIA, sort_keys=True, default=str)
+        return hashlib.sha1(payload.encode('utf-8')).hexdigest()[:12]
+
+    @property
+    def rgb(self) -> np.ndarray:
+        """(H, W, 3) uint8 像素"""
+        if self._rgb is None:
+            self._rgb = np.asarray(self.rgb_image)
+        return self._rgb
+
+    @property
+    def histogram(self) -> ColorHistogram:
+        """全精度颜色直方图（颜色相关指标共享，首次访问时构建）"""
+        if self._histogram is None:
+            self._histogram = ColorHistogram.from_rgb(self.rgb)
+        return self._histogram
+
+    def color_palette(self) -> List[Dict]:
+        """提取主色调及各自的像素覆盖率（与颜色相关指标共享颜色直方图）"""
+        config = COLOR_PALETTE_CONFIG
+        palette = self.histogram.reduce(config['bits']).palette(
+            config['palette_size'], config['refine_iterations']
         )
-        
-        return creativity_score, {
-            'shape_variety': shape_variety,
-            'stroke_expression': stroke_expression,
-            'space_usage': space_usage
-        }
+        return [
+            {'color': '#{:02x}{:02x}{:02x}'.format(*color), 'coverage': float(coverage)}
+            for color, coverage in palette
+        ]
 
-    def _calculate_color_harmony(self, colors: List[Tuple[int, int, int]]) -> float:
+    def _count_unique_colors(self) -> int:
+        """计算独特颜色数量（降低位深合并相近颜色，并忽略占比过低的噪声颜色）"""
+        criteria = SCORING_CRITERIA['color_usage']['unique_colors']
+        return self.histogram.reduce(criteria['bits']).unique_count(criteria['min_fraction'])
+
+    def _harmony_metric(self) -> float:
+        """计算颜色和谐度指标"""
+        return self._calculate_color_harmony(self.histogram)
+
+    def _calculate_color_harmony(self, histogram: ColorHistogram) -> float:
         """计算颜色和谐度"""
-        # 转换RGB为HSV
-        hsv_colors = []
-        for r, g, b in colors:
-            h, s, v = colorsys.rgb_to_hsv(r/255, g/255, b/255)
-            hsv_colors.append((h, s, v))
+        criteria = SCORING_CRITERIA['color_usage']['color_harmony']
         
-        # 分析色相分布
-        hues = [h for h, _, _ in hsv_colors]
-        hue_counts = Counter([int(h * 360) for h in hues])
+        # 通过查找表得到每种颜色的色相和饱和度/明度分档，按像素数统计色相分布
+        reduced = histogram.reduce(HUE_LUT_CONFIG['bits'])
+        entries = np.asarray(load_hue_table()[reduced.keys])
+        hues = entries[:, HUE]
+        hue_counts = np.bincount(hues, weights=reduced.counts, minlength=360)
         
         # 检查互补色
-        harmony_score = 0
-        for hue in hue_counts:
-            complement = (hue + 180) % 360
-            if abs(hue_counts[hue] - hue_counts[complement]) < len(colors) * 0.1:
-                harmony_score += SCORING_CRITERIA['color_usage']['color_harmony']['complementary_bonus']
+        complement_counts = np.roll(hue_counts, -180)  # complement_counts[h] == hue_counts[(h + 180) % 360]
+        balanced = (hue_counts > 0) & (np.abs(hue_counts - complement_counts) < histogram.total * 0.1)
+        harmony_score = np.count_nonzero(balanced) * criteria['complementary_bonus']
+        
+        # 检查类似色：有彩色像素中相邻的主要色相扇区
+        chromatic = (entries[:, SATURATION_BIN] >= criteria['min_saturation_bin']) & \
+                    (entries[:, VALUE_BIN] >= criteria['min_value_bin'])
+        sectors = np.bincount(
+            hues[chromatic] // criteria['analogous_range'],
+            weights=reduced.counts[chromatic],
+            minlength=360 // criteria['analogous_range']
+        )
+        if sectors.sum() > 0:
+            significant = sectors / sectors.sum() >= criteria['analogous_min_share']
+            analogous_pairs = np.count_nonzero(significant & np.roll(significant, -1))
+            harmony_score += analogous_pairs * criteria['analogous_bonus']
         
         # 标准化得分
-        return min(100, harmony_score) / 100
+        return float(min(100, harmony_score) / 100)
 
     def _calculate_color_coverage(self) -> float:
         """计算颜色覆盖率"""
-        # 转换为灰度图像
-        gray = self.image.convert('L')
-        np_gray = np.array(gray)
-        
-        # 计算非空白区域比例
-        non_white_pixels = np.sum(np_gray < 250)  # 假设接近白色的像素为空白
-        total_pixels = self.width * self.height
-        
-        coverage = non_white_pixels / total_pixels
-        min_coverage = SCORING_CRITERIA['color_usage']['color_coverage']['min_coverage']
-        
-        return min(1.0, coverage / min_coverage)
+        return float(batch_metrics.coverage(self.rgb))
 
-    def _score_unique_colors(self, unique_colors: int) -> float:
+    @staticmethod
+    def _score_unique_colors(unique_colors: int) -> float:
         """根据独特颜色数量评分"""
         thresholds = SCORING_CRITERIA['color_usage']['unique_colors']['thresholds']
         for threshold, score in sorted(thresholds.items()):
@@ -147,97 +445,157 @@ class ScoringEngine:
                 return score / 100
         return 1.0
 
+    @property
+    def sample_rgb(self) -> np.ndarray:
+        """分层抽样的像素 (n, 3)"""
+        if self._sample_rgb is None:
+            rgb = self.rgb
+            ys, xs = sampling.stratified_pixel_sample(
+                self.height, self.width, SAMPLING_CONFIG['pixel_samples'], SAMPLING_CONFIG['seed']
+            )
+            self._sample_rgb = rgb[ys, xs]
+        return self._sample_rgb
+
+    def _sample_unique_colors(self) -> Tuple[int, int, int]:
+        """抽样估计独特颜色数量"""
+        criteria = SCORING_CRITERIA['color_usage']['unique_colors']
+        histogram = ColorHistogram.from_rgb(self.sample_rgb, bits=criteria['bits'])
+        return sampling.estimate_unique_colors(histogram, criteria['min_fraction'], SAMPLING_CONFIG['confidence_z'])
+
+    def _sample_harmony(self) -> Tuple[float, float, float]:
+        """抽样估计颜色和谐度"""
+        histogram = ColorHistogram.from_rgb(self.sample_rgb, bits=HUE_LUT_CONFIG['bits'])
+        return sampling.estimate_harmony(
+            histogram, load_hue_table(), SCORING_CRITERIA['color_usage']['color_harmony'],
+            SAMPLING_CONFIG['confidence_z']
+        )
+
+    def _sample_coverage(self) -> Tuple[float, float, float]:
+        """抽样估计颜色覆盖率"""
+        return sampling.estimate_coverage(
+            self.sample_rgb,
+            SCORING_CRITERIA['color_usage']['color_coverage']['min_coverage'],
+            SAMPLING_CONFIG['confidence_z']
+        )
+
+    def _sample_space_usage(self) -> Tuple[float, float, float]:
+        """抽样行和列估计空间利用"""
+        rows = sampling.stratified_line_sample(self.height, SAMPLING_CONFIG['line_samples'], SAMPLING_CONFIG['seed'])
+        cols = sampling.stratified_line_sample(self.width, SAMPLING_CONFIG['line_samples'], SAMPLING_CONFIG['seed'] + 1)
+        row_gray = np.mean(self.np_image[rows], axis=2)
+        col_gray = np.mean(self.np_image[:, cols], axis=2)
+        return sampling.estimate_space_usage(row_gray, col_gray, SAMPLING_CONFIG['confidence_z'])
+
+    def _check_deadline(self):
+        """截止时间检查点"""
+        if self.deadline is not None:
+            self.deadline.check()
+
+    def _filter(self, function, array: np.ndarray, halo: int) -> np.ndarray:
+        """执行局部滤波；设置了截止时间且图像较大时分条执行，每条之间检查截止时间"""
+        if self.deadline is None or array.size < DEADLINE_CONFIG['tile_min_pixels']:
+            return function(array)
+        return batch_metrics.apply_in_strips(
+            function, array, halo, DEADLINE_CONFIG['tile_rows'], self._check_deadline
+        )
+
+    @property
+    def content_counts(self) -> np.ndarray:
+        """每个像素非纯白的通道数（三分法和平衡性指标共享）"""
+        if self._content_counts is None:
+            self._content_counts = batch_metrics.content_counts(self.np_image)
+        return self._content_counts
+
+    @property
+    def gray(self) -> np.ndarray:
+        """三通道均值灰度（构图和创造力指标共享）"""
+        if self._gray is None:
+            self._gray = batch_metrics.gray(self.np_image)
+        return self._gray
+
+    @property
+    def edges(self) -> np.ndarray:
+        """Sobel边缘（焦点和形状指标共享）"""
+        if self._edges is None:
+            self._edges = self._filter(batch_metrics.sobel_edges, self.gray, halo=1)
+        return self._edges
+
     def _analyze_rule_of_thirds(self) -> float:
         """分析三分法构图"""
-        # 将图像分为3x3网格
-        h_thirds = self.height // 3
-        w_thirds = self.width // 3
-        
-        # 计算交叉点周围的内容密度
-        intersection_scores = []
-        for i in [1, 2]:
-            for j in [1, 2]:
-                region = self.np_image[
-                    (i-1)*h_thirds:(i+1)*h_thirds,
-                    (j-1)*w_thirds:(j+1)*w_thirds
-                ]
-                density = np.mean(np.sum(region != 255, axis=2))
-                intersection_scores.append(density)
-        
-        return np.mean(intersection_scores) / 255
+        return float(batch_metrics.rule_of_thirds(self.content_counts))
 
     def _analyze_balance(self) -> float:
         """分析画面平衡性"""
-        # 将图像分为四个象限
-        h_mid = self.height // 2
-        w_mid = self.width // 2
-        
-        quadrants = [
-            self.np_image[:h_mid, :w_mid],    # 左上
-            self.np_image[:h_mid, w_mid:],    # 右上
-            self.np_image[h_mid:, :w_mid],    # 左下
-            self.np_image[h_mid:, w_mid:]     # 右下
-        ]
-        
-        # 计算每个象限的内容密度
-        densities = []
-        for quad in quadrants:
-            density = np.mean(np.sum(quad != 255, axis=2))
-            densities.append(density)
-        
-        # 计算平衡得分
-        balance = 1 - np.std(densities) / np.mean(densities)
-        return max(0, min(1, balance))
+        return float(batch_metrics.balance(self.content_counts))
 
     def _analyze_focal_point(self) -> float:
         """分析焦点区域"""
-        # 使用边缘检测找到主要内容区域
-        from scipy import ndimage
-        gray = np.mean(self.np_image, axis=2)
-        edges = ndimage.sobel(gray)
-        
-        # 找到边缘密度最高的区域
-        kernel_size = min(self.width, self.height) // 5
-        focal_map = ndimage.uniform_filter(np.abs(edges), kernel_size)
-        
-        # 计算焦点得分
-        max_density = np.max(focal_map)
-        threshold = SCORING_CRITERIA['composition']['focal_point']['detection_threshold']
-        
-        return min(1.0, max_density / (255 * threshold))
+        kernel_size = batch_metrics.focal_kernel_size(self.edges)
+        density = self._filter(
+            lambda edges: batch_metrics.focal_map(edges, kernel_size), self.edges, halo=kernel_size // 2 + 1
+        )
+        return float(batch_metrics.focal_score(density))
 
     def _analyze_shape_variety(self) -> float:
         """分析形状多样性"""
-        # 使用边缘检测识别形状
-        from scipy import ndimage
-        gray = np.mean(self.np_image, axis=2)
-        edges = ndimage.sobel(gray)
-        
-        # 计算形状复杂度
-        shape_complexity = np.sum(edges > 50) / (self.width * self.height)
-        return min(1.0, shape_complexity * 5)
+        return float(batch_metrics.shape_variety(self.edges))
 
     def _analyze_stroke_expression(self) -> float:
         """分析笔触表现力"""
-        # 计算局部方差来评估笔触变化
-        from scipy.ndimage import generic_filter
-        gray = np.mean(self.np_image, axis=2)
-        local_std = generic_filter(gray, np.std, size=5)
-        
-        # 评估笔触变化的丰富程度
-        stroke_variety = np.mean(local_std) / 128
-        return min(1.0, stroke_variety * 2)
+        return float(batch_metrics.stroke_score(self._filter(batch_metrics.local_std, self.gray, halo=2)))
 
     def _analyze_space_usage(self) -> float:
         """分析空间利用"""
-        # 计算非空白区域的分布
-        gray = np.mean(self.np_image, axis=2)
-        content_mask = gray < 250
-        
-        # 计算内容的空间分布
-        x_distribution = np.mean(content_mask, axis=0)
-        y_distribution = np.mean(content_mask, axis=1)
-        
-        # 评估空间利用的均匀性
-        space_usage = (np.std(x_distribution) + np.std(y_distribution)) / 2
-        return min(1.0, 1 - space_usage)
+        return float(batch_metrics.space_usage(self.gray))
+
+# 内置子指标：(名称, 维度, 计算方法, 依赖的平面, 抽样方法, 抽样依赖的平面)
+for _name, _dimension, _method, _planes, _sampled, _sampled_planes in (
+    ('unique_colors', 'color_usage', '_count_unique_colors', ('histogram',), '_sample_unique_colors', ('sample_rgb',)),
+    ('harmony_score', 'color_usage', '_harmony_metric', ('histogram',), '_sample_harmony', ('sample_rgb',)),
+    ('coverage_score', 'color_usage', '_calculate_color_coverage', ('rgb',), '_sample_coverage', ('sample_rgb',)),
+    ('thirds_score', 'composition', '_analyze_rule_of_thirds', ('content_counts',), None, ()),
+    ('balance_score', 'composition', '_analyze_balance', ('content_counts',), None, ()),
+    ('focal_score', 'composition', '_analyze_focal_point', ('edges',), None, ()),
+    ('shape_variety', 'creativity', '_analyze_shape_variety', ('edges',), None, ()),
+    ('stroke_expression', 'creativity', '_analyze_stroke_expression', ('gray',), None, ()),
+    ('space_usage', 'creativity', '_analyze_space_usage', ('gray',), '_sample_space_usage', ('rgb',))
+):
+    ScoringEngine.register_metric(_name, _dimension, _method, _planes, _sampled, _sampled_planes)
+
+class MultiFrameScoringEngine:
+    def __init__(self, images: List[Image.Image], deadline: Deadline = None):
+        """
+        多帧（动图抽样帧）评分引擎：各帧分别精确计算子指标，取均值后计算维度得分
+
+        Args:
+            images: 各帧图像
+            deadline: 截止时间，由各帧的引擎检查
+        """
+        self.engines = [ScoringEngine(image, deadline=deadline) for image in images]
+        self.frame_metrics = [{} for _ in images]
+        # 与 ScoringEngine 接口一致；多帧评分只做精确计算
+        self.metric_intervals = {}
+        self.score_intervals = {}
+
+    def iter_analyze(self, dimensions=None) -> Iterator[Tuple[str, float, Dict]]:
+        """逐个维度分析，产出 (dimension, score, details)，details 为各帧子指标的均值"""
+        for dimension in ScoringEngine.select_dimensions(dimensions):
+            names = ScoringEngine.metric_names(dimension)
+            for engine, metrics in zip(self.engines, self.frame_metrics):
+                metrics.update(engine.compute_metrics(names))
+            details = {name: float(np.mean([metrics[name] for metrics in self.frame_metrics])) for name in names}
+            yield dimension, ScoringEngine.weighted_score(dimension, details), details
+
+    # 部分结果的处理与单帧相同
+    analyze = ScoringEngine.analyze
+
+    def frame_scores(self) -> List[Dict[str, float]]:
+        """各帧已计算维度的得分"""
+        return [
+            {
+                dimension: ScoringEngine.weighted_score(dimension, metrics)
+                for dimension, names in DIMENSION_METRICS.items()
+                if all(name in metrics for name in names)
+            }
+            for metrics in self.frame_metrics
+        ]
@@ -0,0 +1,124 @@
+"""
+近似重复图像检测：感知哈希（dHash）+ BK树汉明距离索引
+"""
+import threading
+from typing import List, Optional, Tuple
+import numpy as np
+from PIL import Image
+
+def dhash(image: Image.Image, hash_size: int = 8) -> int:
+    """
+    计算差值哈希（dHash）
+
+    将图像缩小为 (hash_size+1) x hash_size 的灰度图，
+    比较每行相邻像素的亮度，得到 hash_size*hash_size 位的整数哈希。
+    缩放和重新压缩对哈希影响很小。
+    """
+    small = image.convert('L').resize((hash_size + 1, hash_size), Image.Resampling.BOX)
+    pixels = np.asarray(small, dtype=np.int16)
+    bits = (pixels[:, 1:] > pixels[:, :-1]).flatten()
+    return int(''.join('1' if bit else '0' for bit in bits), 2)
+
+def hamming_distance(a: int, b: int) -> int:
+    """计算两个哈希的汉明距离"""
+    return bin(a ^ b).count('1')
+
+class BKTree:
+    def __init__(self):
+        """以汉明距离为度量的BK树"""
+        self._root = None
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def add(self, value: int, key: str):
+        """插入一个哈希值及其关联的键"""
+        self._size += 1
+        if self._root is None:
+            self._root = (value, [key], {})
+            return
+        node = self._root
+        while True:
+            node_value, keys, children = node
+            distance = hamming_distance(value, node_value)
+            if distance == 0:
+                keys.append(key)
+                return
+            if distance not in children:
+                children[distance] = (value, [key], {})
+                return
+            node = children[distance]
+
+    def search(self, value: int, max_distance: int) -> List[Tuple[int, str]]:
+        """查找距离不超过 max_distance 的所有键，按距离升序返回 (distance, key)"""
+        if self._root is None:
+            return []
+        matches = []
+        stack = [self._root]
+        while stack:
+            node_value, keys, children = stack.pop()
+            distance = hamming_distance(value, node_value)
+            if distance <= max_distance:
+                matches.extend((distance, key) for key in keys)
+            # 三角不等式：只有距离在 [d-max, d+max] 内的子树可能包含匹配
+            for child_distance, child in children.items():
+                if distance - max_distance <= child_distance <= distance + max_distance:
+                    stack.append(child)
+        return sorted(matches)
+
+class DuplicateIndex:
+    def __init__(self, max_distance: int, hash_size: int = 8, min_bits: int = 8):
+        """
+        进程内近似重复索引
+
+        Args:
+            max_distance: 判定为近似重复的最大汉明距离
+            hash_size: dHash边长
+            min_bits: 哈希中1和0都至少要有的位数，信息量过低（如接近空白的画面）的哈希不参与近似匹配
+        """
+        self.max_distance = max_distance
+        self.hash_size = hash_size
+        self.min_bits = min_bits
+        self._tree = BKTree()
+        self._lock = threading.Lock()
+        self.stats = {'lookups': 0, 'exact_hits': 0, 'near_hits': 0}
+
+    def __len__(self) -> int:
+        return len(self._tree)
+
+    def is_distinctive(self, value: int) -> bool:
+        """哈希信息量是否足以进行近似匹配"""
+        ones = bin(value).count('1')
+        return self.min_bits <= ones <= self.hash_size * self.hash_size - self.min_bits
+
+    def add(self, value: int, image_hash: str):
+        """将一张图像加入索引"""
+        with self._lock:
+            self._tree.add(value, image_hash)
+
+    def find(self, value: int) -> Optional[Tuple[int, str]]:
+        """查找最接近的近似重复图像，返回 (distance, image_hash)，没有时返回None"""
+        if not self.is_distinctive(value):
+            return None
+        with self._lock:
+            matches = self._tree.search(value, self.max_distance)
+        return matches[0] if matches else None
+
+    def record_lookup(self, exact: bool = False, near: bool = False):
+        """记录一次查重结果"""
+        with self._lock:
+            self.stats['lookups'] += 1
+            if exact:
+                self.stats['exact_hits'] += 1
+            elif near:
+                self.stats['near_hits'] += 1
+
+    def report(self) -> dict:
+        """重复率统计"""
+        with self._lock:
+            stats = dict(self.stats)
+        lookups = stats['lookups']
+        stats['indexed'] = len(self)
+        stats['duplicate_rate'] = (stats['exact_hits'] + stats['near_hits']) / lookups if lookups else 0.0
+        return stats
@@ -0,0 +1,185 @@
+"""
+动图（GIF）帧处理：由块结构定位各帧，只解码合成所需的帧
+
+Pillow 的 seek(n) 会依次解码第 0..n 帧。这里先用 read_gif_structure 定位各帧的字节范围，
+把单帧连同颜色表拼成独立的GIF单独解码为调色板索引，再按处置方法合成到画布上。
+覆盖整个画布且不透明的帧（关键帧）完全遮住之前的画面，合成时从最近的关键帧开始。
+"""
+import io
+import struct
+from typing import Dict, List, Tuple
+import numpy as np
+from PIL import Image
+from .image_guard import GifStructure, ImageRejected, read_gif_structure
+
+# 画布背景（处置方法2恢复的颜色）：按空白画纸处理为白色
+BACKGROUND = 255
+
+class FrameLimitExceeded(ImageRejected):
+    """需要解码的帧数超过上限"""
+
+def _palette(raw: bytes) -> np.ndarray:
+    """颜色表字节转为 (256, 3) 数组（不足256色的部分补0）"""
+    palette = np.zeros((256, 3), dtype=np.uint8)
+    colors = np.frombuffer(raw, dtype=np.uint8).reshape(-1, 3)[:256]
+    palette[:len(colors)] = colors
+    return palette
+
+class GifFrameDecoder:
+    def __init__(self, data: bytes, structure: GifStructure, max_decoded_frames: int):
+        """
+        初始化帧解码器
+
+        Args:
+            data: GIF文件内容
+            structure: read_gif_structure 的结果
+            max_decoded_frames: 最多解码的帧数（每帧只解码一次，结果缓存为调色板索引）
+        """
+        if not structure.frames:
+            raise ImageRejected("无效的GIF文件")
+        self.data = data
+        self.structure = structure
+        self.frames = structure.frames
+        self.max_decoded_frames = max_decoded_frames
+        self.decoded = 0
+        # 帧序号 -> (调色板索引 (h, w) uint8, 颜色表 (256, 3))
+        self._cache: Dict[int, Tuple[np.ndarray, np.ndarray]] = {}
+        self._global_palette = data[13:structure.global_palette_end]
+        # 每帧之前（含）最近的关键帧
+        self._keyframes = []
+        keyframe = 0
+        for index, frame in enumerate(self.frames):
+            if self._is_keyframe(frame):
+                keyframe = index
+            self._keyframes.append(keyframe)
+
+    @classmethod
+    def open(cls, stream, max_frames: int, max_decoded_frames: int) -> 'GifFrameDecoder':
+        """读取GIF块结构（不解码像素）；结束后流位置重置到开头"""
+        structure = read_gif_structure(stream, max_frames)
+        stream.seek(0)
+        data = stream.read()
+        stream.seek(0)
+        return cls(data, structure, max_decoded_frames)
+
+    def _is_keyframe(self, frame) -> bool:
+        return frame.left == 0 and frame.top == 0 and frame.transparency is None and \
+            frame.width >= self.structure.width and frame.height >= self.structure.height
+
+    def frame_data(self, index: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        单独解码一帧，返回 (调色板索引, 颜色表)
+
+        Raises:
+            FrameLimitExceeded: 已解码的帧数达到上限
+        """
+        if index in self._cache:
+            return self._cache[index]
+        if self.decoded >= self.max_decoded_frames:
+            raise FrameLimitExceeded(f"动图解码帧数超过限制 (最多 {self.max_decoded_frames} 帧)")
+        frame = self.frames[index]
+        # 图像描述符起的字节，位置改为 (0, 0)；逻辑屏幕取帧尺寸
+        descriptor = bytearray(self.data[frame.descriptor:frame.end])
+        descriptor[1:5] = bytes(4)
+        header = b'GIF89a' + struct.pack('<HHB', frame.width, frame.height, self.data[10]) + \
+            self.data[11:13] + self._global_palette
+        try:
+            with Image.open(io.BytesIO(header + bytes(descriptor) + b'\x3b')) as image:
+                if image.mode not in ('P', 'L'):
+                    raise ImageRejected("无效的GIF帧")
+                indices = np.asarray(image)
+        except (OSError, SyntaxError):
+            raise ImageRejected("无效的GIF帧")
+        if frame.local_palette:
+            packed = self.data[frame.descriptor + 9]
+            start = frame.descriptor + 10
+            palette = _palette(self.data[start:start + (3 << ((packed & 0x07) + 1))])
+        else:
+            palette = _palette(self._global_palette)
+        self.decoded += 1
+        self._cache[index] = indices, palette
+        return indices, palette
+
+    def plan(self, targets: List[int]) -> List[int]:
+        """按升序合成 targets 中各帧依次需要解码的帧序号"""
+        decoded = []
+        position = -1
+        for target in sorted(set(targets)):
+            decoded.extend(range(max(self._keyframes[target], position + 1), target + 1))
+            position = target
+        return decoded
+
+    def representative(self) -> int:
+        """代表帧：最后一帧（通常是完成的画面）；合成所需帧数超过上限时取上限内能合成的最后一帧"""
+        for index in range(len(self.frames) - 1, 0, -1):
+            if index - self._keyframes[index] + 1 <= self.max_decoded_frames:
+                return index
+        return 0
+
+    def sample(self, count: int) -> List[int]:
+        """均匀抽取至多 count 帧（包含代表帧），合成所需的总解码帧数不超过上限"""
+        chosen = [self.representative()]
+        for index in np.linspace(0, len(self.frames) - 1, count).round().astype(int).tolist():
+            if len(chosen) >= count:
+                break
+            if index not in chosen and len(self.plan(chosen + [index])) <= self.max_decoded_frames:
+                chosen.append(index)
+        return sorted(chosen)
+
+    def _region(self, canvas: np.ndarray, index: int) -> np.ndarray:
+        frame = self.frames[index]
+        return canvas[frame.top:frame.top + frame.height, frame.left:frame.left + frame.width]
+
+    def _draw(self, canvas: np.ndarray, index: int):
+        """把一帧画到画布上，返回处置方法3需要恢复的原区域内容"""
+        frame = self.frames[index]
+        region = self._region(canvas, index)
+        saved = region.copy() if frame.disposal == 3 else None
+        indices, palette = self.frame_data(index)
+        # 超出画布的部分裁掉
+        indices = indices[:region.shape[0], :region.shape[1]]
+        if frame.transparency is None:
+            region[...] = palette[indices]
+        else:
+            opaque = indices != frame.transparency
+            region[opaque] = palette[indices[opaque]]
+        return saved
+
+    def _dispose(self, canvas: np.ndarray, index: int, saved):
+        frame = self.frames[index]
+        if frame.disposal == 2:
+            self._region(canvas, index)[...] = BACKGROUND
+        elif frame.disposal == 3:
+            self._region(canvas, index)[...] = saved
+
+    def render(self, targets: List[int]) -> Dict[int, Image.Image]:
+        """
+        合成指定帧的完整画面
+
+        Returns:
+            帧序号到RGB图像的映射
+
+        Raises:
+            FrameLimitExceeded: 需要解码的帧数超过上限
+        """
+        if len(self.plan(targets)) > self.max_decoded_frames:
+            raise FrameLimitExceeded(f"动图解码帧数超过限制 (最多 {self.max_decoded_frames} 帧)")
+        canvas = None
+        pending = None  # 上一帧 (序号, 处置需要恢复的内容)
+        position = -1
+        rendered = {}
+        for target in sorted(set(targets)):
+            first = self._keyframes[target]
+            if first > position:
+                # 从关键帧（或第一帧）开始，之前的画面不影响结果
+                canvas = np.full((self.structure.height, self.structure.width, 3), BACKGROUND, dtype=np.uint8)
+                pending = None
+            else:
+                first = position + 1
+            for index in range(first, target + 1):
+                if pending is not None:
+                    self._dispose(canvas, *pending)
+                pending = index, self._draw(canvas, index)
+            rendered[target] = Image.fromarray(canvas.copy())
+            position = target
+        return rendered
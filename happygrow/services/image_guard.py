@@ -0,0 +1,299 @@
+"""
+解码前的图像防护：从文件头解析尺寸和帧数执行像素预算（防解压炸弹），
+并按进程统计并发请求的预估内存，超出预算时降级为草稿解码或拒绝
+"""
+import struct
+import threading
+from typing import List, Optional, Tuple
+from PIL import Image
+
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+# 可能携带压缩数据的PNG辅助块
+PNG_METADATA_CHUNKS = {b'iCCP', b'zTXt', b'iTXt', b'tEXt', b'eXIf'}
+
+class ImageRejected(Exception):
+    """图像不满足像素预算或文件头无效"""
+
+class MemoryBudgetExceeded(Exception):
+    """当前并发请求的预估内存已占满预算"""
+
+class HeaderInfo:
+    def __init__(self, format: str, width: int, height: int, frames: int = 1):
+        """
+        从文件头得到的图像信息
+
+        Args:
+            format: 'PNG'、'GIF'、'JPEG' 等
+            width: 宽度（GIF为所有帧的画布范围）
+            height: 高度
+            frames: 帧数
+        """
+        self.format = format
+        self.width = width
+        self.height = height
+        self.frames = frames
+
+    @property
+    def pixels(self) -> int:
+        """单帧像素数"""
+        return self.width * self.height
+
+    @property
+    def size(self) -> Tuple[int, int]:
+        return self.width, self.height
+
+def _read_exact(stream, n: int) -> bytes:
+    data = stream.read(n)
+    if len(data) != n:
+        raise ImageRejected("图像文件不完整")
+    return data
+
+def _inspect_png(stream, max_metadata_chunk: int, max_chunks: int = 1024) -> HeaderInfo:
+    """逐块读取PNG块头直到第一个IDAT：取IHDR尺寸和APNG的acTL帧数，检查辅助块大小"""
+    stream.seek(len(PNG_SIGNATURE))
+    width = height = None
+    frames = 1
+    for _ in range(max_chunks):
+        length, chunk_type = struct.unpack('>I4s', _read_exact(stream, 8))
+        if chunk_type == b'IHDR':
+            if length != 13:
+                raise ImageRejected("无效的PNG文件头")
+            width, height = struct.unpack('>II', _read_exact(stream, 8))
+            stream.seek(length - 8 + 4, 1)  # 其余字段和CRC
+            continue
+        if chunk_type == b'acTL':
+            frames = max(1, struct.unpack('>I', _read_exact(stream, 4))[0])
+            stream.seek(length - 4 + 4, 1)
+            continue
+        if chunk_type == b'IDAT':
+            break
+        if chunk_type in PNG_METADATA_CHUNKS and length > max_metadata_chunk:
+            raise ImageRejected("PNG元数据块过大")
+        stream.seek(length + 4, 1)
+    else:
+        raise ImageRejected("PNG辅助块过多")
+    if not width or not height:
+        raise ImageRejected("无效的PNG文件头")
+    return HeaderInfo('PNG', width, height, frames)
+
+def _skip_sub_blocks(stream):
+    """跳过GIF数据子块序列（不解码LZW数据）"""
+    while True:
+        size = stream.read(1)
+        if not size or size[0] == 0:
+            return
+        stream.seek(size[0], 1)
+
+class GifFrame:
+    def __init__(self, start: int, descriptor: int, end: int, left: int, top: int, width: int, height: int,
+                 disposal: int = 0, transparency: Optional[int] = None, local_palette: bool = False):
+        """
+        从GIF块结构得到的单帧信息（未解码）
+
+        Args:
+            start: 该帧字节范围的起点（图形控制扩展或图像描述符）
+            descriptor: 图像描述符的位置
+            end: 该帧图像数据之后的位置
+            left, top, width, height: 帧在画布上的区域
+            disposal: 处置方法（2 恢复为背景，3 恢复为上一状态）
+            transparency: 透明色索引，没有时为None
+            local_palette: 是否带局部颜色表
+        """
+        self.start = start
+        self.descriptor = descriptor
+        self.end = end
+        self.left = left
+        self.top = top
+        self.width = width
+        self.height = height
+        self.disposal = disposal
+        self.transparency = transparency
+        self.local_palette = local_palette
+
+class GifStructure:
+    def __init__(self, width: int, height: int, global_palette_end: int, frames: List[GifFrame]):
+        """
+        GIF的画布尺寸和各帧位置
+
+        Args:
+            width, height: 逻辑画布尺寸
+            global_palette_end: 文件头、逻辑屏幕描述符和全局颜色表之后的位置
+            frames: 各帧信息（遍历在帧数超过上限后停止）
+        """
+        self.width = width
+        self.height = height
+        self.global_palette_end = global_palette_end
+        self.frames = frames
+
+def read_gif_structure(stream, max_frames: int) -> GifStructure:
+    """
+    遍历GIF块结构得到各帧的位置和区域，只读取块头并跳过图像数据；帧数超过 max_frames 即停止
+
+    Raises:
+        ImageRejected: 文件头无效
+    """
+    stream.seek(6)
+    width, height, packed = struct.unpack('<HHB', _read_exact(stream, 5))
+    stream.seek(2, 1)  # 背景色索引、像素宽高比
+    if packed & 0x80:
+        stream.seek(3 << ((packed & 0x07) + 1), 1)  # 全局颜色表
+    global_palette_end = stream.tell()
+    frames = []
+    control = None  # 下一帧的图形控制扩展 (起点, 处置方法, 透明色索引)
+    while len(frames) <= max_frames:
+        position = stream.tell()
+        introducer = stream.read(1)
+        if introducer == b'\x2c':  # 图像描述符
+            left, top, frame_width, frame_height, packed = struct.unpack('<HHHHB', _read_exact(stream, 9))
+            if packed & 0x80:
+                stream.seek(3 << ((packed & 0x07) + 1), 1)  # 局部颜色表
+            stream.seek(1, 1)  # LZW最小码长
+            _skip_sub_blocks(stream)
+            start, disposal, transparency = control or (position, 0, None)
+            frames.append(GifFrame(start, position, stream.tell(), left, top, frame_width, frame_height,
+                                   disposal, transparency, bool(packed & 0x80)))
+            control = None
+        elif introducer == b'\x21':  # 扩展块
+            label = _read_exact(stream, 1)
+            if label == b'\xf9':  # 图形控制扩展
+                block_size, flags, _, transparent_index = struct.unpack('<BBHB', _read_exact(stream, 5))
+                stream.seek(block_size - 4, 1)
+                control = (position, (flags >> 2) & 0x07, transparent_index if flags & 0x01 else None)
+            _skip_sub_blocks(stream)
+        else:
+            # 结束符、截断或无法识别的块
+            break
+    return GifStructure(width, height, global_palette_end, frames)
+
+def _inspect_gif(stream, max_frames: int) -> HeaderInfo:
+    """由GIF块结构统计帧数和画布范围（包括超出逻辑画布的帧）"""
+    structure = read_gif_structure(stream, max_frames)
+    width = max([structure.width] + [frame.left + frame.width for frame in structure.frames])
+    height = max([structure.height] + [frame.top + frame.height for frame in structure.frames])
+    if not width or not height:
+        raise ImageRejected("无效的GIF文件头")
+    return HeaderInfo('GIF', width, height, max(len(structure.frames), 1))
+
+def inspect_header(stream, max_metadata_chunk: int, max_frames: int) -> HeaderInfo:
+    """
+    只读取文件头获取格式、尺寸和帧数，不解码像素；结束后流位置重置到开头
+
+    Raises:
+        ImageRejected: 文件头无效
+    """
+    stream.seek(0)
+    try:
+        signature = stream.read(8)
+        if signature == PNG_SIGNATURE:
+            return _inspect_png(stream, max_metadata_chunk)
+        if signature[:6] in (b'GIF87a', b'GIF89a'):
+            return _inspect_gif(stream, max_frames)
+        stream.seek(0)
+        try:
+            with Image.open(stream) as image:
+                return HeaderInfo(image.format, image.size[0], image.size[1], getattr(image, 'n_frames', 1))
+        except Image.DecompressionBombError:
+            raise ImageRejected("图像像素数超过限制")
+        except Exception:
+            raise ImageRejected("无效的图像文件")
+    except struct.error:
+        raise ImageRejected("无效的图像文件")
+    finally:
+        stream.seek(0)
+
+def check_pixel_budget(info: HeaderInfo, max_pixels: int, max_frames: int, max_total_pixels: int) -> Optional[str]:
+    """检查像素预算，超出时返回错误信息"""
+    if info.pixels > max_pixels:
+        return f"图像像素数超过限制 ({info.width}x{info.height})"
+    if info.frames > max_frames:
+        return f"动图帧数超过限制 (最多 {max_frames} 帧)"
+    if info.pixels * info.frames > max_total_pixels:
+        return "动图总像素数超过限制"
+    return None
+
+class Reservation:
+    def __init__(self, budget: 'MemoryBudget', nbytes: int):
+        """一次内存预留，release 可重复调用"""
+        self.budget = budget
+        self.nbytes = nbytes
+        self._released = False
+
+    def release(self):
+        if self._released:
+            return
+        self._released = True
+        self.budget._release(self.nbytes)
+
+class MemoryBudget:
+    def __init__(self, budget_bytes: int, bytes_per_decoded_pixel: float, bytes_per_analysis_pixel: float,
+                 analysis_max_size: int, draft_max_size: int):
+        """
+        进程内内存预算
+
+        Args:
+            budget_bytes: 并发请求预估内存之和的上限
+            bytes_per_decoded_pixel: 解码原图每像素的内存
+            bytes_per_analysis_pixel: 评分时每像素的峰值内存（各浮点特征平面之和）
+            analysis_max_size: 评分使用的最长边像素
+            draft_max_size: 降级时草稿解码和评分使用的最长边像素
+        """
+        self.budget_bytes = budget_bytes
+        self.bytes_per_decoded_pixel = bytes_per_decoded_pixel
+        self.bytes_per_analysis_pixel = bytes_per_analysis_pixel
+        self.analysis_max_size = analysis_max_size
+        self.draft_max_size = draft_max_size
+        self._lock = threading.Lock()
+        self.used = 0
+        self.stats = {'admitted': 0, 'downgraded': 0, 'rejected': 0, 'peak': 0}
+
+    def estimate(self, width: int, height: int, max_size: int, draft: bool = False) -> int:
+        """
+        预估处理一张图像的峰值内存（字节）
+
+        草稿解码时JPEG按 1/2、1/4、1/8 缩小解码，解码尺寸不小于 max_size。
+        """
+        longest = max(width, height)
+        reduction = 1
+        if draft:
+            while reduction < 8 and longest / (reduction * 2) >= max_size:
+                reduction *= 2
+        decoded = (width // reduction) * (height // reduction)
+        scale = min(1.0, max_size / longest)
+        analysis = (width * scale) * (height * scale)
+        return int(decoded * self.bytes_per_decoded_pixel + analysis * self.bytes_per_analysis_pixel)
+
+    def admit(self, info: HeaderInfo) -> Tuple[Reservation, Optional[int]]:
+        """
+        为一张图像预留内存；预算不足时对JPEG降级为草稿解码（以 draft_max_size 解码和评分）
+
+        Returns:
+            (reservation, draft_size)，未降级时 draft_size 为None
+
+        Raises:
+            MemoryBudgetExceeded: 降级后仍超出预算
+        """
+        candidates = [(self.estimate(info.width, info.height, self.analysis_max_size), None)]
+        if info.format == 'JPEG' and max(info.size) > self.draft_max_size:
+            candidates.append((self.estimate(info.width, info.height, self.draft_max_size, draft=True),
+                               self.draft_max_size))
+        with self._lock:
+            for nbytes, draft_size in candidates:
+                if self.used + nbytes <= self.budget_bytes:
+                    self.used += nbytes
+                    self.stats['peak'] = max(self.stats['peak'], self.used)
+                    self.stats['downgraded' if draft_size else 'admitted'] += 1
+                    return Reservation(self, nbytes), draft_size
+            self.stats['rejected'] += 1
+        raise MemoryBudgetExceeded("内存预算不足")
+
+    def _release(self, nbytes: int):
+        with self._lock:
+            self.used -= nbytes
+
+    def report(self) -> dict:
+        """内存预算统计"""
+        with self._lock:
+            stats = dict(self.stats)
+            stats['used'] = self.used
+        stats['budget'] = self.budget_bytes
+        return stats
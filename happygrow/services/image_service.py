@@ -3,10 +3,14 @@
 """
 import os
 import uuid
+import hashlib
 from datetime import datetime
-from PIL import Image, UnidentifiedImageError
+from PIL import Image, UnidentifiedImageError, features
 from werkzeug.utils import secure_filename
-from ..config.config import IMAGE_CONFIG
+from ..config.config import IMAGE_CONFIG, DUPLICATE_CONFIG, THUMBNAIL_CONFIG, IMAGE_GUARD_CONFIG, ANIMATION_CONFIG
+from .duplicate_index import dhash
+from .image_guard import inspect_header, check_pixel_budget, ImageRejected
+from .gif_frames import GifFrameDecoder
 
 class ImageService:
     @staticmethod
@@ -39,7 +43,13 @@ class ImageService:
             max_size_mb = IMAGE_CONFIG['max_file_size'] / (1024 * 1024)
             return False, f"文件大小超过限制 ({max_size_mb}MB)"
         
-        # 验证图像格式和尺寸
+        # 解码前解析文件头（PNG块、GIF帧结构）
+        try:
+            info = ImageService.inspect_header(file)
+        except ImageRejected as e:
+            return False, str(e)
+        
+        # 验证图像格式和尺寸（Image.open 只读取文件头，不解码像素）
         try:
             image = Image.open(file.stream)
             
@@ -53,6 +63,16 @@ class ImageService:
                image.size[1] > IMAGE_CONFIG['max_height']:
                 return False, f"图像尺寸太大。最大尺寸: {IMAGE_CONFIG['max_width']}x{IMAGE_CONFIG['max_height']}"
             
+            # 检查像素预算（包括动图的帧数）
+            error = check_pixel_budget(
+                info,
+                IMAGE_GUARD_CONFIG['max_pixels'],
+                IMAGE_GUARD_CONFIG['max_frames'],
+                IMAGE_GUARD_CONFIG['max_total_pixels']
+            )
+            if error:
+                return False, error
+            
             file.stream.seek(0)  # 重置文件指针
             return True, None
             
@@ -62,29 +82,87 @@ class ImageService:
             return False, f"图像处理错误: {str(e)}"
     
     @staticmethod
-    def preprocess_image(file):
+    def inspect_header(file):
+        """
+        只读取文件头获取格式、尺寸和帧数（HeaderInfo），不解码像素
+
+        Raises:
+            ImageRejected: 文件头无效
+        """
+        return inspect_header(file.stream, IMAGE_GUARD_CONFIG['max_metadata_chunk'], IMAGE_GUARD_CONFIG['max_frames'])
+    
+    @staticmethod
+    def preprocess_image(file, draft_size=None):
         """
         预处理图像：
         1. 转换为RGB模式
         2. 调整大小（如果需要）
         3. 标准化
+        
+        Args:
+            draft_size: 降级处理时的最长边像素，JPEG按该尺寸草稿解码（以1/2、1/4、1/8缩小解码）
         """
         image = Image.open(file.stream)
+        if draft_size:
+            image.draft('RGB', (draft_size, draft_size))
         
         # 转换为RGB模式
         if image.mode != 'RGB':
             image = image.convert('RGB')
         
-        # 调整大小（保持宽高比）
-        if image.size[0] > IMAGE_CONFIG['max_width'] or \
-           image.size[1] > IMAGE_CONFIG['max_height']:
-            image.thumbnail((
-                IMAGE_CONFIG['max_width'],
-                IMAGE_CONFIG['max_height']
-            ), Image.Resampling.LANCZOS)
-        
+        return ImageService._fit_analysis_size(image, draft_size)
+    
+    @staticmethod
+    def _fit_analysis_size(image, draft_size=None):
+        """调整大小（保持宽高比），评分只使用不超过 analysis_max_size 的分辨率"""
+        max_size = min(draft_size or IMAGE_CONFIG['analysis_max_size'], IMAGE_CONFIG['max_width'],
+                       IMAGE_CONFIG['max_height'])
+        if image.size[0] > max_size or image.size[1] > max_size:
+            image.thumbnail((max_size, max_size), Image.Resampling.LANCZOS)
         return image
     
+    @staticmethod
+    def preprocess_animation(file):
+        """
+        预处理多帧GIF：按 ANIMATION_CONFIG 选取代表帧（'sample' 策略下另加均匀抽取的帧），
+        只解码合成这些帧所需的帧
+        
+        Returns:
+            (代表帧图像, [(帧序号, 图像), ...])，后者为参与评分的帧（按帧序号升序，包含代表帧）
+        
+        Raises:
+            ImageRejected: GIF结构无效或解码帧数超过 max_decoded_frames
+        """
+        decoder = GifFrameDecoder.open(file.stream, IMAGE_GUARD_CONFIG['max_frames'],
+                                       ANIMATION_CONFIG['max_decoded_frames'])
+        representative = decoder.representative()
+        if ANIMATION_CONFIG['strategy'] == 'sample':
+            targets = decoder.sample(ANIMATION_CONFIG['sample_frames'])
+        else:
+            targets = [representative]
+        rendered = decoder.render(targets)
+        frames = [(index, ImageService._fit_analysis_size(rendered[index])) for index in targets]
+        return dict(frames)[representative], frames
+    
+    @staticmethod
+    def compute_hash(file):
+        """
+        计算上传文件内容的SHA-256哈希，用作结果存储的键
+        """
+        file.stream.seek(0)
+        hasher = hashlib.sha256()
+        for chunk in iter(lambda: file.stream.read(64 * 1024), b''):
+            hasher.update(chunk)
+        file.stream.seek(0)  # 重置文件指针
+        return hasher.hexdigest()
+    
+    @staticmethod
+    def compute_perceptual_hash(image):
+        """
+        计算图像的感知哈希（dHash），用于识别缩放或重新压缩后的重复上传
+        """
+        return dhash(image, DUPLICATE_CONFIG['hash_size'])
+    
     @staticmethod
     def save_image(image, original_filename, output_dir):
         """
@@ -106,3 +184,43 @@ class ImageService:
         image.save(output_path, 'JPEG', quality=IMAGE_CONFIG['jpeg_quality'])
         
         return output_path
+    
+    @staticmethod
+    def thumbnail_path(thumbnail_dir, image_hash, size, fmt):
+        """缩略图文件路径（按哈希前两位分目录，避免单个目录文件过多）"""
+        extension = 'jpg' if fmt == 'jpeg' else fmt
+        return os.path.join(thumbnail_dir, image_hash[:2], f"{image_hash}_{size}.{extension}")
+    
+    @staticmethod
+    def thumbnail_formats():
+        """当前Pillow支持的缩略图格式"""
+        return [fmt for fmt in THUMBNAIL_CONFIG['formats'] if fmt != 'webp' or features.check('webp')]
+    
+    @staticmethod
+    def generate_thumbnails(image, image_hash, thumbnail_dir):
+        """
+        生成并缓存各尺寸、各格式的缩略图（已存在的跳过）
+        返回 {size: {format: path}}
+        """
+        renditions = {}
+        # 从大到小生成，小尺寸由上一级缩略图缩放而来，减少重采样开销
+        source = image
+        for size in sorted(THUMBNAIL_CONFIG['sizes'], reverse=True):
+            scale = size / max(source.size)
+            if scale < 1:
+                new_size = (max(1, round(source.size[0] * scale)), max(1, round(source.size[1] * scale)))
+                rendition = source.resize(new_size, Image.Resampling.LANCZOS, reducing_gap=3.0)
+            else:
+                rendition = source
+            renditions[size] = {}
+            for fmt in ImageService.thumbnail_formats():
+                path = ImageService.thumbnail_path(thumbnail_dir, image_hash, size, fmt)
+                if not os.path.exists(path):
+                    os.makedirs(os.path.dirname(path), exist_ok=True)
+                    # 先写临时文件再原子替换，避免并发请求读到不完整的缩略图
+                    tmp_path = f"{path}.{uuid.uuid4().hex[:8]}.tmp"
+                    rendition.save(tmp_path, fmt.upper(), quality=THUMBNAIL_CONFIG['quality'])
+                    os.replace(tmp_path, path)
+                renditions[size][fmt] = path
+            source = rendition
+        return renditions
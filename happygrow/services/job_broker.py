@@ -0,0 +1,595 @@
+"""
+评分任务队列：网页端（生产者）提交评分任务，各主机上的评分worker（消费者）领取执行
+
+至少一次投递：领取的任务带租约，worker在租约内确认（ack）才算完成，worker崩溃或超时后
+任务重新投递给其他worker；任务ID为图像内容哈希，重复投递时结果按哈希覆盖写入，不产生重复数据。
+worker定期发送心跳（同时续租正在执行的任务）。
+
+实现：SQLiteJobBroker（单机或共享文件系统）、RedisJobBroker（Redis协议，不依赖 redis-py）。
+"""
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+from urllib.parse import urlparse
+
+class Job:
+    def __init__(self, job_id: str, payload: Dict, attempts: int, worker: Optional[str] = None):
+        """
+        已领取的任务
+
+        Args:
+            job_id: 任务ID（图像内容哈希）
+            payload: 任务内容
+            attempts: 已领取次数（包括本次）
+            worker: 领取的worker
+        """
+        self.job_id = job_id
+        self.payload = payload
+        self.attempts = attempts
+        self.worker = worker
+
+class JobBroker:
+    """任务队列接口"""
+
+    def __init__(self, lease_seconds: float, max_attempts: int, heartbeat_timeout: float, result_ttl: float):
+        """
+        Args:
+            lease_seconds: 领取任务的租约时长，超时未确认则重新投递
+            max_attempts: 最多领取次数，超过后任务失败（结果为错误）
+            heartbeat_timeout: 超过该时长没有心跳的worker视为下线
+            result_ttl: 任务结果的保留时长
+        """
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.heartbeat_timeout = heartbeat_timeout
+        self.result_ttl = result_ttl
+
+    def enqueue(self, job_id: str, payload: Dict) -> bool:
+        """
+        提交任务；同一ID的任务尚未完成时不重复提交（等待同一结果），已完成或已失败时重新提交
+
+        Returns:
+            是否新提交了任务
+        """
+        raise NotImplementedError
+
+    def claim(self, worker_id: str) -> Optional[Job]:
+        """领取一个排队中或租约已过期的任务，没有时返回None"""
+        raise NotImplementedError
+
+    def ack(self, job: Job, result: Dict):
+        """确认任务完成并保存结果（重复确认时覆盖结果）"""
+        raise NotImplementedError
+
+    def fail(self, job: Job, error: str) -> bool:
+        """
+        任务执行失败：未超过最多领取次数时重新排队，否则标记失败并以 {'error': ...} 作为结果
+
+        Returns:
+            是否重新排队
+        """
+        raise NotImplementedError
+
+    def get_result(self, job_id: str) -> Optional[Dict]:
+        """任务结果，未完成时返回None"""
+        raise NotImplementedError
+
+    def heartbeat(self, worker_id: str, info: Dict, job: Optional[Job] = None):
+        """记录worker心跳；提供 job 时同时续租该任务"""
+        raise NotImplementedError
+
+    def workers(self) -> Dict[str, Dict]:
+        """在线worker（最近心跳在 heartbeat_timeout 内）及其上报的信息"""
+        raise NotImplementedError
+
+    def counts(self) -> Dict[str, int]:
+        """各状态的任务数：queued、running、done、failed"""
+        raise NotImplementedError
+
+    def wait_result(self, job_id: str, timeout: Optional[float], poll_interval: float = 0.05) -> Optional[Dict]:
+        """轮询等待任务结果，超时返回None"""
+        expires_at = None if timeout is None else time.monotonic() + timeout
+        while True:
+            result = self.get_result(job_id)
+            if result is not None:
+                return result
+            if expires_at is not None and time.monotonic() >= expires_at:
+                return None
+            time.sleep(poll_interval if expires_at is None else
+                       max(0.0, min(poll_interval, expires_at - time.monotonic())))
+
+    @staticmethod
+    def _lease_expired_error(attempts: int) -> str:
+        return f"任务租约过期（已领取 {attempts} 次），评分worker可能已崩溃"
+
+    def report(self) -> Dict:
+        """任务数和在线worker"""
+        return {'jobs': self.counts(), 'workers': self.workers()}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    job_id TEXT PRIMARY KEY,
+    payload TEXT NOT NULL,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    worker TEXT,
+    lease_until REAL,
+    error TEXT,
+    enqueued_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, enqueued_at);
+CREATE TABLE IF NOT EXISTS job_results (
+    job_id TEXT PRIMARY KEY,
+    result TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS job_results_created ON job_results (created_at);
+CREATE TABLE IF NOT EXISTS workers (
+    worker_id TEXT PRIMARY KEY,
+    info TEXT,
+    last_seen REAL NOT NULL
+);
+"""
+
+class SQLiteJobBroker(JobBroker):
+    def __init__(self, db_path, **kwargs):
+        """
+        基于SQLite的任务队列（多进程共享同一数据库文件；跨主机时需放在支持文件锁的共享存储上）
+
+        Args:
+            db_path: 数据库文件路径
+            其余参数见 JobBroker
+        """
+        super().__init__(**kwargs)
+        self.db_path = str(db_path)
+        os.makedirs(os.path.dirname(self.db_path) or '.', exist_ok=True)
+        with self._connect() as conn:
+            conn.executescript(_SCHEMA)
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        try:
+            conn.execute('PRAGMA journal_mode=WAL')
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def enqueue(self, job_id: str, payload: Dict) -> bool:
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            row = conn.execute('SELECT status FROM jobs WHERE job_id = ?', (job_id,)).fetchone()
+            if row is not None and row['status'] in ('queued', 'running'):
+                return False
+            conn.execute('DELETE FROM job_results WHERE job_id = ?', (job_id,))
+            conn.execute(
+                """
+                INSERT INTO jobs (job_id, payload, status, attempts, enqueued_at, updated_at)
+                VALUES (?, ?, 'queued', 0, ?, ?)
+                ON CONFLICT(job_id) DO UPDATE SET
+                    payload = excluded.payload, status = 'queued', attempts = 0, worker = NULL,
+                    lease_until = NULL, error = NULL, enqueued_at = excluded.enqueued_at,
+                    updated_at = excluded.updated_at
+                """,
+                (job_id, json.dumps(payload), now, now)
+            )
+        return True
+
+    def claim(self, worker_id: str) -> Optional[Job]:
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            # 租约过期且已达到最多领取次数的任务不再投递（避免导致worker崩溃的任务被反复领取）
+            for row in conn.execute(
+                "SELECT job_id, attempts FROM jobs WHERE status = 'running' AND lease_until < ? AND attempts >= ?",
+                (now, self.max_attempts)
+            ).fetchall():
+                error = self._lease_expired_error(row['attempts'])
+                conn.execute(
+                    "UPDATE jobs SET status = 'failed', lease_until = NULL, error = ?, updated_at = ? "
+                    "WHERE job_id = ?",
+                    (error, now, row['job_id'])
+                )
+                conn.execute(
+                    'INSERT INTO job_results (job_id, result, created_at) VALUES (?, ?, ?) '
+                    'ON CONFLICT(job_id) DO UPDATE SET result = excluded.result, created_at = excluded.created_at',
+                    (row['job_id'], json.dumps({'error': error}), now)
+                )
+            row = conn.execute(
+                """
+                SELECT job_id, payload, attempts FROM jobs
+                WHERE status = 'queued' OR (status = 'running' AND lease_until < ?)
+                ORDER BY enqueued_at LIMIT 1
+                """,
+                (now,)
+            ).fetchone()
+            if row is None:
+                return None
+            conn.execute(
+                "UPDATE jobs SET status = 'running', attempts = attempts + 1, worker = ?, lease_until = ?, "
+                "updated_at = ? WHERE job_id = ?",
+                (worker_id, now + self.lease_seconds, now, row['job_id'])
+            )
+        return Job(row['job_id'], json.loads(row['payload']), row['attempts'] + 1, worker_id)
+
+    def ack(self, job: Job, result: Dict):
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                'INSERT INTO job_results (job_id, result, created_at) VALUES (?, ?, ?) '
+                'ON CONFLICT(job_id) DO UPDATE SET result = excluded.result, created_at = excluded.created_at',
+                (job.job_id, json.dumps(result), now)
+            )
+            conn.execute(
+                "UPDATE jobs SET status = 'done', lease_until = NULL, updated_at = ? WHERE job_id = ?",
+                (now, job.job_id)
+            )
+            # 顺带清理过期的结果和已完成的任务
+            conn.execute('DELETE FROM job_results WHERE created_at < ?', (now - self.result_ttl,))
+            conn.execute("DELETE FROM jobs WHERE status IN ('done', 'failed') AND updated_at < ?",
+                         (now - self.result_ttl,))
+
+    def fail(self, job: Job, error: str) -> bool:
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            row = conn.execute('SELECT status, worker FROM jobs WHERE job_id = ?', (job.job_id,)).fetchone()
+            if row is None or row['status'] != 'running' or row['worker'] != job.worker:
+                # 租约已过期并被其他worker领取，或已完成
+                return False
+            if job.attempts < self.max_attempts:
+                conn.execute(
+                    "UPDATE jobs SET status = 'queued', worker = NULL, lease_until = NULL, error = ?, "
+                    "updated_at = ? WHERE job_id = ?",
+                    (error, now, job.job_id)
+                )
+                return True
+            conn.execute(
+                "UPDATE jobs SET status = 'failed', lease_until = NULL, error = ?, updated_at = ? WHERE job_id = ?",
+                (error, now, job.job_id)
+            )
+            conn.execute(
+                'INSERT INTO job_results (job_id, result, created_at) VALUES (?, ?, ?) '
+                'ON CONFLICT(job_id) DO UPDATE SET result = excluded.result, created_at = excluded.created_at',
+                (job.job_id, json.dumps({'error': error}), now)
+            )
+        return False
+
+    def get_result(self, job_id: str) -> Optional[Dict]:
+        with self._connect() as conn:
+            row = conn.execute('SELECT result FROM job_results WHERE job_id = ?', (job_id,)).fetchone()
+        return None if row is None else json.loads(row['result'])
+
+    def heartbeat(self, worker_id: str, info: Dict, job: Optional[Job] = None):
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                'INSERT INTO workers (worker_id, info, last_seen) VALUES (?, ?, ?) '
+                'ON CONFLICT(worker_id) DO UPDATE SET info = excluded.info, last_seen = excluded.last_seen',
+                (worker_id, json.dumps(info), now)
+            )
+            if job is not None:
+                conn.execute(
+                    "UPDATE jobs SET lease_until = ? WHERE job_id = ? AND status = 'running' AND worker = ?",
+                    (now + self.lease_seconds, job.job_id, worker_id)
+                )
+
+    def workers(self) -> Dict[str, Dict]:
+        with self._connect() as conn:
+            rows = conn.execute('SELECT worker_id, info, last_seen FROM workers WHERE last_seen >= ?',
+                                (time.time() - self.heartbeat_timeout,)).fetchall()
+        return {row['worker_id']: dict(json.loads(row['info']), last_seen=row['last_seen']) for row in rows}
+
+    def counts(self) -> Dict[str, int]:
+        counts = dict.fromkeys(('queued', 'running', 'done', 'failed'), 0)
+        with self._connect() as conn:
+            for row in conn.execute('SELECT status, COUNT(*) AS n FROM jobs GROUP BY status'):
+                counts[row['status']] = row['n']
+        return counts
+
+class RespError(Exception):
+    """Redis返回的错误"""
+
+class RespClient:
+    def __init__(self, url: str, timeout: float = 5.0):
+        """
+        最小的Redis协议（RESP2）客户端，线程间共享一个连接（按命令加锁）
+
+        Args:
+            url: redis://host:port/db
+            timeout: 连接和读写超时（秒）
+        """
+        parsed = urlparse(url)
+        self.host = parsed.hostname or 'localhost'
+        self.port = parsed.port or 6379
+        self.db = int(parsed.path.lstrip('/') or 0)
+        self.password = parsed.password
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._sock = None
+        self._file = None
+
+    def _connect(self):
+        self._sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        self._file = self._sock.makefile('rb')
+        if self.password:
+            self._call('AUTH', self.password)
+        if self.db:
+            self._call('SELECT', self.db)
+
+    def close(self):
+        with self._lock:
+            self._close()
+
+    def _close(self):
+        if self._sock is not None:
+            try:
+                self._file.close()
+                self._sock.close()
+            except OSError:
+                pass
+        self._sock = self._file = None
+
+    def execute(self, *args):
+        """
+        执行一条命令并返回结果（字符串为 bytes，整数为 int，数组为 list）
+
+        Raises:
+            RespError: Redis返回错误
+            ConnectionError: 连接失败或中断（下次调用时重新连接）
+        """
+        with self._lock:
+            try:
+                if self._sock is None:
+                    self._connect()
+                return self._call(*args)
+            except OSError as e:
+                self._close()
+                raise ConnectionError(f"Redis连接失败: {e}") from e
+
+    def transaction(self, keys: List[str], prepare: Callable) -> Optional[list]:
+        """
+        乐观事务：WATCH keys 后调用 prepare(call) 读取当前值并返回要在 MULTI 中执行的命令列表，
+        EXEC 时 keys 已被其他客户端修改则重新读取并重试
+
+        Args:
+            keys: 监视的键
+            prepare: 以执行单条命令的函数为参数，返回 [(命令, 参数...)]；返回None时放弃
+
+        Returns:
+            各命令的结果，放弃时返回None
+        """
+        with self._lock:
+            try:
+                if self._sock is None:
+                    self._connect()
+                while True:
+                    self._call('WATCH', *keys)
+                    commands = prepare(self._call)
+                    if commands is None:
+                        self._call('UNWATCH')
+                        return None
+                    self._call('MULTI')
+                    for command in commands:
+                        self._call(*command)
+                    replies = self._call('EXEC')
+                    if replies is not None:
+                        return replies
+            except RespError:
+                # 事务中途出错时连接可能仍处于 WATCH/MULTI 状态，断开后重新连接
+                self._close()
+                raise
+            except OSError as e:
+                self._close()
+                raise ConnectionError(f"Redis连接失败: {e}") from e
+
+    def _call(self, *args):
+        parts = [f"*{len(args)}\r\n".encode()]
+        for arg in args:
+            data = arg if isinstance(arg, bytes) else str(arg).encode()
+            parts.append(b'$%d\r\n%s\r\n' % (len(data), data))
+        self._sock.sendall(b''.join(parts))
+        return self._read_reply()
+
+    def _read_reply(self):
+        line = self._file.readline()
+        if not line.endswith(b'\r\n'):
+            raise ConnectionError("Redis连接已断开")
+        kind, body = line[:1], line[1:-2]
+        if kind == b'+':
+            return body
+        if kind == b'-':
+            raise RespError(body.decode())
+        if kind == b':':
+            return int(body)
+        if kind == b'$':
+            length = int(body)
+            if length < 0:
+                return None
+            data = self._file.read(length + 2)
+            return data[:-2]
+        if kind == b'*':
+            length = int(body)
+            return None if length < 0 else [self._read_reply() for _ in range(length)]
+        raise RespError(f"无法解析的回复: {line!r}")
+
+class RedisJobBroker(JobBroker):
+    def __init__(self, url: str, prefix: str = 'happygrow', client: RespClient = None, **kwargs):
+        """
+        基于Redis的任务队列
+
+        键（均以 prefix 开头）：
+            :queue        排队中的任务ID（列表）
+            :processing   已领取未确认的任务ID（列表，RPOPLPUSH 原子转移，领取后崩溃也不丢失）
+            :leases       任务ID -> 租约到期时间（有序集合）
+            :done         已完成的任务ID -> 完成时间（有序集合，计数时清除超过 result_ttl 的）
+            :failed       已失败的任务ID -> 失败时间（同上）
+            :job:<id>     任务内容、状态、领取次数、worker（哈希）
+            :result:<id>  任务结果（带过期时间）
+            :workers      worker ID -> 心跳信息（哈希）
+
+        Args:
+            url: redis://host:port/db
+            prefix: 键前缀
+            client: 已创建的 RespClient（默认按 url 创建）
+            其余参数见 JobBroker
+        """
+        super().__init__(**kwargs)
+        self.client = client or RespClient(url)
+        self.prefix = prefix
+
+    def _key(self, *parts) -> str:
+        return ':'.join((self.prefix,) + parts)
+
+    def enqueue(self, job_id: str, payload: Dict) -> bool:
+        key = self._key('job', job_id)
+
+        def prepare(call) -> Optional[List[Tuple]]:
+            # 读取状态和提交在同一事务中，并发提交同一任务时只有一方成功
+            if call('HGET', key, 'status') in (b'queued', b'running'):
+                return None
+            return [
+                ('DEL', self._key('result', job_id)),
+                ('ZREM', self._key('done'), job_id),
+                ('ZREM', self._key('failed'), job_id),
+                ('HSET', key, 'payload', json.dumps(payload), 'status', 'queued', 'attempts', 0,
+                 'worker', '', 'enqueued_at', time.time()),
+                ('LPUSH', self._key('queue'), job_id)
+            ]
+        return self.client.transaction([key], prepare) is not None
+
+    def _requeue_expired(self):
+        """重新投递租约过期的任务；已转入 processing 但尚未登记租约的任务（领取中途崩溃）补登租约"""
+        now = time.time()
+        for raw in self.client.execute('LRANGE', self._key('processing'), 0, -1) or []:
+            self.client.execute('ZADD', self._key('leases'), 'NX', now + self.lease_seconds, raw)
+        for raw in self.client.execute('ZRANGEBYSCORE', self._key('leases'), '-inf', now) or []:
+            # ZREM 成功的一方负责重新排队，避免多个worker重复投递
+            if self.client.execute('ZREM', self._key('leases'), raw) != 1:
+                continue
+            key = self._key('job', raw.decode())
+            attempts = int(self.client.execute('HGET', key, 'attempts') or 0)
+            if attempts >= self.max_attempts:
+                # 已达到最多领取次数，不再投递（避免导致worker崩溃的任务被反复领取）
+                error = self._lease_expired_error(attempts)
+                self.client.execute('HSET', key, 'status', 'failed', 'error', error)
+                self.client.execute('EXPIRE', key, max(1, int(self.result_ttl)))
+                self._store_result(raw.decode(), {'error': error})
+                self._finish(raw.decode(), 'failed')
+            else:
+                self.client.execute('LPUSH', self._key('queue'), raw)
+            self.client.execute('LREM', self._key('processing'), 1, raw)
+
+    def claim(self, worker_id: str) -> Optional[Job]:
+        self._requeue_expired()
+        while True:
+            raw = self.client.execute('RPOPLPUSH', self._key('queue'), self._key('processing'))
+            if raw is None:
+                return None
+            job_id = raw.decode()
+            key = self._key('job', job_id)
+            self.client.execute('ZADD', self._key('leases'), time.time() + self.lease_seconds, job_id)
+            fields = self._hash(self.client.execute('HGETALL', key))
+            if fields.get('status') not in ('queued', 'running'):
+                # 已完成的任务（重新投递与确认竞争时残留的ID）
+                self._release(job_id)
+                continue
+            attempts = self.client.execute('HINCRBY', key, 'attempts', 1)
+            self.client.execute('HSET', key, 'status', 'running', 'worker', worker_id)
+            return Job(job_id, json.loads(fields['payload']), attempts, worker_id)
+
+    @staticmethod
+    def _hash(reply) -> Dict[str, str]:
+        reply = reply or []
+        return {reply[i].decode(): reply[i + 1].decode() for i in range(0, len(reply), 2)}
+
+    def _release(self, job_id: str):
+        self.client.execute('ZREM', self._key('leases'), job_id)
+        self.client.execute('LREM', self._key('processing'), 0, job_id)
+
+    def _store_result(self, job_id: str, result: Dict):
+        self.client.execute('SET', self._key('result', job_id), json.dumps(result),
+                            'EX', max(1, int(self.result_ttl)))
+
+    def _finish(self, job_id: str, status: str):
+        """记录任务完成或失败的时间（供 counts 统计 result_ttl 之内的任务数）"""
+        self.client.execute('ZADD', self._key(status), time.time(), job_id)
+
+    def ack(self, job: Job, result: Dict):
+        self._store_result(job.job_id, result)
+        key = self._key('job', job.job_id)
+        self.client.execute('HSET', key, 'status', 'done')
+        self.client.execute('EXPIRE', key, max(1, int(self.result_ttl)))
+        self._finish(job.job_id, 'done')
+        self._release(job.job_id)
+
+    def fail(self, job: Job, error: str) -> bool:
+        key = self._key('job', job.job_id)
+        fields = self._hash(self.client.execute('HGETALL', key))
+        if fields.get('status') != 'running' or fields.get('worker') != job.worker:
+            return False
+        self._release(job.job_id)
+        if job.attempts < self.max_attempts:
+            self.client.execute('HSET', key, 'status', 'queued', 'worker', '', 'error', error)
+            self.client.execute('LPUSH', self._key('queue'), job.job_id)
+            return True
+        self.client.execute('HSET', key, 'status', 'failed', 'error', error)
+        self.client.execute('EXPIRE', key, max(1, int(self.result_ttl)))
+        self._store_result(job.job_id, {'error': error})
+        self._finish(job.job_id, 'failed')
+        return False
+
+    def get_result(self, job_id: str) -> Optional[Dict]:
+        raw = self.client.execute('GET', self._key('result', job_id))
+        return None if raw is None else json.loads(raw)
+
+    def heartbeat(self, worker_id: str, info: Dict, job: Optional[Job] = None):
+        self.client.execute('HSET', self._key('workers'), worker_id, json.dumps(dict(info, last_seen=time.time())))
+        if job is not None and self.client.execute('HGET', self._key('job', job.job_id), 'worker') == worker_id.encode():
+            self.client.execute('ZADD', self._key('leases'), 'XX', time.time() + self.lease_seconds, job.job_id)
+
+    def workers(self) -> Dict[str, Dict]:
+        workers = {}
+        cutoff = time.time() - self.heartbeat_timeout
+        for worker_id, raw in self._hash(self.client.execute('HGETALL', self._key('workers'))).items():
+            info = json.loads(raw)
+            if info['last_seen'] >= cutoff:
+                workers[worker_id] = info
+            else:
+                self.client.execute('HDEL', self._key('workers'), worker_id)
+        return workers
+
+    def counts(self) -> Dict[str, int]:
+        # 与SQLite实现相同，已完成和失败的任务只统计 result_ttl 之内的
+        counts = {
+            'queued': self.client.execute('LLEN', self._key('queue')),
+            'running': self.client.execute('LLEN', self._key('processing'))
+        }
+        cutoff = time.time() - self.result_ttl
+        for status in ('done', 'failed'):
+            self.client.execute('ZREMRANGEBYSCORE', self._key(status), '-inf', cutoff)
+            counts[status] = self.client.execute('ZCARD', self._key(status))
+        return counts
+
+def create_broker(config: Dict) -> JobBroker:
+    """按 BROKER_CONFIG 创建任务队列"""
+    options = {
+        'lease_seconds': config['lease_seconds'],
+        'max_attempts': config['max_attempts'],
+        'heartbeat_timeout': config['heartbeat_timeout'],
+        'result_ttl': config['result_ttl']
+    }
+    if config['backend'] == 'sqlite':
+        return SQLiteJobBroker(config['sqlite_path'], **options)
+    if config['backend'] == 'redis':
+        return RedisJobBroker(config['redis_url'], prefix=config['prefix'], **options)
+    raise ValueError(f"未知的任务队列后端: {config['backend']}")
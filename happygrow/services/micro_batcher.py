@@ -0,0 +1,88 @@
+"""
+跨请求微批处理：把短时间内到达的多个请求合并为一批统一处理
+"""
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, List
+
+class MicroBatcher:
+    def __init__(self, process_batch: Callable[[List[Any]], List[Any]], max_batch_size: int, max_wait: float):
+        """
+        初始化微批处理器
+
+        Args:
+            process_batch: 批处理函数，输入一批任务，返回顺序对应的结果列表
+            max_batch_size: 每批最多合并的任务数
+            max_wait: 收到一批的第一个任务后最多等待的秒数
+        """
+        self.process_batch = process_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._worker = None
+        self._worker_pid = None
+        self.stats = {'batches': 0, 'items': 0, 'max_batch': 0}
+
+    def submit(self, item: Any) -> Future:
+        """提交一个任务，返回其结果的 Future"""
+        self._ensure_worker()
+        future = Future()
+        self._queue.put((item, future))
+        return future
+
+    def _ensure_worker(self):
+        """按需启动后台线程（fork出的worker进程中不存在父进程的线程，需要重新启动）"""
+        with self._lock:
+            if self._worker is not None and self._worker.is_alive() and self._worker_pid == os.getpid():
+                return
+            if self._worker_pid != os.getpid():
+                # 丢弃从父进程继承的队列和锁状态
+                self._queue = queue.Queue()
+            self._worker = threading.Thread(target=self._run, name='micro-batcher', daemon=True)
+            self._worker_pid = os.getpid()
+            self._worker.start()
+
+    def _collect(self) -> list:
+        """阻塞等待第一个任务，然后在 max_wait 内继续收集，直到达到 max_batch_size"""
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            # 调用方已取消的任务不再计算
+            batch = [(item, future) for item, future in batch if future.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            try:
+                results = self.process_batch([item for item, _ in batch])
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            with self._lock:
+                self.stats['batches'] += 1
+                self.stats['items'] += len(batch)
+                self.stats['max_batch'] = max(self.stats['max_batch'], len(batch))
+            for (_, future), result in zip(batch, results):
+                future.set_result(result)
+
+    def report(self) -> dict:
+        """批处理统计"""
+        with self._lock:
+            stats = dict(self.stats)
+        stats['mean_batch'] = stats['items'] / stats['batches'] if stats['batches'] else 0.0
+        return stats
@@ -0,0 +1,115 @@
+"""
+归档图像的解码像素缓存：按内容哈希把解码并缩小到评分分辨率的RGB像素保存为 .npy 文件，
+再次读取时以内存映射方式打开（不解码、不复制），总大小超过上限时按最近使用时间淘汰
+"""
+import os
+import threading
+import uuid
+from pathlib import Path
+from typing import List, Optional, Tuple
+import numpy as np
+from PIL import Image
+from .image_service import ImageService
+
+class PixelCache:
+    def __init__(self, directory, max_bytes: int):
+        """
+        初始化像素缓存
+
+        Args:
+            directory: 缓存目录（多个进程可共享）
+            max_bytes: 缓存文件总大小上限
+        """
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._total = None  # 缓存文件总大小，首次写入时扫描目录得到
+        self.stats = {'hits': 0, 'misses': 0, 'stored': 0, 'evicted': 0}
+
+    def path(self, image_hash: str) -> Path:
+        """缓存文件路径（按哈希前两位分目录）"""
+        return self.directory / image_hash[:2] / f"{image_hash}.npy"
+
+    def get(self, image_hash: str) -> Optional[np.ndarray]:
+        """以只读内存映射打开缓存的像素 (H, W, 3) uint8，未缓存时返回None"""
+        path = self.path(image_hash)
+        try:
+            pixels = np.load(path, mmap_mode='r')
+            # 以修改时间记录最近使用，供淘汰时排序
+            os.utime(path)
+        except (OSError, ValueError):
+            with self._lock:
+                self.stats['misses'] += 1
+            return None
+        with self._lock:
+            self.stats['hits'] += 1
+        return pixels
+
+    def put(self, image_hash: str, pixels: np.ndarray):
+        """保存像素（先写临时文件再原子替换），超过总大小上限时淘汰最久未使用的文件"""
+        path = self.path(image_hash)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f"{path.name}.{uuid.uuid4().hex[:8]}.tmp")
+        with open(tmp_path, 'wb') as f:
+            np.save(f, np.ascontiguousarray(pixels, dtype=np.uint8))
+        os.replace(tmp_path, path)
+        size = path.stat().st_size
+        with self._lock:
+            self.stats['stored'] += 1
+            if self._total is None:
+                self._total = sum(entry_size for _, entry_size, _ in self._entries())
+            else:
+                self._total += size
+            if self._total > self.max_bytes:
+                self._evict()
+
+    def load(self, image_hash: str, image_path) -> np.ndarray:
+        """
+        读取归档图像的像素：命中缓存时内存映射读取，否则解码图像文件、
+        缩小到评分分辨率（与上传时的预处理相同）并写入缓存
+
+        Raises:
+            OSError: 图像文件不存在或无法解码
+        """
+        pixels = self.get(image_hash)
+        if pixels is not None:
+            return pixels
+        with Image.open(image_path) as image:
+            pixels = np.asarray(ImageService._fit_analysis_size(image.convert('RGB')))
+        self.put(image_hash, pixels)
+        return pixels
+
+    def _entries(self) -> List[Tuple[float, int, Path]]:
+        """缓存文件的 (最近使用时间, 大小, 路径)"""
+        entries = []
+        for path in self.directory.glob('*/*.npy'):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue  # 已被其他进程淘汰
+            entries.append((stat.st_mtime, stat.st_size, path))
+        return entries
+
+    def _evict(self):
+        """按最近使用时间从旧到新删除，直到总大小不超过上限（调用方持有锁）"""
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                # 已映射该文件的读取方不受影响（POSIX下删除后映射仍然有效）
+                path.unlink()
+            except FileNotFoundError:
+                pass
+            total -= size
+            self.stats['evicted'] += 1
+        self._total = total
+
+    def report(self) -> dict:
+        """缓存统计"""
+        with self._lock:
+            stats = dict(self.stats)
+            stats['bytes'] = self._total
+        stats['max_bytes'] = self.max_bytes
+        return stats
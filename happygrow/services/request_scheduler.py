@@ -0,0 +1,178 @@
+"""
+按预估成本调度评分请求：根据图像头部中的尺寸预估耗时，分入各自限制并发数的优先级通道，
+避免一张大图占满worker导致后面的小图排队（队头阻塞）
+"""
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional
+import numpy as np
+
+class SchedulerBusy(Exception):
+    """通道排队超时"""
+
+class Lane:
+    def __init__(self, name: str, max_cost: Optional[float], concurrency: int):
+        """
+        调度通道
+
+        Args:
+            name: 通道名称
+            max_cost: 通道接收的最大预估成本（秒），None 表示不限
+            concurrency: 通道内同时执行的请求数
+        """
+        self.name = name
+        self.max_cost = max_cost
+        self.concurrency = concurrency
+        self._semaphore = threading.BoundedSemaphore(concurrency)
+        self.stats = {
+            'active': 0, 'waiting': 0, 'completed': 0, 'rejected': 0,
+            'estimated_total': 0.0, 'actual_total': 0.0, 'wait_total': 0.0
+        }
+
+class Ticket:
+    def __init__(self, scheduler: 'RequestScheduler', lane: Lane, features: Dict[str, float],
+                 estimated: float, waited: float):
+        """已获得执行名额的请求，release 时记录实际耗时"""
+        self.scheduler = scheduler
+        self.lane = lane
+        self.features = features
+        self.estimated = estimated
+        self.waited = waited
+        self.started = time.perf_counter()
+        self._released = False
+
+    def release(self):
+        """释放名额（可重复调用，只生效一次）"""
+        if self._released:
+            return
+        self._released = True
+        self.scheduler._finish(self, time.perf_counter() - self.started)
+
+class RequestScheduler:
+    # 成本模型的特征：常数项、解码像素（百万）、分析像素（百万）
+    FEATURES = ('base', 'decode_megapixels', 'analysis_megapixels')
+
+    def __init__(self, lanes: List[Dict], cost_model: Dict[str, float], analysis_max_size: int,
+                 queue_timeout: float, calibration_samples: int = 500):
+        """
+        初始化调度器
+
+        Args:
+            lanes: 通道配置列表（name、max_cost、concurrency），按 max_cost 升序匹配
+            cost_model: 各特征的系数（秒），见 FEATURES
+            analysis_max_size: 评分使用的最长边像素（超过时先缩小）
+            queue_timeout: 在通道中排队的最长秒数
+            calibration_samples: 保留用于校准成本模型的最近样本数
+        """
+        self.lanes = [Lane(lane['name'], lane['max_cost'], lane['concurrency']) for lane in lanes]
+        self.cost_model = dict(cost_model)
+        self.analysis_max_size = analysis_max_size
+        self.queue_timeout = queue_timeout
+        self._samples = deque(maxlen=calibration_samples)
+        self._lock = threading.Lock()
+
+    def features(self, width: int, height: int) -> Dict[str, float]:
+        """由图像头部中的尺寸计算成本特征"""
+        scale = min(1.0, self.analysis_max_size / max(width, height, 1))
+        return {
+            'base': 1.0,
+            'decode_megapixels': width * height / 1e6,
+            'analysis_megapixels': (width * scale) * (height * scale) / 1e6
+        }
+
+    def estimate(self, features: Dict[str, float]) -> float:
+        """预估耗时（秒）"""
+        return sum(self.cost_model[name] * features[name] for name in self.FEATURES)
+
+    def lane_for(self, cost: float) -> Lane:
+        """选择可接收该成本的第一个通道"""
+        for lane in self.lanes:
+            if lane.max_cost is None or cost <= lane.max_cost:
+                return lane
+        return self.lanes[-1]
+
+    def acquire(self, width: int, height: int, timeout: Optional[float] = None) -> Ticket:
+        """
+        按图像尺寸分入通道并等待执行名额
+
+        Args:
+            timeout: 最长排队秒数，默认为 queue_timeout（取两者中较小者）
+
+        Raises:
+            SchedulerBusy: 排队超过 queue_timeout
+        """
+        features = self.features(width, height)
+        estimated = self.estimate(features)
+        lane = self.lane_for(estimated)
+        with self._lock:
+            lane.stats['waiting'] += 1
+        start = time.perf_counter()
+        wait = self.queue_timeout if timeout is None else min(timeout, self.queue_timeout)
+        acquired = lane._semaphore.acquire(timeout=wait)
+        waited = time.perf_counter() - start
+        with self._lock:
+            lane.stats['waiting'] -= 1
+            if not acquired:
+                lane.stats['rejected'] += 1
+                raise SchedulerBusy(f"通道 {lane.name} 排队超时")
+            lane.stats['active'] += 1
+        return Ticket(self, lane, features, estimated, waited)
+
+    @contextmanager
+    def slot(self, width: int, height: int) -> Iterator[Ticket]:
+        """在通道名额内执行"""
+        ticket = self.acquire(width, height)
+        try:
+            yield ticket
+        finally:
+            ticket.release()
+
+    def _finish(self, ticket: Ticket, actual: float):
+        lane = ticket.lane
+        with self._lock:
+            lane.stats['active'] -= 1
+            lane.stats['completed'] += 1
+            lane.stats['estimated_total'] += ticket.estimated
+            lane.stats['actual_total'] += actual
+            lane.stats['wait_total'] += ticket.waited
+        self.record_sample(ticket.features, actual)
+        lane._semaphore.release()
+
+    def record_sample(self, features: Dict[str, float], actual: float):
+        """记录一个 (特征, 实际耗时) 样本用于校准"""
+        with self._lock:
+            self._samples.append([features[name] for name in self.FEATURES] + [actual])
+
+    def calibration(self) -> Optional[Dict[str, float]]:
+        """用最近的样本对成本模型做最小二乘拟合，样本不足时返回None"""
+        with self._lock:
+            samples = np.array(self._samples, dtype=np.float64)
+        if len(samples) < 2 * len(self.FEATURES):
+            return None
+        coefficients, *_ = np.linalg.lstsq(samples[:, :-1], samples[:, -1], rcond=None)
+        return dict(zip(self.FEATURES, (float(c) for c in coefficients)))
+
+    def report(self) -> Dict:
+        """各通道的排队、预估与实际耗时统计，以及拟合的成本模型"""
+        with self._lock:
+            lanes = {}
+            for lane in self.lanes:
+                stats = dict(lane.stats)
+                completed = stats['completed']
+                stats['concurrency'] = lane.concurrency
+                stats['max_cost'] = lane.max_cost
+                stats['mean_estimated'] = stats['estimated_total'] / completed if completed else 0.0
+                stats['mean_actual'] = stats['actual_total'] / completed if completed else 0.0
+                stats['mean_wait'] = stats['wait_total'] / completed if completed else 0.0
+                stats['actual_to_estimated'] = \
+                    stats['actual_total'] / stats['estimated_total'] if stats['estimated_total'] else None
+                lanes[lane.name] = stats
+            samples = len(self._samples)
+        return {
+            'lanes': lanes,
+            'cost_model': dict(self.cost_model),
+            'samples': samples,
+            'calibrated_cost_model': self.calibration()
+        }
@@ -0,0 +1,86 @@
+"""
+归档重评分服务：只重新计算算法版本发生变化的子指标，权重变化时直接由已保存的指标推导得分
+"""
+import os
+from collections import Counter
+from typing import Dict, List
+from PIL import Image
+from ..core.scoring_engine import ScoringEngine
+from .image_service import ImageService
+from ..config.config import BASE_DIR
+
+class RescoreService:
+    def __init__(self, result_store, base_dir=BASE_DIR, pixel_cache=None):
+        """
+        初始化重评分服务
+
+        Args:
+            result_store: ResultStore实例
+            base_dir: 归档图像相对路径的根目录
+            pixel_cache: PixelCache实例，提供时归档图像只在首次重评分时解码
+        """
+        self.result_store = result_store
+        self.base_dir = base_dir
+        self.pixel_cache = pixel_cache
+
+    @staticmethod
+    def stale_metrics(result: Dict) -> List[str]:
+        """返回缺失或算法版本已过期的子指标（包括已注册的第三方子指标）"""
+        stored_versions = result.get('metric_versions', {})
+        return [
+            name
+            for name, version in ScoringEngine.metric_versions().items()
+            if stored_versions.get(name) != version
+        ]
+
+    def rescore(self, result: Dict) -> List[str]:
+        """
+        重评分一条已保存的结果
+
+        Returns:
+            本次重新计算的子指标列表
+        """
+        stale = self.stale_metrics(result)
+        metrics = dict(result['metrics'])
+        if stale:
+            if not result.get('image_path'):
+                raise FileNotFoundError(f"结果 {result['image_hash']} 没有归档图像")
+            image_path = os.path.join(self.base_dir, result['image_path'])
+            if self.pixel_cache is not None:
+                engine = ScoringEngine(self.pixel_cache.load(result['image_hash'], image_path))
+                metrics.update(engine.compute_metrics(stale))
+            else:
+                with Image.open(image_path) as image:
+                    engine = ScoringEngine(ImageService._fit_analysis_size(image.convert('RGB')))
+                    metrics.update(engine.compute_metrics(stale))
+
+        scores, _ = ScoringEngine.score_from_metrics(metrics)
+        self.result_store.save_result(
+            result['image_hash'],
+            scores,
+            {name: metrics[name] for name in stale},
+            ScoringEngine.metric_versions(),
+            config_version=ScoringEngine.config_version()
+        )
+        return stale
+
+    def rescore_all(self) -> Dict:
+        """
+        重评分全部归档结果
+
+        Returns:
+            统计信息：重评分数量、各指标重新计算次数、失败数量
+        """
+        stats = {'rescored': 0, 'reweighted_only': 0, 'failed': 0, 'recomputed': Counter()}
+        for result in self.result_store.iter_results():
+            try:
+                stale = self.rescore(result)
+            except (OSError, KeyError):
+                stats['failed'] += 1
+                continue
+            stats['rescored'] += 1
+            if stale:
+                stats['recomputed'].update(stale)
+            else:
+                stats['reweighted_only'] += 1
+        return stats
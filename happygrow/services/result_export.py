@@ -0,0 +1,209 @@
+"""
+评分结果的列式导出（供离线分析调整 SCORING_CRITERIA）：按最后写入顺序分块读取结果存储，
+每块写成一个 gzip 压缩的CSV文件或Parquet文件（需要 pyarrow），内存占用只与块大小有关
+
+每行一条结果：image_hash、age_group、class_id、config_version、时间、各维度得分、总体得分，
+以及各子指标的值和算法版本。导出目录中的 manifest.json 记录已写入的文件和游标（最后一条结果的
+revision），中断后再次导出从游标继续。结果被覆盖写入（重评分）时分配新的 revision，下次导出
+会再次写入该结果，读取时同一 image_hash 以 cursor 最大的一行为准。
+"""
+import csv
+import io
+import json
+import os
+import uuid
+import zlib
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+from ..config.config import SCORING_CRITERIA, METRIC_VERSIONS
+
+FORMATS = ('csv', 'parquet')
+MANIFEST = 'manifest.json'
+
+def columns() -> List[str]:
+    """导出的列（由当前配置的维度和子指标决定，各块相同）"""
+    return (
+        ['cursor', 'image_hash', 'age_group', 'class_id', 'config_version', 'created_at', 'updated_at'] +
+        [f"score_{dimension}" for dimension in SCORING_CRITERIA] + ['score_overall'] +
+        [f"metric_{name}" for name in METRIC_VERSIONS] +
+        [f"version_{name}" for name in METRIC_VERSIONS]
+    )
+
+def to_row(cursor: int, result: Dict) -> Dict:
+    """结果字典转换为导出行，缺少的得分和子指标为None"""
+    scores = result['scores']
+    row = {
+        'cursor': cursor,
+        'image_hash': result['image_hash'],
+        'age_group': result['age_group'],
+        'class_id': result['class_id'],
+        'config_version': result['config_version'],
+        'created_at': result['created_at'],
+        'updated_at': result['updated_at'],
+        'score_overall': sum(scores.values()) / len(scores) if scores else None
+    }
+    for dimension in SCORING_CRITERIA:
+        row[f"score_{dimension}"] = scores.get(dimension)
+    for name in METRIC_VERSIONS:
+        row[f"metric_{name}"] = result['metrics'].get(name)
+        row[f"version_{name}"] = result['metric_versions'].get(name)
+    return row
+
+def parquet_available() -> bool:
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+def _check_format(fmt: str):
+    if fmt not in FORMATS:
+        raise ValueError(f"不支持的导出格式: {fmt}")
+    if fmt == 'parquet' and not parquet_available():
+        raise ValueError("导出Parquet需要安装 pyarrow")
+
+def iter_csv_gzip(rows: Iterable[Dict], names: List[str]) -> Iterator[bytes]:
+    """逐行编码为gzip压缩的CSV（含表头），用于流式响应"""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, names, lineterminator='\n')
+    writer.writeheader()
+    for row in rows:
+        writer.writerow(row)
+        if buffer.tell() >= 64 * 1024:
+            data = compressor.compress(buffer.getvalue().encode('utf-8'))
+            buffer.seek(0)
+            buffer.truncate()
+            if data:
+                yield data
+    yield compressor.compress(buffer.getvalue().encode('utf-8')) + compressor.flush()
+
+def parquet_bytes(rows: List[Dict], names: List[str]) -> bytes:
+    """一块结果编码为Parquet"""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    table = pa.Table.from_pylist(rows, schema=_parquet_schema(names))
+    sink = io.BytesIO()
+    pq.write_table(table, sink, compression='zstd')
+    return sink.getvalue()
+
+def _parquet_schema(names: List[str]):
+    import pyarrow as pa
+    types = {'cursor': pa.int64()}
+    for name in names:
+        if name.startswith(('score_', 'metric_')):
+            types[name] = pa.float64()
+        elif name.startswith('version_'):
+            types[name] = pa.int64()
+    return pa.schema([(name, types.get(name, pa.string())) for name in names])
+
+class ResultExporter:
+    def __init__(self, result_store, directory, fmt: str = 'csv', chunk_rows: int = 5000):
+        """
+        初始化导出
+
+        Args:
+            result_store: ResultStore实例
+            directory: 导出目录（存放分块文件和 manifest.json）
+            fmt: 'csv'（gzip压缩）或 'parquet'
+            chunk_rows: 每个文件的结果数
+
+        Raises:
+            ValueError: 格式不支持或缺少 pyarrow
+        """
+        _check_format(fmt)
+        self.result_store = result_store
+        self.directory = Path(directory)
+        self.fmt = fmt
+        self.chunk_rows = chunk_rows
+
+    def load_manifest(self) -> Optional[Dict]:
+        try:
+            with open(self.directory / MANIFEST, encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def _write_manifest(self, manifest: Dict):
+        self._write_atomic(MANIFEST, [json.dumps(manifest, ensure_ascii=False, indent=2).encode('utf-8')])
+
+    def _write_atomic(self, name: str, data: Iterable[bytes]):
+        """先写临时文件再原子替换，中断时不会留下不完整的文件"""
+        path = self.directory / name
+        tmp_path = path.with_name(f"{name}.{uuid.uuid4().hex[:8]}.tmp")
+        with open(tmp_path, 'wb') as f:
+            for block in data:
+                f.write(block)
+        os.replace(tmp_path, path)
+
+    def _encode(self, rows: List[Dict], names: List[str]) -> Iterable[bytes]:
+        if self.fmt == 'parquet':
+            return [parquet_bytes(rows, names)]
+        return iter_csv_gzip(rows, names)
+
+    def export(self, restart: bool = False, max_chunks: Optional[int] = None) -> Dict:
+        """
+        从 manifest.json 记录的游标继续导出（restart 时清空记录从头导出）
+
+        每写完一个文件更新一次 manifest.json，中断后重新执行不会重复或遗漏结果。
+
+        Args:
+            restart: 忽略已有记录从头导出（已有的分块文件会被覆盖或保留为孤立文件）
+            max_chunks: 最多写入的文件数，None为导出到末尾
+
+        Returns:
+            本次导出的统计：rows、files、cursor、done
+
+        Raises:
+            ValueError: 已有导出的格式或列与当前不同（需要 restart）
+        """
+        self.directory.mkdir(parents=True, exist_ok=True)
+        names = columns()
+        manifest = None if restart else self.load_manifest()
+        if manifest is None:
+            manifest = {'format': self.fmt, 'columns': names, 'cursor': 0, 'rows': 0, 'files': []}
+        elif manifest['format'] != self.fmt or manifest['columns'] != names:
+            raise ValueError("已有导出的格式或列与当前不同，请从头导出")
+
+        stats = {'rows': 0, 'files': [], 'cursor': manifest['cursor'], 'done': False}
+        while max_chunks is None or len(stats['files']) < max_chunks:
+            page = self.result_store.export_page(manifest['cursor'], self.chunk_rows)
+            if not page:
+                stats['done'] = True
+                break
+            first, last = page[0][0], page[-1][0]
+            name = f"results-{first:012d}-{last:012d}.{'parquet' if self.fmt == 'parquet' else 'csv.gz'}"
+            self._write_atomic(name, self._encode([to_row(cursor, result) for cursor, result in page], names))
+            manifest['files'].append({'name': name, 'rows': len(page), 'first': first, 'last': last})
+            manifest['cursor'] = last
+            manifest['rows'] += len(page)
+            manifest['updated_at'] = datetime.now().isoformat(timespec='seconds')
+            self._write_manifest(manifest)
+            stats['rows'] += len(page)
+            stats['files'].append(name)
+            stats['cursor'] = last
+        return stats
+
+def export_chunk(result_store, cursor: int, limit: int,
+                 fmt: str = 'csv') -> Tuple[Optional[Iterator[bytes]], int, int]:
+    """
+    读取游标之后的一块结果并编码（供管理接口逐块下载）
+
+    Returns:
+        (数据块迭代器，没有更多结果时为None, 下一个游标, 结果数)
+
+    Raises:
+        ValueError: 格式不支持或缺少 pyarrow
+    """
+    _check_format(fmt)
+    page = result_store.export_page(cursor, limit)
+    if not page:
+        return None, cursor, 0
+    names = columns()
+    rows = [to_row(row_cursor, result) for row_cursor, result in page]
+    if fmt == 'parquet':
+        body = iter([parquet_bytes(rows, names)])
+    else:
+        body = iter_csv_gzip(rows, names)
+    return body, page[-1][0], len(page)
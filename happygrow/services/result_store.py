@@ -0,0 +1,390 @@
+"""
+评分结果存储服务，按图像内容哈希保存评分结果和原始子指标，并增量维护班级/年龄组的聚合统计（见 rollups.py）
+"""
+import os
+import json
+import sqlite3
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+from . import rollups
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    image_hash TEXT PRIMARY KEY,
+    image_path TEXT,
+    age_group TEXT,
+    phash TEXT,
+    scores TEXT NOT NULL,
+    class_id TEXT,
+    config_version TEXT,
+    created_at TEXT NOT NULL,
+    updated_at TEXT NOT NULL,
+    revision INTEGER
+);
+CREATE TABLE IF NOT EXISTS metrics (
+    image_hash TEXT NOT NULL,
+    metric TEXT NOT NULL,
+    value REAL NOT NULL,
+    version INTEGER NOT NULL,
+    PRIMARY KEY (image_hash, metric)
+);
+CREATE TABLE IF NOT EXISTS aliases (
+    alias TEXT PRIMARY KEY,
+    image_hash TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS archives (
+    image_path TEXT PRIMARY KEY,
+    image_hash TEXT,
+    content_hash TEXT,
+    size INTEGER NOT NULL,
+    created_at TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS retention_stats (
+    name TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS retention_sweeps (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    result TEXT NOT NULL
+);
+"""
+
+class ResultStore:
+    def __init__(self, db_path, score_bins: int = 10):
+        """
+        初始化结果存储
+
+        Args:
+            db_path: SQLite数据库文件路径
+            score_bins: 聚合统计中得分分布的区间数
+        """
+        self.db_path = str(db_path)
+        self.score_bins = score_bins
+        os.makedirs(os.path.dirname(self.db_path) or '.', exist_ok=True)
+        with self._connect() as conn:
+            conn.executescript(_SCHEMA)
+            conn.executescript(rollups.ROLLUP_SCHEMA)
+            self._migrate(conn)
+
+    @staticmethod
+    def _migrate(conn: sqlite3.Connection):
+        """为旧版本数据库补充新增的列"""
+        columns = {row['name'] for row in conn.execute('PRAGMA table_info(results)')}
+        if 'phash' not in columns:
+            conn.execute('ALTER TABLE results ADD COLUMN phash TEXT')
+        if 'class_id' not in columns:
+            conn.execute('ALTER TABLE results ADD COLUMN class_id TEXT')
+        if 'revision' not in columns:
+            # 已有结果按写入顺序编号（与之前按 rowid 导出的游标一致）
+            conn.execute('ALTER TABLE results ADD COLUMN revision INTEGER')
+            conn.execute('UPDATE results SET revision = rowid')
+        conn.execute('CREATE INDEX IF NOT EXISTS results_revision ON results (revision)')
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        """每次操作使用独立连接（事务结束后提交并关闭），便于在多线程/多进程中共享同一数据库文件"""
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        try:
+            conn.execute('PRAGMA journal_mode=WAL')
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def save_result(self, image_hash: str, scores: Dict[str, float], metrics: Dict[str, float],
+                    metric_versions: Dict[str, int], image_path: Optional[str] = None,
+                    age_group: Optional[str] = None, config_version: Optional[str] = None,
+                    phash: Optional[int] = None, class_id: Optional[str] = None):
+        """
+        保存（或覆盖）一张图像的评分结果
+
+        Args:
+            image_hash: 图像内容哈希
+            scores: 各维度得分
+            metrics: 原始子指标值（只需包含本次计算或更新的指标）
+            metric_versions: 各子指标对应的算法版本
+            image_path: 归档图像路径（相对项目根目录）
+            age_group: 年龄组
+            config_version: 评分配置版本
+            phash: 感知哈希
+            class_id: 班级
+        """
+        now = datetime.now().isoformat(timespec='seconds')
+        scores_json = json.dumps({name: float(value) for name, value in scores.items()})
+        with self._connect() as conn:
+            # 读取旧结果和写入新结果之间不允许其他写入，保证聚合统计的增减一致
+            conn.execute('BEGIN IMMEDIATE')
+            old = conn.execute(
+                'SELECT class_id, age_group, scores, created_at FROM results WHERE image_hash = ?', (image_hash,)
+            ).fetchone()
+            conn.execute(
+                """
+                INSERT INTO results (image_hash, image_path, age_group, phash, scores, class_id, config_version,
+                                     created_at, updated_at, revision)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, (SELECT COALESCE(MAX(revision), 0) + 1 FROM results))
+                ON CONFLICT(image_hash) DO UPDATE SET
+                    image_path = COALESCE(excluded.image_path, results.image_path),
+                    age_group = COALESCE(excluded.age_group, results.age_group),
+                    phash = COALESCE(excluded.phash, results.phash),
+                    class_id = COALESCE(excluded.class_id, results.class_id),
+                    scores = excluded.scores,
+                    config_version = excluded.config_version,
+                    updated_at = excluded.updated_at,
+                    revision = excluded.revision
+                """,
+                (image_hash, image_path, age_group, None if phash is None else format(phash, 'x'),
+                 scores_json, class_id, config_version, now, now)
+            )
+            if old is not None:
+                rollups.apply(conn, old['class_id'], old['age_group'], old['created_at'],
+                              json.loads(old['scores']), -1, self.score_bins)
+            new = conn.execute(
+                'SELECT class_id, age_group, created_at FROM results WHERE image_hash = ?', (image_hash,)
+            ).fetchone()
+            rollups.apply(conn, new['class_id'], new['age_group'], new['created_at'], scores, 1, self.score_bins)
+            conn.executemany(
+                """
+                INSERT INTO metrics (image_hash, metric, value, version) VALUES (?, ?, ?, ?)
+                ON CONFLICT(image_hash, metric) DO UPDATE SET
+                    value = excluded.value, version = excluded.version
+                """,
+                [(image_hash, name, float(value), metric_versions[name])
+                 for name, value in metrics.items()]
+            )
+
+    def get_result(self, image_hash: str) -> Optional[Dict]:
+        """获取一张图像的评分结果，不存在时返回None"""
+        with self._connect() as conn:
+            row = conn.execute('SELECT * FROM results WHERE image_hash = ?', (image_hash,)).fetchone()
+            if row is None:
+                return None
+            metric_rows = conn.execute(
+                'SELECT metric, value, version FROM metrics WHERE image_hash = ?', (image_hash,)
+            ).fetchall()
+        return self._row_to_result(row, metric_rows)
+
+    def add_alias(self, alias: str, image_hash: str) -> bool:
+        """
+        记录指向已有结果的别名哈希
+
+        网页端会在上传前缩小图像，此时客户端对原始文件计算的哈希与服务端收到的内容哈希不同，
+        以别名记录两者的对应关系，之后上传同一原始文件可在上传前命中。
+        别名由客户端提供，服务端无法校验，已有的别名不会被改写（避免伪造的哈希把其他图像的别名
+        指向错误的结果）。
+
+        Returns:
+            是否新记录了别名
+        """
+        with self._connect() as conn:
+            cursor = conn.execute(
+                'INSERT INTO aliases (alias, image_hash) VALUES (?, ?) ON CONFLICT(alias) DO NOTHING',
+                (alias, image_hash)
+            )
+            return cursor.rowcount > 0
+
+    def find_result(self, content_hash: str) -> Optional[Dict]:
+        """按内容哈希或别名哈希查找评分结果，不存在时返回None"""
+        result = self.get_result(content_hash)
+        if result is not None:
+            return result
+        with self._connect() as conn:
+            row = conn.execute('SELECT image_hash FROM aliases WHERE alias = ?', (content_hash,)).fetchone()
+        return None if row is None else self.get_result(row['image_hash'])
+
+    def iter_results(self) -> Iterator[Dict]:
+        """按写入顺序遍历所有评分结果"""
+        last_rowid = 0
+        while True:
+            with self._connect() as conn:
+                rows = conn.execute(
+                    'SELECT rowid, * FROM results WHERE rowid > ? ORDER BY rowid LIMIT 500',
+                    (last_rowid,)
+                ).fetchall()
+            if not rows:
+                return
+            for row in rows:
+                last_rowid = row['rowid']
+                result = self.get_result(row['image_hash'])
+                if result is not None:
+                    yield result
+
+    def record_archive(self, image_path: str, image_hash: Optional[str] = None, size: int = 0,
+                       content_hash: Optional[str] = None):
+        """
+        记录归档图像文件及其对应的图像哈希（供保留策略按哈希分组）
+
+        Args:
+            image_path: 归档图像路径（相对项目根目录）
+            image_hash: 上传内容哈希；启用保留策略前归档、没有结果指向的文件为None
+            size: 文件大小
+            content_hash: 归档文件本身的哈希（没有 image_hash 时用于分组）
+        """
+        with self._connect() as conn:
+            conn.execute(
+                """
+                INSERT INTO archives (image_path, image_hash, content_hash, size, created_at) VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT(image_path) DO UPDATE SET
+                    image_hash = COALESCE(excluded.image_hash, archives.image_hash),
+                    content_hash = COALESCE(excluded.content_hash, archives.content_hash),
+                    size = excluded.size
+                """,
+                (image_path, image_hash, content_hash, size, datetime.now().isoformat(timespec='seconds'))
+            )
+
+    def archive_info(self, image_paths: Iterable[str]) -> Dict[str, Dict]:
+        """
+        查询归档图像文件的分组信息
+
+        Returns:
+            {image_path: {'image_hash', 'content_hash', 'referenced'}}，referenced 表示有结果指向该文件；
+            未记录也没有结果指向的文件不出现
+        """
+        image_paths = list(image_paths)
+        info = {}
+        with self._connect() as conn:
+            for start in range(0, len(image_paths), 500):
+                batch = image_paths[start:start + 500]
+                placeholders = ','.join('?' * len(batch))
+                for row in conn.execute(
+                    f'SELECT image_path, image_hash, content_hash FROM archives WHERE image_path IN ({placeholders})',
+                    batch
+                ):
+                    info[row['image_path']] = {'image_hash': row['image_hash'], 'content_hash': row['content_hash'],
+                                               'referenced': False}
+                for row in conn.execute(
+                    f'SELECT image_path, image_hash FROM results WHERE image_path IN ({placeholders})', batch
+                ):
+                    entry = info.setdefault(row['image_path'], {'image_hash': None, 'content_hash': None})
+                    entry['image_hash'] = row['image_hash']
+                    entry['referenced'] = True
+        return info
+
+    def result_image_paths(self, image_hashes: Iterable[str]) -> Dict[str, str]:
+        """查询结果指向的归档图像路径：{image_hash: image_path}，没有结果或没有归档路径的哈希不出现"""
+        image_hashes = list(image_hashes)
+        paths = {}
+        with self._connect() as conn:
+            for start in range(0, len(image_hashes), 500):
+                batch = image_hashes[start:start + 500]
+                placeholders = ','.join('?' * len(batch))
+                for row in conn.execute(
+                    f'SELECT image_hash, image_path FROM results '
+                    f'WHERE image_hash IN ({placeholders}) AND image_path IS NOT NULL', batch
+                ):
+                    paths[row['image_hash']] = row['image_path']
+        return paths
+
+    def remove_archive(self, image_path: str):
+        """归档图像文件已删除：删除记录，指向它的结果不再有归档图像（子指标仍可复用）"""
+        with self._connect() as conn:
+            conn.execute('DELETE FROM archives WHERE image_path = ?', (image_path,))
+            conn.execute('UPDATE results SET image_path = NULL WHERE image_path = ?', (image_path,))
+
+    def add_retention_stats(self, counters: Dict[str, int], last_sweep: Optional[Dict] = None):
+        """
+        累加保留策略的清理统计（各进程共享，gunicorn 的每个worker读到相同的统计）
+
+        Args:
+            counters: {计数名: 增量}
+            last_sweep: 最近一次清理的结果，None时不更新
+        """
+        with self._connect() as conn:
+            conn.executemany(
+                'INSERT INTO retention_stats (name, value) VALUES (?, ?) '
+                'ON CONFLICT(name) DO UPDATE SET value = value + excluded.value',
+                list(counters.items())
+            )
+            if last_sweep is not None:
+                conn.execute(
+                    'INSERT INTO retention_sweeps (id, result) VALUES (1, ?) '
+                    'ON CONFLICT(id) DO UPDATE SET result = excluded.result',
+                    (json.dumps(last_sweep),)
+                )
+
+    def retention_stats(self) -> Tuple[Dict[str, int], Optional[Dict]]:
+        """累计的清理统计：({计数名: 值}, 最近一次清理的结果或None)"""
+        with self._connect() as conn:
+            counters = {row['name']: row['value'] for row in conn.execute('SELECT name, value FROM retention_stats')}
+            row = conn.execute('SELECT result FROM retention_sweeps WHERE id = 1').fetchone()
+        return counters, None if row is None else json.loads(row['result'])
+
+    def export_page(self, after: int, limit: int) -> List[Tuple[int, Dict]]:
+        """
+        按最后写入顺序读取游标之后的一页结果（同一连接内两次查询，不逐条读取子指标）
+
+        每次保存（包括覆盖写入）都在写锁内为结果分配递增的 revision，被覆盖的结果会排到游标之后再次读取。
+
+        Args:
+            after: 游标（上一页最后一条结果的 revision，从头读取时为0）
+            limit: 最多读取的结果数
+
+        Returns:
+            [(revision, 结果字典)]，revision 即下一页的游标
+        """
+        with self._connect() as conn:
+            rows = conn.execute(
+                'SELECT * FROM results WHERE revision > ? ORDER BY revision LIMIT ?', (after, limit)
+            ).fetchall()
+            metric_rows = {}
+            if rows:
+                for r in conn.execute(
+                    'SELECT m.image_hash, m.metric, m.value, m.version FROM metrics m '
+                    'JOIN results r ON r.image_hash = m.image_hash WHERE r.revision > ? AND r.revision <= ?',
+                    (after, rows[-1]['revision'])
+                ):
+                    metric_rows.setdefault(r['image_hash'], []).append(r)
+        return [(row['revision'], self._row_to_result(row, metric_rows.get(row['image_hash'], []))) for row in rows]
+
+    def rollup(self, class_id: str, age_groups: Iterable[str], period: str, buckets: Iterable[str]) -> Dict:
+        """
+        读取班级（'*' 为全部班级）在指定年龄组和时间桶上的聚合统计，见 rollups.read
+
+        只读取 年龄组数 x 时间桶数 x 维度数 行，与历史结果数量无关
+        """
+        with self._connect() as conn:
+            return rollups.read(conn, class_id, age_groups, period, buckets)
+
+    def rebuild_rollups(self) -> int:
+        """
+        由全部结果重建聚合统计（用于回填或修复），期间其他写入等待
+
+        Returns:
+            计入的结果数
+        """
+        count = 0
+        with self._connect() as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            conn.execute('DELETE FROM rollups')
+            for row in conn.execute('SELECT class_id, age_group, scores, created_at FROM results ORDER BY rowid'):
+                rollups.apply(conn, row['class_id'], row['age_group'], row['created_at'],
+                              json.loads(row['scores']), 1, self.score_bins)
+                count += 1
+        return count
+
+    def iter_perceptual_hashes(self) -> Iterator[Tuple[str, int]]:
+        """遍历所有已记录感知哈希的 (image_hash, phash)"""
+        with self._connect() as conn:
+            rows = conn.execute(
+                'SELECT image_hash, phash FROM results WHERE phash IS NOT NULL ORDER BY rowid'
+            ).fetchall()
+        for row in rows:
+            yield row['image_hash'], int(row['phash'], 16)
+
+    @staticmethod
+    def _row_to_result(row: sqlite3.Row, metric_rows) -> Dict:
+        """将数据库行转换为结果字典"""
+        return {
+            'image_hash': row['image_hash'],
+            'image_path': row['image_path'],
+            'age_group': row['age_group'],
+            'class_id': row['class_id'],
+            'phash': None if row['phash'] is None else int(row['phash'], 16),
+            'scores': json.loads(row['scores']),
+            'config_version': row['config_version'],
+            'created_at': row['created_at'],
+            'updated_at': row['updated_at'],
+            'metrics': {r['metric']: r['value'] for r in metric_rows},
+            'metric_versions': {r['metric']: r['version'] for r in metric_rows}
+        }
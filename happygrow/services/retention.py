@@ -0,0 +1,368 @@
+"""
+上传目录的保留策略：后台线程以低优先级定期扫描归档图像，按以下策略删除文件并统计回收的空间
+
+- keep_per_hash：同一图像哈希只保留最新的N份归档（结果指向的那份总是保留）
+- max_age_days：删除超过保留天数的归档
+- max_total_bytes：总大小（包括缩略图）超过上限时从最旧的归档开始删除
+
+缩略图（uploads/thumbnails/<哈希前两位>/<图像哈希>_*）按图像哈希跟随归档：该哈希已没有剩余的归档、
+也没有结果指向归档时一并删除（原因与删除最后一份归档相同，之前已失去归档的记为 orphan）。
+
+最近 min_age_seconds 秒内写入的归档和缩略图不删除：上传时先归档再评分，评分完成前结果还未指向新归档。
+扫描和删除都分批进行，批次之间暂停，不长时间占用磁盘和结果存储；多个进程（gunicorn worker）
+通过文件锁保证同一时间只有一个在清理，清理统计累计在结果存储中，各进程读到相同的统计。
+被删除的归档如有结果指向，结果的 image_path 置空，之后上传同一图像时重新归档和评分。
+"""
+import hashlib
+import logging
+import os
+import threading
+import time
+from collections import Counter
+from typing import Dict, Iterable, List, Optional
+from ..config.config import BASE_DIR, IMAGE_CONFIG, THUMBNAIL_CONFIG
+
+try:
+    import fcntl
+except ImportError:  # Windows：不做跨进程互斥
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+REASONS = ('duplicate', 'age', 'quota', 'orphan')
+
+class RetentionManager:
+    def __init__(self, upload_dir, result_store, max_age_days: Optional[float] = None,
+                 max_total_bytes: Optional[int] = None, keep_per_hash: Optional[int] = None,
+                 interval: float = 3600, batch_size: int = 200, batch_pause: float = 0.05,
+                 lock_path=None, base_dir=BASE_DIR, min_age_seconds: float = 600):
+        """
+        初始化保留策略
+
+        Args:
+            upload_dir: 归档图像目录（只处理其中的图像文件和缩略图目录，不进入其他子目录）
+            result_store: ResultStore实例
+            max_age_days: 保留天数，None为不限
+            max_total_bytes: 归档和缩略图总大小上限，None为不限
+            keep_per_hash: 同一图像哈希保留的归档数，None为不限
+            interval: 后台清理的间隔秒数
+            batch_size: 每批扫描或删除的文件数
+            batch_pause: 批次之间暂停的秒数
+            lock_path: 跨进程互斥的锁文件，None时只在进程内互斥
+            base_dir: 结果存储中归档路径的根目录
+            min_age_seconds: 修改时间在此秒数之内的归档和缩略图不删除（可能尚未被结果指向）
+        """
+        self.upload_dir = str(upload_dir)
+        self.thumbnail_dir = os.path.join(self.upload_dir, THUMBNAIL_CONFIG['folder'])
+        self.result_store = result_store
+        self.max_age_days = max_age_days
+        self.max_total_bytes = max_total_bytes
+        self.keep_per_hash = keep_per_hash
+        self.interval = interval
+        self.batch_size = batch_size
+        self.batch_pause = batch_pause
+        self.lock_path = lock_path
+        self.base_dir = str(base_dir)
+        self.min_age_seconds = min_age_seconds
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _relpath(self, name: str) -> str:
+        return os.path.relpath(os.path.join(self.upload_dir, name), self.base_dir)
+
+    def _pause(self, count: int):
+        if count % self.batch_size == 0 and self.batch_pause:
+            self._stop.wait(self.batch_pause)
+
+    def _scan(self) -> List[Dict]:
+        """分批列出归档图像文件：name、path（相对 base_dir）、size、mtime"""
+        extensions = tuple(f".{extension}" for extension in IMAGE_CONFIG['allowed_extensions'])
+        entries = []
+        try:
+            iterator = os.scandir(self.upload_dir)
+        except FileNotFoundError:
+            return entries
+        with iterator:
+            for entry in iterator:
+                if not entry.name.lower().endswith(extensions) or not entry.is_file(follow_symlinks=False):
+                    continue
+                try:
+                    stat = entry.stat(follow_symlinks=False)
+                except FileNotFoundError:
+                    continue
+                entries.append({'name': entry.name, 'path': self._relpath(entry.name),
+                                'size': stat.st_size, 'mtime': stat.st_mtime})
+                self._pause(len(entries))
+        return entries
+
+    def _scan_thumbnails(self) -> List[Dict]:
+        """分批列出缩略图文件：name（相对上传目录）、path、size、mtime、image_hash"""
+        entries = []
+        try:
+            shards = [entry.name for entry in os.scandir(self.thumbnail_dir) if entry.is_dir(follow_symlinks=False)]
+        except FileNotFoundError:
+            return entries
+        for shard in shards:
+            try:
+                iterator = os.scandir(os.path.join(self.thumbnail_dir, shard))
+            except FileNotFoundError:
+                continue
+            with iterator:
+                for entry in iterator:
+                    image_hash, separator, _ = entry.name.partition('_')
+                    if not separator or not entry.is_file(follow_symlinks=False):
+                        continue
+                    try:
+                        stat = entry.stat(follow_symlinks=False)
+                    except FileNotFoundError:
+                        continue
+                    name = os.path.join(THUMBNAIL_CONFIG['folder'], shard, entry.name)
+                    entries.append({'name': name, 'path': self._relpath(name), 'size': stat.st_size,
+                                    'mtime': stat.st_mtime, 'image_hash': image_hash, 'thumbnail': True})
+                    self._pause(len(entries))
+        return entries
+
+    def _content_hash(self, name: str) -> Optional[str]:
+        digest = hashlib.sha256()
+        try:
+            with open(os.path.join(self.upload_dir, name), 'rb') as f:
+                for block in iter(lambda: f.read(1 << 20), b''):
+                    digest.update(block)
+        except OSError:
+            return None
+        return digest.hexdigest()
+
+    def _assign_groups(self, entries: List[Dict]):
+        """
+        为每个文件确定分组键（图像哈希）和是否被结果指向
+
+        没有记录的旧归档计算文件内容哈希并记录，之后的扫描不再重复计算。
+        """
+        info = self.result_store.archive_info(entry['path'] for entry in entries)
+        computed = 0
+        for entry in entries:
+            record = info.get(entry['path'])
+            entry['referenced'] = bool(record and record['referenced'])
+            entry['image_hash'] = record['image_hash'] if record else None
+            group = record and (record['image_hash'] or record['content_hash'])
+            if not group and self.keep_per_hash is not None:
+                content_hash = self._content_hash(entry['name'])
+                if content_hash is not None:
+                    self.result_store.record_archive(entry['path'], size=entry['size'], content_hash=content_hash)
+                    group = content_hash
+                computed += 1
+                self._pause(computed)
+            entry['group'] = group
+
+    def plan(self, entries: List[Dict], now: Optional[float] = None,
+             thumbnails: Iterable[Dict] = ()) -> List[Dict]:
+        """
+        按策略决定删除的文件（依次为 duplicate、age、quota），每项附带 reason；
+        图像哈希失去全部归档的缩略图随之删除
+
+        Args:
+            entries: _scan 列出并经 _assign_groups 分组的文件
+            now: 当前时间戳（测试用）
+            thumbnails: _scan_thumbnails 列出的缩略图（计入总大小）
+        """
+        now = time.time() if now is None else now
+        thumbnails = list(thumbnails)
+        deleted = {}
+        # 最近写入的归档和缩略图不作为删除对象（仍计入总大小）
+        recent = {entry['path'] for entry in entries + thumbnails if entry['mtime'] > now - self.min_age_seconds}
+        if self.keep_per_hash is not None:
+            groups = {}
+            for entry in entries:
+                if entry['group'] and entry['path'] not in recent:
+                    groups.setdefault(entry['group'], []).append(entry)
+            for members in groups.values():
+                # 结果指向的归档优先保留，其余按修改时间从新到旧
+                members.sort(key=lambda entry: (not entry['referenced'], -entry['mtime']))
+                for entry in members[max(self.keep_per_hash, 1):]:
+                    deleted[entry['path']] = dict(entry, reason='duplicate')
+        if self.max_age_days is not None:
+            cutoff = now - self.max_age_days * 86400
+            for entry in entries:
+                if entry['mtime'] < cutoff and entry['path'] not in deleted and entry['path'] not in recent:
+                    deleted[entry['path']] = dict(entry, reason='age')
+
+        # 每个图像哈希剩余的归档数，以及结果指向的归档路径
+        groups = {}
+        for thumbnail in thumbnails:
+            if thumbnail['path'] not in recent:
+                groups.setdefault(thumbnail['image_hash'], []).append(thumbnail)
+        archives = Counter(entry.get('image_hash') for entry in entries if entry['path'] not in deleted)
+        result_paths = self.result_store.result_image_paths(groups) if groups else {}
+
+        def release(image_hash, reason) -> int:
+            """哈希已没有归档也没有结果指向归档时删除其缩略图，返回释放的字节数"""
+            result_path = result_paths.get(image_hash)
+            if archives[image_hash] or (result_path is not None and result_path not in deleted):
+                return 0
+            released = 0
+            for thumbnail in groups.pop(image_hash, []):
+                deleted[thumbnail['path']] = dict(thumbnail, reason=reason)
+                released += thumbnail['size']
+            return released
+
+        for entry in list(deleted.values()):
+            release(entry.get('image_hash'), entry['reason'])
+        for image_hash in list(groups):
+            release(image_hash, 'orphan')
+        if self.max_total_bytes is not None:
+            remaining = sorted((entry for entry in entries if entry['path'] not in deleted),
+                               key=lambda entry: entry['mtime'])
+            total = sum(entry['size'] for entry in remaining + thumbnails if entry['path'] not in deleted)
+            for entry in remaining:
+                if total <= self.max_total_bytes:
+                    break
+                if entry['path'] in recent:
+                    continue
+                deleted[entry['path']] = dict(entry, reason='quota')
+                total -= entry['size']
+                archives[entry.get('image_hash')] -= 1
+                total -= release(entry.get('image_hash'), 'quota')
+        return list(deleted.values())
+
+    def _delete(self, plan: List[Dict]) -> Dict[str, Dict[str, int]]:
+        reclaimed = {reason: {'files': 0, 'bytes': 0} for reason in REASONS}
+        for count, entry in enumerate(plan, 1):
+            if self._stop.is_set():
+                break
+            try:
+                os.remove(os.path.join(self.upload_dir, entry['name']))
+            except FileNotFoundError:
+                pass
+            except OSError:
+                logger.exception("删除 %s 失败", entry['path'])
+                self.result_store.add_retention_stats({'errors': 1})
+                continue
+            if not entry.get('thumbnail'):
+                self.result_store.remove_archive(entry['path'])
+            reclaimed[entry['reason']]['files'] += 1
+            reclaimed[entry['reason']]['bytes'] += entry['size']
+            self._pause(count)
+        return reclaimed
+
+    def _acquire(self):
+        """跨进程互斥，返回锁文件（未配置或不支持时返回True），其他进程正在清理时返回None"""
+        if self.lock_path is None or fcntl is None:
+            return True
+        os.makedirs(os.path.dirname(str(self.lock_path)) or '.', exist_ok=True)
+        lock_file = open(self.lock_path, 'a')
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return None
+        return lock_file
+
+    def sweep(self, dry_run: bool = False, now: Optional[float] = None) -> Optional[Dict]:
+        """
+        执行一次完整的扫描和清理
+
+        Args:
+            dry_run: 只计算会删除的文件，不删除
+            now: 当前时间戳（测试用）
+
+        Returns:
+            本次统计：scanned（归档数）、thumbnails（缩略图数）、total_bytes、remaining_bytes、
+            reclaimed（按原因的文件数和字节数，包括缩略图）、
+            duration；其他进程正在清理时返回None
+        """
+        with self._lock:
+            lock_file = self._acquire()
+            if lock_file is None:
+                self.result_store.add_retention_stats({'skipped': 1})
+                return None
+            try:
+                start = time.perf_counter()
+                entries = self._scan()
+                self._assign_groups(entries)
+                thumbnails = self._scan_thumbnails()
+                plan = self.plan(entries, now, thumbnails)
+                if dry_run:
+                    reclaimed = {reason: {'files': 0, 'bytes': 0} for reason in REASONS}
+                    for entry in plan:
+                        reclaimed[entry['reason']]['files'] += 1
+                        reclaimed[entry['reason']]['bytes'] += entry['size']
+                else:
+                    reclaimed = self._delete(plan)
+            finally:
+                if lock_file is not True:
+                    lock_file.close()
+            total_bytes = sum(entry['size'] for entry in entries + thumbnails)
+            result = {
+                'scanned': len(entries),
+                'thumbnails': len(thumbnails),
+                'total_bytes': total_bytes,
+                'remaining_bytes': total_bytes - sum(item['bytes'] for item in reclaimed.values()),
+                'reclaimed': reclaimed,
+                'duration': time.perf_counter() - start,
+                'dry_run': dry_run
+            }
+            if not dry_run:
+                counters = {'sweeps': 1}
+                for reason, item in reclaimed.items():
+                    counters[f"files_{reason}"] = item['files']
+                    counters[f"bytes_{reason}"] = item['bytes']
+                self.result_store.add_retention_stats(counters, last_sweep=result)
+            return result
+
+    def _run(self):
+        # 降低清理线程的调度优先级（Linux上线程可单独设置nice值）
+        try:
+            os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), 19)
+        except (AttributeError, OSError):
+            pass
+        while not self._stop.wait(self.interval):
+            try:
+                self.sweep()
+            except Exception:
+                logger.exception("清理上传目录失败")
+                try:
+                    self.result_store.add_retention_stats({'errors': 1})
+                except Exception:
+                    pass
+
+    def start(self):
+        """
+        启动后台清理线程（首次清理在一个间隔之后）
+
+        gunicorn 中由 post_worker_init 在每个worker内启动（预加载时master中启动的线程不会随fork
+        进入worker），worker之间通过锁文件互斥；也可以不启动线程，由cron定期执行 flask retention。
+        """
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, daemon=True, name='retention')
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def report(self) -> Dict:
+        """累计清理统计（所有进程）和当前策略"""
+        counters, last_sweep = self.result_store.retention_stats()
+        by_reason = {
+            reason: {'files': counters.get(f"files_{reason}", 0), 'bytes': counters.get(f"bytes_{reason}", 0)}
+            for reason in REASONS
+        }
+        return dict(
+            sweeps=counters.get('sweeps', 0),
+            skipped=counters.get('skipped', 0),    # 其他进程正在清理
+            errors=counters.get('errors', 0),
+            files_deleted=sum(item['files'] for item in by_reason.values()),
+            bytes_reclaimed=sum(item['bytes'] for item in by_reason.values()),
+            by_reason=by_reason,
+            last_sweep=last_sweep,
+            policy={
+                'max_age_days': self.max_age_days,
+                'max_total_bytes': self.max_total_bytes,
+                'keep_per_hash': self.keep_per_hash,
+                'interval': self.interval,
+                'min_age_seconds': self.min_age_seconds
+            }
+        )
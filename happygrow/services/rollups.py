@@ -0,0 +1,135 @@
+"""
+班级和年龄组的预聚合统计：评分结果写入时在同一事务中增量更新，查询只读取固定数量的聚合行，
+耗时与历史结果数量无关
+
+每条结果计入 (班级, 年龄组, 周期, 时间桶, 维度) 的计数、得分和、得分平方和及得分分布，
+班级和年龄组各自另有汇总键 '*'（全部班级 / 全部年龄组）。周期为 day（2026-10-19）、
+week（ISO周，2026-W43）和 all。结果被覆盖（如重评分）时先减去旧得分再加上新得分。
+"""
+import json
+import math
+import sqlite3
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+ALL = '*'
+OVERALL = 'overall'
+PERIODS = ('day', 'week', 'all')
+
+ROLLUP_SCHEMA = """
+CREATE TABLE IF NOT EXISTS rollups (
+    class_id TEXT NOT NULL,
+    age_group TEXT NOT NULL,
+    period TEXT NOT NULL,
+    bucket TEXT NOT NULL,
+    dimension TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    total REAL NOT NULL,
+    total_sq REAL NOT NULL,
+    bins TEXT NOT NULL,
+    PRIMARY KEY (class_id, age_group, period, bucket, dimension)
+);
+"""
+
+def day_bucket(day: date) -> str:
+    return day.isoformat()
+
+def week_bucket(day: date) -> str:
+    year, week, _ = day.isocalendar()
+    return f"{year}-W{week:02d}"
+
+def buckets_for(created_at: str) -> List[Tuple[str, str]]:
+    """结果写入时间（ISO格式）所属的 (周期, 时间桶)"""
+    day = datetime.fromisoformat(created_at).date()
+    return [('day', day_bucket(day)), ('week', week_bucket(day)), ('all', 'all')]
+
+def recent_buckets(period: str, count: int, today: Optional[date] = None) -> List[str]:
+    """截至今天的最近 count 个时间桶（从早到晚）"""
+    today = today or date.today()
+    if period == 'day':
+        return [day_bucket(today - timedelta(days=i)) for i in range(count - 1, -1, -1)]
+    if period == 'week':
+        return [week_bucket(today - timedelta(weeks=i)) for i in range(count - 1, -1, -1)]
+    raise ValueError(f"未知的统计周期: {period}")
+
+def _with_overall(scores: Dict[str, float]) -> Dict[str, float]:
+    """各维度得分加上总体得分（各维度平均，与总体评价一致）"""
+    scores = {name: float(value) for name, value in scores.items()}
+    if scores:
+        scores[OVERALL] = sum(scores.values()) / len(scores)
+    return scores
+
+def _score_bin(score: float, bins: int) -> int:
+    return min(bins - 1, max(0, int(score * bins)))
+
+def apply(conn: sqlite3.Connection, class_id: Optional[str], age_group: Optional[str], created_at: str,
+          scores: Dict[str, float], sign: int, bins: int):
+    """
+    把一条结果的得分计入（sign=1）或移出（sign=-1）聚合，调用方负责事务
+
+    Args:
+        class_id: 班级，没有时计入 ''（只出现在全部班级的汇总中）
+        age_group: 年龄组，没有时计入 ''
+        created_at: 结果首次写入时间
+        scores: 各维度得分
+        sign: 1 计入，-1 移出
+        bins: 得分分布的区间数（[0, 1] 等分）
+    """
+    scores = _with_overall(scores)
+    class_keys = {class_id or '', ALL}
+    age_keys = {age_group or '', ALL}
+    for class_key in class_keys:
+        for age_key in age_keys:
+            for period, bucket in buckets_for(created_at):
+                for dimension, score in scores.items():
+                    key = (class_key, age_key, period, bucket, dimension)
+                    row = conn.execute(
+                        'SELECT bins FROM rollups WHERE class_id = ? AND age_group = ? AND period = ? '
+                        'AND bucket = ? AND dimension = ?', key
+                    ).fetchone()
+                    counts = json.loads(row[0]) if row else [0] * bins
+                    if len(counts) != bins:
+                        counts = (counts + [0] * bins)[:bins]
+                    counts[_score_bin(score, bins)] += sign
+                    conn.execute(
+                        """
+                        INSERT INTO rollups (class_id, age_group, period, bucket, dimension, count, total, total_sq, bins)
+                        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                        ON CONFLICT(class_id, age_group, period, bucket, dimension) DO UPDATE SET
+                            count = count + excluded.count,
+                            total = total + excluded.total,
+                            total_sq = total_sq + excluded.total_sq,
+                            bins = excluded.bins
+                        """,
+                        key + (sign, sign * score, sign * score * score, json.dumps(counts))
+                    )
+
+def _stats(row) -> Dict:
+    count = row['count']
+    if count <= 0:
+        return {'count': 0, 'mean': None, 'std': None, 'distribution': json.loads(row['bins'])}
+    mean = row['total'] / count
+    variance = max(0.0, row['total_sq'] / count - mean * mean)
+    return {'count': count, 'mean': mean, 'std': math.sqrt(variance), 'distribution': json.loads(row['bins'])}
+
+def read(conn: sqlite3.Connection, class_id: str, age_groups: Iterable[str], period: str,
+         buckets: Iterable[str]) -> Dict[str, Dict[str, Dict[str, Dict]]]:
+    """
+    读取聚合行
+
+    Returns:
+        {年龄组: {时间桶: {维度: {count, mean, std, distribution}}}}，没有数据的键不出现
+    """
+    age_groups, buckets = list(age_groups), list(buckets)
+    result = {}
+    rows = conn.execute(
+        f"""
+        SELECT * FROM rollups WHERE class_id = ? AND period = ?
+        AND age_group IN ({','.join('?' * len(age_groups))}) AND bucket IN ({','.join('?' * len(buckets))})
+        """,
+        [class_id, period] + age_groups + buckets
+    ).fetchall()
+    for row in rows:
+        if row['count'] > 0:
+            result.setdefault(row['age_group'], {}).setdefault(row['bucket'], {})[row['dimension']] = _stats(row)
+    return result
@@ -0,0 +1,155 @@
+"""
+评分worker（任务队列的消费者）：领取网页端提交的评分任务，计算子指标并按图像哈希写入结果存储
+
+任务内容：image_hash、image_path（归档图像，相对 base_dir）、age_group、class_id、phash。
+分析用的像素由网页端按内容哈希写入共享的暂存目录（PixelCache），worker以内存映射读取，
+与网页端本地评分使用的像素完全相同；暂存已被淘汰时退回读取归档图像（同样缩小到评分分辨率）。
+"""
+import logging
+import os
+import socket
+import threading
+import uuid
+from typing import Dict, Optional
+from PIL import Image
+from .image_service import ImageService
+from .job_broker import Job, JobBroker
+from .rescore_service import RescoreService
+from ..core.scoring_engine import ScoringEngine
+from ..config.config import BASE_DIR
+
+logger = logging.getLogger(__name__)
+
+class ScoringWorker:
+    def __init__(self, broker: JobBroker, result_store, staging=None, base_dir=BASE_DIR,
+                 worker_id: Optional[str] = None, heartbeat_interval: float = 5.0, poll_interval: float = 0.2):
+        """
+        初始化评分worker
+
+        Args:
+            broker: 任务队列
+            result_store: ResultStore实例
+            staging: 网页端写入分析像素的 PixelCache（可选）
+            base_dir: 归档图像相对路径的根目录
+            worker_id: worker标识，默认为 主机名-进程号-随机后缀
+            heartbeat_interval: 心跳（及续租）间隔
+            poll_interval: 队列为空时的轮询间隔
+        """
+        self.broker = broker
+        self.result_store = result_store
+        self.staging = staging
+        self.base_dir = base_dir
+        self.worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+        self.heartbeat_interval = heartbeat_interval
+        self.poll_interval = poll_interval
+        self._current: Optional[Job] = None
+        self.stats = {'processed': 0, 'reused': 0, 'failed': 0}
+
+    @staticmethod
+    def _is_current(result: Optional[Dict]) -> bool:
+        """已保存的结果是否由当前评分配置和全部子指标的当前版本计算"""
+        return result is not None and result['config_version'] == ScoringEngine.config_version() and \
+            not RescoreService.stale_metrics(result)
+
+    def process(self, job: Job) -> Dict:
+        """
+        执行一个评分任务并写入结果存储（按图像哈希覆盖写入，重复投递时结果相同）
+
+        Returns:
+            任务结果：image_hash、metrics（原始子指标）、worker
+        """
+        payload = job.payload
+        image_hash = payload['image_hash']
+        stored = self.result_store.get_result(image_hash)
+        if self._is_current(stored):
+            # 重复投递（之前的worker已写入结果但未来得及确认），不再重新计算
+            self.stats['reused'] += 1
+            return {'image_hash': image_hash, 'metrics': stored['metrics'], 'worker': self.worker_id}
+
+        pixels = self.staging.get(image_hash) if self.staging is not None else None
+        if pixels is not None:
+            metrics = ScoringEngine(pixels).compute_metrics()
+        else:
+            with Image.open(os.path.join(self.base_dir, payload['image_path'])) as image:
+                metrics = ScoringEngine(ImageService._fit_analysis_size(image.convert('RGB'))).compute_metrics()
+        metrics = {name: float(value) for name, value in metrics.items()}
+        scores, _ = ScoringEngine.score_from_metrics(metrics)
+        versions = ScoringEngine.metric_versions()
+        self.result_store.save_result(
+            image_hash,
+            scores,
+            {name: value for name, value in metrics.items() if name in versions},
+            versions,
+            image_path=payload.get('image_path'),
+            age_group=payload.get('age_group'),
+            config_version=ScoringEngine.config_version(),
+            phash=payload.get('phash'),
+            class_id=payload.get('class_id')
+        )
+        return {'image_hash': image_hash, 'metrics': metrics, 'worker': self.worker_id}
+
+    def run_once(self) -> bool:
+        """
+        领取并执行一个任务
+
+        Returns:
+            是否领取到任务
+        """
+        job = self.broker.claim(self.worker_id)
+        if job is None:
+            return False
+        self._current = job
+        try:
+            result = self.process(job)
+        except Exception as e:
+            self.stats['failed'] += 1
+            logger.exception("评分任务 %s 失败（第 %d 次）", job.job_id, job.attempts)
+            self.broker.fail(job, str(e) or type(e).__name__)
+        else:
+            self.broker.ack(job, result)
+            self.stats['processed'] += 1
+        finally:
+            self._current = None
+        return True
+
+    def heartbeat(self):
+        """发送心跳，并续租正在执行的任务"""
+        self.broker.heartbeat(self.worker_id, {
+            'host': socket.gethostname(),
+            'pid': os.getpid(),
+            'current': self._current.job_id if self._current else None,
+            **self.stats
+        }, job=self._current)
+
+    def _heartbeat_loop(self, stop: threading.Event):
+        while not stop.wait(self.heartbeat_interval):
+            try:
+                self.heartbeat()
+            except Exception:
+                logger.exception("发送心跳失败")
+
+    def run(self, stop: Optional[threading.Event] = None, max_jobs: Optional[int] = None):
+        """
+        持续领取执行任务，直到 stop 被设置或执行了 max_jobs 个任务
+        """
+        stop = stop or threading.Event()
+        heartbeat_stop = threading.Event()
+        self.heartbeat()
+        thread = threading.Thread(target=self._heartbeat_loop, args=(heartbeat_stop,), daemon=True,
+                                  name='scoring-worker-heartbeat')
+        thread.start()
+        done = 0
+        try:
+            while not stop.is_set() and (max_jobs is None or done < max_jobs):
+                try:
+                    claimed = self.run_once()
+                except ConnectionError:
+                    logger.exception("任务队列不可用")
+                    claimed = False
+                if claimed:
+                    done += 1
+                else:
+                    stop.wait(self.poll_interval)
+        finally:
+            heartbeat_stop.set()
+            thread.join()
@@ -0,0 +1,149 @@
+"""
+影子评分：对抽样的线上请求在后台线程中再用候选评分引擎计算一次，
+记录各子指标、各维度得分的差异和耗时比，用于验证优化后的引擎与线上结果一致且不更慢
+"""
+import importlib
+import os
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, Optional
+import numpy as np
+
+def load_candidate(path: str) -> Callable:
+    """按 'module:attribute' 加载候选引擎（类或工厂函数，以图像为参数，返回带 analyze() 的引擎）"""
+    module_name, _, attribute = path.partition(':')
+    if not attribute:
+        raise ValueError(f"候选引擎应为 'module:attribute' 格式: {path}")
+    return getattr(importlib.import_module(module_name), attribute)
+
+class _DeltaStats:
+    """单个子指标或维度得分的差异统计"""
+    def __init__(self):
+        self.count = 0
+        self.total_abs = 0.0
+        self.max_abs = 0.0
+        self.mismatches = 0
+
+    def add(self, delta: float, tolerance: float):
+        self.count += 1
+        self.total_abs += abs(delta)
+        self.max_abs = max(self.max_abs, abs(delta))
+        if abs(delta) > tolerance:
+            self.mismatches += 1
+
+    def report(self) -> Dict:
+        return {
+            'count': self.count,
+            'mean_abs_delta': self.total_abs / self.count if self.count else 0.0,
+            'max_abs_delta': self.max_abs,
+            'mismatches': self.mismatches
+        }
+
+class ShadowScorer:
+    def __init__(self, candidate: Callable, sample_rate: float, max_pending: int = 4,
+                 tolerance: float = 1e-6, latency_window: int = 1000, seed: Optional[int] = None):
+        """
+        初始化影子评分
+
+        Args:
+            candidate: 候选引擎（以图像为参数构造，带 analyze() 方法）
+            sample_rate: 进入影子评分的请求比例
+            max_pending: 排队和执行中的影子评分上限，超过时丢弃（不让请求等待）
+            tolerance: 差异超过该值记为不一致
+            latency_window: 保留最近多少个耗时比用于计算分位数
+            seed: 抽样随机种子
+        """
+        self.candidate = candidate
+        self.sample_rate = sample_rate
+        self.max_pending = max_pending
+        self.tolerance = tolerance
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._executor = None
+        self._executor_pid = None
+        self._pending = 0
+        self._latency_ratios = deque(maxlen=latency_window)
+        self._metrics: Dict[str, _DeltaStats] = {}
+        self._scores: Dict[str, _DeltaStats] = {}
+        self.stats = {'sampled': 0, 'completed': 0, 'dropped': 0, 'failed': 0}
+
+    def _ensure_executor(self) -> ThreadPoolExecutor:
+        """按需创建后台线程（fork出的worker进程中需要重新创建），调用方持有锁"""
+        if self._executor is None or self._executor_pid != os.getpid():
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='shadow-scoring')
+            self._executor_pid = os.getpid()
+            self._pending = 0
+        return self._executor
+
+    def maybe_submit(self, image, scores: Dict[str, float], details: Dict[str, Dict],
+                     seconds: float) -> Optional[Future]:
+        """
+        按抽样比例提交一次影子评分（立即返回，不等待结果）
+
+        Args:
+            image: 线上评分使用的图像
+            scores, details: 线上引擎的结果
+            seconds: 线上引擎 analyze() 的耗时
+
+        Returns:
+            影子评分的 Future，未抽中或被丢弃时返回None
+        """
+        with self._lock:
+            if self._random.random() >= self.sample_rate:
+                return None
+            executor = self._ensure_executor()
+            if self._pending >= self.max_pending:
+                self.stats['dropped'] += 1
+                return None
+            self.stats['sampled'] += 1
+            self._pending += 1
+        return executor.submit(self._run, image, scores, details, seconds)
+
+    def _run(self, image, scores: Dict[str, float], details: Dict[str, Dict], seconds: float):
+        try:
+            start = time.perf_counter()
+            candidate_scores, candidate_details = self.candidate(image).analyze()
+            candidate_seconds = time.perf_counter() - start
+            self.record(scores, details, seconds, candidate_scores, candidate_details, candidate_seconds)
+        except Exception:
+            with self._lock:
+                self.stats['failed'] += 1
+            raise
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+    def record(self, scores: Dict[str, float], details: Dict[str, Dict], seconds: float,
+               candidate_scores: Dict[str, float], candidate_details: Dict[str, Dict], candidate_seconds: float):
+        """记录一次线上与候选结果的比较（只比较两边都有的维度和子指标）"""
+        with self._lock:
+            self.stats['completed'] += 1
+            for dimension, score in scores.items():
+                if dimension not in candidate_scores:
+                    continue
+                self._scores.setdefault(dimension, _DeltaStats()).add(
+                    candidate_scores[dimension] - score, self.tolerance)
+                for name, value in details[dimension].items():
+                    if name in candidate_details[dimension]:
+                        self._metrics.setdefault(name, _DeltaStats()).add(
+                            candidate_details[dimension][name] - value, self.tolerance)
+            if seconds > 0:
+                self._latency_ratios.append(candidate_seconds / seconds)
+
+    def report(self) -> Dict:
+        """差异和耗时比汇总；latency_ratio 为候选耗时 / 线上耗时"""
+        with self._lock:
+            report = dict(self.stats)
+            report['pending'] = self._pending
+            report['scores'] = {name: stats.report() for name, stats in self._scores.items()}
+            report['metrics'] = {name: stats.report() for name, stats in self._metrics.items()}
+            ratios = np.array(self._latency_ratios)
+        report['latency_ratio'] = {
+            'mean': float(ratios.mean()),
+            'p50': float(np.percentile(ratios, 50)),
+            'p95': float(np.percentile(ratios, 95))
+        } if len(ratios) else None
+        return report
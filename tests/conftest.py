@@ -0,0 +1,17 @@
+"""
+测试运行前把结果存储和色相查找表指向临时目录，测试不写入项目的 data/ 目录
+"""
+import os
+import shutil
+import tempfile
+
+_data_dir = tempfile.mkdtemp(prefix='happygrow-test-')
+# 须在导入配置（以及 app 创建模块级的结果存储）之前设置
+os.environ['HAPPYGROW_DATABASE'] = os.path.join(_data_dir, 'happygrow.db')
+
+from happygrow.config.config import HUE_LUT_CONFIG  # noqa: E402
+
+HUE_LUT_CONFIG['directory'] = _data_dir
+
+def pytest_unconfigure(config):
+    shutil.rmtree(_data_dir, ignore_errors=True)
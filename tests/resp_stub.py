@@ -0,0 +1,277 @@
+"""
+测试用的本地Redis替身：实现 RedisJobBroker 用到的Redis协议命令子集（数据保存在内存中）
+"""
+import copy
+import socketserver
+import threading
+import time
+
+class _Store:
+    def __init__(self):
+        self.data = {}
+        self.expires = {}
+        self.lock = threading.Lock()
+
+    def get(self, key, kind=None):
+        if key in self.expires and self.expires[key] <= time.time():
+            self.data.pop(key, None)
+            self.expires.pop(key, None)
+        value = self.data.get(key)
+        if value is not None and kind is not None and not isinstance(value, kind):
+            raise TypeError('WRONGTYPE Operation against a key holding the wrong kind of value')
+        return value
+
+    def setdefault(self, key, factory):
+        value = self.get(key, factory)
+        if value is None:
+            value = self.data[key] = factory()
+        return value
+
+    def delete(self, key):
+        self.expires.pop(key, None)
+        return self.data.pop(key, None) is not None
+
+    def snapshot(self, key):
+        return copy.deepcopy(self.get(key))
+
+class RespStubServer:
+    def __init__(self):
+        """在本机随机端口启动（线程服务器），url 为连接地址"""
+        self.store = _Store()
+        store = self.store
+        commands = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                # 连接级的事务状态：WATCH 时的键快照，MULTI 之后排队的命令
+                self.watched = {}
+                self.queued = None
+                while True:
+                    args = self._read_command()
+                    if args is None:
+                        return
+                    try:
+                        with store.lock:
+                            reply = self._transaction(args)
+                    except (TypeError, ValueError, KeyError) as e:
+                        reply = Exception(str(e))
+                    self.wfile.write(_encode(reply))
+
+            def _transaction(self, args):
+                name = args[0].decode().upper()
+                if name == 'WATCH':
+                    for key in args[1:]:
+                        self.watched.setdefault(key, store.snapshot(key))
+                    return 'OK'
+                if name == 'UNWATCH':
+                    self.watched = {}
+                    return 'OK'
+                if name == 'MULTI':
+                    self.queued = []
+                    return 'OK'
+                if name == 'DISCARD':
+                    self.queued, self.watched = None, {}
+                    return 'OK'
+                if name == 'EXEC':
+                    queued, watched = self.queued, self.watched
+                    self.queued, self.watched = None, {}
+                    if queued is None:
+                        raise ValueError('ERR EXEC without MULTI')
+                    if any(store.snapshot(key) != value for key, value in watched.items()):
+                        return NIL_ARRAY
+                    replies = []
+                    for queued_args in queued:
+                        try:
+                            replies.append(commands.dispatch(queued_args))
+                        except (TypeError, ValueError, KeyError) as e:
+                            replies.append(Exception(str(e)))
+                    return replies
+                if self.queued is not None:
+                    self.queued.append(args)
+                    return 'QUEUED'
+                return commands.dispatch(args)
+
+            def _read_command(self):
+                line = self.rfile.readline()
+                if not line:
+                    return None
+                count = int(line[1:-2])
+                args = []
+                for _ in range(count):
+                    length = int(self.rfile.readline()[1:-2])
+                    args.append(self.rfile.read(length + 2)[:-2])
+                return args
+
+        class Server(socketserver.ThreadingTCPServer):
+            daemon_threads = True
+            allow_reuse_address = True
+
+        self.server = Server(('127.0.0.1', 0), Handler)
+        self.url = f"redis://127.0.0.1:{self.server.server_address[1]}/0"
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def dispatch(self, args):
+        name = args[0].decode().upper()
+        handler = getattr(self, f"cmd_{name.lower()}", None)
+        if handler is None:
+            raise ValueError(f"ERR unknown command '{name}'")
+        return handler(*args[1:])
+
+    # 通用
+    def cmd_ping(self):
+        return 'PONG'
+
+    def cmd_select(self, db):
+        return 'OK'
+
+    def cmd_flushdb(self):
+        self.store.data.clear()
+        self.store.expires.clear()
+        return 'OK'
+
+    def cmd_del(self, *keys):
+        return sum(self.store.delete(key) for key in keys)
+
+    def cmd_expire(self, key, seconds):
+        if self.store.get(key) is None:
+            return 0
+        self.store.expires[key] = time.time() + int(seconds)
+        return 1
+
+    # 字符串
+    def cmd_get(self, key):
+        return self.store.get(key, bytes)
+
+    def cmd_set(self, key, value, *options):
+        self.store.delete(key)
+        self.store.data[key] = value
+        options = [option.decode().upper() for option in options]
+        if 'EX' in options:
+            self.store.expires[key] = time.time() + int(options[options.index('EX') + 1])
+        return 'OK'
+
+    # 哈希
+    def cmd_hset(self, key, *pairs):
+        hash_ = self.store.setdefault(key, dict)
+        added = 0
+        for field, value in zip(pairs[::2], pairs[1::2]):
+            added += field not in hash_
+            hash_[field] = value
+        return added
+
+    def cmd_hget(self, key, field):
+        return (self.store.get(key, dict) or {}).get(field)
+
+    def cmd_hgetall(self, key):
+        return [item for pair in (self.store.get(key, dict) or {}).items() for item in pair]
+
+    def cmd_hdel(self, key, *fields):
+        hash_ = self.store.get(key, dict) or {}
+        return sum(hash_.pop(field, None) is not None for field in fields)
+
+    def cmd_hincrby(self, key, field, amount):
+        hash_ = self.store.setdefault(key, dict)
+        value = int(hash_.get(field, b'0')) + int(amount)
+        hash_[field] = str(value).encode()
+        return value
+
+    # 列表（左端为头）
+    def cmd_lpush(self, key, *values):
+        items = self.store.setdefault(key, list)
+        for value in values:
+            items.insert(0, value)
+        return len(items)
+
+    def cmd_rpoplpush(self, source, destination):
+        items = self.store.get(source, list)
+        if not items:
+            return None
+        value = items.pop()
+        self.store.setdefault(destination, list).insert(0, value)
+        return value
+
+    def cmd_lrange(self, key, start, stop):
+        items = self.store.get(key, list) or []
+        start, stop = int(start), int(stop)
+        stop = len(items) + stop if stop < 0 else stop
+        return items[start:stop + 1]
+
+    def cmd_lrem(self, key, count, value):
+        items = self.store.get(key, list) or []
+        count = int(count)
+        removed = 0
+        index = 0
+        while index < len(items):
+            if items[index] == value and (count == 0 or removed < count):
+                items.pop(index)
+                removed += 1
+            else:
+                index += 1
+        return removed
+
+    def cmd_llen(self, key):
+        return len(self.store.get(key, list) or [])
+
+    # 有序集合
+    def cmd_zadd(self, key, *args):
+        flags = set()
+        while args and args[0].upper() in (b'NX', b'XX'):
+            flags.add(args[0].upper())
+            args = args[1:]
+        zset = self.store.setdefault(key, dict)
+        added = 0
+        for score, member in zip(args[::2], args[1::2]):
+            exists = member in zset
+            if (b'NX' in flags and exists) or (b'XX' in flags and not exists):
+                continue
+            added += not exists
+            zset[member] = float(score)
+        return added
+
+    def cmd_zrem(self, key, *members):
+        zset = self.store.get(key, dict) or {}
+        return sum(zset.pop(member, None) is not None for member in members)
+
+    def cmd_zscore(self, key, member):
+        score = (self.store.get(key, dict) or {}).get(member)
+        return None if score is None else repr(score).encode()
+
+    def cmd_zrangebyscore(self, key, low, high):
+        low, high = float(low), float(high)
+        zset = self.store.get(key, dict) or {}
+        return [member for member, score in sorted(zset.items(), key=lambda item: item[1]) if low <= score <= high]
+
+    def cmd_zremrangebyscore(self, key, low, high):
+        low, high = float(low), float(high)
+        zset = self.store.get(key, dict) or {}
+        removed = [member for member, score in zset.items() if low <= score <= high]
+        for member in removed:
+            del zset[member]
+        return len(removed)
+
+    def cmd_zcard(self, key):
+        return len(self.store.get(key, dict) or {})
+
+NIL_ARRAY = object()  # EXEC 时监视的键已被修改
+
+def _encode(reply) -> bytes:
+    if reply is NIL_ARRAY:
+        return b'*-1\r\n'
+    if reply is None:
+        return b'$-1\r\n'
+    if isinstance(reply, Exception):
+        return f"-{reply}\r\n".encode()
+    if isinstance(reply, str):
+        return f"+{reply}\r\n".encode()
+    if isinstance(reply, int):
+        return f":{int(reply)}\r\n".encode()
+    if isinstance(reply, bytes):
+        return b'$%d\r\n%s\r\n' % (len(reply), reply)
+    if isinstance(reply, list):
+        return b'*%d\r\n' % len(reply) + b''.join(_encode(item) for item in reply)
+    raise TypeError(f"无法编码的回复: {reply!r}")
@@ -0,0 +1,76 @@
+"""
+测试分析结果的响应结构和序列化
+"""
+import json
+import numpy as np
+import pytest
+from happygrow.core import analysis_result
+from happygrow.core.analysis_result import AnalysisResult, dumps
+
+class TestAnalysisResult:
+    @pytest.fixture
+    def result(self):
+        """得分和子指标为NumPy标量的分析结果"""
+        scores = {'color_usage': np.float64(0.8), 'composition': np.float32(0.5), 'creativity': np.float64(0.6)}
+        details = {
+            'color_usage': {'unique_colors': np.int64(12), 'harmony_score': np.float32(0.25),
+                            'coverage_score': np.float64(0.9)},
+            'composition': {'thirds_score': np.float64(0.5), 'balance_score': np.float64(0.4),
+                            'focal_score': np.float64(0.3)},
+            'creativity': {'shape_variety': 0.6, 'stroke_expression': np.float64(0.5), 'space_usage': 0.7}
+        }
+        return AnalysisResult('abc', 'uploads/a.jpg', 'school', scores, details, {'256': '/thumbnails/abc?size=256'})
+    
+    @pytest.fixture(params=['orjson', 'json'])
+    def serializer(self, request, monkeypatch):
+        """分别使用 orjson（如已安装）和标准库 json"""
+        if request.param == 'json':
+            monkeypatch.setattr(analysis_result, 'orjson', None)
+        elif analysis_result.orjson is None:
+            pytest.skip('未安装 orjson')
+        return request.param
+    
+    def test_full_response(self, result, serializer):
+        """测试完整响应与原有结构相同"""
+        data = json.loads(result.to_json())
+        assert set(data) == {'scores', 'feedback', 'suggestions', 'image_path', 'image_hash', 'thumbnails'}
+        assert data['scores']['composition'] == pytest.approx(0.5)
+        assert data['feedback']['overall']
+        assert data['thumbnails'] == {'256': '/thumbnails/abc?size=256'}
+    
+    def test_compact_response(self, result, serializer):
+        """测试compact模式只返回数值"""
+        result.duplicate_of = 'def'
+        data = json.loads(result.to_json(compact=True))
+        assert set(data) == {'image_hash', 'scores', 'overall', 'details', 'duplicate_of'}
+        assert data['overall'] == pytest.approx((0.8 + 0.5 + 0.6) / 3)
+        assert data['details']['color_usage'] == {'unique_colors': 12.0, 'harmony_score': 0.25, 'coverage_score': 0.9}
+    
+    def test_optional_fields(self, result, serializer):
+        """测试可选字段只在设置时出现"""
+        result.score_errors = {'color_usage': np.float64(0.01)}
+        result.downgraded = True
+        result.frames = [{'index': np.int64(2), 'scores': {'color_usage': np.float32(0.5)}}]
+        data = json.loads(result.to_json())
+        assert data['score_errors'] == {'color_usage': 0.01}
+        assert data['downgraded'] is True
+        assert data['frames'] == [{'index': 2, 'scores': {'color_usage': 0.5}}]
+    
+    def test_palette(self, result, serializer):
+        """测试主色调只在完整模式返回"""
+        result.palette = [{'color': '#ff0000', 'coverage': np.float64(0.75)}, {'color': '#0000ff', 'coverage': 0.25}]
+        data = json.loads(result.to_json())
+        assert data['palette'] == [{'color': '#ff0000', 'coverage': 0.75}, {'color': '#0000ff', 'coverage': 0.25}]
+        assert 'palette' not in json.loads(result.to_json(compact=True))
+    
+    def test_dumps_numpy(self, serializer):
+        """测试直接序列化NumPy标量和数组"""
+        data = json.loads(dumps({'a': np.float32(0.5), 'b': np.int64(3), 'c': np.arange(3), 'd': np.bool_(True)}))
+        assert data == {'a': 0.5, 'b': 3, 'c': [0, 1, 2], 'd': True}
+        with pytest.raises(TypeError):
+            dumps({'a': object()})
+    
+    def test_slots(self, result):
+        """测试不能设置未声明的属性"""
+        with pytest.raises(AttributeError):
+            result.extra = 1
@@ -0,0 +1,47 @@
+"""
+测试可向量化的子指标
+"""
+import numpy as np
+import pytest
+from scipy import ndimage
+from happygrow.core import batch_metrics
+from happygrow.core.scoring_engine import ScoringEngine
+from test_duplicate_index import create_drawing
+
+class TestBatchMetrics:
+    def test_sobel_matches_ndimage(self):
+        """测试批量Sobel与逐张 ndimage.sobel 结果相同"""
+        stack = np.random.default_rng(0).random((3, 40, 50)) * 255
+        edges = batch_metrics.sobel_edges(stack)
+        for image, image_edges in zip(stack, edges):
+            assert np.array_equal(image_edges, ndimage.sobel(image))
+    
+    def test_stroke_expression_matches_generic_filter(self):
+        """测试均值滤波计算的局部标准差与逐窗口 np.std 一致"""
+        gray = np.random.default_rng(1).integers(0, 256, (60, 60)).astype(np.float64)
+        expected = min(1.0, np.mean(ndimage.generic_filter(gray, np.std, size=5)) / 128 * 2)
+        assert float(batch_metrics.stroke_expression(gray)) == pytest.approx(expected, abs=1e-9)
+    
+    def test_batch_matches_single_image(self):
+        """测试批量计算与逐张计算的子指标相同"""
+        images = [create_drawing(seed, size=300) for seed in range(3)]
+        images.append(images[0].resize((200, 240)))
+        
+        batch = ScoringEngine.compute_batch_metrics(images)
+        for image, metrics in zip(images, batch):
+            assert metrics == ScoringEngine(image).compute_metrics()
+    
+    def test_blank_image_balance(self):
+        """测试纯白画面视为完全平衡"""
+        blank = np.full((2, 50, 50, 3), 255, dtype=np.uint8)
+        assert np.array_equal(batch_metrics.balance(batch_metrics.content_counts(blank)), [1.0, 1.0])
+    
+    def test_apply_in_strips(self):
+        """测试分条滤波与整幅滤波结果一致"""
+        gray = np.random.default_rng(2).random((103, 40)) * 255
+        calls = []
+        for function, halo in [(batch_metrics.sobel_edges, 1), (batch_metrics.local_std, 2),
+                               (lambda a: batch_metrics.focal_map(a, 8), 5)]:
+            stripped = batch_metrics.apply_in_strips(function, gray, halo, 10, lambda: calls.append(1))
+            assert np.allclose(stripped, function(gray), rtol=0, atol=1e-9)
+        assert len(calls) == 3 * 11
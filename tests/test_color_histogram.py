@@ -0,0 +1,67 @@
+"""
+测试颜色直方图
+"""
+import numpy as np
+import pytest
+from happygrow.core.color_histogram import ColorHistogram, pack_rgb, unpack_rgb
+
+def make_image(colors, counts, width=10):
+    """按颜色和像素数构造图像数组"""
+    pixels = np.repeat(np.array(colors, dtype=np.uint8), counts, axis=0)
+    return pixels.reshape(-1, width, 3)
+
+class TestColorHistogram:
+    def test_pack_roundtrip(self):
+        """测试打包与还原互逆"""
+        pixels = np.array([[0, 0, 0], [255, 128, 1], [17, 200, 99]], dtype=np.uint8)
+        assert np.array_equal(unpack_rgb(pack_rgb(pixels, 8), 8), pixels)
+    
+    def test_counts(self):
+        """测试颜色计数"""
+        rgb = make_image([(255, 0, 0), (0, 0, 255), (0, 255, 0)], [50, 30, 20])
+        histogram = ColorHistogram.from_rgb(rgb)
+        
+        assert len(histogram) == 3
+        assert histogram.total == 100
+        counts = dict(zip(map(tuple, histogram.rgb_colors().tolist()), histogram.counts.tolist()))
+        assert counts == {(255, 0, 0): 50, (0, 0, 255): 30, (0, 255, 0): 20}
+    
+    def test_dense_and_sparse_agree(self):
+        """测试稠密统计（低位深）与排序统计（全位深）结果一致"""
+        rgb = np.random.default_rng(0).integers(0, 256, (40, 50, 3), dtype=np.uint8)
+        dense = ColorHistogram.from_rgb(rgb, bits=5)
+        reduced = ColorHistogram.from_rgb(rgb, bits=8).reduce(5)
+        
+        assert np.array_equal(dense.keys, reduced.keys)
+        assert np.array_equal(dense.counts, reduced.counts)
+    
+    def test_unique_count_ignores_noise(self):
+        """测试占比过低的噪声颜色不计入"""
+        rgb = make_image([(255, 0, 0), (0, 0, 255), (1, 2, 3)], [500, 499, 1])
+        histogram = ColorHistogram.from_rgb(rgb)
+        
+        assert histogram.unique_count() == 3
+        assert histogram.unique_count(min_fraction=0.01) == 2
+    
+    def test_median_cut_coverage(self):
+        """测试中位切分覆盖全部像素"""
+        rgb = np.random.default_rng(1).integers(0, 256, (40, 50, 3), dtype=np.uint8)
+        palette = ColorHistogram.from_rgb(rgb, bits=5).median_cut(8)
+        
+        assert len(palette) == 8
+        assert sum(coverage for _, coverage in palette) == pytest.approx(1.0)
+    
+    def test_palette_merges_similar_colors(self):
+        """测试细化后相近颜色归为同一主色调"""
+        rgb = make_image([(250, 10, 10), (245, 12, 8), (10, 10, 240), (240, 240, 240)], [300, 300, 200, 200])
+        palette = ColorHistogram.from_rgb(rgb).palette(3)
+        
+        assert len(palette) == 3
+        assert sum(coverage for _, coverage in palette) == pytest.approx(1.0)
+        assert palette[0][1] == pytest.approx(0.6)
+        assert palette[0][0][0] > 200 and palette[0][0][2] < 50
+    
+    def test_median_cut_fewer_colors_than_palette(self):
+        """测试颜色数少于主色调数量"""
+        rgb = make_image([(0, 0, 0)], [100])
+        assert ColorHistogram.from_rgb(rgb).median_cut(8) == [((0, 0, 0), 1.0)]
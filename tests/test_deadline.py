@@ -0,0 +1,64 @@
+"""
+测试评分截止时间
+"""
+import time
+import pytest
+from happygrow.core.deadline import Deadline, ScoringTimeout
+from happygrow.core.scoring_engine import ScoringEngine
+from test_duplicate_index import create_drawing
+
+class CountingDeadline(Deadline):
+    """允许指定次数的检查后超时"""
+    def __init__(self, allowed_checks):
+        super().__init__(None)
+        self.allowed_checks = allowed_checks
+        self.checks = 0
+    
+    def check(self):
+        self.checks += 1
+        if self.checks > self.allowed_checks:
+            raise ScoringTimeout()
+
+class TestDeadline:
+    def test_expiry(self):
+        """测试超时后检查点抛出异常"""
+        deadline = Deadline(0.01)
+        deadline.check()
+        assert deadline.remaining() > 0
+        time.sleep(0.02)
+        assert deadline.expired()
+        assert deadline.remaining() == 0
+        with pytest.raises(ScoringTimeout):
+            deadline.check()
+    
+    def test_unlimited(self):
+        """测试不限时"""
+        deadline = Deadline(None)
+        assert deadline.remaining() is None
+        assert not deadline.expired()
+        deadline.check()
+    
+    def test_partial_scores(self):
+        """测试超时时带回已完成维度的得分"""
+        image = create_drawing(0, size=300)
+        engine = ScoringEngine(image, deadline=CountingDeadline(allowed_checks=4))
+        
+        with pytest.raises(ScoringTimeout) as info:
+            engine.analyze()
+        
+        assert list(info.value.scores) == ['color_usage']
+        expected, _ = ScoringEngine(image).analyze_color_usage()
+        assert info.value.scores['color_usage'] == pytest.approx(expected)
+    
+    def test_checks_between_tiles(self, monkeypatch):
+        """测试大图在分条滤波之间检查截止时间"""
+        from happygrow.config.config import DEADLINE_CONFIG
+        monkeypatch.setitem(DEADLINE_CONFIG, 'tile_min_pixels', 0)
+        monkeypatch.setitem(DEADLINE_CONFIG, 'tile_rows', 50)
+        image = create_drawing(1, size=400)
+        
+        deadline = CountingDeadline(allowed_checks=10 ** 6)
+        metrics = ScoringEngine(image, deadline=deadline).compute_metrics()
+        # 9个子指标各检查一次，另有边缘、焦点、笔触滤波各8条
+        assert deadline.checks == 9 + 3 * 8
+        assert metrics == pytest.approx(ScoringEngine(image).compute_metrics(), abs=1e-9)
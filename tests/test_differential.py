@@ -0,0 +1,81 @@
+"""
+测试评分引擎与参考实现的差分比较
+"""
+import os
+import random
+import numpy as np
+import pytest
+from PIL import Image
+from happygrow.config.config import DIFFERENTIAL_CONFIG
+from happygrow.core import reference_metrics
+from happygrow.core.differential import (
+    generate_corpus, generate_drawing, load_corpus, run_differential
+)
+from happygrow.core.scoring_engine import ScoringEngine
+
+# 提交在仓库中的真实儿童画（已缩小到最长边96像素，含JPEG和灰度图）
+FIXTURE_DIR = os.path.join(os.path.dirname(__file__), 'fixtures', 'drawings')
+
+@pytest.fixture(scope='module')
+def corpus():
+    """随机生成的画、边界情况和固定的真实图像（缩小以控制参考实现的耗时）"""
+    return generate_corpus(12, DIFFERENTIAL_CONFIG['seed'], 96) + load_corpus(FIXTURE_DIR, 96)
+
+class TestDifferential:
+    def test_exact_mode_matches_reference(self, corpus):
+        """测试精确模式的全部子指标在容差内与参考实现一致"""
+        report = run_differential(corpus)
+        assert report.passed, report.format()
+        assert report.cases == len(corpus)
+        assert len(load_corpus(FIXTURE_DIR, 96)) == 5
+        assert set(report.metrics) == set(reference_metrics.REFERENCE_METRICS)
+    
+    def test_fast_mode_within_tolerance(self):
+        """测试快速模式的抽样估计在容差内（图像足够大时才会抽样）"""
+        corpus = generate_corpus(6, 1, 300)
+        report = run_differential(corpus, mode='fast',
+                                  names=['unique_colors', 'harmony_score', 'coverage_score', 'space_usage'])
+        assert report.passed, report.format()
+    
+    def test_generated_drawings_are_reproducible(self):
+        """测试同一种子生成相同的画，且尺寸在范围内"""
+        first = generate_drawing(random.Random('seed'), 80)
+        second = generate_drawing(random.Random('seed'), 80)
+        assert np.array_equal(np.asarray(first), np.asarray(second))
+        assert 16 <= min(first.size) and max(first.size) <= 80
+    
+    def test_random_images_properties(self):
+        """测试随机生成图像上的基本性质：与参考实现一致、取值范围、与图像来源（PIL或数组）无关"""
+        for index in range(8):
+            image = generate_drawing(random.Random(f"property-{index}"), 64)
+            metrics = ScoringEngine(image).compute_metrics()
+            from_array = ScoringEngine(np.asarray(image)).compute_metrics()
+            for name, compute in reference_metrics.REFERENCE_METRICS.items():
+                assert metrics[name] == pytest.approx(compute(image), abs=1e-9), name
+                assert from_array[name] == pytest.approx(metrics[name], abs=1e-12), name
+                if name != 'unique_colors':
+                    assert 0 <= metrics[name] <= 1, name
+    
+    def test_detects_deviation(self, corpus):
+        """测试候选实现偏离时报告失败用例和最大偏差"""
+        class Broken(ScoringEngine):
+            def _calculate_color_coverage(self):
+                return super()._calculate_color_coverage() * 0.5
+        
+        report = run_differential(corpus[:8], candidate=lambda image, mode: Broken(image, mode=mode),
+                                  names=['coverage_score', 'thirds_score'])
+        assert not report.passed
+        assert set(report.failures()) == {'coverage_score'}
+        assert report.metrics['coverage_score'].max_deviation > 0
+        assert report.to_dict()['metrics']['coverage_score']['failures']
+        assert 'coverage_score' in report.format()
+    
+    def test_load_corpus_skips_invalid_files(self, tmp_path):
+        """测试读取真实图像目录时缩小图像并跳过无效文件"""
+        Image.new('RGB', (400, 200), 'white').save(tmp_path / 'drawing.png')
+        (tmp_path / 'broken.jpg').write_bytes(b'not an image')
+        (tmp_path / 'notes.txt').write_text('x')
+        corpus = load_corpus(tmp_path, 100)
+        assert [name for name, _ in corpus] == ['drawing.png']
+        assert corpus[0][1].size == (100, 50)
+        assert load_corpus(tmp_path / 'missing', 100) == []
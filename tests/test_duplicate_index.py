@@ -0,0 +1,88 @@
+"""
+测试感知哈希和近似重复索引
+"""
+import io
+import random
+import pytest
+from PIL import Image, ImageDraw
+from happygrow.services.duplicate_index import dhash, hamming_distance, BKTree, DuplicateIndex
+
+def create_drawing(seed, size=400):
+    """创建随机图形组成的测试画作"""
+    rng = random.Random(seed)
+    image = Image.new('RGB', (size, size), 'white')
+    draw = ImageDraw.Draw(image)
+    for _ in range(12):
+        x0, y0 = rng.randrange(size), rng.randrange(size)
+        x1, y1 = x0 + rng.randrange(20, size // 2), y0 + rng.randrange(20, size // 2)
+        color = tuple(rng.randrange(256) for _ in range(3))
+        draw.ellipse([x0, y0, x1, y1], fill=color)
+    return image
+
+class TestPerceptualHash:
+    def test_resized_and_recompressed_are_close(self):
+        """测试缩放和重新压缩后哈希接近"""
+        original = create_drawing(1)
+        buf = io.BytesIO()
+        original.resize((250, 250)).save(buf, 'JPEG', quality=60)
+        buf.seek(0)
+        variant = Image.open(buf)
+        
+        assert hamming_distance(dhash(original), dhash(variant)) <= 6
+    
+    def test_different_drawings_are_far(self):
+        """测试不同画作哈希差异较大"""
+        assert hamming_distance(dhash(create_drawing(1)), dhash(create_drawing(2))) > 10
+
+class TestBKTree:
+    def test_search_matches_brute_force(self):
+        """测试BK树查询结果与暴力搜索一致"""
+        rng = random.Random(0)
+        values = [rng.getrandbits(64) for _ in range(300)]
+        tree = BKTree()
+        for i, value in enumerate(values):
+            tree.add(value, str(i))
+        
+        query = values[17] ^ 0b1011
+        expected = sorted(
+            (hamming_distance(query, value), str(i))
+            for i, value in enumerate(values)
+            if hamming_distance(query, value) <= 12
+        )
+        assert tree.search(query, 12) == expected
+        assert len(tree) == 300
+    
+    def test_empty_tree(self):
+        """测试空树查询"""
+        assert BKTree().search(0, 5) == []
+
+class TestDuplicateIndex:
+    @pytest.fixture
+    def index(self):
+        return DuplicateIndex(max_distance=6)
+    
+    def test_find_nearest(self, index):
+        """测试返回最接近的图像"""
+        value = dhash(create_drawing(3))
+        index.add(value, 'a')
+        index.add(value ^ 0b111, 'b')
+        
+        assert index.find(value ^ 0b1) == (1, 'a')
+        assert index.find(value ^ ((1 << 40) - 1)) is None
+    
+    def test_blank_images_not_matched(self, index):
+        """测试接近空白的画面不参与近似匹配"""
+        blank = dhash(Image.new('RGB', (300, 300), 'white'))
+        index.add(blank, 'blank')
+        assert index.find(blank) is None
+    
+    def test_report(self, index):
+        """测试重复率统计"""
+        index.record_lookup(exact=True)
+        index.record_lookup(near=True)
+        index.record_lookup()
+        index.record_lookup()
+        
+        report = index.report()
+        assert report['lookups'] == 4
+        assert report['duplicate_rate'] == 0.5
@@ -105,3 +105,10 @@ class TestFeedbackGenerator:
         
         # 应该默认使用 school 年龄组的模板
         assert feedback['encouragement']
+    
+    def test_is_stable(self, sample_scores):
+        """测试误差范围是否跨越反馈分档阈值"""
+        assert FeedbackGenerator.is_stable(sample_scores, {'color_usage': (0.86, 0.88)}, {})
+        assert not FeedbackGenerator.is_stable(sample_scores, {'color_usage': (0.84, 0.86)}, {})
+        assert not FeedbackGenerator.is_stable(sample_scores, {}, {'unique_colors': (9, 12)})
+        assert FeedbackGenerator.is_stable(sample_scores, {}, {'unique_colors': (12, 15)})
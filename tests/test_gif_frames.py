@@ -0,0 +1,71 @@
+"""
+测试动图帧的按需解码与合成
+"""
+import io
+import numpy as np
+import pytest
+from PIL import Image
+from happygrow.services.gif_frames import GifFrameDecoder, FrameLimitExceeded
+
+def _animation(frame_count=12, disposal=0, optimize=True):
+    """逐帧增加笔画的动图（优化后除第一帧外都是局部更新）"""
+    canvas = np.full((60, 80, 3), 255, dtype=np.uint8)
+    frames = []
+    for i in range(frame_count):
+        canvas = canvas.copy()
+        canvas[i * 5:i * 5 + 5, :i * 6 + 6] = (i * 20, 100, 200 - i * 10)
+        frames.append(Image.fromarray(canvas))
+    buffer = io.BytesIO()
+    frames[0].save(buffer, 'GIF', save_all=True, append_images=frames[1:], disposal=disposal, optimize=optimize)
+    return buffer.getvalue()
+
+class TestGifFrameDecoder:
+    @pytest.mark.parametrize('disposal,optimize', [(0, True), (1, False), (2, True)])
+    def test_render_matches_pillow(self, disposal, optimize):
+        """测试逐帧合成的画面与Pillow顺序解码的结果相同"""
+        data = _animation(disposal=disposal, optimize=optimize)
+        decoder = GifFrameDecoder.open(io.BytesIO(data), max_frames=100, max_decoded_frames=100)
+        rendered = decoder.render(list(range(len(decoder.frames))))
+        
+        reference = Image.open(io.BytesIO(data))
+        for index in range(reference.n_frames):
+            reference.seek(index)
+            assert np.array_equal(np.asarray(rendered[index]), np.asarray(reference.convert('RGB')))
+    
+    def test_keyframes_skip_earlier_frames(self):
+        """测试整幅不透明的帧之前的帧不需要解码"""
+        data = _animation(disposal=2)  # 每帧都覆盖整个画布
+        decoder = GifFrameDecoder.open(io.BytesIO(data), max_frames=100, max_decoded_frames=100)
+        
+        decoder.render([11])
+        
+        assert decoder.plan([11]) == [11]
+        assert decoder.decoded == 1
+    
+    def test_decoded_frames_are_cached(self):
+        """测试同一帧只解码一次（缓存调色板索引）"""
+        decoder = GifFrameDecoder.open(io.BytesIO(_animation()), max_frames=100, max_decoded_frames=100)
+        
+        decoder.render([5])
+        decoder.render([3, 7])
+        
+        assert decoder.decoded == 8
+    
+    def test_decode_limit(self):
+        """测试合成所需帧数超过上限时拒绝，代表帧取上限内能合成的最后一帧"""
+        decoder = GifFrameDecoder.open(io.BytesIO(_animation()), max_frames=100, max_decoded_frames=4)
+        
+        with pytest.raises(FrameLimitExceeded):
+            decoder.render([11])
+        assert decoder.decoded == 0
+        assert decoder.representative() == 3
+    
+    def test_sample_within_limit(self):
+        """测试抽样帧包含代表帧且总解码帧数不超过上限"""
+        decoder = GifFrameDecoder.open(io.BytesIO(_animation()), max_frames=100, max_decoded_frames=100)
+        assert decoder.sample(4) == [0, 4, 7, 11]
+        
+        limited = GifFrameDecoder.open(io.BytesIO(_animation()), max_frames=100, max_decoded_frames=6)
+        samples = limited.sample(4)
+        assert limited.representative() in samples
+        assert len(limited.plan(samples)) <= 6
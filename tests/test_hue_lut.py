@@ -0,0 +1,48 @@
+"""
+测试色相查找表
+"""
+import colorsys
+import numpy as np
+from happygrow.core.color_histogram import pack_rgb
+from happygrow.core.hue_lut import (build_hue_lut, load_hue_lut, rgb_to_hsv_arrays,
+                                    HUE, SATURATION_BIN)
+
+class TestHueLut:
+    def test_hsv_matches_colorsys(self):
+        """测试向量化HSV转换与 colorsys 结果一致"""
+        rgb = np.random.default_rng(0).integers(0, 256, (5000, 3))
+        rgb[:100] = rgb[:100, :1]  # 包含灰色
+        h, s, v = rgb_to_hsv_arrays(rgb)
+        expected = np.array([colorsys.rgb_to_hsv(r / 255, g / 255, b / 255) for r, g, b in rgb.tolist()])
+        
+        assert np.array_equal(h, expected[:, 0])
+        assert np.array_equal(s, expected[:, 1])
+        assert np.array_equal(v, expected[:, 2])
+    
+    def test_lut_entries(self):
+        """测试查找表内容"""
+        lut = build_hue_lut(4, saturation_bins=4, value_bins=4)
+        colors = np.array([[15, 0, 0], [0, 15, 0], [0, 0, 15], [0, 0, 0]])
+        entries = lut[pack_rgb(colors, 4)]
+        
+        assert entries[:3, HUE].tolist() == [0, 120, 240]
+        assert entries[:3, SATURATION_BIN].tolist() == [3, 3, 3]
+        assert entries[3].tolist() == [0, 0, 0]
+    
+    def test_load_builds_and_maps(self, tmp_path):
+        """测试首次加载构建文件，之后以只读内存映射复用"""
+        lut = load_hue_lut(tmp_path, 3, 4, 4)
+        
+        assert isinstance(lut, np.memmap)
+        assert not lut.flags.writeable
+        assert lut.shape == (512, 3)
+        assert load_hue_lut(tmp_path, 3, 4, 4) is lut
+        assert len(list(tmp_path.glob('*.npy'))) == 1
+    
+    def test_load_rebuilds_corrupted_file(self, tmp_path):
+        """测试损坏的查找表文件会被重新构建"""
+        path = tmp_path / 'hue_lut_b2_s4_v4.npy'
+        np.save(path, np.zeros((3, 3), dtype=np.uint16))
+        
+        lut = load_hue_lut(tmp_path, 2, 4, 4)
+        assert lut.shape == (64, 3)
@@ -0,0 +1,117 @@
+"""
+测试解码前的图像防护
+"""
+import io
+import struct
+import zlib
+import pytest
+from PIL import Image
+from happygrow.services.image_guard import (
+    HeaderInfo, ImageRejected, MemoryBudget, MemoryBudgetExceeded, check_pixel_budget, inspect_header
+)
+
+def _chunk(chunk_type: bytes, data: bytes) -> bytes:
+    return struct.pack('>I', len(data)) + chunk_type + data + struct.pack('>I', zlib.crc32(chunk_type + data))
+
+def _png_header(width: int, height: int, extra: bytes = b'') -> io.BytesIO:
+    """只含文件头和辅助块的PNG（没有像素数据也能解析尺寸）"""
+    ihdr = struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0)
+    data = b'\x89PNG\r\n\x1a\n' + _chunk(b'IHDR', ihdr) + extra + _chunk(b'IDAT', b'') + _chunk(b'IEND', b'')
+    return io.BytesIO(data)
+
+class TestInspectHeader:
+    def test_png_dimensions_without_decoding(self):
+        """测试从IHDR读取尺寸（声明 100000x100000 的文件头不会被解码）"""
+        info = inspect_header(_png_header(100000, 100000), max_metadata_chunk=1024, max_frames=10)
+        
+        assert (info.format, info.size, info.frames) == ('PNG', (100000, 100000), 1)
+    
+    def test_apng_frame_count(self):
+        """测试从acTL块读取APNG帧数"""
+        actl = _chunk(b'acTL', struct.pack('>II', 42, 0))
+        info = inspect_header(_png_header(64, 64, actl), max_metadata_chunk=1024, max_frames=10)
+        
+        assert info.frames == 42
+    
+    def test_oversized_metadata_chunk_rejected(self):
+        """测试过大的压缩元数据块被拒绝"""
+        ztxt = _chunk(b'zTXt', b'Comment\x00\x00' + b'x' * 2048)
+        
+        with pytest.raises(ImageRejected):
+            inspect_header(_png_header(64, 64, ztxt), max_metadata_chunk=1024, max_frames=10)
+    
+    def test_gif_frames_and_canvas(self):
+        """测试遍历GIF块结构统计帧数"""
+        frames = [Image.new('RGB', (40, 30), color=(i * 40, 0, 0)) for i in range(5)]
+        buffer = io.BytesIO()
+        frames[0].save(buffer, 'GIF', save_all=True, append_images=frames[1:])
+        
+        info = inspect_header(buffer, max_metadata_chunk=1024, max_frames=10)
+        
+        assert (info.format, info.size, info.frames) == ('GIF', (40, 30), 5)
+        assert buffer.tell() == 0
+    
+    def test_gif_frame_counting_stops_at_limit(self):
+        """测试帧数超过上限后不再继续遍历"""
+        frames = [Image.new('RGB', (8, 8), color=(i * 10, 0, 0)) for i in range(20)]
+        buffer = io.BytesIO()
+        frames[0].save(buffer, 'GIF', save_all=True, append_images=frames[1:])
+        
+        info = inspect_header(buffer, max_metadata_chunk=1024, max_frames=3)
+        
+        assert info.frames == 4
+    
+    def test_jpeg_uses_pillow_header(self):
+        """测试其他格式由Pillow读取文件头"""
+        buffer = io.BytesIO()
+        Image.new('RGB', (120, 80)).save(buffer, 'JPEG')
+        
+        info = inspect_header(buffer, max_metadata_chunk=1024, max_frames=10)
+        
+        assert (info.format, info.size) == ('JPEG', (120, 80))
+    
+    def test_invalid_file(self):
+        """测试无效文件"""
+        with pytest.raises(ImageRejected):
+            inspect_header(io.BytesIO(b'not an image'), max_metadata_chunk=1024, max_frames=10)
+
+class TestPixelBudget:
+    def test_pixel_budget(self):
+        """测试单帧像素数、帧数和总像素数限制"""
+        assert check_pixel_budget(HeaderInfo('PNG', 100, 100), 10000, 10, 100000) is None
+        assert check_pixel_budget(HeaderInfo('PNG', 101, 100), 10000, 10, 100000) is not None
+        assert check_pixel_budget(HeaderInfo('GIF', 10, 10, 11), 10000, 10, 100000) is not None
+        assert check_pixel_budget(HeaderInfo('GIF', 100, 100, 10), 10000, 10, 50000) is not None
+
+class TestMemoryBudget:
+    @pytest.fixture
+    def budget(self):
+        """创建内存预算：2048x2048 的JPEG完整处理约需 4*4M + 60*4M 字节"""
+        return MemoryBudget(350 * 1024 * 1024, 4, 60, analysis_max_size=2048, draft_max_size=1024)
+    
+    def test_admit_and_release(self, budget):
+        """测试预留和释放"""
+        reservation, draft_size = budget.admit(HeaderInfo('PNG', 2048, 2048))
+        
+        assert draft_size is None
+        assert budget.report()['used'] == reservation.nbytes
+        reservation.release()
+        reservation.release()
+        assert budget.report()['used'] == 0
+    
+    def test_jpeg_downgraded_to_draft(self, budget):
+        """测试预算不足时JPEG降级为草稿解码"""
+        first, _ = budget.admit(HeaderInfo('JPEG', 2048, 2048))
+        second, draft_size = budget.admit(HeaderInfo('JPEG', 2048, 2048))
+        
+        assert draft_size == 1024
+        assert second.nbytes < first.nbytes
+        assert budget.report()['downgraded'] == 1
+    
+    def test_rejected_when_exhausted(self, budget):
+        """测试无法降级的格式在预算不足时被拒绝"""
+        budget.admit(HeaderInfo('PNG', 2048, 2048))
+        
+        with pytest.raises(MemoryBudgetExceeded):
+            budget.admit(HeaderInfo('PNG', 2048, 2048))
+        assert budget.report()['rejected'] == 1
@@ -143,6 +143,7 @@ class TestImageService:
         processed = ImageService.preprocess_image(file)
         assert processed.size[0] <= IMAGE_CONFIG['max_width']
         assert processed.size[1] <= IMAGE_CONFIG['max_height']
+        assert max(processed.size) == IMAGE_CONFIG['analysis_max_size']
     
     def test_preprocess_image_invalid(self):
         """测试处理无效图像"""
@@ -172,3 +173,31 @@ class TestImageService:
         assert path1 != path2
         assert os.path.exists(path1)
         assert os.path.exists(path2)
+    
+    def test_generate_thumbnails(self, tmp_path):
+        """测试生成各尺寸缩略图"""
+        image = Image.new('RGB', (2000, 1000), 'white')
+        renditions = ImageService.generate_thumbnails(image, 'ab' * 32, str(tmp_path))
+        
+        for size, paths in renditions.items():
+            assert 'jpeg' in paths
+            for path in paths.values():
+                with Image.open(path) as thumb:
+                    assert thumb.size == (size, size // 2)
+    
+    def test_generate_thumbnails_skips_existing(self, tmp_path):
+        """测试已存在的缩略图不会重新生成"""
+        image = Image.new('RGB', (600, 600), 'white')
+        first = ImageService.generate_thumbnails(image, 'cd' * 32, str(tmp_path))
+        mtime = os.path.getmtime(first[256]['jpeg'])
+        
+        second = ImageService.generate_thumbnails(image, 'cd' * 32, str(tmp_path))
+        assert os.path.getmtime(second[256]['jpeg']) == mtime
+    
+    def test_small_image_not_upscaled(self, tmp_path):
+        """测试小图不会被放大"""
+        image = Image.new('RGB', (300, 200), 'white')
+        renditions = ImageService.generate_thumbnails(image, 'ef' * 32, str(tmp_path))
+        
+        with Image.open(renditions[1024]['jpeg']) as thumb:
+            assert thumb.size == (300, 200)
@@ -4,7 +4,8 @@ HappyGrow 系统集成测试
 import pytest
 import os
 import io
-from PIL import Image
+import gzip
+from PIL import Image, features
 from flask.testing import FlaskClient
 from app import app
 
@@ -16,6 +17,18 @@ class TestHappyGrowIntegration:
         with app.test_client() as client:
             yield client
     
+    @pytest.fixture(autouse=True)
+    def uploads_cleanup(self):
+        """测试结束后删除测试期间写入上传目录的归档图像和缩略图"""
+        import app as app_module
+        
+        def listing():
+            return {os.path.join(root, name) for root, _, names in os.walk(app_module.UPLOAD_FOLDER) for name in names}
+        before = listing()
+        yield
+        for path in listing() - before:
+            os.remove(path)
+    
     @pytest.fixture
     def test_image(self):
         """创建测试图像"""
@@ -156,3 +169,416 @@ class TestHappyGrowIntegration:
         
         # 清理测试文件
         os.remove(saved_path)
+    
+    def test_analyze_near_duplicate_reuses_result(self, client):
+        """测试缩放后的重复上传复用已有评分"""
+        from test_duplicate_index import create_drawing
+        original = create_drawing(os.getpid(), size=600)
+        uploads = []
+        for image in (original, original.resize((300, 300))):
+            img_io = io.BytesIO()
+            image.save(img_io, 'JPEG', quality=80)
+            img_io.seek(0)
+            response = client.post('/analyze', data={'file': (img_io, 'dup.jpg'), 'age_group': 'school'},
+                                   content_type='multipart/form-data')
+            assert response.status_code == 200
+            uploads.append(response.get_json())
+        
+        assert 'duplicate_of' in uploads[1]
+        assert uploads[1]['scores'] == pytest.approx(uploads[0]['scores'])
+        assert uploads[1]['image_path'] == uploads[0]['image_path']
+        
+        stats = client.get('/stats/duplicates').get_json()
+        assert stats['lookups'] >= 2
+        
+        os.remove(os.path.join(app.root_path, uploads[0]['image_path']))
+    
+    @pytest.mark.skipif(not features.check('webp'), reason='Pillow 未编译 WebP 支持')
+    def test_thumbnail_endpoint(self, client, test_image):
+        """测试缩略图尺寸协商、格式协商和条件请求"""
+        response = client.post('/analyze', data={'file': (test_image, 'test.png'), 'age_group': 'school'},
+                               content_type='multipart/form-data')
+        json_data = response.get_json()
+        url = json_data['thumbnails']['256']
+        
+        response = client.get(url, headers={'Accept': 'image/webp'})
+        assert response.status_code == 200
+        assert response.mimetype == 'image/webp'
+        assert 'immutable' in response.headers['Cache-Control']
+        etag = response.headers['ETag']
+        
+        response = client.get(url, headers={'Accept': 'image/webp', 'If-None-Match': etag})
+        assert response.status_code == 304
+        
+        response = client.get(url)
+        assert response.mimetype == 'image/jpeg'
+        
+        assert client.get('/thumbnails/not-a-hash').status_code == 400
+        assert client.get('/thumbnails/' + '0' * 64).status_code == 404
+    
+    def test_analyze_stream(self, client, test_image):
+        """测试渐进式分析按维度依次返回事件，最后返回反馈"""
+        import json
+        response = client.post('/analyze/stream', data={'file': (test_image, 'test.png'), 'age_group': 'school'},
+                               content_type='multipart/form-data')
+        assert response.status_code == 200
+        assert response.mimetype == 'text/event-stream'
+        
+        events = []
+        for message in response.get_data(as_text=True).strip().split('\n\n'):
+            event_line, data_line = message.split('\n')
+            events.append((event_line[len('event: '):], json.loads(data_line[len('data: '):])))
+        
+        assert [event for event, _ in events] == ['dimension', 'dimension', 'dimension', 'feedback']
+        assert [data['dimension'] for _, data in events[:3]] == ['color_usage', 'composition', 'creativity']
+        assert 'unique_colors' in events[0][1]['details']
+        result = events[-1][1]
+        assert result['scores'] == pytest.approx({data['dimension']: data['score'] for _, data in events[:3]})
+        assert 'overall' in result['feedback']
+        
+        response = client.post('/analyze/stream', data={})
+        assert response.status_code == 400
+    
+    def test_lookup_by_client_hash(self, client):
+        """测试网页端缩小上传后，可按原始文件哈希在上传前命中已有结果"""
+        import hashlib
+        from test_duplicate_index import create_drawing
+        original = create_drawing(os.getpid() + 1, size=600)
+        original_io = io.BytesIO()
+        original.save(original_io, 'PNG')
+        client_hash = hashlib.sha256(original_io.getvalue()).hexdigest()
+        
+        assert client.get(f'/results/{client_hash}').status_code == 404
+        assert client.get('/results/not-a-hash').status_code == 400
+        
+        resized_io = io.BytesIO()
+        original.resize((300, 300)).save(resized_io, 'JPEG', quality=85)
+        resized_io.seek(0)
+        response = client.post('/analyze', data={'file': (resized_io, 'resized.jpg'), 'age_group': 'school',
+                                                 'client_hash': client_hash},
+                               content_type='multipart/form-data')
+        uploaded = response.get_json()
+        
+        response = client.get(f'/results/{client_hash}?age_group=school')
+        assert response.status_code == 200
+        json_data = response.get_json()
+        assert json_data['image_hash'] == uploaded['image_hash']
+        assert json_data['scores'] == pytest.approx(uploaded['scores'])
+        
+        # 其他图像使用同一客户端哈希不会改写已有的别名
+        other_io = io.BytesIO()
+        create_drawing(os.getpid() + 2, size=300).save(other_io, 'JPEG', quality=85)
+        other_io.seek(0)
+        other = client.post('/analyze', data={'file': (other_io, 'other.jpg'), 'age_group': 'school',
+                                              'client_hash': client_hash},
+                            content_type='multipart/form-data').get_json()
+        assert other['image_hash'] != uploaded['image_hash']
+        assert client.get(f'/results/{client_hash}').get_json()['image_hash'] == uploaded['image_hash']
+        
+        os.remove(os.path.join(app.root_path, uploaded['image_path']))
+        os.remove(os.path.join(app.root_path, other['image_path']))
+    
+    def test_scheduler_stats(self, client, test_image):
+        """测试调度统计包含预估与实际耗时"""
+        client.post('/analyze', data={'file': (test_image, 'test.png'), 'age_group': 'school'},
+                    content_type='multipart/form-data')
+        
+        report = client.get('/stats/scheduler').get_json()
+        small = report['lanes']['small']
+        assert small['completed'] >= 1
+        assert small['mean_estimated'] > 0
+        assert small['mean_actual'] > 0
+        assert 'calibrated_cost_model' in report
+    
+    def test_memory_stats(self, client, test_image):
+        """测试评分结束后内存预留已释放"""
+        client.post('/analyze', data={'file': (test_image, 'test.png'), 'age_group': 'school'},
+                    content_type='multipart/form-data')
+        
+        report = client.get('/stats/memory').get_json()
+        assert report['admitted'] >= 1
+        assert report['used'] == 0
+        assert report['peak'] > 0
+    
+    def test_analyze_selected_dimensions(self, client, test_image):
+        """测试只评分请求的维度，未知维度返回400"""
+        data = test_image.getvalue()
+        response = client.post('/analyze', data={'file': (io.BytesIO(data), 'test.png'), 'age_group': 'school',
+                                                 'dimensions': 'color_usage'},
+                               content_type='multipart/form-data')
+        assert response.status_code == 200
+        assert list(response.get_json()['scores']) == ['color_usage']
+        
+        response = client.post('/analyze', data={'file': (io.BytesIO(data), 'test.png'), 'dimensions': 'texture'},
+                               content_type='multipart/form-data')
+        assert response.status_code == 400
+    
+    def test_shadow_scoring(self, client, monkeypatch):
+        """测试抽样请求进入影子评分，汇总中相同引擎没有差异"""
+        import app as app_module
+        from happygrow.config.config import SHADOW_CONFIG
+        monkeypatch.setitem(SHADOW_CONFIG, 'enabled', True)
+        monkeypatch.setattr(app_module.shadow_scorer, 'sample_rate', 1.0)
+        submitted = []
+        monkeypatch.setattr(app_module.shadow_scorer, 'maybe_submit', lambda *args: submitted.append(args))
+        
+        # 与其他测试不重复的图像，避免直接复用已保存的结果
+        image = Image.new('RGB', (300, 260), 'white')
+        image.paste((20, 160, 90), (30, 30, 250, 90))
+        image.paste((200, 60, 160), (120, 140, 180, 240))
+        img_io = io.BytesIO()
+        image.save(img_io, 'PNG')
+        img_io.seek(0)
+        
+        response = client.post('/analyze', data={'file': (img_io, 'shadow.png'), 'age_group': 'school'},
+                               content_type='multipart/form-data')
+        
+        assert response.status_code == 200
+        assert len(submitted) == 1
+        assert 'latency_ratio' in client.get('/stats/shadow').get_json()
+    
+    @pytest.fixture
+    def remote_scoring(self, monkeypatch, tmp_path):
+        """开启评分任务队列（SQLite，结果写入临时的结果存储），返回 (队列, 启动评分worker的函数)"""
+        import threading
+        import app as app_module
+        from happygrow.services.job_broker import SQLiteJobBroker
+        from happygrow.services.pixel_cache import PixelCache
+        from happygrow.services.result_store import ResultStore
+        from happygrow.services.scoring_worker import ScoringWorker
+        from happygrow.config.config import DUPLICATE_CONFIG
+        broker = SQLiteJobBroker(tmp_path / 'jobs.db', lease_seconds=30, max_attempts=2,
+                                 heartbeat_timeout=30, result_ttl=3600)
+        staging = PixelCache(tmp_path / 'staging', 1 << 30)
+        monkeypatch.setattr(app_module, 'job_broker', broker)
+        monkeypatch.setattr(app_module, 'staging_cache', staging)
+        monkeypatch.setattr(app_module, 'result_store', ResultStore(tmp_path / 'results.db'))
+        # 不复用其他测试上传的近似图像（近似重复索引在进程内共享）
+        monkeypatch.setitem(DUPLICATE_CONFIG, 'enabled', False)
+        stop = threading.Event()
+        threads = []
+        
+        def start_worker():
+            worker = ScoringWorker(broker, app_module.result_store, staging=staging,
+                                   worker_id='test-worker', poll_interval=0.01)
+            thread = threading.Thread(target=worker.run, kwargs={'stop': stop})
+            thread.start()
+            threads.append(thread)
+        yield broker, start_worker
+        stop.set()
+        for thread in threads:
+            thread.join(5)
+    
+    def _unique_png(self, seed):
+        image = Image.new('RGB', (320, 240), 'white')
+        image.paste((seed * 37 % 256, 90, 200), (20, 20, 200, 120))
+        image.paste((240, seed * 53 % 256, 30), (150, 100, 300, 220))
+        img_io = io.BytesIO()
+        image.save(img_io, 'PNG')
+        img_io.seek(0)
+        return img_io
+    
+    def test_remote_scoring(self, client, remote_scoring):
+        """测试开启任务队列后由评分worker计算，结果写入存储，/stats/broker 显示在线worker"""
+        import app as app_module
+        broker, start_worker = remote_scoring
+        start_worker()
+        
+        response = client.post('/analyze', data={'file': (self._unique_png(11), 'remote.png'), 'age_group': 'school'},
+                               content_type='multipart/form-data')
+        
+        assert response.status_code == 200
+        data = response.get_json()
+        assert set(data['scores']) == {'color_usage', 'composition', 'creativity'}
+        assert broker.get_result(data['image_hash'])['worker'] == 'test-worker'
+        assert app_module.result_store.get_result(data['image_hash']) is not None
+        stats = client.get('/stats/broker').get_json()
+        assert stats['enabled'] and 'test-worker' in stats['workers']
+    
+    def test_remote_waits_do_not_hold_lanes(self, remote_scoring):
+        """测试等待评分worker结果的请求不占用调度名额：同时等待的请求数可以超过通道并发数"""
+        import threading
+        import time
+        import app as app_module
+        from happygrow.config.config import SCHEDULER_CONFIG
+        broker, start_worker = remote_scoring
+        requests = sum(lane['concurrency'] for lane in SCHEDULER_CONFIG['lanes']) + 2
+        statuses = []
+        
+        def post(seed):
+            with app.test_client() as client:
+                response = client.post('/analyze', data={'file': (self._unique_png(seed), 'remote.png'),
+                                                         'age_group': 'school'},
+                                       content_type='multipart/form-data')
+                statuses.append(response.status_code)
+        threads = [threading.Thread(target=post, args=(40 + i,)) for i in range(requests)]
+        for thread in threads:
+            thread.start()
+        
+        # 没有worker时所有请求都已提交任务并在名额之外等待
+        def waiting_outside_lanes():
+            lanes = app_module.request_scheduler.report()['lanes'].values()
+            return broker.counts()['queued'] == requests and all(lane['active'] == 0 for lane in lanes)
+        deadline = time.time() + 20
+        while not waiting_outside_lanes() and time.time() < deadline:
+            time.sleep(0.02)
+        assert waiting_outside_lanes()
+        
+        start_worker()
+        for thread in threads:
+            thread.join(30)
+        assert statuses == [200] * requests
+    
+    def test_remote_scoring_timeout(self, client, remote_scoring, monkeypatch):
+        """测试没有评分worker时等待结果超时返回504"""
+        from happygrow.config.config import DEADLINE_CONFIG
+        monkeypatch.setitem(DEADLINE_CONFIG, 'timeout', 0.3)
+        
+        response = client.post('/analyze', data={'file': (self._unique_png(12), 'remote.png'), 'age_group': 'school'},
+                               content_type='multipart/form-data')
+        assert response.status_code == 504
+    
+    def test_class_rollups(self, client, monkeypatch, tmp_path):
+        """测试提交时指定班级，班级统计和趋势查询读取预聚合结果"""
+        import app as app_module
+        from happygrow.services.result_store import ResultStore
+        from happygrow.config.config import DUPLICATE_CONFIG
+        monkeypatch.setattr(app_module, 'result_store', ResultStore(tmp_path / 'results.db'))
+        monkeypatch.setitem(DUPLICATE_CONFIG, 'enabled', False)
+        
+        for seed, age_group in ((21, 'school'), (22, 'preschool')):
+            response = client.post('/analyze', data={'file': (self._unique_png(seed), 'class.png'),
+                                                     'age_group': age_group, 'class_id': 'c-1'},
+                                   content_type='multipart/form-data')
+            assert response.status_code == 200
+        
+        summary = client.get('/classes/c-1/summary').get_json()
+        assert summary['age_groups']['all']['overall']['count'] == 2
+        assert summary['age_groups']['school']['color_usage']['count'] == 1
+        assert client.get('/classes/all/summary').get_json()['age_groups']['all']['overall']['count'] == 2
+        
+        trend = client.get('/classes/c-1/trend?period=day&count=3&age_group=preschool').get_json()
+        assert [len(bucket['dimensions']) > 0 for bucket in trend['buckets']] == [False, False, True]
+        assert client.get('/classes/c-1/trend?period=month').status_code == 400
+        
+        response = client.post('/analyze', data={'file': (self._unique_png(23), 'class.png'), 'class_id': 'a b'},
+                               content_type='multipart/form-data')
+        assert response.status_code == 400
+    
+    def test_admin_export(self, client, monkeypatch, tmp_path):
+        """测试管理接口需要令牌，按游标逐块下载导出结果"""
+        import app as app_module
+        from happygrow.services.result_store import ResultStore
+        from happygrow.config.config import EXPORT_CONFIG
+        store = ResultStore(tmp_path / 'results.db')
+        for i in range(3):
+            store.save_result(f"hash{i}", {'color_usage': 0.5}, {}, {}, age_group='school')
+        monkeypatch.setattr(app_module, 'result_store', store)
+        monkeypatch.setitem(EXPORT_CONFIG, 'admin_token', 'secret')
+        headers = {'Authorization': 'Bearer secret'}
+        
+        assert client.get('/admin/export').status_code == 403
+        assert client.get('/admin/export', headers={'Authorization': 'Bearer wrong'}).status_code == 403
+        
+        response = client.get('/admin/export?limit=2', headers=headers)
+        assert response.status_code == 200
+        assert response.headers['X-Export-Rows'] == '2'
+        assert gzip.decompress(response.data).decode('utf-8').count('\n') == 3
+        
+        cursor = response.headers['X-Export-Cursor']
+        response = client.get(f'/admin/export?cursor={cursor}&limit=2', headers=headers)
+        assert response.headers['X-Export-Rows'] == '1'
+        response = client.get(f"/admin/export?cursor={response.headers['X-Export-Cursor']}", headers=headers)
+        assert response.status_code == 204
+        assert client.get('/admin/export?format=xlsx', headers=headers).status_code == 400
+    
+    def test_archive_recorded_for_retention(self, client, monkeypatch, tmp_path):
+        """测试归档时记录图像哈希，/stats/retention 返回清理统计"""
+        import app as app_module
+        from happygrow.services.result_store import ResultStore
+        store = ResultStore(tmp_path / 'results.db')
+        monkeypatch.setattr(app_module, 'result_store', store)
+        
+        response = client.post('/analyze', data={'file': (self._unique_png(31), 'retention.png'),
+                                                 'age_group': 'school'},
+                               content_type='multipart/form-data')
+        data = response.get_json()
+        info = store.archive_info([data['image_path']])[data['image_path']]
+        assert info['image_hash'] == data['image_hash']
+        
+        stats = client.get('/stats/retention').get_json()
+        assert 'bytes_reclaimed' in stats and 'policy' in stats
+        os.remove(os.path.join(app.root_path, data['image_path']))
+    
+    def test_compact_response(self, client, monkeypatch, tmp_path):
+        """测试 format=compact 只返回数值，/results 查询同样支持"""
+        import hashlib
+        import app as app_module
+        from happygrow.services.result_store import ResultStore
+        monkeypatch.setattr(app_module, 'result_store', ResultStore(tmp_path / 'results.db'))
+        image = self._unique_png(41)
+        content_hash = hashlib.sha256(image.getvalue()).hexdigest()
+        
+        response = client.post('/analyze', data={'file': (image, 'compact.png'), 'format': 'compact'},
+                               content_type='multipart/form-data')
+        assert response.status_code == 200
+        data = response.get_json()
+        assert set(data) == {'image_hash', 'scores', 'overall', 'details'}
+        assert data['overall'] == pytest.approx(sum(data['scores'].values()) / len(data['scores']))
+        assert 'unique_colors' in data['details']['color_usage']
+        
+        lookup = client.get(f'/results/{content_hash}?format=compact').get_json()
+        assert lookup['scores'] == pytest.approx(data['scores'])
+        assert lookup['duplicate_of'] == data['image_hash']
+        assert 'feedback' in client.get(f'/results/{content_hash}').get_json()
+        
+        full = client.post('/analyze', data={'file': (self._unique_png(41), 'compact.png')},
+                           content_type='multipart/form-data').get_json()
+        assert sum(entry['coverage'] for entry in full['palette']) == pytest.approx(1.0, abs=1e-6)
+        
+        stored = app_module.result_store.get_result(data['image_hash'])
+        os.remove(os.path.join(app.root_path, stored['image_path']))
+    
+    def test_analyze_timeout(self, client, test_image, monkeypatch):
+        """测试超过截止时间返回504"""
+        from happygrow.config.config import DEADLINE_CONFIG
+        monkeypatch.setitem(DEADLINE_CONFIG, 'timeout', 0)
+        
+        response = client.post('/analyze', data={'file': (test_image, 'test.png'), 'age_group': 'school'},
+                               content_type='multipart/form-data')
+        assert response.status_code == 504
+        assert response.get_json()['timeout'] is True
+    
+    def _animated_gif(self, frame_count=6):
+        """逐帧增加色块的动图"""
+        frames = []
+        canvas = Image.new('RGB', (240, 240), 'white')
+        for i in range(frame_count):
+            canvas = canvas.copy()
+            canvas.paste((40 * i, 200 - 30 * i, 120), (i * 40, 0, i * 40 + 40, 240))
+            frames.append(canvas)
+        img_io = io.BytesIO()
+        frames[0].save(img_io, 'GIF', save_all=True, append_images=frames[1:])
+        img_io.seek(0)
+        return img_io
+    
+    def test_animated_gif_representative_frame(self, client):
+        """测试动图默认以最后一帧评分"""
+        response = client.post('/analyze', data={'file': (self._animated_gif(), 'anim.gif'), 'age_group': 'school'},
+                               content_type='multipart/form-data')
+        
+        assert response.status_code == 200
+        assert 'frames' not in response.get_json()
+    
+    def test_animated_gif_sampled_frames(self, client, monkeypatch):
+        """测试抽样策略返回各帧得分"""
+        from happygrow.config.config import ANIMATION_CONFIG
+        monkeypatch.setitem(ANIMATION_CONFIG, 'strategy', 'sample')
+        monkeypatch.setitem(ANIMATION_CONFIG, 'sample_frames', 3)
+        
+        response = client.post('/analyze', data={'file': (self._animated_gif(), 'anim.gif'), 'age_group': 'school'},
+                               content_type='multipart/form-data')
+        assert response.status_code == 200
+        frames = response.get_json()['frames']
+        assert [frame['index'] for frame in frames] == [0, 2, 5]
+        assert set(frames[0]['scores']) == {'color_usage', 'composition', 'creativity'}
@@ -0,0 +1,223 @@
+"""
+测试评分任务队列（SQLite 与 Redis 协议实现，Redis 使用本地替身）
+"""
+import threading
+import time
+import pytest
+from happygrow.services.job_broker import (
+    SQLiteJobBroker, RedisJobBroker, RespClient, RespError, create_broker
+)
+from resp_stub import RespStubServer
+
+OPTIONS = {'lease_seconds': 30, 'max_attempts': 2, 'heartbeat_timeout': 30, 'result_ttl': 3600}
+
+@pytest.fixture(scope='module')
+def resp_server():
+    server = RespStubServer()
+    yield server
+    server.close()
+
+@pytest.fixture(params=['sqlite', 'redis'])
+def make_broker(request, tmp_path, resp_server):
+    """按参数创建两种实现（同一测试中多次调用得到共享同一队列的实例）"""
+    prefix = f"test-{time.monotonic_ns()}"
+
+    def make(**overrides):
+        options = dict(OPTIONS, **overrides)
+        if request.param == 'sqlite':
+            return SQLiteJobBroker(tmp_path / 'jobs.db', **options)
+        return RedisJobBroker(resp_server.url, prefix=prefix, **options)
+    return make
+
+class TestJobBroker:
+    def test_enqueue_claim_ack(self, make_broker):
+        """测试提交、领取、确认后可读取结果"""
+        broker = make_broker()
+        assert broker.claim('w1') is None
+        assert broker.enqueue('hash-a', {'image_hash': 'hash-a'})
+        
+        job = broker.claim('w1')
+        assert job.job_id == 'hash-a' and job.payload == {'image_hash': 'hash-a'}
+        assert job.attempts == 1 and job.worker == 'w1'
+        assert broker.claim('w2') is None
+        assert broker.get_result('hash-a') is None
+        
+        broker.ack(job, {'metrics': {'x': 1.0}})
+        assert broker.get_result('hash-a') == {'metrics': {'x': 1.0}}
+        assert broker.counts()['running'] == 0
+    
+    def test_claims_in_submission_order(self, make_broker):
+        """测试按提交顺序领取"""
+        broker = make_broker()
+        for job_id in ('a', 'b', 'c'):
+            broker.enqueue(job_id, {})
+        assert [broker.claim('w').job_id for _ in range(3)] == ['a', 'b', 'c']
+    
+    def test_duplicate_enqueue_coalesces(self, make_broker):
+        """测试未完成的同一任务不重复提交，完成后可重新提交且旧结果被清除"""
+        broker = make_broker()
+        assert broker.enqueue('hash-a', {'n': 1})
+        assert not broker.enqueue('hash-a', {'n': 2})
+        job = broker.claim('w1')
+        assert not broker.enqueue('hash-a', {'n': 3})
+        broker.ack(job, {'ok': True})
+        
+        assert broker.enqueue('hash-a', {'n': 4})
+        assert broker.get_result('hash-a') is None
+        job = broker.claim('w1')
+        assert job.payload == {'n': 4} and job.attempts == 1
+    
+    def test_expired_lease_is_redelivered(self, make_broker):
+        """测试租约过期的任务重新投递给其他worker，原worker的失败报告被忽略"""
+        broker = make_broker(lease_seconds=0.05)
+        broker.enqueue('hash-a', {})
+        first = broker.claim('w1')
+        time.sleep(0.1)
+        
+        second = broker.claim('w2')
+        assert second.job_id == 'hash-a' and second.attempts == 2 and second.worker == 'w2'
+        assert broker.fail(first, 'late failure') is False
+        broker.ack(second, {'ok': True})
+        # 原worker晚到的确认按相同键覆盖结果
+        broker.ack(first, {'ok': True})
+        assert broker.get_result('hash-a') == {'ok': True}
+        assert broker.claim('w3') is None
+    
+    def test_expired_lease_stops_after_max_attempts(self, make_broker):
+        """测试租约反复过期（worker崩溃）的任务达到最多领取次数后标记失败，不再投递"""
+        broker = make_broker(lease_seconds=0.05)
+        broker.enqueue('hash-a', {})
+        assert broker.claim('w1').attempts == 1
+        time.sleep(0.1)
+        assert broker.claim('w2').attempts == 2
+        time.sleep(0.1)
+        
+        assert broker.claim('w3') is None
+        assert 'error' in broker.get_result('hash-a')
+        assert broker.counts()['running'] == 0
+        # 失败的任务可以重新提交
+        assert broker.enqueue('hash-a', {})
+    
+    def test_concurrent_enqueue_coalesces(self, make_broker):
+        """测试多个实例并发提交同一任务时只有一个成功，队列中只有一份"""
+        brokers = [make_broker() for _ in range(8)]
+        for round_ in range(5):
+            job_id = f"hash-{round_}"
+            accepted = []
+            barrier = threading.Barrier(len(brokers))
+            
+            def submit(broker):
+                barrier.wait()
+                accepted.append(broker.enqueue(job_id, {}))
+            threads = [threading.Thread(target=submit, args=(broker,)) for broker in brokers]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            assert accepted.count(True) == 1
+        assert [brokers[0].claim('w').job_id for _ in range(5)] == [f"hash-{i}" for i in range(5)]
+        assert brokers[0].claim('w') is None
+    
+    def test_heartbeat_extends_lease(self, make_broker):
+        """测试心跳续租正在执行的任务"""
+        broker = make_broker(lease_seconds=0.3)
+        broker.enqueue('hash-a', {})
+        job = broker.claim('w1')
+        time.sleep(0.2)
+        broker.heartbeat('w1', {}, job=job)
+        time.sleep(0.2)
+        assert broker.claim('w2') is None
+    
+    def test_fail_retries_then_reports_error(self, make_broker):
+        """测试失败后重新排队，超过最多投递次数时结果为错误"""
+        broker = make_broker()
+        broker.enqueue('hash-a', {})
+        assert broker.fail(broker.claim('w1'), 'boom') is True
+        job = broker.claim('w2')
+        assert job.attempts == 2
+        assert broker.fail(job, 'boom again') is False
+        
+        assert broker.get_result('hash-a') == {'error': 'boom again'}
+        assert broker.claim('w3') is None
+        # 失败的任务可以重新提交
+        assert broker.enqueue('hash-a', {})
+    
+    def test_counts(self, make_broker):
+        """测试两种实现按相同结构统计各状态的任务数，重新提交的任务不再计入完成或失败"""
+        broker = make_broker(max_attempts=1)
+        for job_id in ('hash-a', 'hash-b', 'hash-c', 'hash-d'):
+            broker.enqueue(job_id, {})
+        broker.ack(broker.claim('w1'), {'metrics': {}})
+        broker.fail(broker.claim('w1'), 'boom')
+        broker.claim('w1')
+        
+        assert broker.counts() == {'queued': 1, 'running': 1, 'done': 1, 'failed': 1}
+        broker.enqueue('hash-a', {})
+        assert broker.counts() == {'queued': 2, 'running': 1, 'done': 0, 'failed': 1}
+    
+    def test_workers_heartbeat(self, make_broker):
+        """测试在线worker列表只包含心跳未超时的worker"""
+        broker = make_broker(heartbeat_timeout=0.1)
+        broker.heartbeat('old', {'pid': 1})
+        time.sleep(0.15)
+        broker.heartbeat('w1', {'pid': 2})
+        
+        workers = broker.workers()
+        assert list(workers) == ['w1']
+        assert workers['w1']['pid'] == 2 and 'last_seen' in workers['w1']
+        assert broker.report()['workers'] == workers
+    
+    def test_wait_result(self, make_broker):
+        """测试等待结果：超时返回None，其他worker确认后返回结果"""
+        broker = make_broker()
+        broker.enqueue('hash-a', {})
+        assert broker.wait_result('hash-a', 0.05, poll_interval=0.01) is None
+        
+        def consume():
+            consumer = make_broker()
+            consumer.ack(consumer.claim('w1'), {'done': 1})
+        threading.Timer(0.05, consume).start()
+        assert broker.wait_result('hash-a', 5, poll_interval=0.01) == {'done': 1}
+    
+    def test_create_broker(self, tmp_path):
+        """测试按配置创建后端"""
+        config = dict(OPTIONS, backend='sqlite', sqlite_path=tmp_path / 'jobs.db',
+                      redis_url='redis://localhost:6379/0', prefix='p')
+        assert isinstance(create_broker(config), SQLiteJobBroker)
+        assert isinstance(create_broker(dict(config, backend='redis')), RedisJobBroker)
+        with pytest.raises(ValueError):
+            create_broker(dict(config, backend='kafka'))
+
+class TestRedisJobBroker:
+    def test_claim_interrupted_before_lease_is_recovered(self, resp_server):
+        """测试任务转入 processing 后、登记租约前worker崩溃，任务仍会在租约期后重新投递"""
+        broker = RedisJobBroker(resp_server.url, prefix='crash', **dict(OPTIONS, lease_seconds=0.05))
+        broker.enqueue('hash-a', {'n': 1})
+        broker.client.execute('RPOPLPUSH', 'crash:queue', 'crash:processing')
+        
+        assert broker.claim('w1') is None  # 补登租约
+        time.sleep(0.1)
+        job = broker.claim('w1')
+        assert job.job_id == 'hash-a' and job.payload == {'n': 1}
+    
+    def test_resp_client(self, resp_server):
+        """测试RESP客户端的回复类型和错误"""
+        client = RespClient(resp_server.url)
+        assert client.execute('PING') == b'PONG'
+        assert client.execute('SET', 'k', 'v\r\nwith newline') == b'OK'
+        assert client.execute('GET', 'k') == b'v\r\nwith newline'
+        assert client.execute('GET', 'missing') is None
+        assert client.execute('LPUSH', 'l', 'a', 'b') == 2
+        assert client.execute('LRANGE', 'l', 0, -1) == [b'b', b'a']
+        with pytest.raises(RespError):
+            client.execute('NOSUCHCOMMAND')
+        client.close()
+    
+    def test_connection_error(self):
+        """测试连接失败时抛出 ConnectionError"""
+        import socket
+        with socket.socket() as sock:
+            sock.bind(('127.0.0.1', 0))
+            port = sock.getsockname()[1]
+        with pytest.raises(ConnectionError):
+            RespClient(f"redis://127.0.0.1:{port}/0", timeout=0.5).execute('PING')
@@ -0,0 +1,55 @@
+"""
+测试跨请求微批处理
+"""
+import threading
+import pytest
+from happygrow.services.micro_batcher import MicroBatcher
+
+class TestMicroBatcher:
+    def test_coalesces_concurrent_requests(self):
+        """测试等待时间内到达的请求合并为一批，结果按顺序返回给各自的调用方"""
+        batches = []
+        def process(items):
+            batches.append(list(items))
+            return [item * 2 for item in items]
+        batcher = MicroBatcher(process, max_batch_size=8, max_wait=0.2)
+        
+        start = threading.Barrier(5)
+        results = {}
+        def worker(value):
+            start.wait()
+            results[value] = batcher.submit(value).result(timeout=5)
+        threads = [threading.Thread(target=worker, args=(value,)) for value in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        
+        assert results == {value: value * 2 for value in range(5)}
+        assert len(batches) < 5
+        assert batcher.report()['items'] == 5
+    
+    def test_max_batch_size(self):
+        """测试每批不超过最大批大小"""
+        batches = []
+        def process(items):
+            batches.append(len(items))
+            return items
+        batcher = MicroBatcher(process, max_batch_size=3, max_wait=0.2)
+        
+        futures = [batcher.submit(value) for value in range(7)]
+        assert [future.result(timeout=5) for future in futures] == list(range(7))
+        assert max(batches) <= 3
+        assert batcher.report()['max_batch'] <= 3
+    
+    def test_exception_propagates_to_batch(self):
+        """测试批处理失败时同批的所有请求都收到异常"""
+        def process(items):
+            raise ValueError('boom')
+        batcher = MicroBatcher(process, max_batch_size=4, max_wait=0.01)
+        
+        with pytest.raises(ValueError):
+            batcher.submit(1).result(timeout=5)
+        # 失败后后台线程继续工作
+        with pytest.raises(ValueError):
+            batcher.submit(2).result(timeout=5)
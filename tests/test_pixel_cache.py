@@ -0,0 +1,71 @@
+"""
+测试归档图像的解码像素缓存
+"""
+import os
+import numpy as np
+import pytest
+from PIL import Image
+from happygrow.core.scoring_engine import ScoringEngine
+from happygrow.services.pixel_cache import PixelCache
+
+class TestPixelCache:
+    @pytest.fixture
+    def drawing(self, tmp_path):
+        """归档的JPEG图像"""
+        image = Image.new('RGB', (240, 200), 'white')
+        image.paste((200, 40, 40), (40, 40, 160, 150))
+        path = tmp_path / 'drawing.jpg'
+        image.save(path, 'JPEG')
+        return path
+    
+    def test_load_decodes_once_then_maps(self, tmp_path, drawing):
+        """测试首次读取解码并写入缓存，之后以只读内存映射读取"""
+        cache = PixelCache(tmp_path / 'cache', max_bytes=10 * 1024 * 1024)
+        
+        decoded = cache.load('ab' * 32, drawing)
+        mapped = cache.load('ab' * 32, drawing)
+        
+        assert isinstance(mapped, np.memmap)
+        assert not mapped.flags.writeable
+        assert np.array_equal(mapped, decoded)
+        assert np.array_equal(mapped, np.asarray(Image.open(drawing).convert('RGB')))
+        assert cache.report()['hits'] == 1
+        assert cache.report()['misses'] == 1
+    
+    def test_engine_on_mapped_pixels(self, tmp_path, drawing):
+        """测试由缓存像素构造的评分引擎与由图像构造的结果相同"""
+        cache = PixelCache(tmp_path / 'cache', max_bytes=10 * 1024 * 1024)
+        cache.load('cd' * 32, drawing)
+        
+        with Image.open(drawing) as image:
+            expected = ScoringEngine(image.convert('RGB')).compute_metrics()
+        assert ScoringEngine(cache.get('cd' * 32)).compute_metrics() == pytest.approx(expected)
+    
+    def test_load_caches_analysis_resolution(self, tmp_path, monkeypatch):
+        """测试超过评分分辨率的归档图像按上传时的预处理缩小后再缓存"""
+        from happygrow.config.config import IMAGE_CONFIG
+        monkeypatch.setitem(IMAGE_CONFIG, 'analysis_max_size', 100)
+        path = tmp_path / 'large.png'
+        Image.new('RGB', (300, 150), (200, 40, 40)).save(path)
+        cache = PixelCache(tmp_path / 'cache', max_bytes=10 * 1024 * 1024)
+        
+        cache.load('ef' * 32, path)
+        
+        assert cache.get('ef' * 32).shape == (50, 100, 3)
+    
+    def test_lru_eviction(self, tmp_path):
+        """测试超过总大小上限时淘汰最久未使用的文件"""
+        pixels = np.zeros((100, 100, 3), dtype=np.uint8)
+        cache = PixelCache(tmp_path / 'cache', max_bytes=2 * pixels.nbytes + 1024)
+        cache.put('aa' * 32, pixels)
+        cache.put('bb' * 32, pixels)
+        # aa 最早写入；访问 aa 后 bb 成为最久未使用
+        os.utime(cache.path('bb' * 32), (1, 1))
+        assert cache.get('aa' * 32) is not None
+        
+        cache.put('cc' * 32, pixels)
+        
+        assert cache.get('bb' * 32) is None
+        assert cache.get('aa' * 32) is not None
+        assert cache.get('cc' * 32) is not None
+        assert cache.report()['evicted'] == 1
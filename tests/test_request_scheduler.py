@@ -0,0 +1,66 @@
+"""
+测试按成本调度请求
+"""
+import pytest
+from happygrow.services.request_scheduler import RequestScheduler, SchedulerBusy
+
+LANES = [
+    {'name': 'small', 'max_cost': 0.25, 'concurrency': 2},
+    {'name': 'large', 'max_cost': None, 'concurrency': 1}
+]
+COST_MODEL = {'base': 0.01, 'decode_megapixels': 0.02, 'analysis_megapixels': 0.2}
+
+class TestRequestScheduler:
+    @pytest.fixture
+    def scheduler(self):
+        """创建调度器"""
+        return RequestScheduler(LANES, COST_MODEL, analysis_max_size=2048, queue_timeout=0.1)
+    
+    def test_routes_by_estimated_cost(self, scheduler):
+        """测试按头部尺寸预估成本选择通道"""
+        small = scheduler.features(400, 400)
+        large = scheduler.features(4096, 4096)
+        
+        assert large['analysis_megapixels'] == pytest.approx(2048 * 2048 / 1e6)
+        assert scheduler.lane_for(scheduler.estimate(small)).name == 'small'
+        assert scheduler.lane_for(scheduler.estimate(large)).name == 'large'
+    
+    def test_large_lane_does_not_block_small(self, scheduler):
+        """测试大图占满自己的通道时小图仍可执行，大图通道排队超时"""
+        with scheduler.slot(4096, 4096):
+            with pytest.raises(SchedulerBusy):
+                scheduler.acquire(4000, 3000)
+            with scheduler.slot(400, 400) as ticket:
+                assert ticket.lane.name == 'small'
+        
+        report = scheduler.report()
+        assert report['lanes']['large']['rejected'] == 1
+        assert report['lanes']['small']['completed'] == 1
+        assert report['lanes']['small']['active'] == 0
+    
+    def test_release_is_idempotent(self, scheduler):
+        """测试重复释放只生效一次"""
+        ticket = scheduler.acquire(400, 400)
+        ticket.release()
+        ticket.release()
+        
+        assert scheduler.report()['lanes']['small']['completed'] == 1
+        # 名额未被多释放：仍只能同时获得2个
+        tickets = [scheduler.acquire(400, 400) for _ in range(2)]
+        with pytest.raises(SchedulerBusy):
+            scheduler.acquire(400, 400)
+        for ticket in tickets:
+            ticket.release()
+    
+    def test_calibration_recovers_cost_model(self, scheduler):
+        """测试由样本拟合出成本模型系数"""
+        assert scheduler.calibration() is None
+        true_model = {'base': 0.005, 'decode_megapixels': 0.03, 'analysis_megapixels': 0.25}
+        for width, height in [(400, 400), (800, 600), (1024, 1024), (2048, 1536), (3000, 3000),
+                              (4096, 4096), (1500, 4000), (600, 2000)]:
+            features = scheduler.features(width, height)
+            scheduler.record_sample(features, sum(true_model[k] * features[k] for k in true_model))
+        
+        calibrated = scheduler.calibration()
+        for name, value in true_model.items():
+            assert calibrated[name] == pytest.approx(value, abs=1e-9)
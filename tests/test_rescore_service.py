@@ -0,0 +1,104 @@
+"""
+测试归档增量重评分
+"""
+import pytest
+from unittest import mock
+from PIL import Image
+from happygrow.core.scoring_engine import ScoringEngine
+from happygrow.services.result_store import ResultStore
+from happygrow.services.rescore_service import RescoreService
+from happygrow.config.config import METRIC_VERSIONS, SCORING_CRITERIA
+
+class TestRescoreService:
+    @pytest.fixture
+    def archived(self, tmp_path):
+        """归档一张已评分的图像"""
+        image = Image.new('RGB', (200, 200), 'white')
+        for x in range(50, 150):
+            for y in range(50, 150):
+                image.putpixel((x, y), (255, 0, 0))
+        image.save(tmp_path / 'drawing.png')
+        
+        store = ResultStore(tmp_path / 'results.db')
+        metrics = ScoringEngine(image).compute_metrics()
+        scores, _ = ScoringEngine.score_from_metrics(metrics)
+        store.save_result('abc', scores, metrics, METRIC_VERSIONS, image_path='drawing.png')
+        return store, RescoreService(store, base_dir=tmp_path)
+    
+    def test_weight_change_does_not_recompute(self, archived):
+        """测试纯权重变化只重新加权"""
+        store, service = archived
+        criteria = dict(SCORING_CRITERIA['creativity'], variety=0.5, uniqueness=0.2)
+        
+        with mock.patch.dict(SCORING_CRITERIA, {'creativity': criteria}), \
+             mock.patch.object(ScoringEngine, 'compute_metrics') as compute:
+            stats = service.rescore_all()
+        
+        compute.assert_not_called()
+        assert stats['rescored'] == 1
+        assert stats['reweighted_only'] == 1
+        
+        metrics = store.get_result('abc')['metrics']
+        expected = metrics['shape_variety'] * 0.5 + metrics['stroke_expression'] * 0.3 + \
+            metrics['space_usage'] * 0.2
+        assert store.get_result('abc')['scores']['creativity'] == pytest.approx(expected)
+    
+    def test_version_change_recomputes_only_stale_metric(self, archived):
+        """测试算法版本变化只重新计算对应指标"""
+        store, service = archived
+        versions = dict(METRIC_VERSIONS, stroke_expression=METRIC_VERSIONS['stroke_expression'] + 1)
+        
+        with mock.patch.dict(METRIC_VERSIONS, versions), \
+             mock.patch.object(ScoringEngine, '_analyze_stroke_expression', return_value=0.42), \
+             mock.patch.object(ScoringEngine, '_analyze_focal_point') as focal:
+            stats = service.rescore_all()
+            result = store.get_result('abc')
+        
+        focal.assert_not_called()
+        assert stats['recomputed'] == {'stroke_expression': 1}
+        assert result['metrics']['stroke_expression'] == 0.42
+        assert result['metric_versions']['stroke_expression'] == versions['stroke_expression']
+    
+    def test_missing_image_counts_as_failed(self, archived, tmp_path):
+        """测试归档图像缺失时记录失败"""
+        store, service = archived
+        (tmp_path / 'drawing.png').unlink()
+        
+        with mock.patch.dict(METRIC_VERSIONS, dict(METRIC_VERSIONS, focal_score=METRIC_VERSIONS['focal_score'] + 1)):
+            stats = service.rescore_all()
+        
+        assert stats['failed'] == 1
+    
+    def test_rescore_with_pixel_cache(self, archived, tmp_path):
+        """测试使用像素缓存重评分时结果不变，第二次重评分不再解码"""
+        from happygrow.services.pixel_cache import PixelCache
+        store, _ = archived
+        cache = PixelCache(tmp_path / 'cache', max_bytes=10 * 1024 * 1024)
+        service = RescoreService(store, base_dir=tmp_path, pixel_cache=cache)
+        expected = store.get_result('abc')['metrics']['focal_score']
+        
+        current = METRIC_VERSIONS['focal_score']
+        for version in (current + 1, current + 2):
+            with mock.patch.dict(METRIC_VERSIONS, dict(METRIC_VERSIONS, focal_score=version)):
+                service.rescore_all()
+        
+        assert store.get_result('abc')['metrics']['focal_score'] == pytest.approx(expected)
+        assert cache.report()['misses'] == 1
+        assert cache.report()['hits'] == 1
+    
+    @pytest.mark.parametrize('use_cache', [False, True])
+    def test_large_archive_rescored_at_analysis_resolution(self, tmp_path, use_cache):
+        """测试超过 analysis_max_size 的归档图像按上传时的分辨率重评分"""
+        from happygrow.services.image_service import ImageService
+        from happygrow.services.pixel_cache import PixelCache
+        image = Image.new('RGB', (2400, 160), 'white')
+        image.paste((30, 120, 220), (300, 20, 1500, 140))
+        image.save(tmp_path / 'large.png')
+        store = ResultStore(tmp_path / 'results.db')
+        store.save_result('big', {}, {}, {}, image_path='large.png')
+        cache = PixelCache(tmp_path / 'cache', max_bytes=10 * 1024 * 1024) if use_cache else None
+        
+        assert RescoreService(store, base_dir=tmp_path, pixel_cache=cache).rescore_all()['rescored'] == 1
+        
+        expected = ScoringEngine(ImageService._fit_analysis_size(image.copy())).compute_metrics()
+        assert store.get_result('big')['metrics'] == pytest.approx(expected)
@@ -0,0 +1,129 @@
+"""
+测试评分结果的列式导出
+"""
+import csv
+import gzip
+import io
+import pytest
+from happygrow.services.result_store import ResultStore
+from happygrow.services.result_export import ResultExporter, columns, export_chunk, parquet_available
+from happygrow.config.config import METRIC_VERSIONS
+
+class TestResultExport:
+    @pytest.fixture
+    def store(self, tmp_path):
+        """保存了5条结果的临时结果存储"""
+        store = ResultStore(tmp_path / 'results.db')
+        metrics = {name: 0.5 for name in METRIC_VERSIONS}
+        for i in range(5):
+            store.save_result(f"hash{i}", {'color_usage': 0.1 * i, 'composition': 0.5, 'creativity': 0.9},
+                              dict(metrics, unique_colors=i), METRIC_VERSIONS,
+                              age_group='school', config_version='v1', class_id='c1' if i % 2 else None)
+        return store
+    
+    def _read(self, path):
+        with gzip.open(path, 'rt', encoding='utf-8', newline='') as f:
+            return list(csv.DictReader(f))
+    
+    def test_export_chunks(self, store, tmp_path):
+        """测试分块写入gzip CSV，列与配置一致"""
+        exporter = ResultExporter(store, tmp_path / 'exports', chunk_rows=2)
+        stats = exporter.export()
+        
+        assert stats['rows'] == 5 and stats['done']
+        assert len(stats['files']) == 3
+        rows = [row for name in stats['files'] for row in self._read(tmp_path / 'exports' / name)]
+        assert list(rows[0]) == columns()
+        assert [row['image_hash'] for row in rows] == [f"hash{i}" for i in range(5)]
+        assert float(rows[3]['score_color_usage']) == pytest.approx(0.3)
+        assert float(rows[3]['score_overall']) == pytest.approx((0.3 + 0.5 + 0.9) / 3)
+        assert rows[3]['metric_unique_colors'] == '3.0'
+        assert rows[3]['version_unique_colors'] == str(METRIC_VERSIONS['unique_colors'])
+        assert rows[3]['class_id'] == 'c1' and rows[2]['class_id'] == ''
+        assert rows[0]['config_version'] == 'v1'
+    
+    def test_resume_from_cursor(self, store, tmp_path):
+        """测试中断后从 manifest 记录的游标继续，新结果在下次导出"""
+        exporter = ResultExporter(store, tmp_path / 'exports', chunk_rows=2)
+        first = exporter.export(max_chunks=1)
+        assert first['rows'] == 2 and not first['done']
+        
+        second = ResultExporter(store, tmp_path / 'exports', chunk_rows=2).export()
+        assert second['rows'] == 3
+        assert set(first['files']).isdisjoint(second['files'])
+        
+        store.save_result('hash5', {'color_usage': 0.5}, {}, {})
+        third = exporter.export()
+        assert third['rows'] == 1
+        manifest = exporter.load_manifest()
+        assert manifest['rows'] == 6 and len(manifest['files']) == 4
+        
+        assert exporter.export(restart=True)['rows'] == 6
+    
+    def test_overwritten_result_exported_again(self, store, tmp_path):
+        """测试覆盖写入（重评分）的结果在下次导出时再次写入"""
+        exporter = ResultExporter(store, tmp_path / 'exports', chunk_rows=10)
+        first = exporter.export()
+        
+        store.save_result('hash1', {'color_usage': 0.7, 'composition': 0.5, 'creativity': 0.9}, {}, METRIC_VERSIONS)
+        second = exporter.export()
+        
+        assert second['rows'] == 1 and second['cursor'] > first['cursor']
+        rows = self._read(tmp_path / 'exports' / second['files'][0])
+        assert rows[0]['image_hash'] == 'hash1'
+        assert float(rows[0]['score_color_usage']) == pytest.approx(0.7)
+        assert rows[0]['age_group'] == 'school'
+        assert exporter.export()['rows'] == 0
+    
+    def test_legacy_database_keeps_cursor(self, tmp_path):
+        """测试旧数据库补充 revision 列后按原有写入顺序编号"""
+        import sqlite3
+        path = tmp_path / 'legacy.db'
+        with sqlite3.connect(path) as conn:
+            conn.execute('CREATE TABLE results (image_hash TEXT PRIMARY KEY, image_path TEXT, age_group TEXT, '
+                         'phash TEXT, scores TEXT NOT NULL, class_id TEXT, config_version TEXT, '
+                         'created_at TEXT NOT NULL, updated_at TEXT NOT NULL)')
+            for name in ('a', 'b'):
+                conn.execute("INSERT INTO results (image_hash, scores, created_at, updated_at) "
+                             "VALUES (?, '{}', '2024-01-01T00:00:00', '2024-01-01T00:00:00')", (name,))
+        store = ResultStore(path)
+        assert [(cursor, result['image_hash']) for cursor, result in store.export_page(0, 10)] == [(1, 'a'), (2, 'b')]
+        store.save_result('a', {'color_usage': 0.5}, {}, {})
+        assert [result['image_hash'] for _, result in store.export_page(2, 10)] == ['a']
+    
+    def test_manifest_mismatch(self, store, tmp_path):
+        """测试已有导出的格式不同时拒绝继续"""
+        exporter = ResultExporter(store, tmp_path / 'exports')
+        exporter.export()
+        exporter.fmt = 'parquet'
+        with pytest.raises(ValueError):
+            exporter.export()
+    
+    def test_export_chunk(self, store):
+        """测试管理接口使用的逐块编码"""
+        body, cursor, rows = export_chunk(store, 0, 3)
+        data = gzip.decompress(b''.join(body)).decode('utf-8')
+        assert rows == 3
+        assert len(list(csv.DictReader(io.StringIO(data)))) == 3
+        
+        body, end, rows = export_chunk(store, cursor, 3)
+        assert rows == 2
+        b''.join(body)
+        assert export_chunk(store, end, 3) == (None, end, 0)
+    
+    def test_unsupported_format(self, store, tmp_path):
+        """测试不支持的格式（以及未安装 pyarrow 时的Parquet）"""
+        with pytest.raises(ValueError):
+            ResultExporter(store, tmp_path, fmt='xlsx')
+        if not parquet_available():
+            with pytest.raises(ValueError):
+                export_chunk(store, 0, 1, 'parquet')
+    
+    @pytest.mark.skipif(not parquet_available(), reason='需要 pyarrow')
+    def test_parquet(self, store, tmp_path):
+        """测试Parquet导出"""
+        import pyarrow.parquet as pq
+        stats = ResultExporter(store, tmp_path / 'exports', fmt='parquet', chunk_rows=10).export()
+        table = pq.read_table(tmp_path / 'exports' / stats['files'][0])
+        assert table.num_rows == 5
+        assert table.column_names == columns()
@@ -0,0 +1,87 @@
+"""
+测试评分结果存储
+"""
+import pytest
+from happygrow.services.result_store import ResultStore
+from happygrow.config.config import METRIC_VERSIONS
+
+class TestResultStore:
+    @pytest.fixture
+    def store(self, tmp_path):
+        """创建临时结果存储"""
+        return ResultStore(tmp_path / 'results.db')
+    
+    @pytest.fixture
+    def sample_metrics(self):
+        """样本原始子指标"""
+        return {
+            'unique_colors': 12,
+            'harmony_score': 0.5,
+            'coverage_score': 0.9,
+            'thirds_score': 0.7,
+            'balance_score': 0.8,
+            'focal_score': 0.75,
+            'shape_variety': 0.85,
+            'stroke_expression': 0.6,
+            'space_usage': 0.9
+        }
+    
+    def test_save_and_get_result(self, store, sample_metrics):
+        """测试保存和读取结果"""
+        scores = {'color_usage': 0.8, 'composition': 0.75, 'creativity': 0.8}
+        store.save_result('abc', scores, sample_metrics, METRIC_VERSIONS,
+                          image_path='uploads/a.jpg', age_group='school', config_version='v1')
+        
+        result = store.get_result('abc')
+        assert result['scores'] == scores
+        assert result['metrics'] == sample_metrics
+        assert result['metric_versions'] == METRIC_VERSIONS
+        assert result['image_path'] == 'uploads/a.jpg'
+        assert result['age_group'] == 'school'
+    
+    def test_get_missing_result(self, store):
+        """测试读取不存在的结果"""
+        assert store.get_result('missing') is None
+    
+    def test_partial_update_keeps_other_metrics(self, store, sample_metrics):
+        """测试只更新部分子指标时保留其余指标和元数据"""
+        scores = {'color_usage': 0.8, 'composition': 0.75, 'creativity': 0.8}
+        store.save_result('abc', scores, sample_metrics, METRIC_VERSIONS,
+                          image_path='uploads/a.jpg', age_group='school')
+        
+        versions = dict(METRIC_VERSIONS, thirds_score=99)
+        store.save_result('abc', scores, {'thirds_score': 0.1}, versions)
+        
+        result = store.get_result('abc')
+        assert result['metrics']['thirds_score'] == 0.1
+        assert result['metric_versions']['thirds_score'] == 99
+        assert result['metrics']['balance_score'] == 0.8
+        assert result['image_path'] == 'uploads/a.jpg'
+    
+    def test_iter_results(self, store, sample_metrics):
+        """测试遍历全部结果"""
+        scores = {'color_usage': 0.8, 'composition': 0.75, 'creativity': 0.8}
+        for image_hash in ['a', 'b', 'c']:
+            store.save_result(image_hash, scores, sample_metrics, METRIC_VERSIONS)
+        
+        assert [r['image_hash'] for r in store.iter_results()] == ['a', 'b', 'c']
+    
+    def test_find_result_by_alias(self, store, sample_metrics):
+        """测试按别名哈希查找结果"""
+        scores = {'color_usage': 0.8, 'composition': 0.75, 'creativity': 0.8}
+        store.save_result('abc', scores, sample_metrics, METRIC_VERSIONS)
+        store.add_alias('original', 'abc')
+        
+        assert store.find_result('abc')['image_hash'] == 'abc'
+        assert store.find_result('original')['image_hash'] == 'abc'
+        assert store.find_result('unknown') is None
+    
+    def test_alias_is_not_repointed(self, store, sample_metrics):
+        """测试已有的别名不会被改写"""
+        scores = {'color_usage': 0.8, 'composition': 0.75, 'creativity': 0.8}
+        store.save_result('abc', scores, sample_metrics, METRIC_VERSIONS)
+        store.save_result('def', scores, sample_metrics, METRIC_VERSIONS)
+        assert store.add_alias('original', 'abc')
+        assert not store.add_alias('original', 'def')
+        
+        assert store.find_result('original')['image_hash'] == 'abc'
@@ -0,0 +1,186 @@
+"""
+测试上传目录保留策略
+"""
+import os
+import time
+import pytest
+from happygrow.services.result_store import ResultStore
+from happygrow.services.retention import RetentionManager
+
+class TestRetentionManager:
+    @pytest.fixture
+    def store(self, tmp_path):
+        return ResultStore(tmp_path / 'results.db')
+    
+    @pytest.fixture
+    def uploads(self, tmp_path):
+        directory = tmp_path / 'uploads'
+        directory.mkdir()
+        (directory / 'thumbnails').mkdir()
+        return directory
+    
+    def _archive(self, store, uploads, name, image_hash=None, size=100, age_days=0, content=None):
+        """写入一个归档文件，修改时间为 age_days 天前"""
+        path = uploads / name
+        path.write_bytes(content if content is not None else os.urandom(size))
+        mtime = time.time() - age_days * 86400
+        os.utime(path, (mtime, mtime))
+        if image_hash is not None:
+            store.record_archive(f"uploads/{name}", image_hash, path.stat().st_size)
+        return path
+    
+    def _thumbnail(self, uploads, image_hash, size=100, age_days=0):
+        """写入一个缩略图文件（uploads/thumbnails/<前两位>/<哈希>_256.jpg）"""
+        path = uploads / 'thumbnails' / image_hash[:2] / f"{image_hash}_256.jpg"
+        path.parent.mkdir(exist_ok=True)
+        path.write_bytes(os.urandom(size))
+        mtime = time.time() - age_days * 86400
+        os.utime(path, (mtime, mtime))
+        return path
+    
+    def _manager(self, store, uploads, **policy):
+        return RetentionManager(uploads, store, base_dir=uploads.parent, batch_pause=0, batch_size=2, **policy)
+    
+    def test_keep_latest_per_hash(self, store, uploads):
+        """测试同一哈希只保留最新的归档，结果指向的归档总是保留"""
+        self._archive(store, uploads, 'a1.jpg', 'a', age_days=3)
+        self._archive(store, uploads, 'a2.jpg', 'a', age_days=2)
+        self._archive(store, uploads, 'a3.jpg', 'a', age_days=1)
+        self._archive(store, uploads, 'b1.jpg', 'b', age_days=5)
+        store.save_result('a', {'color_usage': 0.5}, {}, {}, image_path='uploads/a1.jpg')
+        
+        result = self._manager(store, uploads, keep_per_hash=1).sweep()
+        
+        assert sorted(os.listdir(uploads)) == ['a1.jpg', 'b1.jpg', 'thumbnails']
+        assert result['scanned'] == 4
+        assert result['reclaimed']['duplicate'] == {'files': 2, 'bytes': 200}
+        assert result['remaining_bytes'] == 200
+    
+    def test_recent_archive_not_deleted(self, store, uploads):
+        """测试刚写入、结果尚未指向的归档不被删除"""
+        self._archive(store, uploads, 'a1.jpg', 'a', age_days=3)
+        self._archive(store, uploads, 'a2.jpg', 'a')
+        store.save_result('a', {'color_usage': 0.5}, {}, {}, image_path='uploads/a1.jpg')
+        
+        result = self._manager(store, uploads, keep_per_hash=1, max_total_bytes=0).sweep()
+        
+        assert sorted(os.listdir(uploads)) == ['a2.jpg', 'thumbnails']
+        assert result['reclaimed']['quota']['files'] == 1
+    
+    def test_untracked_files_grouped_by_content(self, store, uploads):
+        """测试没有记录的旧归档按文件内容分组"""
+        self._archive(store, uploads, 'old1.jpg', content=b'same', age_days=2)
+        self._archive(store, uploads, 'old2.jpg', content=b'same', age_days=1)
+        self._archive(store, uploads, 'other.jpg', content=b'other')
+        
+        manager = self._manager(store, uploads, keep_per_hash=1)
+        assert manager.sweep()['reclaimed']['duplicate']['files'] == 1
+        assert sorted(os.listdir(uploads)) == ['old2.jpg', 'other.jpg', 'thumbnails']
+        # 内容哈希已记录，再次清理时不需要重新计算
+        assert store.archive_info(['uploads/old2.jpg'])['uploads/old2.jpg']['content_hash']
+    
+    def test_max_age(self, store, uploads):
+        """测试删除超过保留天数的归档，指向它的结果不再有归档路径"""
+        self._archive(store, uploads, 'old.jpg', 'a', age_days=40)
+        self._archive(store, uploads, 'new.jpg', 'b', age_days=1)
+        store.save_result('a', {'color_usage': 0.5}, {'unique_colors': 3}, {'unique_colors': 1},
+                          image_path='uploads/old.jpg')
+        
+        result = self._manager(store, uploads, max_age_days=30).sweep()
+        
+        assert result['reclaimed']['age']['files'] == 1
+        assert not (uploads / 'old.jpg').exists()
+        stored = store.get_result('a')
+        assert stored['image_path'] is None
+        assert stored['metrics'] == {'unique_colors': 3}
+    
+    def test_max_total_bytes(self, store, uploads):
+        """测试总大小超过上限时从最旧的开始删除"""
+        for i in range(5):
+            self._archive(store, uploads, f"f{i}.jpg", f"h{i}", size=100, age_days=5 - i)
+        
+        manager = self._manager(store, uploads, max_total_bytes=250)
+        result = manager.sweep()
+        
+        assert result['reclaimed']['quota'] == {'files': 3, 'bytes': 300}
+        assert sorted(os.listdir(uploads)) == ['f3.jpg', 'f4.jpg', 'thumbnails']
+        report = manager.report()
+        assert report['sweeps'] == 1
+        assert report['bytes_reclaimed'] == 300
+        assert report['by_reason']['quota']['files'] == 3
+        # 统计保存在结果存储中，其他进程（worker）读到相同的统计
+        other = self._manager(store, uploads)
+        assert other.report()['by_reason'] == report['by_reason']
+        assert other.report()['last_sweep']['remaining_bytes'] == 200
+    
+    def test_thumbnails_follow_archives(self, store, uploads):
+        """测试图像哈希没有剩余归档、也没有结果指向归档时删除缩略图"""
+        self._archive(store, uploads, 'old.jpg', 'aa1', age_days=40)
+        self._archive(store, uploads, 'new.jpg', 'bb1', age_days=1)
+        self._archive(store, uploads, 'scored.jpg', age_days=40)
+        store.save_result('cc1', {'color_usage': 0.5}, {}, {}, image_path='uploads/scored.jpg')
+        expired = self._thumbnail(uploads, 'aa1', age_days=40)
+        current = self._thumbnail(uploads, 'bb1', age_days=40)
+        referenced = self._thumbnail(uploads, 'cc1', age_days=40)
+        orphan = self._thumbnail(uploads, 'dd1', age_days=40)
+        recent = self._thumbnail(uploads, 'ee1')
+        
+        result = self._manager(store, uploads, max_age_days=30).sweep()
+        
+        assert not expired.exists() and not orphan.exists()
+        assert current.exists() and recent.exists()
+        # scored.jpg 超过保留天数被删除，结果不再指向归档后其缩略图一并删除
+        assert not referenced.exists()
+        assert result['thumbnails'] == 5
+        assert result['reclaimed']['age'] == {'files': 4, 'bytes': 400}
+        assert result['reclaimed']['orphan'] == {'files': 1, 'bytes': 100}
+        assert store.get_result('cc1')['image_path'] is None
+    
+    def test_max_total_bytes_counts_thumbnails(self, store, uploads):
+        """测试缩略图计入总大小，删除最旧的归档时释放其缩略图"""
+        for i in range(2):
+            self._archive(store, uploads, f"f{i}.jpg", f"h{i}", size=100, age_days=5 - i)
+            self._thumbnail(uploads, f"h{i}", size=100, age_days=5 - i)
+        
+        result = self._manager(store, uploads, max_total_bytes=250).sweep()
+        
+        assert result['total_bytes'] == 400
+        assert result['reclaimed']['quota'] == {'files': 2, 'bytes': 200}
+        assert result['remaining_bytes'] == 200
+        assert sorted(os.listdir(uploads / 'thumbnails' / 'h1')) == ['h1_256.jpg']
+        assert not (uploads / 'thumbnails' / 'h0' / 'h0_256.jpg').exists()
+    
+    def test_dry_run(self, store, uploads):
+        """测试只统计不删除"""
+        self._archive(store, uploads, 'old.jpg', 'a', age_days=40)
+        manager = self._manager(store, uploads, max_age_days=30)
+        
+        result = manager.sweep(dry_run=True)
+        
+        assert result['reclaimed']['age']['files'] == 1
+        assert (uploads / 'old.jpg').exists()
+        assert manager.report()['files_deleted'] == 0
+    
+    def test_lock_between_processes(self, store, uploads, tmp_path):
+        """测试锁文件被占用时跳过本次清理"""
+        fcntl = pytest.importorskip('fcntl')
+        lock_path = tmp_path / 'retention.lock'
+        manager = self._manager(store, uploads, max_age_days=1, lock_path=lock_path)
+        with open(lock_path, 'a') as holder:
+            fcntl.flock(holder, fcntl.LOCK_EX)
+            assert manager.sweep() is None
+        assert manager.report()['skipped'] == 1
+        assert manager.sweep() is not None
+    
+    def test_background_thread(self, store, uploads):
+        """测试后台线程按间隔清理"""
+        self._archive(store, uploads, 'old.jpg', 'a', age_days=40)
+        manager = RetentionManager(uploads, store, max_age_days=30, interval=0.01, base_dir=uploads.parent)
+        manager.start()
+        try:
+            deadline = time.time() + 5
+            while manager.report()['sweeps'] == 0 and time.time() < deadline:
+                time.sleep(0.01)
+        finally:
+            manager.stop()
+        assert not (uploads / 'old.jpg').exists()
@@ -0,0 +1,96 @@
+"""
+测试班级/年龄组预聚合统计
+"""
+from datetime import date
+import pytest
+from happygrow.services import rollups
+from happygrow.services.result_store import ResultStore
+
+class TestRollups:
+    @pytest.fixture
+    def store(self, tmp_path):
+        """创建临时结果存储（4个得分区间）"""
+        return ResultStore(tmp_path / 'results.db', score_bins=4)
+    
+    def _save(self, store, image_hash, scores, class_id='c1', age_group='school'):
+        store.save_result(image_hash, scores, {}, {}, age_group=age_group, class_id=class_id)
+    
+    def _summary(self, store, class_id, age_group=rollups.ALL):
+        return store.rollup(class_id, [age_group], 'all', ['all']).get(age_group, {}).get('all', {})
+    
+    def test_buckets(self):
+        """测试时间桶"""
+        assert rollups.buckets_for('2026-10-19T08:30:00') == [
+            ('day', '2026-10-19'), ('week', '2026-W43'), ('all', 'all')
+        ]
+        assert rollups.recent_buckets('day', 3, date(2026, 3, 1)) == ['2026-02-27', '2026-02-28', '2026-03-01']
+        assert rollups.recent_buckets('week', 2, date(2026, 1, 1)) == ['2025-W52', '2026-W01']
+        with pytest.raises(ValueError):
+            rollups.recent_buckets('month', 2)
+    
+    def test_incremental_stats(self, store):
+        """测试写入结果时更新计数、均值、标准差和得分分布"""
+        self._save(store, 'a', {'color_usage': 0.2, 'composition': 0.4})
+        self._save(store, 'b', {'color_usage': 0.6, 'composition': 0.8})
+        
+        stats = self._summary(store, 'c1')
+        assert stats['color_usage']['count'] == 2
+        assert stats['color_usage']['mean'] == pytest.approx(0.4)
+        assert stats['color_usage']['std'] == pytest.approx(0.2)
+        assert stats['color_usage']['distribution'] == [1, 0, 1, 0]
+        # 总体得分为各维度平均
+        assert stats['overall']['mean'] == pytest.approx(0.5)
+    
+    def test_class_and_age_group_keys(self, store):
+        """测试按班级、年龄组以及全部班级/全部年龄组分别汇总"""
+        self._save(store, 'a', {'color_usage': 0.2}, class_id='c1', age_group='school')
+        self._save(store, 'b', {'color_usage': 0.6}, class_id='c1', age_group='preschool')
+        self._save(store, 'c', {'color_usage': 1.0}, class_id='c2', age_group='school')
+        self._save(store, 'd', {'color_usage': 0.9}, class_id=None, age_group='school')
+        
+        data = store.rollup('c1', ['school', 'preschool', rollups.ALL], 'all', ['all'])
+        assert data['school']['all']['color_usage']['count'] == 1
+        assert data['preschool']['all']['color_usage']['count'] == 1
+        assert data[rollups.ALL]['all']['color_usage']['count'] == 2
+        assert self._summary(store, 'c2')['color_usage']['mean'] == pytest.approx(1.0)
+        # 没有班级的结果只计入全部班级
+        assert self._summary(store, rollups.ALL)['color_usage']['count'] == 4
+        assert self._summary(store, rollups.ALL, 'school')['color_usage']['count'] == 3
+        assert self._summary(store, 'missing') == {}
+    
+    def test_overwrite_replaces_contribution(self, store):
+        """测试覆盖写入（如重评分）时先移出旧得分；未指定班级时保留原班级"""
+        self._save(store, 'a', {'color_usage': 0.2})
+        self._save(store, 'a', {'color_usage': 0.9}, class_id=None)
+        
+        stats = self._summary(store, 'c1')['color_usage']
+        assert stats['count'] == 1
+        assert stats['mean'] == pytest.approx(0.9)
+        assert stats['distribution'] == [0, 0, 0, 1]
+        assert store.get_result('a')['class_id'] == 'c1'
+    
+    def test_trend_buckets(self, store):
+        """测试按天和周读取"""
+        self._save(store, 'a', {'color_usage': 0.5})
+        today = date.today()
+        day = store.rollup('c1', [rollups.ALL], 'day', rollups.recent_buckets('day', 7, today))[rollups.ALL]
+        week = store.rollup('c1', [rollups.ALL], 'week', [rollups.week_bucket(today)])[rollups.ALL]
+        assert list(day) == [today.isoformat()]
+        assert week[rollups.week_bucket(today)]['color_usage']['count'] == 1
+    
+    def test_rebuild(self, store):
+        """测试由全部结果重建聚合与增量结果一致"""
+        self._save(store, 'a', {'color_usage': 0.2, 'composition': 0.5})
+        self._save(store, 'b', {'color_usage': 0.7, 'composition': 0.1}, class_id='c2')
+        self._save(store, 'a', {'color_usage': 0.3, 'composition': 0.5})
+        before = store.rollup(rollups.ALL, [rollups.ALL, 'school'], 'all', ['all'])
+        
+        with store._connect() as conn:
+            conn.execute('DELETE FROM rollups')
+        assert store.rollup(rollups.ALL, [rollups.ALL], 'all', ['all']) == {}
+        assert store.rebuild_rollups() == 2
+        after = store.rollup(rollups.ALL, [rollups.ALL, 'school'], 'all', ['all'])
+        assert after[rollups.ALL]['all']['color_usage']['mean'] == pytest.approx(0.5)
+        assert after[rollups.ALL]['all']['color_usage']['count'] == before[rollups.ALL]['all']['color_usage']['count']
+        assert after['school']['all']['composition']['distribution'] == \
+            before['school']['all']['composition']['distribution']
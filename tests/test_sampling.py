@@ -0,0 +1,53 @@
+"""
+测试抽样估计
+"""
+import numpy as np
+import pytest
+from happygrow.core import sampling
+from happygrow.core.color_histogram import ColorHistogram
+
+class TestSampling:
+    def test_stratified_sample_is_deterministic_and_spread(self):
+        """测试分层抽样可复现且覆盖整幅图像"""
+        ys, xs = sampling.stratified_pixel_sample(300, 400, 1200, seed=1)
+        ys2, xs2 = sampling.stratified_pixel_sample(300, 400, 1200, seed=1)
+        
+        assert np.array_equal(ys, ys2) and np.array_equal(xs, xs2)
+        assert 1000 <= len(ys) <= 1200
+        assert ys.min() < 30 and ys.max() > 270
+        assert xs.min() < 30 and xs.max() > 370
+    
+    def test_stratified_lines(self):
+        """测试分层抽样行下标"""
+        lines = sampling.stratified_line_sample(1000, 10, seed=0)
+        assert len(lines) == 10
+        assert all(i * 100 <= line < (i + 1) * 100 for i, line in enumerate(lines))
+        assert np.array_equal(sampling.stratified_line_sample(5, 10, seed=0), np.arange(5))
+    
+    def test_luminance_matches_pillow(self):
+        """测试亮度公式与 Pillow 一致"""
+        from PIL import Image
+        rgb = np.random.default_rng(0).integers(0, 256, (50, 60, 3), dtype=np.uint8)
+        expected = np.asarray(Image.fromarray(rgb).convert('L'))
+        assert np.array_equal(sampling.luminance(rgb), expected)
+    
+    def test_coverage_interval_contains_truth(self):
+        """测试覆盖率置信区间包含真实值"""
+        rgb = np.full((20000, 3), 255, dtype=np.uint8)
+        rgb[:3000] = 0  # 15% 非空白
+        rng = np.random.default_rng(0)
+        sample = rgb[rng.choice(len(rgb), 4000, replace=False)]
+        
+        estimate, low, high = sampling.estimate_coverage(sample, 0.4, z=2.576)
+        assert low <= 0.15 / 0.4 <= high
+        assert estimate == pytest.approx(0.375, abs=0.05)
+    
+    def test_unique_colors_interval(self):
+        """测试颜色数区间：明显高于或低于阈值的颜色是确定的"""
+        counts = np.array([5000, 3000, 2000, 50, 1])
+        histogram = ColorHistogram(np.arange(5, dtype=np.uint32), counts, bits=5)
+        
+        estimate, low, high = sampling.estimate_unique_colors(histogram, 0.005, z=2.576)
+        assert estimate == 3
+        assert low <= 3 <= high
+        assert low == 3 and high <= 4
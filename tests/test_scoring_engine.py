@@ -96,3 +96,149 @@ class TestScoringEngine:
             crea_score, _ = engine.analyze_creativity()
             
             assert all(0 <= score <= 1 for score in [color_score, comp_score, crea_score])
+    
+    def test_score_from_metrics_matches_analysis(self, engine):
+        """测试由原始子指标推导的得分与直接分析一致"""
+        color_score, _ = engine.analyze_color_usage()
+        comp_score, _ = engine.analyze_composition()
+        crea_score, _ = engine.analyze_creativity()
+        
+        scores, details = ScoringEngine.score_from_metrics(engine.compute_metrics())
+        
+        assert scores['color_usage'] == pytest.approx(color_score)
+        assert scores['composition'] == pytest.approx(comp_score)
+        assert scores['creativity'] == pytest.approx(crea_score)
+        assert set(details['composition']) == {'thirds_score', 'balance_score', 'focal_score'}
+    
+    def test_unique_colors_ignore_compression_noise(self):
+        """测试JPEG压缩噪声不会产生大量独特颜色"""
+        import io
+        from PIL import ImageDraw
+        image = Image.new('RGB', (400, 400), 'white')
+        draw = ImageDraw.Draw(image)
+        for i, color in enumerate([(255, 0, 0), (0, 200, 0), (0, 0, 255), (250, 220, 0), (0, 0, 0)]):
+            draw.ellipse([i * 60, i * 60, i * 60 + 150, i * 60 + 150], fill=color)
+        buf = io.BytesIO()
+        image.save(buf, 'JPEG', quality=70)
+        buf.seek(0)
+        noisy = Image.open(buf).convert('RGB')
+        
+        _, details = ScoringEngine(noisy).analyze_color_usage()
+        assert 6 <= details['unique_colors'] < 15
+    
+    def test_color_palette(self, engine):
+        """测试主色调提取"""
+        palette = engine.color_palette()
+        
+        assert len(palette) == 3
+        # 降位深后取区间中心，主色调与原色相近
+        assert {entry['color'] for entry in palette} == {'#fc0404', '#04fc04', '#0404fc'}
+        assert sum(entry['coverage'] for entry in palette) == pytest.approx(1.0)
+    
+    def test_analogous_colors_bonus(self):
+        """测试类似色搭配获得和谐度加分"""
+        analogous = create_test_image(colors=[(255, 0, 0), (255, 128, 0), (255, 255, 0)])
+        spread = create_test_image(colors=[(255, 0, 0), (0, 255, 0), (0, 0, 255)])
+        
+        assert ScoringEngine(analogous)._harmony_metric() > ScoringEngine(spread)._harmony_metric()
+    
+    def test_fast_mode_reports_error_bounds(self):
+        """测试快速模式返回误差范围"""
+        image = create_test_image(width=400, height=400)
+        engine = ScoringEngine(image, mode='fast')
+        score, details = engine.analyze_color_usage()
+        
+        assert 'coverage_score_error' in details
+        assert 'score_error' in details
+        low, high = engine.score_intervals['color_usage']
+        assert low <= score <= high
+    
+    def test_fast_mode_matches_exact_feedback(self):
+        """测试快速模式的最终得分与精确模式给出相同的反馈档位"""
+        from happygrow.core.feedback_generator import FeedbackGenerator
+        image = create_test_image(width=400, height=400)
+        exact_scores, exact_details = ScoringEngine(image).analyze()
+        fast_scores, fast_details = ScoringEngine(image, mode='fast').analyze()
+        
+        exact = FeedbackGenerator('school', exact_scores, exact_details)
+        fast = FeedbackGenerator('school', fast_scores, fast_details)
+        assert fast.generate_feedback() == exact.generate_feedback()
+        assert fast.get_improvement_suggestions() == exact.get_improvement_suggestions()
+    
+    def test_fast_mode_falls_back_when_unstable(self):
+        """测试误差可能改变反馈档位时回退为精确计算"""
+        from unittest import mock
+        image = create_test_image(width=400, height=400)
+        engine = ScoringEngine(image, mode='fast')
+        
+        with mock.patch('happygrow.core.scoring_engine.FeedbackGenerator.is_stable', return_value=False):
+            scores, details = engine.analyze()
+        
+        assert engine.mode == 'exact'
+        assert not engine.metric_intervals
+        assert 'score_error' not in details['color_usage']
+    
+    def test_invalid_mode(self):
+        """测试无效的评分模式"""
+        with pytest.raises(ValueError):
+            ScoringEngine(create_test_image(), mode='turbo')
+    
+    def test_multi_frame_average(self):
+        """测试多帧评分取各帧子指标的均值，相同的帧与单帧结果一致"""
+        from happygrow.core.scoring_engine import MultiFrameScoringEngine
+        image = create_test_image()
+        single_scores, single_details = ScoringEngine(image).analyze()
+        
+        engine = MultiFrameScoringEngine([image, image.copy()])
+        scores, details = engine.analyze()
+        
+        for dimension in single_scores:
+            assert scores[dimension] == pytest.approx(single_scores[dimension])
+            assert details[dimension] == pytest.approx(single_details[dimension])
+        assert engine.frame_scores()[1] == pytest.approx(single_scores)
+    
+    def test_selected_dimensions_skip_other_planes(self):
+        """测试只评分颜色维度时不计算灰度和边缘"""
+        engine = ScoringEngine(create_test_image())
+        scores, details = engine.analyze(['color_usage'])
+        
+        assert list(scores) == ['color_usage']
+        assert engine._gray is None and engine._edges is None
+        assert scores['color_usage'] == pytest.approx(ScoringEngine(create_test_image()).analyze()[0]['color_usage'])
+        with pytest.raises(ValueError):
+            engine.analyze(['texture'])
+    
+    def test_register_third_party_metric(self):
+        """测试第三方子指标按声明的特征平面计算，出现在维度详情中且不改变维度得分"""
+        ScoringEngine.register_metric('dark_ratio', 'creativity', lambda gray: float(np.mean(gray < 64)),
+                                      planes=('gray',))
+        try:
+            image = create_test_image()
+            scores, details = ScoringEngine(image).analyze(['creativity'])
+            assert 'dark_ratio' in details['creativity']
+            assert scores['creativity'] == pytest.approx(ScoringEngine(image).analyze()[0]['creativity'])
+            with pytest.raises(ValueError):
+                ScoringEngine.register_metric('dark_ratio', 'creativity', lambda gray: 0.0, planes=('gray',))
+        finally:
+            ScoringEngine.unregister_metric('dark_ratio')
+        
+        with pytest.raises(ValueError):
+            ScoringEngine.register_metric('bad', 'creativity', lambda mask: 0.0, planes=('mask',))
+    
+    def test_third_party_metric_in_stored_details(self):
+        """测试由已保存的子指标推导得分时第三方子指标仍出现在详情中，缺少时按过期处理"""
+        from happygrow.services.rescore_service import RescoreService
+        ScoringEngine.register_metric('dark_ratio', 'creativity', lambda gray: float(np.mean(gray < 64)),
+                                      planes=('gray',), version=3)
+        try:
+            metrics = ScoringEngine(create_test_image()).compute_metrics()
+            scores, details = ScoringEngine.score_from_metrics(metrics)
+            assert details['creativity']['dark_ratio'] == metrics['dark_ratio']
+            assert ScoringEngine.metric_versions()['dark_ratio'] == 3
+            
+            stored = {'metric_versions': {name: version for name, version in ScoringEngine.metric_versions().items()
+                                          if name != 'dark_ratio'}}
+            assert RescoreService.stale_metrics(stored) == ['dark_ratio']
+        finally:
+            ScoringEngine.unregister_metric('dark_ratio')
+        assert 'dark_ratio' not in ScoringEngine.score_from_metrics(metrics)[1]['creativity']
@@ -0,0 +1,107 @@
+"""
+测试评分worker
+"""
+import threading
+import numpy as np
+import pytest
+from unittest import mock
+from PIL import Image, ImageDraw
+from happygrow.core.scoring_engine import ScoringEngine
+from happygrow.services.job_broker import SQLiteJobBroker
+from happygrow.services.pixel_cache import PixelCache
+from happygrow.services.result_store import ResultStore
+from happygrow.services.scoring_worker import ScoringWorker
+
+class TestScoringWorker:
+    @pytest.fixture
+    def setup(self, tmp_path):
+        """任务队列、结果存储、暂存目录和一张归档图像"""
+        image = Image.new('RGB', (240, 200), 'white')
+        draw = ImageDraw.Draw(image)
+        draw.ellipse((30, 30, 150, 150), fill=(220, 40, 40))
+        draw.line((0, 190, 239, 10), fill=(20, 90, 200), width=5)
+        image.save(tmp_path / 'drawing.png')
+        broker = SQLiteJobBroker(tmp_path / 'jobs.db', lease_seconds=30, max_attempts=2,
+                                 heartbeat_timeout=30, result_ttl=3600)
+        store = ResultStore(tmp_path / 'results.db')
+        staging = PixelCache(tmp_path / 'staging', 1 << 30)
+        worker = ScoringWorker(broker, store, staging=staging, base_dir=tmp_path, worker_id='w1',
+                               heartbeat_interval=0.05, poll_interval=0.01)
+        payload = {'image_hash': 'abc', 'image_path': 'drawing.png', 'age_group': 'school', 'phash': 7}
+        return broker, store, staging, worker, image, payload
+    
+    def test_process_from_staging(self, setup):
+        """测试由暂存像素计算子指标，写入结果存储并确认任务"""
+        broker, store, staging, worker, image, payload = setup
+        staging.put('abc', np.asarray(image))
+        broker.enqueue('abc', payload)
+        
+        assert worker.run_once()
+        result = broker.get_result('abc')
+        expected = ScoringEngine(image).compute_metrics()
+        assert result['metrics'] == pytest.approx(expected)
+        assert result['worker'] == 'w1'
+        stored = store.get_result('abc')
+        assert stored['image_path'] == 'drawing.png' and stored['phash'] == 7
+        assert stored['config_version'] == ScoringEngine.config_version()
+        assert worker.stats['processed'] == 1
+        assert not worker.run_once()
+    
+    def test_falls_back_to_archived_image(self, setup):
+        """测试暂存像素不存在时读取归档图像"""
+        broker, store, staging, worker, image, payload = setup
+        broker.enqueue('abc', payload)
+        assert worker.run_once()
+        assert broker.get_result('abc')['metrics'] == pytest.approx(ScoringEngine(image).compute_metrics())
+    
+    def test_archived_image_scored_at_analysis_resolution(self, setup, monkeypatch):
+        """测试读取归档图像时按上传时的预处理缩小到评分分辨率"""
+        from happygrow.config.config import IMAGE_CONFIG
+        from happygrow.services.image_service import ImageService
+        broker, store, staging, worker, image, payload = setup
+        monkeypatch.setitem(IMAGE_CONFIG, 'analysis_max_size', 120)
+        broker.enqueue('abc', payload)
+        assert worker.run_once()
+        expected = ScoringEngine(ImageService._fit_analysis_size(image.copy())).compute_metrics()
+        assert broker.get_result('abc')['metrics'] == pytest.approx(expected)
+    
+    def test_redelivered_job_reuses_stored_result(self, setup):
+        """测试重复投递的任务直接使用已写入的结果"""
+        broker, store, staging, worker, image, payload = setup
+        broker.enqueue('abc', payload)
+        worker.run_once()
+        broker.enqueue('abc', payload)
+        
+        with mock.patch.object(ScoringEngine, 'compute_metrics') as compute:
+            assert worker.run_once()
+        compute.assert_not_called()
+        assert worker.stats['reused'] == 1
+        assert 'metrics' in broker.get_result('abc')
+    
+    def test_failure_is_retried_then_reported(self, setup):
+        """测试失败的任务重新排队，超过最多投递次数后结果为错误"""
+        broker, store, staging, worker, image, payload = setup
+        broker.enqueue('abc', dict(payload, image_path='missing.png'))
+        
+        assert worker.run_once()
+        assert broker.get_result('abc') is None
+        assert worker.run_once()
+        assert 'error' in broker.get_result('abc')
+        assert worker.stats['failed'] == 2
+        assert store.get_result('abc') is None
+    
+    def test_run_sends_heartbeats(self, setup):
+        """测试持续运行时发送心跳，执行指定数量的任务后退出"""
+        broker, store, staging, worker, image, payload = setup
+        stop = threading.Event()
+        thread = threading.Thread(target=worker.run, kwargs={'stop': stop})
+        thread.start()
+        try:
+            broker.enqueue('abc', payload)
+            assert broker.wait_result('abc', 10, poll_interval=0.01) is not None
+            workers = broker.workers()
+            assert workers['w1']['pid'] > 0
+        finally:
+            stop.set()
+            thread.join(5)
+        assert not thread.is_alive()
@@ -0,0 +1,73 @@
+"""
+测试影子评分
+"""
+import threading
+import pytest
+from PIL import Image
+from happygrow.core.scoring_engine import ScoringEngine
+from happygrow.services.shadow_scoring import ShadowScorer, load_candidate
+
+def _drawing():
+    image = Image.new('RGB', (200, 200), 'white')
+    image.paste((30, 120, 220), (40, 40, 160, 120))
+    return image
+
+class _ShiftedEngine(ScoringEngine):
+    """把笔触表现力整体加0.1的候选引擎"""
+    def _analyze_stroke_expression(self):
+        return super()._analyze_stroke_expression() + 0.1
+
+class TestShadowScorer:
+    def test_identical_candidate(self):
+        """测试与线上相同的候选引擎没有差异，并记录耗时比"""
+        scorer = ShadowScorer(ScoringEngine, sample_rate=1.0)
+        image = _drawing()
+        scores, details = ScoringEngine(image).analyze()
+        
+        scorer.maybe_submit(image, scores, details, 0.01).result(timeout=10)
+        report = scorer.report()
+        
+        assert report['completed'] == 1
+        assert report['pending'] == 0
+        assert all(stats['max_abs_delta'] == 0 for stats in report['metrics'].values())
+        assert report['latency_ratio']['p50'] > 0
+    
+    def test_candidate_deltas(self):
+        """测试记录各子指标和维度得分的差异"""
+        scorer = ShadowScorer(_ShiftedEngine, sample_rate=1.0)
+        image = _drawing()
+        scores, details = ScoringEngine(image).analyze()
+        
+        scorer.maybe_submit(image, scores, details, 0.01).result(timeout=10)
+        report = scorer.report()
+        
+        assert report['metrics']['stroke_expression']['mismatches'] == 1
+        assert report['metrics']['stroke_expression']['max_abs_delta'] == pytest.approx(0.1)
+        assert report['metrics']['focal_score']['mismatches'] == 0
+        assert report['scores']['creativity']['mismatches'] == 1
+        assert report['scores']['color_usage']['mismatches'] == 0
+    
+    def test_sampling_and_backpressure(self):
+        """测试未抽中的请求不提交，排队已满时丢弃而不等待"""
+        assert ShadowScorer(ScoringEngine, sample_rate=0.0).maybe_submit(None, {}, {}, 0.01) is None
+        
+        release = threading.Event()
+        
+        class SlowEngine:
+            def __init__(self, image):
+                release.wait(10)
+            def analyze(self):
+                return {}, {}
+        
+        scorer = ShadowScorer(SlowEngine, sample_rate=1.0, max_pending=1)
+        first = scorer.maybe_submit(None, {}, {}, 0.01)
+        assert scorer.maybe_submit(None, {}, {}, 0.01) is None
+        release.set()
+        first.result(timeout=10)
+        assert scorer.report()['dropped'] == 1
+    
+    def test_load_candidate(self):
+        """测试按 'module:attribute' 加载候选引擎"""
+        assert load_candidate('happygrow.core.scoring_engine:ScoringEngine') is ScoringEngine
+        with pytest.raises(ValueError):
+            load_candidate('happygrow.core.scoring_engine.ScoringEngine')
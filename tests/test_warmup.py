@@ -0,0 +1,21 @@
+"""
+测试评分路径预热
+"""
+import sys
+from happygrow.core.warmup import create_warmup_image, warmup_scoring_path, preload_dependencies
+
+def test_warmup_image_has_content():
+    """测试预热图像包含非空白内容"""
+    image = create_warmup_image(128)
+    assert image.size == (128, 128)
+    assert len(image.getcolors(128 * 128)) > 1
+
+def test_warmup_scoring_path():
+    """测试预热执行完整评分流程"""
+    elapsed = warmup_scoring_path(64)
+    assert elapsed > 0
+
+def test_preload_dependencies():
+    """测试预加载后SciPy已导入"""
+    preload_dependencies()
+    assert 'scipy.ndimage' in sys.modules
@@ -0,0 +1,8 @@
+"""
+HappyGrow 生产环境 WSGI 入口
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+"""
+from app import app
+
+__all__ = ['app']